@@ -19,7 +19,7 @@ from apps.catalog.models import (
     ShoeProduct,
     PerfumeryProduct,
 )
-from .models import AIProcessingLog, AITemplate, AIModerationQueue, AIProcessingStatus
+from .models import AIBatchJob, AIProcessingLog, AITemplate, AIModerationQueue, AIProcessingStatus, LLMResponseCache
 
 
 # Атрибуты украшений для формы модерации (применяются к JewelryProduct)
@@ -727,6 +727,48 @@ class AITemplateAdmin(admin.ModelAdmin):
     list_select_related = ("category",)
 
 
+@admin.register(AIBatchJob)
+class AIBatchJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "status",
+        "processing_type",
+        "request_count",
+        "completed_count",
+        "failed_count",
+        "submitted_at",
+        "completed_at",
+    )
+    list_filter = ("status", "processing_type", "backend")
+    search_fields = ("external_id",)
+    readonly_fields = (
+        "backend",
+        "external_id",
+        "status",
+        "processing_type",
+        "auto_apply",
+        "options",
+        "request_count",
+        "completed_count",
+        "failed_count",
+        "error_message",
+        "created_at",
+        "submitted_at",
+        "last_polled_at",
+        "completed_at",
+    )
+    date_hierarchy = "created_at"
+
+
+@admin.register(LLMResponseCache)
+class LLMResponseCacheAdmin(admin.ModelAdmin):
+    list_display = ("key", "model", "version", "hit_count", "created_at", "expires_at")
+    list_filter = ("model", "version")
+    search_fields = ("key",)
+    readonly_fields = ("key", "model", "version", "response", "hit_count", "created_at", "expires_at")
+    date_hierarchy = "created_at"
+
+
 @admin.register(AIModerationQueue)
 class AIModerationQueueAdmin(admin.ModelAdmin):
     list_display = (
@@ -1,14 +1,45 @@
-"""Прогон AI по тестовым товарам: качество и стоимость."""
-from decimal import Decimal
-from django.core.management.base import BaseCommand
-from django.db.models import Sum, Avg, Count
-from apps.catalog.models import Product
+"""
+Прогон AI по тестовым товарам: задержки по этапам, токены, стоимость, кэш.
+
+Товары обрабатываются `--concurrency` потоками (как несколько воркеров Celery),
+после `--warmup` прогрева. Отчёт — p50/p95/p99 по этапам пайплайна
+(pipeline_profiler.STAGES), токены и оценка стоимости на товар, доля ответов
+из LLMResponseCache. `--mock-llm` заменяет OpenAI локальной имитацией с
+заданным распределением задержки, `--json` сохраняет отчёт для сравнения
+«до/после».
+"""
+import json
+import threading
+import time
+from contextlib import nullcontext
+from queue import Empty, Queue
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Avg
+from django.utils import timezone
+
 from apps.ai.models import AIProcessingLog, AIProcessingStatus
 from apps.ai.services.content_generator import ContentGenerator
+from apps.ai.services.pipeline_profiler import PERCENTILES, STAGES, PipelineProfiler
+from apps.catalog.models import Category, Product
+
+SUCCESS_STATUSES = (AIProcessingStatus.COMPLETED, AIProcessingStatus.APPROVED, AIProcessingStatus.MODERATION)
+
+# Опции process_product, при которых _options_to_processing_type даёт нужный тип.
+PROCESSING_OPTIONS = {
+    "full": {},
+    "description_only": {"categorize": False},
+    "categorization_only": {"generate_description": False},
+    "image_analysis": {"generate_description": False, "categorize": False},
+}
 
 
 class Command(BaseCommand):
-    help = "Запустить AI обработку на N товарах и вывести сводку (успех, уверенность, стоимость)"
+    help = (
+        "Запустить AI обработку на N товарах с заданной конкурентностью и вывести "
+        "p50/p95/p99 по этапам, токены, стоимость и долю попаданий в кэш"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -26,58 +57,252 @@ class Command(BaseCommand):
         parser.add_argument(
             "--auto-apply",
             action="store_true",
-            help="Применять результаты к товару при успехе",
+            help="Применять результаты к товару при успехе (не с --mock-llm)",
+        )
+        parser.add_argument(
+            "--processing-type",
+            choices=sorted(PROCESSING_OPTIONS),
+            default="full",
+            help="Тип обработки (по умолчанию full)",
+        )
+        parser.add_argument(
+            "--product-type",
+            default="",
+            help="Брать только товары этого product_type",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Сколько товаров обрабатывать одновременно (потоки, по умолчанию 1)",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=0,
+            help="Прогревочных прогонов до замера (не входят в статистику, без кэша ответов)",
+        )
+        parser.add_argument(
+            "--no-images",
+            action="store_true",
+            help="Не отправлять изображения в Vision",
+        )
+        parser.add_argument(
+            "--no-llm-cache",
+            action="store_true",
+            help="Не использовать LLMResponseCache в замеряемом прогоне",
+        )
+        parser.add_argument(
+            "--mock-llm",
+            action="store_true",
+            help="Локальная имитация OpenAI вместо сети (изображения отключаются)",
+        )
+        parser.add_argument(
+            "--mock-latency-ms",
+            type=float,
+            default=800,
+            help="Медиана задержки ответа mock LLM, мс (по умолчанию 800)",
+        )
+        parser.add_argument(
+            "--mock-latency-p95-ms",
+            type=float,
+            default=2000,
+            help="p95 задержки ответа mock LLM, мс (по умолчанию 2000)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed последовательности задержек mock LLM",
+        )
+        parser.add_argument(
+            "--keep-logs",
+            action="store_true",
+            help="Не удалять логи mock-прогона",
+        )
+        parser.add_argument(
+            "--json",
+            dest="json_path",
+            default="",
+            help="Сохранить отчёт в JSON (путь или '-' для stdout)",
         )
 
     def handle(self, *args, **options):
         limit = options["limit"]
-        dry_run = options["dry_run"]
-        auto_apply = options["auto_apply"]
-        products = Product.objects.all()[:limit]
-        product_ids = list(products.values_list("id", flat=True))
+        concurrency = max(1, options["concurrency"])
+        mock_llm = options["mock_llm"]
+        processing_type = options["processing_type"]
+        if mock_llm and options["auto_apply"]:
+            raise CommandError("--auto-apply нельзя сочетать с --mock-llm: ответы mock LLM не должны попасть в товары")
+
+        products = Product.objects.order_by("id")
+        if options["product_type"]:
+            products = products.filter(product_type=options["product_type"])
+        product_ids = list(products.values_list("id", flat=True)[:limit])
         if not product_ids:
             self.stdout.write(self.style.WARNING("Нет товаров в каталоге."))
             return
         self.stdout.write(f"Товаров к обработке: {len(product_ids)} (id: {product_ids})")
-        if dry_run:
+        if options["dry_run"]:
             self.stdout.write("Dry run — выход без запуска.")
             return
-        generator = ContentGenerator()
-        ok = 0
-        err = 0
-        for pid in product_ids:
+
+        generator = self._build_generator(options)
+        # Бенчмарк всегда перегенерирует: уже обработанные товары иначе пропускаются.
+        run_options = {
+            "force": True,
+            **PROCESSING_OPTIONS[processing_type],
+            "use_images": not (options["no_images"] or mock_llm),
+            "skip_llm_cache": options["no_llm_cache"],
+        }
+
+        if options["warmup"]:
+            warmup_ids = [product_ids[i % len(product_ids)] for i in range(options["warmup"])]
+            self.stdout.write(f"Прогрев (прогонов: {len(warmup_ids)})...")
+            self._run(generator, warmup_ids, processing_type, {**run_options, "skip_llm_cache": True}, False, concurrency)
+
+        profiler = PipelineProfiler()
+        profiler.instrument(generator)
+        started_at = timezone.now()
+        started = time.perf_counter()
+        self._run(generator, product_ids, processing_type, run_options, options["auto_apply"], concurrency, profiler)
+        wall_time = time.perf_counter() - started
+
+        summary = profiler.summary(wall_time)
+        run_logs = AIProcessingLog.objects.filter(product_id__in=product_ids, created_at__gte=started_at)
+        summary["avg_category_confidence"] = round(
+            run_logs.filter(status__in=SUCCESS_STATUSES).aggregate(avg=Avg("category_confidence"))["avg"] or 0, 4
+        )
+        self._print_report(profiler, summary)
+
+        if options["json_path"]:
+            report = {
+                "config": {
+                    "limit": limit,
+                    "processing_type": processing_type,
+                    "concurrency": concurrency,
+                    "warmup": options["warmup"],
+                    "mock_llm": mock_llm,
+                    "mock_latency_ms": options["mock_latency_ms"] if mock_llm else None,
+                    "mock_latency_p95_ms": options["mock_latency_p95_ms"] if mock_llm else None,
+                    "seed": options["seed"] if mock_llm else None,
+                    "use_images": run_options["use_images"],
+                    "llm_cache": not options["no_llm_cache"],
+                    "model": generator.llm.model,
+                    "started_at": started_at.isoformat(),
+                },
+                "summary": summary,
+                "samples": [sample.as_dict() for sample in profiler.samples],
+            }
+            payload = json.dumps(report, ensure_ascii=False, indent=2)
+            if options["json_path"] == "-":
+                self.stdout.write(payload)
+            else:
+                with open(options["json_path"], "w", encoding="utf-8") as fh:
+                    fh.write(payload)
+                self.stdout.write(f"Отчёт сохранён: {options['json_path']}")
+
+        if mock_llm and not options["keep_logs"]:
+            from apps.ai.services.mock_llm import MOCK_MODEL_PREFIX
+
+            _, deleted = AIProcessingLog.objects.filter(
+                product_id__in=product_ids,
+                llm_model__startswith=MOCK_MODEL_PREFIX,
+            ).delete()
+            self.stdout.write(f"Удалено логов mock-прогона: {deleted.get(AIProcessingLog._meta.label, 0)}")
+
+    def _build_generator(self, options) -> ContentGenerator:
+        if not options["mock_llm"]:
+            return ContentGenerator()
+        from apps.ai.services import embedding_index
+        from apps.ai.services.mock_llm import ScriptedLatency, build_mock_llm
+
+        category_slug = ""
+        if options["processing_type"] == "categorization_only":
+            category_slug = Category.objects.filter(is_active=True).values_list("slug", flat=True).first() or ""
+        llm = build_mock_llm(
+            ScriptedLatency(options["mock_latency_ms"], options["mock_latency_p95_ms"], seed=options["seed"]),
+            category_slug=category_slug,
+        )
+        # Эмбеддинги запросов RAG тоже идут через mock-клиент.
+        embedding_index.use_embedding_client(llm)
+        self.stdout.write(
+            f"Mock LLM: медиана {options['mock_latency_ms']:.0f} мс, p95 {options['mock_latency_p95_ms']:.0f} мс, "
+            f"seed {options['seed']}"
+        )
+        return ContentGenerator(llm=llm)
+
+    def _run(self, generator, product_ids, processing_type, run_options, auto_apply, concurrency, profiler=None):
+        """Обработка товаров `concurrency` потоками; у каждого потока своё соединение с БД."""
+        queue = Queue()
+        for product_id in product_ids:
+            queue.put(product_id)
+
+        def drain():
+            while True:
+                try:
+                    product_id = queue.get_nowait()
+                except Empty:
+                    return
+                self._process(generator, product_id, processing_type, run_options, auto_apply, profiler)
+
+        def worker():
+            try:
+                drain()
+            finally:
+                connection.close()
+
+        if concurrency == 1:
+            drain()
+            return
+        threads = [threading.Thread(target=worker) for _ in range(min(concurrency, len(product_ids)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _process(self, generator, product_id, processing_type, run_options, auto_apply, profiler):
+        with profiler.product(product_id) if profiler else nullcontext() as sample:
             try:
                 log = generator.process_product(
-                    product_id=pid,
-                    processing_type="full",
+                    product_id=product_id,
+                    processing_type=processing_type,
                     auto_apply=auto_apply,
+                    options=run_options,
                 )
-                status = getattr(log, "status", None)
-                if status in (AIProcessingStatus.COMPLETED, AIProcessingStatus.APPROVED, AIProcessingStatus.MODERATION):
-                    ok += 1
-                    conf = getattr(log, "category_confidence", None) or 0
-                    cost = getattr(log, "cost_usd", None) or Decimal("0")
-                    self.stdout.write(
-                        f"  product {pid}: status={status}, confidence={conf:.2f}, cost_usd={cost}"
-                    )
-                else:
-                    err += 1
-                    self.stdout.write(self.style.WARNING(f"  product {pid}: status={status}"))
+                status = getattr(log, "status", "")
+                if sample is not None:
+                    sample.status = status
+                    if status not in SUCCESS_STATUSES:
+                        sample.error = f"status={status}"
             except Exception as e:
-                err += 1
-                self.stdout.write(self.style.ERROR(f"  product {pid}: error {e}"))
+                if sample is not None:
+                    sample.status = AIProcessingStatus.FAILED
+                    sample.error = str(e) or type(e).__name__
+                if profiler:
+                    self.stdout.write(self.style.ERROR(f"  product {product_id}: error {e}"))
+
+    def _print_report(self, profiler, summary):
         self.stdout.write("")
-        agg = AIProcessingLog.objects.filter(product_id__in=product_ids).aggregate(
-            total_cost=Sum("cost_usd"),
-            avg_conf=Avg("category_confidence"),
-            cnt=Count("id"),
+        header = f"{'этап':<12}" + "".join(f"{'p' + str(q):>10}" for q in PERCENTILES) + f"{'mean':>10}  (мс)"
+        self.stdout.write(header)
+        for name in (*STAGES, "other", "total"):
+            row = summary["latency_ms"][name]
+            self.stdout.write(
+                f"{name:<12}" + "".join(f"{row['p' + str(q)]:>10.1f}" for q in PERCENTILES) + f"{row['mean']:>10.1f}"
+            )
+        self.stdout.write("")
+        cache_info = summary["llm_cache"]
+        self.stdout.write(
+            f"Токены: {summary['tokens']['total']} (на товар {summary['tokens']['per_product']}), "
+            f"стоимость: ${summary['cost_usd']['total']:.4f} (на товар ${summary['cost_usd']['per_product']:.6f}), "
+            f"кэш LLM: {cache_info['hits']}/{cache_info['lookups']} ({cache_info['hit_rate']:.0%})"
         )
-        total_cost = agg["total_cost"] or Decimal("0")
-        avg_conf = agg["avg_conf"] or 0
         self.stdout.write(
             self.style.SUCCESS(
-                f"Итого: обработано {ok + err}, успешно {ok}, ошибок {err}. "
-                f"Логов по товарам: {agg['cnt']}, сумма cost_usd={total_cost:.4f}, "
-                f"avg confidence={avg_conf:.2f}"
+                f"Итого: обработано {summary['products']}, успешно {summary['succeeded']}, "
+                f"ошибок {summary['failed']} за {summary['wall_time_s']:.2f} с "
+                f"({summary['throughput_per_min']:.1f} товаров/мин), "
+                f"avg confidence={summary['avg_category_confidence']:.2f}"
             )
         )
@@ -1,15 +1,25 @@
-"""Инициализация коллекций Qdrant для AI (categories, templates)."""
+"""Инициализация коллекций Qdrant (AI: categories, templates; RecSys: product_recommendations)."""
 from django.core.management.base import BaseCommand
 
 
 class Command(BaseCommand):
-    help = "Создать коллекции Qdrant (categories, templates) если их нет"
+    help = "Создать коллекции Qdrant (categories, templates, product_recommendations) если их нет"
 
     def handle(self, *args, **options):
         try:
             from apps.ai.services.vector_store import QdrantManager
+            from apps.recommendations.services.qdrant_registry import ensure_bootstrapped
+            from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+
             mgr = QdrantManager()
-            mgr._ensure_collections()
+            if mgr._ensure_collections() is False:
+                raise RuntimeError("AI collections are not available")
+            engine = QdrantRecommendationEngine()
+            ensure_bootstrapped(
+                f"recommendations:{engine.COLLECTION_NAME}",
+                engine._ensure_collection_exists,
+                force=True,
+            )
             self.stdout.write(self.style.SUCCESS("Qdrant collections ready."))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Failed: {e}"))
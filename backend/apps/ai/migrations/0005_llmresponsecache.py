@@ -0,0 +1,30 @@
+# Generated by Django 5.2.10 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0004_alter_aiprocessinglog_image_analysis_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Хэш запроса')),
+                ('model', models.CharField(max_length=50, verbose_name='Модель')),
+                ('version', models.CharField(blank=True, default='', help_text='Смена версии промпта делает старые ответы недоступными', max_length=50, verbose_name='Версия шаблона')),
+                ('response', models.JSONField(help_text='content, tokens, cost_usd и raw_response исходного вызова', verbose_name='Ответ LLM')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='Попаданий')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Кэш ответа LLM',
+                'verbose_name_plural': 'Кэш ответов LLM',
+            },
+        ),
+    ]
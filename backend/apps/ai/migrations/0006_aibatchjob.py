@@ -0,0 +1,45 @@
+# Generated by Django 5.2.10 on 2026-10-19 00:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0005_llmresponsecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backend', models.CharField(max_length=255, verbose_name='Backend')),
+                ('external_id', models.CharField(blank=True, default='', max_length=255, verbose_name='ID задания у провайдера')),
+                ('status', models.CharField(choices=[('pending', 'Формируется'), ('submitted', 'Отправлен'), ('completed', 'Результаты применены'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('processing_type', models.CharField(default='description_only', max_length=20, verbose_name='Тип обработки')),
+                ('auto_apply', models.BooleanField(default=False, verbose_name='Применять к товарам')),
+                ('options', models.JSONField(blank=True, default=dict, verbose_name='Опции')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='Запросов')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Успешно')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='С ошибкой')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Сообщение об ошибке')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_polled_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Пакетное AI задание',
+                'verbose_name_plural': 'Пакетные AI задания',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ai_aibatchj_status_6015c7_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='aiprocessinglog',
+            name='batch_job',
+            field=models.ForeignKey(blank=True, help_text='Отложенная обработка через batch API (пусто — интерактивный вызов)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='ai.aibatchjob', verbose_name='Пакетное задание'),
+        ),
+    ]
@@ -11,6 +11,12 @@ class AIProcessingStatus(models.TextChoices):
     APPROVED = 'approved', 'Одобрено'
     REJECTED = 'rejected', 'Отклонено'
 
+class AIBatchJobStatus(models.TextChoices):
+    PENDING = 'pending', 'Формируется'
+    SUBMITTED = 'submitted', 'Отправлен'
+    COMPLETED = 'completed', 'Результаты применены'
+    FAILED = 'failed', 'Ошибка'
+
 class AIProcessingLog(models.Model):
     """
     Полный лог AI обработки товара.
@@ -38,6 +44,15 @@ class AIProcessingLog(models.Model):
         related_name='ai_processed',
         verbose_name='Обработал (модератор)'
     )
+    batch_job = models.ForeignKey(
+        'AIBatchJob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='logs',
+        verbose_name='Пакетное задание',
+        help_text='Отложенная обработка через batch API (пусто — интерактивный вызов)'
+    )
 
     # Тип и статус обработки
     processing_type = models.CharField(
@@ -283,3 +298,72 @@ class AIModerationQueue(models.Model):
 
     class Meta:
         ordering = ['-priority', 'created_at']
+
+class LLMResponseCache(models.Model):
+    """
+    Кэш ответов LLM по хэшу запроса (модель, температура, сообщения, изображения).
+    Повторная обработка товара с теми же входными данными не обращается к API.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name='Хэш запроса')
+    model = models.CharField(max_length=50, verbose_name='Модель')
+    version = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name='Версия шаблона',
+        help_text='Смена версии промпта делает старые ответы недоступными'
+    )
+    response = models.JSONField(
+        verbose_name='Ответ LLM',
+        help_text='content, tokens, cost_usd и raw_response исходного вызова'
+    )
+    hit_count = models.PositiveIntegerField(default=0, verbose_name='Попаданий')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Истекает')
+
+    class Meta:
+        verbose_name = 'Кэш ответа LLM'
+        verbose_name_plural = 'Кэш ответов LLM'
+
+    def __str__(self):
+        return f"{self.model} {self.key[:12]}"
+
+
+class AIBatchJob(models.Model):
+    """
+    Отложенная пакетная генерация: запросы к LLM уходят одним JSONL-файлом
+    в batch backend (OpenAI Batch API), результаты забирает Celery beat.
+    """
+    backend = models.CharField(max_length=255, verbose_name='Backend')
+    external_id = models.CharField(max_length=255, blank=True, default='', verbose_name='ID задания у провайдера')
+    status = models.CharField(
+        max_length=20,
+        choices=AIBatchJobStatus.choices,
+        default=AIBatchJobStatus.PENDING,
+        verbose_name='Статус'
+    )
+    processing_type = models.CharField(max_length=20, default='description_only', verbose_name='Тип обработки')
+    auto_apply = models.BooleanField(default=False, verbose_name='Применять к товарам')
+    options = models.JSONField(default=dict, blank=True, verbose_name='Опции')
+
+    request_count = models.PositiveIntegerField(default=0, verbose_name='Запросов')
+    completed_count = models.PositiveIntegerField(default=0, verbose_name='Успешно')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='С ошибкой')
+    error_message = models.TextField(null=True, blank=True, verbose_name='Сообщение об ошибке')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Пакетное AI задание'
+        verbose_name_plural = 'Пакетные AI задания'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Batch #{self.id} {self.status} ({self.request_count})"
@@ -0,0 +1,114 @@
+"""
+Производные изображений для Vision-анализа.
+
+Каждая обработка товара раньше не только скачивала оригиналы (R2 get_object или
+внешний GET), но и уменьшала их Pillow (LANCZOS) и перекодировала в JPEG.
+Теперь результат («производная») сохраняется один раз в default_storage (R2 или
+локальный диск) под AI_R2_SETTINGS['derivatives_path'] и переиспользуется:
+
+* ключ — идентичность источника + max_size + quality. Для объектов R2 это
+  ключ объекта + ETag + ContentLength из head_object: попадание в кэш не
+  скачивает оригинал, а перезапись объекта меняет ETag. Внешний URL может
+  указывать на что угодно, поэтому его скачиваем и доверяем только sha256 байтов;
+* производная создаётся лениво, при первой AI-обработке — загрузка медиа
+  парсером её не рендерит;
+* внешние загрузки идут через общую на процесс requests.Session с пулом.
+"""
+import hashlib
+import logging
+import os
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = (1024, 1024)
+DEFAULT_QUALITY = 85
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+
+
+def _config(name: str, default):
+    return getattr(settings, "AI_CONFIG", {}).get(name, default)
+
+
+def is_enabled() -> bool:
+    return bool(_config("ANALYSIS_IMAGE_CACHE", True))
+
+
+def get_http_session() -> requests.Session:
+    """Общая Session процесса (keep-alive); после fork создаётся заново."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            pool_size = _config("ANALYSIS_HTTP_POOL_SIZE", 16)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def content_digest(image_data: bytes) -> str:
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def object_digest(key: str, etag: str, content_length: Optional[int]) -> str:
+    """Идентичность объекта R2 по метаданным head_object — без скачивания тела."""
+    etag = (etag or "").strip('"')
+    identity = f"r2:{key}:{etag}:{content_length}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+def derivative_path(digest: str, max_size: Tuple[int, int] = DEFAULT_MAX_SIZE, quality: int = DEFAULT_QUALITY) -> str:
+    """Путь производной в default_storage по object_digest / content_digest источника."""
+    prefix = getattr(settings, "AI_R2_SETTINGS", {}).get("derivatives_path", "products/ai_derivatives/")
+    width, height = max_size
+    return f"{prefix.rstrip('/')}/{digest[:2]}/{digest}-{width}x{height}-q{quality}.jpg"
+
+
+def render_derivative(image_data: bytes, max_size: Tuple[int, int] = DEFAULT_MAX_SIZE, quality: int = DEFAULT_QUALITY) -> Dict:
+    """Уменьшение и JPEG-перекодирование исходных байтов."""
+    img = Image.open(BytesIO(image_data))
+    original_format = img.format
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return {"data": buffer.getvalue(), "dimensions": img.size, "original_format": original_format}
+
+
+def load_derivative(path: str) -> Optional[Dict]:
+    """Сохранённая производная или None (нет файла / хранилище недоступно)."""
+    try:
+        if not default_storage.exists(path):
+            return None
+        with default_storage.open(path, "rb") as fh:
+            data = fh.read()
+        # Image.open читает только заголовок — размеры без декодирования.
+        dimensions = Image.open(BytesIO(data)).size
+    except Exception as e:
+        logger.warning("Analysis derivative %s unreadable: %s", path, e)
+        return None
+    return {"data": data, "dimensions": dimensions, "original_format": None}
+
+
+def save_derivative(path: str, data: bytes) -> None:
+    try:
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(data))
+    except Exception as e:
+        logger.warning("Failed to store analysis derivative %s: %s", path, e)
+
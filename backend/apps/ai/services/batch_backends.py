@@ -0,0 +1,133 @@
+"""
+Backend'ы отложенной пакетной обработки LLM.
+
+Backend принимает JSONL с запросами в формате OpenAI Batch API
+(``{"custom_id", "method", "url", "body"}`` на строку) и позже отдаёт JSONL
+с ответами (``{"custom_id", "response": {"status_code", "body"}, "error"}``).
+Используемый класс задаётся в AI_CONFIG['BATCH_BACKEND'].
+"""
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+@dataclass
+class BatchStatus:
+    state: str  # in_progress | completed | failed
+    output: Optional[str] = None  # JSONL с результатами, когда state == completed
+    error: str = ""
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("completed", "failed")
+
+
+class BaseBatchBackend(ABC):
+    """Интерфейс batch backend'а."""
+
+    @abstractmethod
+    def submit(self, jsonl: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        """Отправляет JSONL, возвращает идентификатор задания у провайдера."""
+
+    @abstractmethod
+    def poll(self, external_id: str) -> BatchStatus:
+        """Состояние задания; output заполнен, когда state == completed."""
+
+
+class OpenAIBatchBackend(BaseBatchBackend):
+    """OpenAI Batch API: окно 24 часа, отдельные от интерактивных лимиты, цена ниже вдвое."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = client
+
+    def submit(self, jsonl: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        input_file = self.client.files.create(
+            file=("ai_batch.jsonl", jsonl.encode("utf-8")),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window="24h",
+            metadata=metadata or None,
+        )
+        return batch.id
+
+    def poll(self, external_id: str) -> BatchStatus:
+        batch = self.client.batches.retrieve(external_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            errors = getattr(batch, "errors", None)
+            return BatchStatus("failed", error=f"{batch.status}: {errors}" if errors else batch.status)
+        if batch.status != "completed":
+            return BatchStatus("in_progress")
+        # Успешные ответы и ошибки по отдельным запросам лежат в разных файлах.
+        parts = [
+            self.client.files.content(file_id).text
+            for file_id in (batch.output_file_id, batch.error_file_id)
+            if file_id
+        ]
+        return BatchStatus("completed", output="\n".join(part.strip() for part in parts if part.strip()))
+
+
+class LocalFileBatchBackend(BaseBatchBackend):
+    """
+    Файловый backend для разработки и тестов: задание — каталог с input.jsonl,
+    результат — output.jsonl рядом. Если задан responder(body) -> ответ chat
+    completion, output формируется при первом poll.
+    """
+
+    def __init__(self, root=None, responder: Optional[Callable[[Dict], Dict]] = None):
+        root = root or settings.AI_CONFIG.get("BATCH_LOCAL_DIR") or Path(settings.MEDIA_ROOT) / "ai_batches"
+        self.root = Path(root)
+        self.responder = responder
+
+    def submit(self, jsonl: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        external_id = f"local-{uuid.uuid4().hex}"
+        job_dir = self.root / external_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        (job_dir / "input.jsonl").write_text(jsonl, encoding="utf-8")
+        (job_dir / "metadata.json").write_text(json.dumps(metadata or {}), encoding="utf-8")
+        return external_id
+
+    def poll(self, external_id: str) -> BatchStatus:
+        job_dir = self.root / external_id
+        if not (job_dir / "input.jsonl").exists():
+            return BatchStatus("failed", error=f"batch {external_id} not found")
+        output_path = job_dir / "output.jsonl"
+        if not output_path.exists() and self.responder is not None:
+            lines = []
+            for raw in (job_dir / "input.jsonl").read_text(encoding="utf-8").splitlines():
+                if not raw.strip():
+                    continue
+                request = json.loads(raw)
+                lines.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": self.responder(request["body"])},
+                    "error": None,
+                }, ensure_ascii=False))
+            output_path.write_text("\n".join(lines), encoding="utf-8")
+        if not output_path.exists():
+            return BatchStatus("in_progress")
+        return BatchStatus("completed", output=output_path.read_text(encoding="utf-8"))
+
+
+def get_batch_backend(path: Optional[str] = None) -> BaseBatchBackend:
+    """Backend по dotted path (по умолчанию — AI_CONFIG['BATCH_BACKEND'])."""
+    path = path or settings.AI_CONFIG.get("BATCH_BACKEND") or "apps.ai.services.batch_backends.OpenAIBatchBackend"
+    return import_string(path)()
@@ -0,0 +1,254 @@
+"""
+Отложенная пакетная генерация контента (nightly-перегенерация описаний).
+
+Интерактивные вызовы (модерация, ручной запуск) и массовая перегенерация
+делят одни лимиты OpenAI. Для тысяч товаров запросы вместо этого
+сериализуются в JSONL и отправляются в batch backend (AIBatchJob):
+
+* submit_batch_job — pending-логи одним bulk_create, JSONL, отправка;
+* collect_batch_job — опрос backend'а (Celery beat) и применение результатов
+  теми же методами ContentGenerator, что и при поштучной обработке.
+
+Vision-анализ в пакетном режиме не выполняется — только текстовая генерация.
+"""
+import json
+import logging
+import traceback
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from apps.ai.models import AIBatchJob, AIBatchJobStatus, AIProcessingLog, AIProcessingStatus
+from apps.ai.services.batch_backends import BaseBatchBackend, get_batch_backend
+from apps.ai.services.bulk_generator import ACTIVE_LOG_STATUSES
+from apps.catalog.models import Product
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROCESSING_TYPES = ("full", "description_only", "categorization_only")
+# Batch API тарифицируется со скидкой 50% от интерактивных цен.
+BATCH_PRICE_FACTOR = 0.5
+
+
+def _get_generator(generator=None):
+    if generator is None:
+        from apps.ai.services.content_generator import ContentGenerator
+
+        generator = ContentGenerator()
+    return generator
+
+
+def _backend_path(backend: BaseBatchBackend) -> str:
+    return f"{type(backend).__module__}.{type(backend).__qualname__}"
+
+
+def _fail_log(log: AIProcessingLog, message: str, stack_trace: str = "") -> None:
+    log.status = AIProcessingStatus.FAILED
+    log.error_message = message
+    log.stack_trace = stack_trace or None
+    log.completed_at = timezone.now()
+    log.save()
+
+
+def _fail_job(job: AIBatchJob, message: str) -> None:
+    job.status = AIBatchJobStatus.FAILED
+    job.error_message = message
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "error_message", "completed_at"])
+
+
+def submit_batch_job(
+    product_ids: List[int],
+    processing_type: str = "description_only",
+    auto_apply: bool = False,
+    options: Optional[Dict] = None,
+    backend: Optional[BaseBatchBackend] = None,
+    generator=None,
+) -> AIBatchJob:
+    """Создаёт pending-логи, сериализует запросы в JSONL и отправляет задание."""
+    if processing_type not in BATCH_PROCESSING_TYPES:
+        raise ValueError(f"Пакетный режим не поддерживает processing_type={processing_type}")
+    options = dict(options or {})
+    backend = backend or get_batch_backend()
+    generator = _get_generator(generator)
+
+    job = AIBatchJob.objects.create(
+        backend=_backend_path(backend),
+        processing_type=processing_type,
+        auto_apply=auto_apply,
+        options=options,
+    )
+    try:
+        return _submit(job, product_ids, processing_type, options, backend, generator)
+    except Exception as e:
+        # Задание не должно навсегда остаться в PENDING.
+        logger.exception("Batch job %s: submit aborted", job.id)
+        _fail_job(job, str(e))
+        AIProcessingLog.objects.filter(batch_job=job, status=AIProcessingStatus.PENDING).update(
+            status=AIProcessingStatus.FAILED,
+            error_message=f"Пакетное задание прервано: {e}",
+            completed_at=timezone.now(),
+        )
+        return job
+
+
+def _submit(job, product_ids, processing_type, options, backend, generator) -> AIBatchJob:
+    products = Product.objects.select_related("category", "brand").in_bulk(product_ids)
+    busy = set()
+    if not options.get("force"):
+        busy = set(
+            AIProcessingLog.objects.filter(
+                product_id__in=products.keys(),
+                processing_type=processing_type,
+                status__in=ACTIVE_LOG_STATUSES,
+            ).values_list("product_id", flat=True)
+        )
+    queued_at = timezone.now().isoformat()
+    # Входные данные собираются по товару: ошибка одного товара роняет только его лог.
+    logs, errors = [], []
+    for product_id in dict.fromkeys(product_ids):
+        if product_id not in products or product_id in busy:
+            continue
+        try:
+            input_data = generator._collect_input_data(products[product_id])
+            error = None
+        except Exception as e:
+            input_data, error = {}, (str(e), traceback.format_exc())
+        logs.append(AIProcessingLog(
+            product=products[product_id],
+            batch_job=job,
+            processing_type=processing_type,
+            status=AIProcessingStatus.PENDING,
+            input_data={**input_data, "batch_job_id": job.id, "queued_at": queued_at},
+            llm_model=generator.llm.model,
+        ))
+        errors.append(error)
+    logs = AIProcessingLog.objects.bulk_create(logs)
+
+    lines = []
+    for log, error in zip(logs, errors):
+        if error is not None:
+            logger.error("Batch job %s: failed to collect input for product %s: %s", job.id, log.product_id, error[0])
+            _fail_log(log, *error)
+            continue
+        try:
+            request = generator.build_batch_request(log.product, log, processing_type, custom_id=f"log-{log.id}")
+            lines.append(json.dumps(request, ensure_ascii=False))
+        except Exception as e:
+            logger.exception("Batch job %s: failed to build request for product %s", job.id, log.product_id)
+            _fail_log(log, str(e), traceback.format_exc())
+
+    if not lines:
+        _fail_job(job, "Нет товаров для пакетной обработки")
+        return job
+
+    try:
+        job.external_id = backend.submit("\n".join(lines), metadata={"ai_batch_job": str(job.id)})
+    except Exception as e:
+        logger.exception("Batch job %s: submit failed", job.id)
+        _fail_job(job, str(e))
+        AIProcessingLog.objects.filter(batch_job=job, status=AIProcessingStatus.PENDING).update(
+            status=AIProcessingStatus.FAILED,
+            error_message=f"Не удалось отправить пакетное задание: {e}",
+            completed_at=timezone.now(),
+        )
+        return job
+
+    job.status = AIBatchJobStatus.SUBMITTED
+    job.request_count = len(lines)
+    job.submitted_at = timezone.now()
+    job.save(update_fields=["external_id", "status", "request_count", "submitted_at"])
+    logger.info("Batch job %s submitted: %s requests (%s)", job.id, len(lines), job.external_id)
+    return job
+
+
+def _generation_result(generator, job: AIBatchJob, body: Dict, custom_id: str) -> Dict:
+    """Ответ batch API в формате LLMClient.generate_content."""
+    usage = body.get("usage") or {}
+    tokens = {
+        "prompt": usage.get("prompt_tokens", 0),
+        "completion": usage.get("completion_tokens", 0),
+        "total": usage.get("total_tokens", 0),
+    }
+    raw_text = ((body.get("choices") or [{}])[0].get("message") or {}).get("content") or ""
+    model = body.get("model") or generator.llm.model
+    elapsed = timezone.now() - (job.submitted_at or job.created_at)
+    return {
+        "content": generator.llm._parse_json_response(raw_text),
+        "tokens": tokens,
+        "cost_usd": round(generator.llm._cost(model, tokens) * BATCH_PRICE_FACTOR, 6),
+        "processing_time_ms": int(elapsed.total_seconds() * 1000),
+        "raw_response": body,
+        "batch": {"job_id": job.id, "custom_id": custom_id},
+    }
+
+
+def collect_batch_job(
+    job: AIBatchJob,
+    backend: Optional[BaseBatchBackend] = None,
+    generator=None,
+) -> List[AIProcessingLog]:
+    """Опрашивает backend; если результаты готовы — применяет их. Возвращает успешные логи."""
+    if job.status != AIBatchJobStatus.SUBMITTED:
+        return []
+    # Задание опрашивается тем backend'ом, через который было отправлено.
+    backend = backend or get_batch_backend(job.backend)
+    status = backend.poll(job.external_id)
+    job.last_polled_at = timezone.now()
+    if not status.finished:
+        job.save(update_fields=["last_polled_at"])
+        return []
+
+    pending = {
+        log.id: log
+        for log in job.logs.select_related("product").filter(status=AIProcessingStatus.PENDING)
+    }
+    if status.state == "failed":
+        for log in pending.values():
+            _fail_log(log, f"Пакетное задание не выполнено: {status.error}")
+        job.status = AIBatchJobStatus.FAILED
+        job.error_message = status.error
+        job.failed_count = len(pending)
+        job.completed_at = timezone.now()
+        job.save(update_fields=["status", "error_message", "failed_count", "last_polled_at", "completed_at"])
+        return []
+
+    generator = _get_generator(generator)
+    processed, failed = [], 0
+    for raw in (status.output or "").splitlines():
+        if not raw.strip():
+            continue
+        line = json.loads(raw)
+        custom_id = line.get("custom_id") or ""
+        log_id = custom_id[len("log-"):]
+        log = pending.pop(int(log_id), None) if custom_id.startswith("log-") and log_id.isdigit() else None
+        if log is None:
+            continue
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            _fail_log(log, f"Batch API error: {line.get('error') or response.get('body')}")
+            failed += 1
+            continue
+        try:
+            log.status = AIProcessingStatus.PROCESSING
+            result = _generation_result(generator, job, response.get("body") or {}, custom_id)
+            generator._finish_generation(log.product, log, result, job.processing_type)
+            generator._complete_log(log, log.product_id, job.auto_apply)
+            processed.append(log)
+        except Exception as e:
+            logger.error("Batch job %s: failed to apply result for product %s: %s", job.id, log.product_id, e)
+            if log.status != AIProcessingStatus.FAILED:
+                _fail_log(log, str(e), traceback.format_exc())
+            failed += 1
+
+    for log in pending.values():
+        _fail_log(log, "Нет результата в ответе пакетного задания")
+        failed += 1
+
+    job.status = AIBatchJobStatus.COMPLETED
+    job.completed_count = len(processed)
+    job.failed_count = failed
+    job.completed_at = timezone.now()
+    job.save(update_fields=["status", "completed_count", "failed_count", "last_polled_at", "completed_at"])
+    logger.info("Batch job %s applied: %s ok, %s failed", job.id, len(processed), failed)
+    return processed
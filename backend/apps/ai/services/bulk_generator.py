@@ -0,0 +1,353 @@
+"""
+Пакетная AI-обработка товаров внутри одной задачи.
+
+process_product_ai_task обрабатывает один товар и блокируется на каждом HTTP
+вызове LLM, поэтому пропускная способность = число воркеров. BulkContentGenerator
+берёт N товаров и выполняет их вызовы LLM конкурентно (asyncio.gather) через один
+AsyncOpenAI-клиент с общим пулом соединений:
+
+* логи AIProcessingLog создаются одним bulk_create;
+* подготовка (изображения, промпты) и разбор результатов — те же методы
+  ContentGenerator, что и в process_product (синхронно, вне event loop);
+* конкурентность ограничена семафором, а темп — token bucket по запросам
+  и токенам в минуту (AI_CONFIG BULK_RPM / BULK_TPM);
+* ответы берутся из кэша LLMResponseCache и сохраняются в него, как и при
+  поштучной обработке.
+"""
+import asyncio
+import logging
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from apps.ai.models import AIProcessingLog, AIProcessingStatus
+from apps.ai.services.llm_client import LLMClient
+from apps.catalog.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Оценка токенов: ~4 символа на токен, изображение в detail=auto — порядка 800 токенов.
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 800
+
+ACTIVE_LOG_STATUSES = (
+    AIProcessingStatus.PENDING,
+    AIProcessingStatus.PROCESSING,
+    AIProcessingStatus.COMPLETED,
+    AIProcessingStatus.APPROVED,
+    AIProcessingStatus.MODERATION,
+)
+
+
+def _config(name: str, default):
+    return getattr(settings, "AI_CONFIG", {}).get(name, default)
+
+
+class TokenBucket:
+    """Ведро на `per_minute` единиц в минуту; 0 — без ограничения."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        # Запрос больше ёмкости ведра иначе не прошёл бы никогда.
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Лимит запросов (RPM) и токенов (TPM) в минуту для пакета."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    prompt = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    prompt += IMAGE_TOKENS
+                else:
+                    prompt += len(part.get("text") or "") // CHARS_PER_TOKEN
+        else:
+            prompt += len(content or "") // CHARS_PER_TOKEN
+    return prompt + max_tokens
+
+
+@dataclass
+class BulkJob:
+    product: Product
+    log: AIProcessingLog
+    images: List[Dict] = field(default_factory=list)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class BulkContentGenerator:
+    """Обработка пачки товаров с конкурентными вызовами LLM."""
+
+    def __init__(
+        self,
+        generator=None,
+        concurrency: Optional[int] = None,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+    ):
+        if generator is None:
+            from apps.ai.services.content_generator import ContentGenerator
+
+            generator = ContentGenerator()
+        self.generator = generator
+        self.concurrency = concurrency or int(_config("BULK_CONCURRENCY", 8))
+        self.rpm = _config("BULK_RPM", 500) if rpm is None else rpm
+        self.tpm = _config("BULK_TPM", 200000) if tpm is None else tpm
+
+    def run(
+        self,
+        product_ids: List[int],
+        processing_type: str = "full",
+        auto_apply: bool = False,
+        options: Optional[Dict] = None,
+    ) -> Dict[str, Any]:
+        """Обрабатывает товары; возвращает сводку и логи по товарам."""
+        return async_to_sync(self._run)(product_ids, processing_type, auto_apply, options or {})
+
+    async def _run(self, product_ids, processing_type, auto_apply, options) -> Dict[str, Any]:
+        jobs, skipped = await sync_to_async(self._create_logs)(product_ids, processing_type, options)
+        try:
+            if jobs:
+                await self._generate(jobs, processing_type, options)
+            return await sync_to_async(self._finish)(jobs, skipped, processing_type, auto_apply)
+        finally:
+            # Прерванный пакет не оставляет логов в PROCESSING навсегда.
+            await sync_to_async(self._fail_unfinished)(jobs)
+
+    async def _generate(self, jobs: List[BulkJob], processing_type: str, options: Dict) -> None:
+        llm = LLMClient(async_mode=True, max_connections=self.concurrency)
+        limiter = RateLimiter(self.rpm, self.tpm)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # force — перегенерация: ответы из LLMResponseCache не берём.
+        use_cache = not options.get("skip_llm_cache", options.get("force", False))
+        try:
+            await sync_to_async(self._prepare_images)(jobs, processing_type, options)
+            vision_jobs = [job for job in jobs if job.images and job.error is None]
+            vision_jobs, vision_requests = await sync_to_async(self._vision_requests)(llm, vision_jobs)
+            results = await self._complete_all(llm, limiter, semaphore, vision_requests, use_cache)
+            await sync_to_async(self._apply_vision)(vision_jobs, results)
+
+            if processing_type in ("full", "description_only", "categorization_only"):
+                text_jobs = [job for job in jobs if job.error is None]
+                text_jobs, text_requests = await sync_to_async(self._text_requests)(llm, text_jobs, processing_type)
+                results = await self._complete_all(llm, limiter, semaphore, text_requests, use_cache)
+                for job, result in zip(text_jobs, results):
+                    job.result = result
+        finally:
+            await llm.client.close()
+
+    def _create_logs(self, product_ids, processing_type, options):
+        products = Product.objects.select_related("category", "brand").in_bulk(product_ids)
+        skipped = []
+        if not options.get("force"):
+            busy = set(
+                AIProcessingLog.objects.filter(
+                    product_id__in=products.keys(),
+                    processing_type=processing_type,
+                    status__in=ACTIVE_LOG_STATUSES,
+                ).values_list("product_id", flat=True)
+            )
+            skipped = [product_id for product_id in product_ids if product_id in busy]
+        run_id = str(uuid.uuid4())
+        started_at = timezone.now().isoformat()
+        logs, errors = [], []
+        for product_id in dict.fromkeys(product_ids):
+            if product_id not in products or product_id in skipped:
+                continue
+            try:
+                input_data = self.generator._collect_input_data(products[product_id])
+                error = None
+            except Exception as e:
+                input_data, error = {}, e
+            logs.append(AIProcessingLog(
+                product=products[product_id],
+                processing_type=processing_type,
+                status=AIProcessingStatus.PROCESSING,
+                input_data={**input_data, "bulk_run_id": run_id, "started_at": started_at},
+                llm_model=self.generator.llm.model,
+            ))
+            errors.append(error)
+        logs = AIProcessingLog.objects.bulk_create(logs)
+        jobs = [BulkJob(product=log.product, log=log) for log in logs]
+        for job, error in zip(jobs, errors):
+            if error is not None:
+                self._fail(job, error)
+        return jobs, skipped
+
+    def _prepare_images(self, jobs: List[BulkJob], processing_type: str, options: Dict) -> None:
+        requested_use_images = options.get("use_images", True)
+        for job in jobs:
+            try:
+                use_images = requested_use_images and self.generator._should_use_images_for_product(job.product)
+                job.images = self.generator._prepare_images(job.product, job.log, processing_type, use_images)
+            except Exception as e:
+                self._fail(job, e)
+
+    def _apply_vision(self, jobs: List[BulkJob], results: List) -> None:
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                self._fail(job, result)
+                continue
+            job.log.image_analysis = result.get("content", {})
+            job.log.save(update_fields=["image_analysis"])
+
+    def _vision_requests(self, llm: LLMClient, jobs: List[BulkJob]):
+        """Задачи, для которых собран запрос Vision, и сами запросы (упавшие — через _fail)."""
+        built, requests = [], []
+        for job in jobs:
+            try:
+                prompt = self.generator._get_vision_prompt(job.product)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            built.append(job)
+            requests.append({
+                "model": llm.vision_model,
+                "messages": llm._vision_messages(job.images, prompt),
+                "max_tokens": 1000,
+                "version": self.generator.LLM_CACHE_VERSIONS["vision"],
+            })
+        return built, requests
+
+    def _text_requests(self, llm: LLMClient, jobs: List[BulkJob], processing_type: str):
+        """Задачи, для которых собран текстовый запрос, и сами запросы (упавшие — через _fail)."""
+        built, requests = [], []
+        for job in jobs:
+            try:
+                request = self.generator._build_generation_request(job.product, job.log, processing_type)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            built.append(job)
+            requests.append({
+                "model": llm.model,
+                "messages": llm._text_messages(request["system_prompt"], request["user_prompt"]),
+                "temperature": request["temperature"],
+                "max_tokens": request["max_tokens"],
+                "version": request["cache_version"],
+            })
+        return built, requests
+
+    async def _complete_all(self, llm, limiter, semaphore, requests: List[Dict], use_cache: bool) -> List:
+        """Ответы на запросы в исходном порядке (исключение — на месте упавшего)."""
+        if not requests:
+            return []
+        keys = [
+            llm._cache_key(
+                request["model"],
+                request["messages"],
+                use_cache,
+                temperature=request.get("temperature"),
+                max_tokens=request["max_tokens"],
+                json_mode=True,
+                version=request["version"],
+            )
+            for request in requests
+        ]
+        start_time = time.time()
+        results = await sync_to_async(
+            lambda: [llm._cached_response(key, start_time) for key in keys]
+        )()
+
+        async def call(request):
+            async with semaphore:
+                await limiter.acquire(estimate_tokens(request["messages"], request["max_tokens"]))
+                return await llm.acomplete(
+                    request["messages"],
+                    model=request["model"],
+                    temperature=request.get("temperature"),
+                    max_tokens=request["max_tokens"],
+                )
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        outcomes = await asyncio.gather(*(call(requests[index]) for index in missing), return_exceptions=True)
+
+        def store():
+            for index, outcome in zip(missing, outcomes):
+                results[index] = outcome
+                if keys[index] and not isinstance(outcome, BaseException):
+                    llm._store_response(keys[index], requests[index]["model"], outcome, requests[index]["version"])
+                    outcome["cache"] = {"hit": False, "key": keys[index]}
+
+        await sync_to_async(store)()
+        return results
+
+    def _finish(self, jobs: List[BulkJob], skipped: List[int], processing_type: str, auto_apply: bool) -> Dict:
+        processed, failed = [], []
+        for job in jobs:
+            try:
+                if job.error is not None:
+                    raise job.error
+                if isinstance(job.result, BaseException):
+                    raise job.result
+                if job.result is not None:
+                    self.generator._finish_generation(job.product, job.log, job.result, processing_type)
+                self.generator._complete_log(job.log, job.product.id, auto_apply)
+                processed.append(job.log)
+            except Exception as e:
+                if job.log.status != AIProcessingStatus.FAILED:
+                    self._fail(job, e)
+                failed.append(job.log)
+        return {
+            "processed": processed,
+            "failed": failed,
+            "skipped": skipped,
+        }
+
+    def _fail_unfinished(self, jobs: List[BulkJob]) -> None:
+        unfinished = [job.log.pk for job in jobs if job.log.pk]
+        if not unfinished:
+            return
+        failed = AIProcessingLog.objects.filter(
+            pk__in=unfinished, status=AIProcessingStatus.PROCESSING
+        ).update(
+            status=AIProcessingStatus.FAILED,
+            error_message="Пакетная обработка прервана",
+            completed_at=timezone.now(),
+        )
+        if failed:
+            logger.error("Bulk AI run interrupted: %s logs marked as failed", failed)
+
+    def _fail(self, job: BulkJob, error: BaseException) -> None:
+        logger.error("Bulk AI processing failed for product %s: %s", job.product.id, error)
+        job.error = error
+        job.log.status = AIProcessingStatus.FAILED
+        job.log.error_message = str(error)
+        job.log.stack_trace = "".join(traceback.format_exception(error))
+        job.log.save()
@@ -52,6 +52,14 @@ class ContentGenerator:
     """
 
     RETRY_COUNT = 3
+    # Версии промптов в ключе кэша ответов LLM. Поднять версию шаблона, если изменилась
+    # обработка ответа при том же тексте промпта, — старые ответы перестанут использоваться.
+    LLM_CACHE_VERSIONS = {
+        "product": "1",
+        "medicine": "1",
+        "vision": "1",
+        "variant": "1",
+    }
     APPLY_ALLOWED_STATUSES = (
         AIProcessingStatus.COMPLETED,
         AIProcessingStatus.MODERATION,
@@ -74,9 +82,9 @@ class ContentGenerator:
         "gender": ("erkek", "kadın", "unisex", "male", "female", "муж", "жен"),
     }
 
-    def __init__(self):
+    def __init__(self, llm: Optional[LLMClient] = None):
         self.logger = logging.getLogger(__name__)
-        self.llm = LLMClient()
+        self.llm = llm or LLMClient()
         self.media_processor = R2MediaProcessor()
         self.variant_detector = VariantContentDetector()
         from .result_applier import AIResultApplier
@@ -125,6 +133,7 @@ class ContentGenerator:
             auto_apply: автоматически применить изменения к товару (если успешно)
             options: опции в духе ТЗ — generate_description, categorize, analyze_images,
                      language, use_images (если заданы, processing_type может быть переопределён)
+                     skip_llm_cache — не брать ответы LLM из LLMResponseCache
         """
         if options:
             processing_type = self._options_to_processing_type(options)
@@ -212,153 +221,34 @@ class ContentGenerator:
             )
 
         requested_use_images = (options or {}).get("use_images", True)
+        use_llm_cache = not (options or {}).get("skip_llm_cache", False)
         use_images = requested_use_images and self._should_use_images_for_product(product)
         try:
             # 1. Подготовка изображений (если нужно)
-            images_data = []
-            if use_images and processing_type in ["full", "image_analysis"]:
-                image_urls = self._get_product_image_urls(product)
-                max_images = 5  # как в media_processor.get_product_images_batch
-                requested_urls = [u for i, u in enumerate(image_urls) if i < max_images]
-                images_data = self.media_processor.get_product_images_batch(image_urls)
-                success_urls = [img.get("url") for img in images_data if img.get("url")]
-                failed_urls = [u for u in requested_urls if u not in success_urls]
-                log_entry.input_images_urls = [img.get("url") for img in images_data]
-                if failed_urls:
-                    input_data = dict(log_entry.input_data or {})
-                    input_data["image_urls_failed"] = failed_urls
-                    log_entry.input_data = input_data
-                    log_entry.save(update_fields=["input_data", "input_images_urls"])
-                else:
-                    log_entry.save(update_fields=["input_images_urls"])
+            images_data = self._prepare_images(product, log_entry, processing_type, use_images)
 
             # 2. Анализ изображений (Vision API)
-            image_analysis_result = {}
-            if use_images and processing_type in ["full", "image_analysis"] and images_data:
-                default_prompt = self._get_default_image_prompt_for_product(product)
-                vision_prompt = self._get_prompt_template(
-                    "image_prompt",
-                    default_prompt,
-                    category=getattr(product, "category", None),
-                )
+            if images_data:
                 image_analysis_result = self.llm.analyze_images(
-                    images=images_data, prompt=vision_prompt
+                    images=images_data,
+                    prompt=self._get_vision_prompt(product),
+                    cache_version=self.LLM_CACHE_VERSIONS["vision"],
+                    use_cache=use_llm_cache,
                 )
                 log_entry.image_analysis = image_analysis_result.get("content", {})
                 log_entry.save(update_fields=["image_analysis"])
 
             # 3. Генерация текстового контента
             if processing_type in ["full", "description_only", "categorization_only"]:
-                # Формируем промпт (описание берётся из product или из перевода ru)
-                input_for_prompt = self._collect_input_data(product)
-                desc_len = len((input_for_prompt.get("description") or "").strip())
-                logger.info(
-                    "Product %s: description length for prompt=%s, image_analysis empty=%s",
-                    product_id,
-                    desc_len,
-                    not log_entry.image_analysis,
-                )
-                is_medicine = getattr(product, "product_type", None) == "medicines"
-                system_prompt = (
-                    self._get_medicine_system_prompt()
-                    if is_medicine
-                    else self._get_system_prompt()
-                )
-                user_prompt = (
-                    self._construct_medicine_user_prompt(
-                        product,
-                        image_analysis=log_entry.image_analysis,
-                        processing_type=processing_type,
-                    )
-                    if is_medicine
-                    else self._construct_user_prompt(
-                        product,
-                        image_analysis=log_entry.image_analysis,
-                        processing_type=processing_type,
-                    )
-                )
-
-                # Вызов LLM (max_tokens=3000 — описание + SEO + en + attributes могут быть длинными)
+                request = self._build_generation_request(product, log_entry, processing_type)
                 generation_result = self.llm.generate_content(
-                    system_prompt=system_prompt,
-                    user_prompt=user_prompt,
-                    max_tokens=5000 if is_medicine else 3000,
-                    temperature=0.2 if is_medicine else 0.7,
+                    **request,
+                    use_cache=use_llm_cache,
                 )
-
-                # Обработка ответа
-                content = generation_result["content"]
-                if isinstance(content, str):
-                    content = self._extract_json_from_response(content)
-                if is_medicine:
-                    input_data = self._collect_input_data(product)
-                    source_sections = self._build_medicine_source_sections(input_data)
-                    if not isinstance(content, dict) or not content:
-                        content = self._build_medicine_fallback_content(input_data)
-                    content, repair_result = self._repair_medicine_ru_translation_content(
-                        content,
-                        product_id=product_id,
-                    )
-                    if repair_result:
-                        self._merge_generation_usage(
-                            generation_result,
-                            repair_result,
-                            "translation_repair",
-                        )
-                    section_result = self._translate_medicine_source_sections(
-                        content,
-                        source_sections,
-                        product_id=product_id,
-                    )
-                    if section_result:
-                        self._merge_generation_usage(
-                            generation_result,
-                            section_result,
-                            "section_translation",
-                        )
-                    generation_result["content"] = content
-                log_entry.raw_llm_response = generation_result
-                log_entry.tokens_used = generation_result["tokens"]
-                log_entry.cost_usd = generation_result["cost_usd"]
-                log_entry.processing_time_ms = generation_result["processing_time_ms"]
-                log_entry.save(update_fields=[
-                    "raw_llm_response", "tokens_used", "cost_usd", "processing_time_ms"
-                ])
-
-                # Парсинг результатов
-                self._validate_generated_content(content, processing_type)
-                self._parse_and_save_results(log_entry, content)
-                if processing_type == "categorization_only" and not log_entry.suggested_category_id:
-                    raise ValueError("AI вернул неизвестную или неактивную категорию")
+                self._finish_generation(product, log_entry, generation_result, processing_type)
 
             # 4. Завершение + применение
-            log_entry.completed_at = timezone.now()
-
-            if auto_apply:
-                log_entry.status = AIProcessingStatus.COMPLETED
-                log_entry.save(update_fields=["status", "completed_at"])
-                try:
-                    self.apply_log_to_product(
-                        log_entry,
-                        allow_approved=False,
-                    )
-                except Exception as e:
-                    logger.exception(f"Error applying AI changes to product {product_id}: {e}")
-                    log_entry.status = AIProcessingStatus.FAILED
-                    log_entry.error_message = f"Error applying changes: {str(e)}"
-                    log_entry.save(update_fields=["status", "error_message", "updated_at"])
-                    raise
-            else:
-                # Без авто-применения: проверяем нужна ли ручная модерация
-                if self._check_needs_moderation(log_entry):
-                    log_entry.status = AIProcessingStatus.MODERATION
-                    log_entry.save()
-                    self._create_moderation_task(log_entry)
-                    return log_entry
-                log_entry.status = AIProcessingStatus.COMPLETED
-
-            log_entry.save()
-            return log_entry
+            return self._complete_log(log_entry, product_id, auto_apply)
 
         except Exception as e:
             logger.error(f"Error processing product {product_id}: {e}")
@@ -369,6 +259,179 @@ class ContentGenerator:
                 log_entry.save()
             raise
 
+    def _prepare_images(
+        self, product: Product, log_entry: AIProcessingLog, processing_type: str, use_images: bool
+    ) -> List[Dict]:
+        """Загружает изображения товара для Vision и фиксирует их в логе."""
+        if not use_images or processing_type not in ["full", "image_analysis"]:
+            return []
+        image_urls = self._get_product_image_urls(product)
+        max_images = 5  # как в media_processor.get_product_images_batch
+        requested_urls = [u for i, u in enumerate(image_urls) if i < max_images]
+        images_data = self.media_processor.get_product_images_batch(image_urls)
+        success_urls = [img.get("url") for img in images_data if img.get("url")]
+        failed_urls = [u for u in requested_urls if u not in success_urls]
+        log_entry.input_images_urls = [img.get("url") for img in images_data]
+        if failed_urls:
+            input_data = dict(log_entry.input_data or {})
+            input_data["image_urls_failed"] = failed_urls
+            log_entry.input_data = input_data
+            log_entry.save(update_fields=["input_data", "input_images_urls"])
+        else:
+            log_entry.save(update_fields=["input_images_urls"])
+        return images_data
+
+    def _get_vision_prompt(self, product: Product) -> str:
+        default_prompt = self._get_default_image_prompt_for_product(product)
+        return self._get_prompt_template(
+            "image_prompt",
+            default_prompt,
+            category=getattr(product, "category", None),
+        )
+
+    def _build_generation_request(
+        self, product: Product, log_entry: AIProcessingLog, processing_type: str
+    ) -> Dict[str, Any]:
+        """Аргументы generate_content для товара (промпты, лимиты, версия кэша)."""
+        # Формируем промпт (описание берётся из product или из перевода ru)
+        input_for_prompt = self._collect_input_data(product)
+        desc_len = len((input_for_prompt.get("description") or "").strip())
+        logger.info(
+            "Product %s: description length for prompt=%s, image_analysis empty=%s",
+            product.id,
+            desc_len,
+            not log_entry.image_analysis,
+        )
+        is_medicine = getattr(product, "product_type", None) == "medicines"
+        system_prompt = (
+            self._get_medicine_system_prompt()
+            if is_medicine
+            else self._get_system_prompt()
+        )
+        user_prompt = (
+            self._construct_medicine_user_prompt(
+                product,
+                image_analysis=log_entry.image_analysis,
+                processing_type=processing_type,
+            )
+            if is_medicine
+            else self._construct_user_prompt(
+                product,
+                image_analysis=log_entry.image_analysis,
+                processing_type=processing_type,
+            )
+        )
+        # max_tokens=3000 — описание + SEO + en + attributes могут быть длинными
+        return {
+            "system_prompt": system_prompt,
+            "user_prompt": user_prompt,
+            "max_tokens": 5000 if is_medicine else 3000,
+            "temperature": 0.2 if is_medicine else 0.7,
+            "cache_version": self.LLM_CACHE_VERSIONS["medicine" if is_medicine else "product"],
+        }
+
+    def build_batch_request(
+        self, product: Product, log_entry: AIProcessingLog, processing_type: str, custom_id: str
+    ) -> Dict[str, Any]:
+        """Строка JSONL для batch API — тот же запрос, что отправил бы generate_content."""
+        request = self._build_generation_request(product, log_entry, processing_type)
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.llm.model,
+                "messages": self.llm._text_messages(request["system_prompt"], request["user_prompt"]),
+                "temperature": request["temperature"],
+                "max_tokens": request["max_tokens"],
+                "response_format": {"type": "json_object"},
+            },
+        }
+
+    def _finish_generation(
+        self,
+        product: Product,
+        log_entry: AIProcessingLog,
+        generation_result: Dict[str, Any],
+        processing_type: str,
+    ) -> None:
+        """Постобработка ответа LLM: доперевод лекарств, метрики в лог, разбор результатов."""
+        product_id = product.id
+        is_medicine = getattr(product, "product_type", None) == "medicines"
+        content = generation_result["content"]
+        if isinstance(content, str):
+            content = self._extract_json_from_response(content)
+        if is_medicine:
+            input_data = self._collect_input_data(product)
+            source_sections = self._build_medicine_source_sections(input_data)
+            if not isinstance(content, dict) or not content:
+                content = self._build_medicine_fallback_content(input_data)
+            content, repair_result = self._repair_medicine_ru_translation_content(
+                content,
+                product_id=product_id,
+            )
+            if repair_result:
+                self._merge_generation_usage(
+                    generation_result,
+                    repair_result,
+                    "translation_repair",
+                )
+            section_result = self._translate_medicine_source_sections(
+                content,
+                source_sections,
+                product_id=product_id,
+            )
+            if section_result:
+                self._merge_generation_usage(
+                    generation_result,
+                    section_result,
+                    "section_translation",
+                )
+            generation_result["content"] = content
+        log_entry.raw_llm_response = generation_result
+        log_entry.tokens_used = generation_result["tokens"]
+        log_entry.cost_usd = generation_result["cost_usd"]
+        log_entry.processing_time_ms = generation_result["processing_time_ms"]
+        log_entry.save(update_fields=[
+            "raw_llm_response", "tokens_used", "cost_usd", "processing_time_ms"
+        ])
+
+        # Парсинг результатов
+        self._validate_generated_content(content, processing_type)
+        self._parse_and_save_results(log_entry, content)
+        if processing_type == "categorization_only" and not log_entry.suggested_category_id:
+            raise ValueError("AI вернул неизвестную или неактивную категорию")
+
+    def _complete_log(self, log_entry: AIProcessingLog, product_id: int, auto_apply: bool) -> AIProcessingLog:
+        """Финальный статус лога: применение к товару или модерация."""
+        log_entry.completed_at = timezone.now()
+
+        if auto_apply:
+            log_entry.status = AIProcessingStatus.COMPLETED
+            log_entry.save(update_fields=["status", "completed_at"])
+            try:
+                self.apply_log_to_product(
+                    log_entry,
+                    allow_approved=False,
+                )
+            except Exception as e:
+                logger.exception(f"Error applying AI changes to product {product_id}: {e}")
+                log_entry.status = AIProcessingStatus.FAILED
+                log_entry.error_message = f"Error applying changes: {str(e)}"
+                log_entry.save(update_fields=["status", "error_message", "updated_at"])
+                raise
+        else:
+            # Без авто-применения: проверяем нужна ли ручная модерация
+            if self._check_needs_moderation(log_entry):
+                log_entry.status = AIProcessingStatus.MODERATION
+                log_entry.save()
+                self._create_moderation_task(log_entry)
+                return log_entry
+            log_entry.status = AIProcessingStatus.COMPLETED
+
+        log_entry.save()
+        return log_entry
+
     # Расширения URL, которые не отправляем в Vision (видео; GIF оставляем — это изображение)
     _VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov", ".avi", ".mkv", ".m4v")
 
@@ -954,6 +1017,7 @@ class ContentGenerator:
             system_prompt=self._get_variant_system_prompt(),
             user_prompt=self._construct_variant_user_prompt(input_data),
             max_tokens=1800,
+            cache_version=self.LLM_CACHE_VERSIONS["variant"],
         )
         content = generation_result["content"]
         if isinstance(content, str):
@@ -0,0 +1,204 @@
+"""
+Внутрипроцессный индекс эмбеддингов для RAG (категории и шаблоны).
+
+Коллекции categories и templates в Qdrant маленькие (сотни векторов), а RAG
+вызывается на каждый товар. Вместо двух сетевых запросов (эмбеддинг запроса в
+OpenAI + query_points в Qdrant) на каждый поиск:
+
+* коллекция один раз выгружается scroll'ом в нормированную матрицу NumPy и
+  ищется полным перебором (косинус = скалярное произведение);
+* матрица версионируется ключом в общем кэше — версия меняется при изменении
+  категорий/шаблонов и при upsert в Qdrant, и каждый процесс перечитывает
+  коллекцию при следующем поиске;
+* если Qdrant недоступен или медленный, поиск продолжает работать по
+  последней загруженной матрице;
+* эмбеддинги запросов мемоизируются: LRU в процессе + Redis по хэшу текста.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_KEY = "ai:rag_index:ver:{collection}"
+EMBEDDING_CACHE_KEY = "ai:embedding:{digest}"
+SCROLL_PAGE_SIZE = 256
+
+_lock = threading.RLock()
+_indexes: Dict[str, "EmbeddingIndex"] = {}
+_QUERY_MEMO: "OrderedDict[str, List[float]]" = OrderedDict()
+_llm = None
+_llm_pid: Optional[int] = None
+
+
+def _config(name: str, default):
+    return getattr(settings, "AI_CONFIG", {}).get(name, default)
+
+
+def is_enabled() -> bool:
+    return bool(_config("RAG_LOCAL_INDEX", True))
+
+
+def get_index_version(collection: str) -> int:
+    try:
+        return int(cache.get(INDEX_VERSION_KEY.format(collection=collection), 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def bump_index_version(collection: str) -> None:
+    """Помечает загруженные в процессах матрицы коллекции устаревшими."""
+    cache.set(INDEX_VERSION_KEY.format(collection=collection), time.time_ns(), None)
+
+
+def clear_indexes() -> None:
+    """Сбрасывает матрицы и мемо эмбеддингов текущего процесса (тесты, смена модели)."""
+    global _llm
+    with _lock:
+        _indexes.clear()
+        _QUERY_MEMO.clear()
+        _llm = None
+
+
+class EmbeddingIndex:
+    """Нормированные векторы коллекции и их payload; поиск top-k полным перебором."""
+
+    def __init__(self, ids: List[Any], vectors: List[List[float]], payloads: List[Dict], version: int = 0):
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.failed_at: Optional[float] = None
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, embedding: List[float], top_k: int) -> List[Dict]:
+        if not len(self) or top_k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape[0] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Embedding size {query.shape[0]} does not match index size {self.matrix.shape[1]}"
+            )
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.matrix @ query
+        top_k = min(top_k, len(self))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {"id": self.ids[i], "score": float(scores[i]), "payload": self.payloads[i]}
+            for i in top
+        ]
+
+
+def load_index(client, collection: str, version: int = 0) -> EmbeddingIndex:
+    """Выгружает все точки коллекции из Qdrant."""
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            if point.vector is None or isinstance(point.vector, dict):
+                continue
+            ids.append(point.id)
+            vectors.append(point.vector)
+            payloads.append(point.payload or {})
+        if offset is None:
+            break
+    return EmbeddingIndex(ids, vectors, payloads, version=version)
+
+
+def get_index(client, collection: str) -> Optional[EmbeddingIndex]:
+    """
+    Матрица коллекции для текущего процесса; перечитывается при смене версии
+    или по истечении AI_CONFIG['RAG_INDEX_TTL']. При ошибке Qdrant возвращает
+    прежнюю матрицу (None — если загрузить не удалось ни разу).
+    """
+    version = get_index_version(collection)
+    ttl = _config("RAG_INDEX_TTL", 3600)
+    retry_after = _config("RAG_INDEX_RETRY_SECONDS", 60)
+    index = _indexes.get(collection)
+    now = time.monotonic()
+    if index is not None and index.version == version and (not ttl or now - index.loaded_at < ttl):
+        return index
+    if index is not None and index.failed_at is not None and now - index.failed_at < retry_after:
+        return index
+
+    with _lock:
+        current = _indexes.get(collection)
+        if current is not None and current is not index:
+            return current
+        try:
+            fresh = load_index(client, collection, version=version)
+        except Exception as e:
+            logger.warning("RAG index %s reload failed, using previous copy: %s", collection, e)
+            if index is not None:
+                index.failed_at = now
+            return index
+        _indexes[collection] = fresh
+        logger.info("RAG index %s loaded: %s vectors (version %s)", collection, len(fresh), version)
+        return fresh
+
+
+def _get_llm():
+    """Общий LLMClient процесса; HTTP-пул родителя после fork не переиспользуется."""
+    global _llm, _llm_pid
+    if _llm is None or _llm_pid != os.getpid():
+        from apps.ai.services.llm_client import LLMClient
+
+        _llm, _llm_pid = LLMClient(), os.getpid()
+    return _llm
+
+
+def use_embedding_client(llm) -> None:
+    """Задаёт LLMClient для эмбеддингов запросов в текущем процессе (бенчмарки, тесты)."""
+    global _llm, _llm_pid
+    _llm, _llm_pid = llm, os.getpid()
+
+
+def get_query_embedding(text: str, llm=None) -> List[float]:
+    """Эмбеддинг текста запроса: LRU в процессе -> общий кэш -> API эмбеддингов."""
+    text = text[:8000]
+    llm = llm or _get_llm()
+    model = getattr(llm, "embedding_model", None) or _config("EMBEDDING_MODEL", "text-embedding-3-small")
+    digest = hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    with _lock:
+        embedding = _QUERY_MEMO.get(digest)
+        if embedding is not None:
+            _QUERY_MEMO.move_to_end(digest)
+            return embedding
+
+    key = EMBEDDING_CACHE_KEY.format(digest=digest)
+    embedding = cache.get(key)
+    if embedding is None:
+        embedding = llm.get_embedding(text)
+        cache.set(key, embedding, _config("EMBEDDING_CACHE_TTL", 60 * 60 * 24 * 7))
+
+    with _lock:
+        _QUERY_MEMO[digest] = embedding
+        _QUERY_MEMO.move_to_end(digest)
+        while len(_QUERY_MEMO) > _config("EMBEDDING_MEMO_SIZE", 2048):
+            _QUERY_MEMO.popitem(last=False)
+    return embedding
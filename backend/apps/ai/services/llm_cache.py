@@ -0,0 +1,182 @@
+"""
+Кэш ответов LLM по нормализованному хэшу запроса.
+
+Ключ — sha256 от модели, температуры, max_tokens, json_mode, версии шаблона и
+сообщений; base64-изображения в сообщениях заменяются их sha256, чтобы ключ
+не зависел от размера картинок. Хранилище — таблица LLMResponseCache
+(переживает перезапуски), перед ней — Django cache (Redis в проде).
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from apps.ai.models import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "llm-response"
+# Redis держит ответ не дольше суток: горячие ключи батча, остальное — из БД.
+FRONT_CACHE_TTL = 60 * 60 * 24
+# Попадания в Redis копятся счётчиками и переносятся в hit_count при очистке
+# (cleanup_old_ai_logs, раз в неделю) — без UPDATE в БД на каждый ответ из кэша.
+HIT_COUNTER_PREFIX = f"{CACHE_KEY_PREFIX}-hits"
+HIT_COUNTER_TTL = 60 * 60 * 24 * 14
+
+
+def _config(name: str, default):
+    return getattr(settings, "AI_CONFIG", {}).get(name, default)
+
+
+def is_enabled() -> bool:
+    return bool(_config("RESPONSE_CACHE_ENABLED", True))
+
+
+def _image_digest(url: str) -> str:
+    if url.startswith("data:"):
+        return "sha256:" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return url
+
+
+def _normalize_messages(messages: List[Dict]) -> List[Dict]:
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    image = dict(part.get("image_url") or {})
+                    image["url"] = _image_digest(image.get("url") or "")
+                    part = {**part, "image_url": image}
+                parts.append(part)
+            content = parts
+        elif isinstance(content, str):
+            content = content.strip()
+        normalized.append({**message, "content": content})
+    return normalized
+
+
+def make_key(
+    model: str,
+    messages: List[Dict],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    json_mode: bool = True,
+    version: str = "",
+) -> str:
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "json_mode": json_mode,
+        "version": f"{_config('RESPONSE_CACHE_VERSION', '1')}:{version}",
+        "messages": _normalize_messages(messages),
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str) -> Optional[Dict]:
+    """Сохранённый ответ или None (истёкшие записи не возвращаются)."""
+    front_key = f"{CACHE_KEY_PREFIX}:{key}"
+    try:
+        response = cache.get(front_key)
+    except Exception as e:
+        logger.warning("LLM response cache unavailable: %s", e)
+        response = None
+    if response is not None:
+        _count_front_hit(key)
+        return response
+    entry = (
+        LLMResponseCache.objects.filter(key=key, expires_at__gt=timezone.now())
+        .only("response", "expires_at")
+        .first()
+    )
+    if entry is None:
+        return None
+    LLMResponseCache.objects.filter(key=key).update(hit_count=F("hit_count") + 1)
+    ttl = min(FRONT_CACHE_TTL, int((entry.expires_at - timezone.now()).total_seconds()))
+    if ttl > 0:
+        try:
+            cache.set(front_key, entry.response, ttl)
+        except Exception:
+            pass
+    return entry.response
+
+
+def _count_front_hit(key: str) -> None:
+    counter_key = f"{HIT_COUNTER_PREFIX}:{key}"
+    try:
+        cache.add(counter_key, 0, HIT_COUNTER_TTL)
+        cache.incr(counter_key)
+    except Exception as e:
+        logger.warning("LLM response cache hit counter unavailable: %s", e)
+
+
+def flush_hit_counts(batch_size: int = 500) -> int:
+    """Переносит счётчики попаданий из Redis в LLMResponseCache.hit_count."""
+    flushed = 0
+    keys = LLMResponseCache.objects.values_list("key", flat=True).iterator(chunk_size=batch_size)
+    batch: List[str] = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flushed += _flush_hit_batch(batch)
+            batch = []
+    if batch:
+        flushed += _flush_hit_batch(batch)
+    return flushed
+
+
+def _flush_hit_batch(keys: List[str]) -> int:
+    counter_keys = {f"{HIT_COUNTER_PREFIX}:{key}": key for key in keys}
+    try:
+        counts = cache.get_many(list(counter_keys))
+    except Exception as e:
+        logger.warning("LLM response cache hit counter unavailable: %s", e)
+        return 0
+    flushed = 0
+    for counter_key, hits in counts.items():
+        hits = int(hits or 0)
+        if hits <= 0:
+            continue
+        LLMResponseCache.objects.filter(key=counter_keys[counter_key]).update(hit_count=F("hit_count") + hits)
+        # decr, а не delete: попадания между get_many и записью не теряются.
+        try:
+            cache.decr(counter_key, hits)
+        except ValueError:
+            pass
+        flushed += hits
+    return flushed
+
+
+def store(key: str, model: str, response: Dict, version: str = "") -> None:
+    ttl = int(_config("RESPONSE_CACHE_TTL", 60 * 60 * 24 * 30))
+    if ttl <= 0:
+        return
+    LLMResponseCache.objects.update_or_create(
+        key=key,
+        defaults={
+            "model": model,
+            "version": version,
+            "response": response,
+            "hit_count": 0,
+            "expires_at": timezone.now() + timedelta(seconds=ttl),
+        },
+    )
+    try:
+        cache.set(f"{CACHE_KEY_PREFIX}:{key}", response, min(FRONT_CACHE_TTL, ttl))
+    except Exception as e:
+        logger.warning("LLM response cache unavailable: %s", e)
+
+
+def purge_expired() -> int:
+    deleted, _ = LLMResponseCache.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
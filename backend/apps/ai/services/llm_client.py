@@ -1,14 +1,18 @@
 import os
 import json
 import time
+import asyncio
 import requests
 import random
 from typing import List, Dict, Optional, Union
-from openai import OpenAI, AsyncOpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from django.conf import settings
 from django.core.cache import cache
 import logging
 
+from . import llm_cache
+
 logger = logging.getLogger(__name__)
 
 class LLMClient:
@@ -16,13 +20,25 @@ class LLMClient:
     Унифицированный клиент для LLM операций.
     Поддержка OpenAI и локальных моделей (через настройку).
     """
-    def __init__(self, async_mode: bool = False):
+    def __init__(self, async_mode: bool = False, max_connections: Optional[int] = None, client=None):
         self.model = settings.AI_CONFIG.get('MODEL', 'gpt-4o-mini')
         self.vision_model = settings.AI_CONFIG.get('VISION_MODEL', 'gpt-4o-mini')
         self.embedding_model = settings.AI_CONFIG.get('EMBEDDING_MODEL', 'text-embedding-3-small')
         
-        client_class = AsyncOpenAI if async_mode else OpenAI
-        self.client = client_class(api_key=settings.OPENAI_API_KEY)
+        if client is not None:
+            # Готовый клиент с интерфейсом OpenAI (например, mock_llm для бенчмарков).
+            self.client = client
+        elif async_mode:
+            # Один пул соединений на все запросы пакета; повторы 429 делает acomplete
+            # (с учётом лимитера), а не SDK.
+            http_client = None
+            if max_connections:
+                http_client = DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+                )
+            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0, http_client=http_client)
+        else:
+            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
         
         # Pricing для подсчета стоимости (обновлять по мере изменений OpenAI)
         self.pricing = {
@@ -88,6 +104,136 @@ class LLMClient:
             logger.warning("LLM JSON parse error: %s, snippet: %s", e, raw[:400])
             return {}
 
+    @staticmethod
+    def _text_messages(system_prompt: str, user_prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    @staticmethod
+    def _vision_messages(images: List[Dict], prompt: str) -> List[Dict]:
+        content = [{"type": "text", "text": prompt}]
+        for img in images:
+            if img.get('base64'):
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": img['base64'],
+                        "detail": "auto"  # или "low" для экономии
+                    }
+                })
+        return [{"role": "user", "content": content}]
+
+    def _cost(self, model: str, tokens: Dict) -> float:
+        model_pricing = self.pricing.get(model, self.pricing.get('gpt-4o-mini'))
+        cost = (tokens['prompt'] * model_pricing['input'] +
+                tokens['completion'] * model_pricing['output']) / 1000
+        return round(cost, 6)
+
+    async def acomplete(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: int = 1000,
+        json_mode: bool = True,
+        max_retries: int = 10,
+        initial_backoff_ms: int = 250,
+    ) -> Dict:
+        """
+        Асинхронный chat completion (клиент async_mode=True) с теми же повторами,
+        что у generate_content. Кэш ответов здесь не используется — его читает
+        и пишет вызывающий код вне event loop (ORM).
+        """
+        model = model or self.model
+        start_time = time.time()
+        params = {"model": model, "messages": messages, "max_tokens": max_tokens}
+        if temperature is not None:
+            params["temperature"] = temperature
+        if json_mode:
+            params["response_format"] = {"type": "json_object"}
+
+        attempt = 0
+        backoff = initial_backoff_ms / 1000.0
+        while True:
+            try:
+                response = await self.client.chat.completions.create(**params)
+                break
+            except Exception as e:
+                msg = str(e).lower()
+                is_rate_limit = "rate limit" in msg or "too many requests" in msg or "429" in msg
+                is_server_busy = "try again" in msg or "overloaded" in msg
+                if "insufficient_quota" in msg:
+                    logger.error(f"OpenAI Insufficient Quota: {e}")
+                    await asyncio.to_thread(self._notify_admin_quota_error)
+                    raise
+                if attempt >= max_retries or not (is_rate_limit or is_server_busy):
+                    logger.error(f"LLM async generation error: {e}")
+                    raise
+                logger.warning(f"LLM async generation retry {attempt + 1}/{max_retries}: {e}")
+                await asyncio.sleep(backoff + random.uniform(0, backoff))
+                backoff = min(backoff * 2, 15.0)
+                attempt += 1
+
+        raw_text = response.choices[0].message.content or ""
+        tokens = {
+            'prompt': response.usage.prompt_tokens,
+            'completion': response.usage.completion_tokens,
+            'total': response.usage.total_tokens
+        }
+        return {
+            'content': self._parse_json_response(raw_text) if json_mode else raw_text,
+            'tokens': tokens,
+            'cost_usd': self._cost(model, tokens),
+            'processing_time_ms': int((time.time() - start_time) * 1000),
+            'raw_response': response.model_dump(),
+        }
+
+    def _cache_key(self, model: str, messages: List[Dict], use_cache: bool, **params) -> Optional[str]:
+        if not use_cache or not llm_cache.is_enabled():
+            return None
+        return llm_cache.make_key(model, messages, **params)
+
+    def _cached_response(self, cache_key: Optional[str], start_time: float) -> Optional[Dict]:
+        """Ответ из кэша в формате generate_content: без вызова API, tokens/cost — нули."""
+        if not cache_key:
+            return None
+        try:
+            stored = llm_cache.lookup(cache_key)
+        except Exception as e:
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            return None
+        if stored is None:
+            return None
+        return {
+            'content': stored.get('content'),
+            'tokens': {'prompt': 0, 'completion': 0, 'total': 0},
+            'cost_usd': 0.0,
+            'processing_time_ms': int((time.time() - start_time) * 1000),
+            'raw_response': stored.get('raw_response'),
+            'cache': {
+                'hit': True,
+                'key': cache_key,
+                'tokens': stored.get('tokens'),
+                'cost_usd': stored.get('cost_usd'),
+            },
+        }
+
+    def _store_response(self, cache_key: Optional[str], model: str, result: Dict, version: str) -> None:
+        # Пустой/нераспарсенный ответ не кэшируем — его нужно перегенерировать.
+        if not cache_key or not result.get('content'):
+            return
+        try:
+            llm_cache.store(
+                cache_key,
+                model,
+                {key: result[key] for key in ('content', 'tokens', 'cost_usd', 'raw_response')},
+                version=version,
+            )
+        except Exception as e:
+            logger.warning(f"LLM response cache store failed: {e}")
+
     def generate_content(
         self,
         system_prompt: str,
@@ -96,10 +242,15 @@ class LLMClient:
         temperature: float = 0.7,
         max_tokens: int = 1000,
         max_retries: int = 10,
-        initial_backoff_ms: int = 250
+        initial_backoff_ms: int = 250,
+        cache_version: str = "",
+        use_cache: bool = True,
     ) -> Dict:
         """
         Генерация текста с полным логированием.
+
+        Одинаковый запрос (модель, температура, сообщения, cache_version)
+        отдаётся из LLMResponseCache без обращения к API.
         
         Returns:
             {
@@ -107,15 +258,25 @@ class LLMClient:
                 'tokens': {'prompt': int, 'completion': int, 'total': int},
                 'cost_usd': float,
                 'processing_time_ms': int,
-                'raw_response': dict
+                'raw_response': dict,
+                'cache': {'hit': bool, 'key': str} (если кэш включён)
             }
         """
         start_time = time.time()
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages = self._text_messages(system_prompt, user_prompt)
+        cache_key = self._cache_key(
+            self.model,
+            messages,
+            use_cache,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=json_mode,
+            version=cache_version,
+        )
+        cached = self._cached_response(cache_key, start_time)
+        if cached is not None:
+            return cached
         
         attempt = 0
         backoff = initial_backoff_ms / 1000.0
@@ -174,17 +335,17 @@ class LLMClient:
             'total': response.usage.total_tokens
         }
         
-        model_pricing = self.pricing.get(self.model, self.pricing.get('gpt-4o-mini'))
-        cost = (tokens['prompt'] * model_pricing['input'] + 
-               tokens['completion'] * model_pricing['output']) / 1000
-        
-        return {
+        result = {
             'content': content,
             'tokens': tokens,
-            'cost_usd': round(cost, 6),
+            'cost_usd': self._cost(self.model, tokens),
             'processing_time_ms': processing_time,
             'raw_response': response.model_dump()
         }
+        if cache_key:
+            self._store_response(cache_key, self.model, result, cache_version)
+            result['cache'] = {'hit': False, 'key': cache_key}
+        return result
         
 
     def analyze_images(
@@ -193,7 +354,9 @@ class LLMClient:
         prompt: str,
         json_mode: bool = True,
         max_retries: int = 10,
-        initial_backoff_ms: int = 250
+        initial_backoff_ms: int = 250,
+        cache_version: str = "",
+        use_cache: bool = True,
     ) -> Dict:
         """
         Анализ изображений через Vision API.
@@ -201,28 +364,24 @@ class LLMClient:
         Args:
             images: список обработанных изображений с base64
             prompt: текстовый промпт для анализа
+            cache_version: версия шаблона для ключа кэша (картинки входят в ключ по sha256)
         """
         start_time = time.time()
         
         # Формируем content для API
-        content = [{"type": "text", "text": prompt}]
-        
-        for img in images:
-            if img.get('base64'):
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": img['base64'],
-                        "detail": "auto"  # или "low" для экономии
-                    }
-                })
-        
-        messages = [
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
+        messages = self._vision_messages(images, prompt)
+        cache_key = self._cache_key(
+            self.vision_model,
+            messages,
+            use_cache,
+            max_tokens=1000,
+            json_mode=json_mode,
+            version=cache_version,
+        )
+        cached = self._cached_response(cache_key, start_time)
+        if cached is not None:
+            cached['analyzed_images_count'] = len(images)
+            return cached
         
         attempt = 0
         backoff = initial_backoff_ms / 1000.0
@@ -277,15 +436,15 @@ class LLMClient:
             'total': response.usage.total_tokens
         }
         
-        model_pricing = self.pricing.get(self.vision_model, self.pricing.get('gpt-4o-mini'))
-        cost = (tokens['prompt'] * model_pricing['input'] + 
-               tokens['completion'] * model_pricing['output']) / 1000
-        
-        return {
+        result = {
             'content': result_content,
             'tokens': tokens,
-            'cost_usd': round(cost, 6),
+            'cost_usd': self._cost(self.vision_model, tokens),
             'processing_time_ms': processing_time,
             'analyzed_images_count': len(images),
             'raw_response': response.model_dump()
         }
+        if cache_key:
+            self._store_response(cache_key, self.vision_model, result, cache_version)
+            result['cache'] = {'hit': False, 'key': cache_key}
+        return result
@@ -1,10 +1,10 @@
-import boto3
-import requests
-from PIL import Image
-from io import BytesIO
-from typing import List, Dict, Optional
-from django.conf import settings
+import base64
 import logging
+from typing import List, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from apps.ai.services import analysis_images
 from apps.catalog.utils.r2_utils import get_r2_client, get_r2_path
 
 logger = logging.getLogger(__name__)
@@ -39,56 +39,42 @@ class R2MediaProcessor:
                 'base64': str,        # Base64 encoded (для OpenAI Vision)
                 'format': str,        # 'jpeg', 'png', 'webp'
                 'size_bytes': int,
-                'dimensions': (w, h)
+                'dimensions': (w, h),
+                'cached': bool,       # взято из сохранённых производных
             }
         """
         
         try:
-            # Скачиваем изображение
-            if image_url.startswith(self.cdn_url):
-                # Из R2 - прямой доступ
-                key = image_url.replace(f"{self.cdn_url}/", "")
-                # Убеждаемся, что ключ включает префикс, если мы его получили из полной ссылки без него
-                # Хотя обычно ссылки уже включают префикс.
-                response = self.s3.get_object(Bucket=self.bucket, Key=key)
-                image_data = response['Body'].read()
-            else:
-                # Внешний URL
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-                image_data = response.content
-            
-            # Оптимизация
-            img = Image.open(BytesIO(image_data))
-            original_format = img.format
-            
-            # Конвертация в RGB если нужно
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize с сохранением пропорций
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Сохранение в буфер
-            buffer = BytesIO()
-            img.save(buffer, format='JPEG', quality=quality, optimize=True)
-            buffer.seek(0)
-            
-            optimized_data = buffer.getvalue()
-            
+            use_cache = analysis_images.is_enabled()
+            image_data = None
+            derivative = None
+            if use_cache:
+                digest, image_data = self._source_identity(image_url)
+                path = analysis_images.derivative_path(digest, max_size, quality)
+                derivative = analysis_images.load_derivative(path)
+            cached = derivative is not None
+            if derivative is None:
+                if image_data is None:
+                    image_data = self._download(image_url)
+                derivative = analysis_images.render_derivative(image_data, max_size, quality)
+                if use_cache:
+                    analysis_images.save_derivative(path, derivative['data'])
+
+            optimized_data = derivative['data']
+
             # Base64 для OpenAI Vision API
-            import base64
             base64_encoded = base64.b64encode(optimized_data).decode('utf-8')
-            
+
             return {
                 'url': image_url,  # Оригинал для ссылки
                 'base64': f"data:image/jpeg;base64,{base64_encoded}",
                 'format': 'jpeg',
                 'size_bytes': len(optimized_data),
-                'dimensions': img.size,
-                'original_format': original_format
+                'dimensions': derivative['dimensions'],
+                'original_format': derivative['original_format'],
+                'cached': cached,
             }
-            
+
         except Exception as e:
             logger.error(f"Error processing image {image_url}: {e}")
             return {
@@ -97,6 +83,35 @@ class R2MediaProcessor:
                 'error': str(e)
             }
 
+    def _r2_key(self, image_url: str) -> Optional[str]:
+        if self.cdn_url and image_url.startswith(self.cdn_url):
+            return image_url.replace(f"{self.cdn_url}/", "")
+        return None
+
+    def _source_identity(self, image_url: str) -> Tuple[str, Optional[bytes]]:
+        """
+        Дайджест источника для ключа производной и байты, если их пришлось скачать.
+
+        Объекты R2 опознаются по head_object (ETag + ContentLength) — тело не
+        скачивается; внешние URL скачиваются и хешируются по содержимому.
+        """
+        key = self._r2_key(image_url)
+        if key is not None:
+            head = self.s3.head_object(Bucket=self.bucket, Key=key)
+            return analysis_images.object_digest(key, head.get('ETag', ''), head.get('ContentLength')), None
+        image_data = self._download(image_url)
+        return analysis_images.content_digest(image_data), image_data
+
+    def _download(self, image_url: str) -> bytes:
+        """Байты оригинала: из R2 напрямую, внешние — через общую Session."""
+        key = self._r2_key(image_url)
+        if key is not None:
+            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+            return response['Body'].read()
+        response = analysis_images.get_http_session().get(image_url, timeout=30)
+        response.raise_for_status()
+        return response.content
+
     def save_processed_image(
         self,
         product_id: int,
@@ -0,0 +1,155 @@
+"""
+Имитация OpenAI API для бенчмарков без сети.
+
+MockOpenAIClient подставляется в LLMClient(client=...) вместо OpenAI: ответы
+chat.completions и embeddings формируются локально после задержки из
+ScriptedLatency, поэтому весь остальной код (кэш ответов, расчёт стоимости,
+разбор JSON, запись логов) работает как с настоящим API.
+
+Имена моделей mock-клиента получают префикс MOCK_MODEL_PREFIX: ключи
+LLMResponseCache и кэша эмбеддингов не пересекаются с настоящими ответами,
+а стоимость считается по тарифу исходной модели.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion
+
+from apps.ai.services.bulk_generator import CHARS_PER_TOKEN, estimate_tokens
+
+MOCK_MODEL_PREFIX = "mock-"
+# Эмбеддинг заметно быстрее генерации.
+EMBEDDING_LATENCY_FACTOR = 0.1
+EMBEDDING_SIZE = 1536
+
+
+class ScriptedLatency:
+    """
+    Логнормальная задержка с заданными медианой и p95; последовательность
+    детерминирована seed'ом, так что прогоны «до» и «после» сравнимы.
+    """
+
+    def __init__(self, median_ms: float, p95_ms: Optional[float] = None, seed: int = 0):
+        self.median = max(median_ms, 0) / 1000.0
+        p95_ms = max(p95_ms or median_ms, median_ms)
+        # p95 логнормального распределения = median * exp(1.645 * sigma)
+        self.sigma = math.log(p95_ms / median_ms) / 1.645 if median_ms > 0 else 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Очередная задержка в секундах."""
+        with self._lock:
+            z = self._random.gauss(0.0, 1.0)
+        return self.median * math.exp(self.sigma * z)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _product_content(prompt: str, category_slug: str = "") -> Dict:
+    tag = _digest(prompt)[:8]
+    content = {
+        locale: {
+            "generated_title": f"{title} {tag}",
+            "generated_description": f"<p>{description} {tag}.</p>",
+            "seo_title": f"{title} {tag}",
+            "seo_description": f"{description} {tag}",
+            "keywords": [title.lower(), tag],
+        }
+        for locale, title, description in (
+            ("ru", "Тестовый товар", "Описание тестового товара"),
+            ("en", "Benchmark product", "Benchmark product description"),
+        )
+    }
+    content["attributes"] = {}
+    if category_slug:
+        content["suggested_category_slug"] = category_slug
+        content["category_confidence"] = 0.9
+    return content
+
+
+def _vision_content(prompt: str) -> Dict:
+    return {"product_type": "benchmark", "colors": ["black"], "description": _digest(prompt)[:8]}
+
+
+class MockOpenAIClient:
+    """Минимальный OpenAI-совместимый клиент: chat.completions.create и embeddings.create."""
+
+    def __init__(self, latency: ScriptedLatency, category_slug: str = "", completion_tokens: Optional[int] = None):
+        self.latency = latency
+        self.category_slug = category_slug
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_completion))
+        self.embeddings = SimpleNamespace(create=self._embedding)
+
+    def _count(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def _chat_completion(self, model: str, messages: List[Dict], max_tokens: int = 1000, **kwargs) -> ChatCompletion:
+        number = self._count()
+        time.sleep(self.latency.sample())
+        last = messages[-1]["content"]
+        if isinstance(last, list):
+            text = " ".join(part.get("text", "") for part in last if part.get("type") == "text")
+            content = _vision_content(text)
+        else:
+            content = _product_content(last, self.category_slug)
+        raw = json.dumps(content, ensure_ascii=False)
+        prompt_tokens = estimate_tokens(messages, 0)
+        completion_tokens = min(self.completion_tokens or len(raw) // CHARS_PER_TOKEN, max_tokens)
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-mock-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": raw},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _embedding(self, model: str, input: str, **kwargs) -> CreateEmbeddingResponse:
+        self._count()
+        time.sleep(self.latency.sample() * EMBEDDING_LATENCY_FACTOR)
+        rng = random.Random(_digest(input))
+        vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_SIZE)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        tokens = max(len(input) // CHARS_PER_TOKEN, 1)
+        return CreateEmbeddingResponse.model_validate({
+            "object": "list",
+            "model": model,
+            "data": [{"object": "embedding", "index": 0, "embedding": [v / norm for v in vector]}],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+def build_mock_llm(latency: ScriptedLatency, category_slug: str = "", completion_tokens: Optional[int] = None):
+    """LLMClient поверх MockOpenAIClient с mock-именами моделей."""
+    from apps.ai.services.llm_client import LLMClient
+
+    llm = LLMClient(client=MockOpenAIClient(latency, category_slug, completion_tokens))
+    for attr in ("model", "vision_model", "embedding_model"):
+        model = getattr(llm, attr)
+        if model in llm.pricing:
+            llm.pricing[MOCK_MODEL_PREFIX + model] = llm.pricing[model]
+        setattr(llm, attr, MOCK_MODEL_PREFIX + model)
+    return llm
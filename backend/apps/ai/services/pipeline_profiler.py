@@ -0,0 +1,198 @@
+"""
+Поэтапный профиль ContentGenerator.process_product (для benchmark_ai).
+
+PipelineProfiler.instrument(generator) оборачивает методы конкретного экземпляра
+генератора — код пайплайна не меняется, а без профилировщика ничего не
+замеряется. Время этапа — собственное (self time): вложенные этапы (например,
+вызовы LLM при доработке ответа) вычитаются из объемлющего. Всё, что не попало
+ни в один этап (чтение товара, создание лога), идёт в «other».
+
+Этапы:
+    input        — _collect_input_data и сборка промптов (без вложенного RAG)
+    images       — _prepare_images (загрузка/оптимизация изображений)
+    rag          — поиск категорий и шаблонов в vector_store
+    llm          — llm.generate_content / llm.analyze_images
+    postprocess  — _finish_generation (разбор, валидация, сохранение результата)
+    db_write     — _complete_log (статус, модерация, применение к товару)
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+STAGES = ("input", "images", "rag", "llm", "postprocess", "db_write")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (как numpy.percentile по умолчанию)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 и среднее в миллисекундах."""
+    summary = {f"p{q}": round(percentile(seconds, q) * 1000, 2) for q in PERCENTILES}
+    summary["mean"] = round(sum(seconds) / len(seconds) * 1000, 2) if seconds else 0.0
+    return summary
+
+
+@dataclass
+class ProductSample:
+    product_id: int
+    stages: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+    total: float = 0.0
+    tokens: int = 0
+    cost_usd: float = 0.0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    status: str = ""
+    error: str = ""
+
+    @property
+    def other(self) -> float:
+        return max(self.total - sum(self.stages.values()), 0.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "product_id": self.product_id,
+            "status": self.status,
+            "error": self.error,
+            "total_ms": round(self.total * 1000, 2),
+            "stages_ms": {
+                name: round(value * 1000, 2)
+                for name, value in {**self.stages, "other": self.other}.items()
+            },
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "llm_calls": self.llm_calls,
+            "cache_hits": self.cache_hits,
+        }
+
+
+class PipelineProfiler:
+    """Сбор поэтапных замеров по товарам; потокобезопасен (замер — на поток)."""
+
+    def __init__(self):
+        self.samples: List[ProductSample] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def product(self, product_id: int):
+        """Замер обработки одного товара; yield — ProductSample для статуса."""
+        sample = ProductSample(product_id=product_id)
+        self._local.sample = sample
+        self._local.stack = []
+        started = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            sample.total = time.perf_counter() - started
+            self._local.sample = None
+            with self._lock:
+                self.samples.append(sample)
+
+    @contextmanager
+    def stage(self, name: str):
+        sample: Optional[ProductSample] = getattr(self._local, "sample", None)
+        if sample is None:
+            yield
+            return
+        stack = self._local.stack
+        frame = [time.perf_counter(), 0.0]  # начало, время вложенных этапов
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            sample.stages[name] += elapsed - frame[1]
+            if stack:
+                stack[-1][1] += elapsed
+
+    def _record_llm(self, result: Any) -> None:
+        sample: Optional[ProductSample] = getattr(self._local, "sample", None)
+        if sample is None or not isinstance(result, dict):
+            return
+        sample.llm_calls += 1
+        sample.tokens += int((result.get("tokens") or {}).get("total") or 0)
+        sample.cost_usd += float(result.get("cost_usd") or 0)
+        cache_info = result.get("cache")
+        if isinstance(cache_info, dict):
+            if cache_info.get("hit"):
+                sample.cache_hits += 1
+            else:
+                sample.cache_misses += 1
+
+    def _wrap(self, obj: Any, attr: str, stage: str, on_result=None) -> None:
+        original = getattr(obj, attr, None)
+        if original is None:
+            return
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            with self.stage(stage):
+                result = original(*args, **kwargs)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        setattr(obj, attr, wrapper)
+
+    def instrument(self, generator) -> None:
+        """Оборачивает методы экземпляра ContentGenerator (и его llm / vector_store)."""
+        self._wrap(generator, "_collect_input_data", "input")
+        self._wrap(generator, "_build_generation_request", "input")
+        self._wrap(generator, "_get_vision_prompt", "input")
+        self._wrap(generator, "_prepare_images", "images")
+        self._wrap(generator, "_finish_generation", "postprocess")
+        self._wrap(generator, "_complete_log", "db_write")
+        self._wrap(generator.llm, "generate_content", "llm", self._record_llm)
+        self._wrap(generator.llm, "analyze_images", "llm", self._record_llm)
+        if generator.vector_store is not None:
+            self._wrap(generator.vector_store, "search_similar_categories_by_text", "rag")
+            self._wrap(generator.vector_store, "get_relevant_templates_by_text", "rag")
+
+    def summary(self, wall_time: Optional[float] = None) -> Dict[str, Any]:
+        samples = list(self.samples)
+        count = len(samples)
+        hits = sum(s.cache_hits for s in samples)
+        lookups = hits + sum(s.cache_misses for s in samples)
+        total_tokens = sum(s.tokens for s in samples)
+        total_cost = sum(s.cost_usd for s in samples)
+        latency = {name: latency_summary([s.stages[name] for s in samples]) for name in STAGES}
+        latency["other"] = latency_summary([s.other for s in samples])
+        latency["total"] = latency_summary([s.total for s in samples])
+        summary = {
+            "products": count,
+            "succeeded": sum(1 for s in samples if not s.error),
+            "failed": sum(1 for s in samples if s.error),
+            "latency_ms": latency,
+            "tokens": {
+                "total": total_tokens,
+                "per_product": round(total_tokens / count, 1) if count else 0.0,
+            },
+            "cost_usd": {
+                "total": round(total_cost, 6),
+                "per_product": round(total_cost / count, 6) if count else 0.0,
+            },
+            "llm_calls": sum(s.llm_calls for s in samples),
+            "llm_cache": {
+                "hits": hits,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            },
+        }
+        if wall_time is not None:
+            summary["wall_time_s"] = round(wall_time, 3)
+            summary["throughput_per_min"] = round(count / wall_time * 60, 2) if wall_time > 0 else 0.0
+        return summary
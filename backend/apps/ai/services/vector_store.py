@@ -1,18 +1,16 @@
 import logging
 from typing import List, Dict, Optional, Any
-import os
 from django.conf import settings
-from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
+from apps.ai.services import embedding_index
+
 logger = logging.getLogger(__name__)
 
 
 def _get_embedding_for_text(text: str) -> List[float]:
-    """Получить эмбеддинг для текста (через LLMClient). Вынесено, чтобы избежать циклического импорта при ленивой инициализации."""
-    from apps.ai.services.llm_client import LLMClient
-    client = LLMClient()
-    return client.get_embedding(text)
+    """Эмбеддинг текста запроса (LRU процесса + Redis, иначе — API эмбеддингов)."""
+    return embedding_index.get_query_embedding(text)
 
 class QdrantManager:
     """
@@ -20,11 +18,14 @@ class QdrantManager:
     Используется для поиска похожих категорий, шаблонов и товаров.
     """
     def __init__(self):
-        self.host = os.environ.get("QDRANT_HOST", "qdrant")
-        self.port = int(os.environ.get("QDRANT_PORT", 6333))
-        self.client = QdrantClient(host=self.host, port=self.port)
+        from apps.recommendations.services.qdrant_registry import ensure_bootstrapped, get_qdrant_client
+
+        self.host = settings.QDRANT_HOST
+        self.port = settings.QDRANT_PORT
+        # Общий на процесс клиент с переподключением; коллекции проверяются один раз.
+        self.client = get_qdrant_client()
         self.vector_size = 1536  # text-embedding-3-small
-        self._ensure_collections()
+        ensure_bootstrapped("ai", self._ensure_collections)
 
     def _ensure_collections(self):
         """Проверка и создание коллекций."""
@@ -43,21 +44,31 @@ class QdrantManager:
                         vectors_config=models.VectorParams(size=size, distance=models.Distance.COSINE)
                     )
                     logger.info(f"Created Qdrant collection: {name}")
+            return True
         except Exception as e:
             logger.error(f"Failed to initialize Qdrant collections: {e}")
+            return False
+
+    def _search(self, collection: str, embedding: List[float], limit: int) -> List[Dict]:
+        """Поиск по матрице коллекции в памяти процесса; без неё — запрос в Qdrant."""
+        if embedding_index.is_enabled():
+            index = embedding_index.get_index(self.client, collection)
+            if index is not None:
+                return index.search(embedding, limit)
+        response = self.client.query_points(
+            collection_name=collection,
+            query=embedding,
+            limit=limit
+        )
+        return [
+            {"id": hit.id, "score": hit.score, "payload": hit.payload or {}}
+            for hit in response.points
+        ]
 
     def search_similar_categories(self, embedding: List[float], limit: int = 3) -> List[Dict]:
         """Поиск похожих категорий."""
         try:
-            response = self.client.query_points(
-                collection_name="categories",
-                query=embedding,
-                limit=limit
-            )
-            return [
-                {"id": hit.id, "score": hit.score, "payload": hit.payload or {}}
-                for hit in response.points
-            ]
+            return self._search("categories", embedding, limit)
         except Exception as e:
             logger.error(f"Qdrant search error: {e}")
             return []
@@ -75,6 +86,7 @@ class QdrantManager:
                     )
                 ]
             )
+            embedding_index.bump_index_version("categories")
         except Exception as e:
             logger.error(f"Qdrant upsert error: {e}")
 
@@ -91,6 +103,7 @@ class QdrantManager:
                     )
                 ]
             )
+            embedding_index.bump_index_version("templates")
         except Exception as e:
             logger.error(f"Qdrant template upsert error: {e}")
 
@@ -126,14 +139,9 @@ class QdrantManager:
             return []
         try:
             embedding = _get_embedding_for_text(product_type.strip())
-            response = self.client.query_points(
-                collection_name="templates",
-                query=embedding,
-                limit=top_k,
-            )
             out = []
-            for hit in response.points:
-                payload = hit.payload or {}
+            for hit in self._search("templates", embedding, top_k):
+                payload = hit["payload"]
                 content = payload.get("content") or payload.get("text") or ""
                 if content:
                     out.append(content)
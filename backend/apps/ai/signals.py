@@ -5,3 +5,6 @@ logger = logging.getLogger(__name__)
 # AI обработка запускается ТОЛЬКО вручную через кнопки в админке («Полная AI обработка»
 # и «Полная AI обработка + авто-применение»). Автоматического сигнала нет, чтобы избежать
 # неконтролируемых трат токенов при каждом сохранении товара.
+
+# Версии RAG-матриц категорий и шаблонов повышаются только при upsert векторов в Qdrant
+# (QdrantManager.upsert_category / upsert_template): сохранение моделей векторы не меняет.
@@ -1,5 +1,6 @@
 from celery import shared_task
 from django.apps import apps
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Count, Q
@@ -8,6 +9,7 @@ import logging
 from typing import List
 
 from apps.catalog.models import Product
+from apps.ai.services import llm_cache
 from apps.ai.services.content_generator import ContentGenerator
 from apps.ai.models import AIProcessingLog, AIProcessingStatus
 
@@ -116,6 +118,8 @@ def process_product_ai_task(
             options = {}
         if force:
             options["force"] = True
+            # Перезапуск должен дать новый ответ, а не тот же из LLMResponseCache.
+            options.setdefault("skip_llm_cache", True)
 
         logger.info(
             "Starting AI processing for product %s, type=%s, force=%s",
@@ -131,11 +135,7 @@ def process_product_ai_task(
             options=options,
             log_entry_id=log_entry_id,
         )
-        try:
-            product = Product.objects.get(id=product_id)
-            generator.sync_variant_titles_from_parent(product, log_entry=log_entry)
-        except Exception:
-            logger.exception("Variant title sync failed for product %s", product_id)
+        _sync_variant_titles(generator, product_id, log_entry)
 
         if log_entry.status in [AIProcessingStatus.COMPLETED, AIProcessingStatus.APPROVED, AIProcessingStatus.MODERATION] and not force:
              # Если статус уже финальный и мы не форсировали, значит лог был возвращен существующий
@@ -150,10 +150,7 @@ def process_product_ai_task(
                 product_id,
                 log_entry.id,
             )
-        if processing_type in ("full", "description_only"):
-            prepare_variant_ai_candidates_task.delay(product_id=product_id, force=force)
-        from apps.recommendations.tasks import index_product_vectors
-        index_product_vectors.apply_async(args=[[product_id]], countdown=60)
+        _schedule_followups([product_id], processing_type, force)
         return {
             "status": "success",
             "log_id": log_entry.id,
@@ -175,6 +172,23 @@ def process_product_ai_task(
         raise
 
 
+def _sync_variant_titles(generator: ContentGenerator, product_id: int, log_entry: AIProcessingLog) -> None:
+    try:
+        product = Product.objects.get(id=product_id)
+        generator.sync_variant_titles_from_parent(product, log_entry=log_entry)
+    except Exception:
+        logger.exception("Variant title sync failed for product %s", product_id)
+
+
+def _schedule_followups(product_ids: List[int], processing_type: str, force: bool) -> None:
+    """Очередь вариантов и переиндексация векторов после обработки товаров."""
+    if processing_type in ("full", "description_only"):
+        for product_id in product_ids:
+            prepare_variant_ai_candidates_task.delay(product_id=product_id, force=force)
+    from apps.recommendations.tasks import index_product_vectors
+    index_product_vectors.apply_async(args=[list(product_ids)], countdown=60)
+
+
 @shared_task
 def prepare_variant_ai_candidates_task(product_id: int, force: bool = False):
     """Собирает очередь вариантов, для которых потенциально нужна отдельная AI-обработка."""
@@ -272,10 +286,42 @@ def batch_process_products(
     product_ids: List[int],
     processing_type: str = "full",
     auto_apply: bool = False,
+    bulk: bool = False,
+    deferred: bool = False,
 ):
-    """Пакетная постановка с видимым pending-логом для каждого товара."""
+    """Пакетная постановка с видимым pending-логом для каждого товара.
+
+    bulk=True — вместо задачи на товар товары делятся на пачки по
+    AI_CONFIG['BULK_BATCH_SIZE'], и каждая пачка обрабатывается одной задачей
+    bulk_process_products_task с конкурентными вызовами LLM.
+    deferred=True — отложенное пакетное задание через batch backend
+    (результаты применит poll_ai_batch_jobs), не расходует интерактивные лимиты.
+    """
     if not product_ids:
         return {"task_id": None, "total": 0, "submitted": False}
+    if deferred:
+        result = submit_ai_batch_job_task.delay(
+            list(product_ids),
+            processing_type=processing_type,
+            auto_apply=auto_apply,
+        )
+        return {"task_id": result.id, "total": len(product_ids), "submitted": 1, "mode": "deferred"}
+    if bulk:
+        batch_size = max(1, int(settings.AI_CONFIG.get("BULK_BATCH_SIZE", 50)))
+        task_ids = [
+            bulk_process_products_task.delay(
+                product_ids[start:start + batch_size],
+                processing_type=processing_type,
+                auto_apply=auto_apply,
+            ).id
+            for start in range(0, len(product_ids), batch_size)
+        ]
+        return {
+            "task_id": task_ids[0],
+            "total": len(product_ids),
+            "submitted": len(task_ids),
+            "mode": "bulk",
+        }
     submitted = 0
     task_ids = []
     for product_id in product_ids:
@@ -294,6 +340,103 @@ def batch_process_products(
     }
 
 
+@shared_task
+def bulk_process_products_task(
+    product_ids: List[int],
+    processing_type: str = "full",
+    auto_apply: bool = False,
+    options: dict | None = None,
+):
+    """Обработка пачки товаров в одной задаче (см. BulkContentGenerator)."""
+    from apps.ai.services.bulk_generator import BulkContentGenerator
+
+    options = dict(options or {})
+    processing_type = _resolve_processing_type(processing_type, options)
+    generator = ContentGenerator()
+    summary = BulkContentGenerator(generator).run(
+        product_ids,
+        processing_type=processing_type,
+        auto_apply=auto_apply,
+        options=options,
+    )
+    processed_ids = [log.product_id for log in summary["processed"]]
+    for log_entry in summary["processed"]:
+        _sync_variant_titles(generator, log_entry.product_id, log_entry)
+    if processed_ids:
+        _schedule_followups(processed_ids, processing_type, bool(options.get("force")))
+    logger.info(
+        "Bulk AI processing: %s processed, %s failed, %s skipped",
+        len(summary["processed"]),
+        len(summary["failed"]),
+        len(summary["skipped"]),
+    )
+    return {
+        "processed": len(summary["processed"]),
+        "failed": len(summary["failed"]),
+        "skipped": summary["skipped"],
+        "log_ids": [log.id for log in summary["processed"] + summary["failed"]],
+    }
+
+
+@shared_task
+def submit_ai_batch_job_task(
+    product_ids: List[int],
+    processing_type: str = "description_only",
+    auto_apply: bool = False,
+    options: dict | None = None,
+):
+    """Отправить товары на отложенную генерацию через batch backend (AIBatchJob)."""
+    from apps.ai.services.batch_jobs import submit_batch_job
+
+    options = dict(options or {})
+    processing_type = _resolve_processing_type(processing_type, options)
+    job = submit_batch_job(
+        product_ids,
+        processing_type=processing_type,
+        auto_apply=auto_apply,
+        options=options,
+    )
+    return {"batch_job_id": job.id, "status": job.status, "requests": job.request_count}
+
+
+@shared_task
+def poll_ai_batch_jobs(limit: int = 20):
+    """По расписанию: забрать готовые результаты отправленных пакетных заданий."""
+    from django.core.cache import cache
+
+    from apps.ai.models import AIBatchJob, AIBatchJobStatus
+    from apps.ai.services.batch_jobs import collect_batch_job
+
+    jobs = AIBatchJob.objects.filter(status=AIBatchJobStatus.SUBMITTED).order_by("submitted_at")[:limit]
+    generator = None
+    summary = {"polled": 0, "completed": 0, "applied_logs": 0}
+    for job in jobs:
+        # Долгое применение результатов не должно пересекаться со следующим запуском beat.
+        lock_key = f"ai-batch-poll:{job.id}"
+        if not cache.add(lock_key, True, 60 * 30):
+            continue
+        try:
+            generator = generator or ContentGenerator()
+            processed = collect_batch_job(job, generator=generator)
+            summary["polled"] += 1
+            if job.status != AIBatchJobStatus.SUBMITTED:
+                summary["completed"] += 1
+            for log_entry in processed:
+                _sync_variant_titles(generator, log_entry.product_id, log_entry)
+            if processed:
+                _schedule_followups(
+                    [log_entry.product_id for log_entry in processed],
+                    job.processing_type,
+                    bool((job.options or {}).get("force")),
+                )
+            summary["applied_logs"] += len(processed)
+        except Exception:
+            logger.exception("Failed to poll AI batch job %s", job.id)
+        finally:
+            cache.delete(lock_key)
+    return summary
+
+
 @shared_task
 def process_uncategorized(limit: int = 100):
     """По расписанию: обработать товары без категории (только категоризация)."""
@@ -361,4 +504,8 @@ def cleanup_old_ai_logs(days: int = 90):
         created_at__lt=cutoff,
         status__in=(AIProcessingStatus.COMPLETED, AIProcessingStatus.APPROVED),
     ).delete()
-    return {"deleted_logs": deleted}
+    return {
+        "deleted_logs": deleted,
+        "flushed_llm_cache_hits": llm_cache.flush_hit_counts(),
+        "deleted_llm_cache": llm_cache.purge_expired(),
+    }
@@ -0,0 +1,129 @@
+import base64
+import hashlib
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from apps.ai.services import analysis_images
+from apps.ai.services.analysis_images import content_digest, derivative_path, object_digest
+from apps.ai.services.media_processor import R2MediaProcessor
+
+CDN = "https://cdn.test"
+
+
+def _png(size=(2400, 1600)):
+    buffer = BytesIO()
+    Image.new("RGBA", size, (200, 30, 30, 255)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+        self.downloads = []
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": f'"{hashlib.md5(self.data).hexdigest()}"', "ContentLength": len(self.data)}
+
+    def get_object(self, Bucket, Key):
+        self.downloads.append(Key)
+        return {"Body": BytesIO(self.data)}
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": str(tmp_path), "base_url": "/media/"},
+        },
+    }
+    settings.AI_CONFIG = {**settings.AI_CONFIG, "ANALYSIS_IMAGE_CACHE": True}
+    return tmp_path
+
+
+def _processor(data):
+    processor = R2MediaProcessor.__new__(R2MediaProcessor)
+    processor.s3 = FakeS3(data)
+    processor.bucket = "bucket"
+    processor.cdn_url = CDN
+    return processor
+
+
+def test_analysis_derivative_is_rendered_once_and_reused(storage):
+    source = _png()
+    processor = _processor(source)
+    url = f"{CDN}/products/parsed/zara/images/zara-1-0-abc.png"
+
+    first = processor.get_image_for_analysis(url)
+    second = processor.get_image_for_analysis(url)
+
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert first["base64"] == second["base64"]
+    assert first["dimensions"] == second["dimensions"] == (1024, 683)
+    assert first["original_format"] == "PNG"
+    # Попадание в кэш определяется по head_object — оригинал скачан один раз.
+    assert len(processor.s3.downloads) == 1
+    head = processor.s3.head_object("bucket", "")
+    key = url.replace(f"{CDN}/", "")
+    assert (storage / derivative_path(object_digest(key, head["ETag"], head["ContentLength"]))).exists()
+
+    # Другие параметры — отдельная производная.
+    small = processor.get_image_for_analysis(url, max_size=(512, 512), quality=70)
+    assert small["cached"] is False and small["dimensions"] == (512, 341)
+
+
+def test_overwritten_source_gets_a_new_derivative(storage):
+    processor = _processor(_png((800, 600)))
+    url = f"{CDN}/products/original/7.png"
+
+    assert processor.get_image_for_analysis(url)["dimensions"] == (800, 600)
+
+    # Тот же URL, другое содержимое — старая производная не отдаётся.
+    processor.s3.data = _png((600, 800))
+    result = processor.get_image_for_analysis(url)
+    assert result["cached"] is False and result["dimensions"] == (600, 800)
+    raw = base64.b64decode(result["base64"].split(",", 1)[1])
+    assert Image.open(BytesIO(raw)).format == "JPEG"
+
+
+def test_external_url_is_keyed_by_downloaded_content(storage, monkeypatch):
+    source = _png((400, 300))
+    requests_made = []
+
+    class Response:
+        content = source
+
+        def raise_for_status(self):
+            pass
+
+    class Session:
+        def get(self, url, timeout):
+            requests_made.append(url)
+            return Response()
+
+    monkeypatch.setattr(analysis_images, "get_http_session", lambda: Session())
+    processor = _processor(b"")
+    url = "https://images.example.com/p/1.png"
+
+    first = processor.get_image_for_analysis(url)
+    second = processor.get_image_for_analysis(url)
+
+    assert (first["cached"], second["cached"]) == (False, True)
+    # Внешний источник не опознать без тела: скачивается каждый раз, рендер — один.
+    assert len(requests_made) == 2
+    assert processor.s3.downloads == []
+    assert (storage / derivative_path(content_digest(source))).exists()
+
+
+def test_disabled_cache_renders_without_storing(storage, settings):
+    settings.AI_CONFIG = {**settings.AI_CONFIG, "ANALYSIS_IMAGE_CACHE": False}
+    processor = _processor(_png((300, 300)))
+    url = f"{CDN}/products/original/1.png"
+
+    assert processor.get_image_for_analysis(url)["cached"] is False
+    assert processor.get_image_for_analysis(url)["cached"] is False
+    assert len(processor.s3.downloads) == 2
+    assert not list(storage.rglob("*.jpg"))
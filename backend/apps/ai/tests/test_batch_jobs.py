@@ -0,0 +1,132 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from apps.ai.models import AIBatchJobStatus, AIProcessingStatus
+from apps.ai.services.batch_backends import LocalFileBatchBackend
+from apps.ai.services.batch_jobs import submit_batch_job
+from apps.ai.services.content_generator import ContentGenerator
+from apps.ai.services.llm_client import LLMClient
+from apps.ai.tasks import poll_ai_batch_jobs
+from apps.catalog.models import Product
+
+
+def _completion(body):
+    content = {
+        "ru": {"generated_title": "Название", "generated_description": "Описание из пакета"},
+        "en": {"generated_title": "Title", "generated_description": "Batch description"},
+    }
+    return {
+        "id": "chatcmpl-batch",
+        "object": "chat.completion",
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 1000, "total_tokens": 2000},
+    }
+
+
+@pytest.fixture
+def generator(settings, tmp_path):
+    settings.OPENAI_API_KEY = "test-key"
+    settings.AI_CONFIG = {
+        **settings.AI_CONFIG,
+        "BATCH_BACKEND": "apps.ai.services.batch_backends.LocalFileBatchBackend",
+        "BATCH_LOCAL_DIR": str(tmp_path),
+    }
+    generator = ContentGenerator.__new__(ContentGenerator)
+    generator.llm = LLMClient()
+    generator.media_processor = SimpleNamespace(get_product_images_batch=lambda urls: [])
+    generator.vector_store = None
+    return generator
+
+
+@pytest.mark.django_db
+def test_deferred_batch_job_is_submitted_as_jsonl_and_applied_on_poll(generator, tmp_path, monkeypatch):
+    products = [
+        Product.objects.create(
+            name=f"Batch product {index}",
+            slug=f"batch-product-{index}",
+            product_type="accessories",
+            price=10,
+            currency="TRY",
+            description="Source description",
+        )
+        for index in range(3)
+    ]
+    followups = []
+    monkeypatch.setattr("apps.ai.tasks.ContentGenerator", lambda: generator)
+    monkeypatch.setattr("apps.ai.tasks._schedule_followups", lambda ids, *args: followups.extend(ids))
+
+    job = submit_batch_job([p.id for p in products], processing_type="description_only", generator=generator)
+
+    assert job.status == AIBatchJobStatus.SUBMITTED and job.request_count == 3
+    lines = [json.loads(line) for line in (tmp_path / job.external_id / "input.jsonl").read_text().splitlines()]
+    assert sorted(line["custom_id"] for line in lines) == sorted(f"log-{log.id}" for log in job.logs.all())
+    assert lines[0]["url"] == "/v1/chat/completions"
+    assert lines[0]["body"]["response_format"] == {"type": "json_object"}
+    assert set(job.logs.values_list("status", flat=True)) == {AIProcessingStatus.PENDING}
+
+    # Результатов ещё нет — задание остаётся отправленным.
+    assert poll_ai_batch_jobs()["completed"] == 0
+    job.refresh_from_db()
+    assert job.status == AIBatchJobStatus.SUBMITTED and job.last_polled_at is not None
+
+    LocalFileBatchBackend(tmp_path, responder=_completion).poll(job.external_id)
+    summary = poll_ai_batch_jobs()
+
+    job.refresh_from_db()
+    assert summary == {"polled": 1, "completed": 1, "applied_logs": 3}
+    assert (job.status, job.completed_count, job.failed_count) == (AIBatchJobStatus.COMPLETED, 3, 0)
+    assert sorted(followups) == sorted(p.id for p in products)
+    for log in job.logs.all():
+        assert log.status in (AIProcessingStatus.COMPLETED, AIProcessingStatus.MODERATION)
+        assert log.raw_llm_response["batch"]["job_id"] == job.id
+        # gpt-4o-mini: 1000 * 0.00015 + 1000 * 0.0006 = 0.00075 $, batch — вдвое дешевле.
+        assert float(log.cost_usd) == pytest.approx(0.000375)
+
+
+def _batch_products(count):
+    return [
+        Product.objects.create(
+            name=f"Batch guard {index}", slug=f"batch-guard-{index}", product_type="accessories",
+            price=10, currency="TRY",
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_broken_product_input_fails_only_its_log(generator, monkeypatch):
+    good, bad = _batch_products(2)
+    original = generator._collect_input_data
+
+    def collect(product):
+        if product.id == bad.id:
+            raise ValueError("broken attributes")
+        return original(product)
+
+    monkeypatch.setattr(generator, "_collect_input_data", collect)
+
+    job = submit_batch_job([good.id, bad.id], processing_type="description_only", generator=generator)
+
+    assert job.status == AIBatchJobStatus.SUBMITTED and job.request_count == 1
+    assert job.logs.get(product=good).status == AIProcessingStatus.PENDING
+    failed = job.logs.get(product=bad)
+    assert (failed.status, failed.error_message) == (AIProcessingStatus.FAILED, "broken attributes")
+
+
+@pytest.mark.django_db
+def test_aborted_submit_marks_job_failed(generator, monkeypatch):
+    products = _batch_products(2)
+
+    def explode(*args, **kwargs):
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr("apps.ai.services.batch_jobs.AIProcessingLog.objects.bulk_create", explode)
+
+    job = submit_batch_job([p.id for p in products], processing_type="description_only", generator=generator)
+
+    job.refresh_from_db()
+    assert (job.status, job.error_message) == (AIBatchJobStatus.FAILED, "db gone")
+    assert job.completed_at is not None
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from apps.ai.models import AIProcessingLog, LLMResponseCache
+from apps.ai.services import embedding_index
+from apps.ai.services.pipeline_profiler import STAGES, percentile
+from apps.catalog.models import Product
+
+LATENCY_MS = 300
+
+
+@pytest.fixture
+def mock_env(settings, monkeypatch):
+    settings.OPENAI_API_KEY = "test-key"
+    settings.AI_CONFIG = {**settings.AI_CONFIG, "RESPONSE_CACHE_ENABLED": True}
+    settings.R2_CONFIG = {**settings.R2_CONFIG, "endpoint_url": "https://r2.test"}
+
+    def no_qdrant():
+        raise ConnectionError("qdrant is not available in tests")
+
+    monkeypatch.setattr("apps.ai.services.content_generator.QdrantManager", no_qdrant)
+    yield
+    embedding_index.clear_indexes()
+
+
+def _benchmark(tmp_path, name, *extra):
+    path = tmp_path / f"{name}.json"
+    call_command(
+        "benchmark_ai",
+        "3",
+        "--mock-llm",
+        "--mock-latency-ms", str(LATENCY_MS),
+        "--mock-latency-p95-ms", str(LATENCY_MS),
+        "--processing-type", "description_only",
+        "--concurrency", "3",
+        "--json", str(path),
+        *extra,
+    )
+    return json.loads(path.read_text())
+
+
+@pytest.mark.django_db(transaction=True)
+def test_mock_benchmark_reports_stage_percentiles_cost_and_cache(mock_env, tmp_path):
+    for index in range(3):
+        Product.objects.create(
+            name=f"Benchmark product {index}",
+            slug=f"benchmark-product-{index}",
+            product_type="accessories",
+            price=10,
+            currency="TRY",
+            description="Source description",
+        )
+
+    report = _benchmark(tmp_path, "cold", "--warmup", "2")
+    summary = report["summary"]
+
+    assert report["config"]["mock_llm"] is True and report["config"]["model"].startswith("mock-")
+    assert (summary["products"], summary["succeeded"], summary["failed"]) == (3, 3, 0)
+    assert set(summary["latency_ms"]) == {*STAGES, "other", "total"}
+    for row in summary["latency_ms"].values():
+        assert row["p50"] <= row["p95"] <= row["p99"]
+    assert summary["latency_ms"]["llm"]["p50"] >= LATENCY_MS * 0.9
+    assert summary["latency_ms"]["images"]["p99"] < LATENCY_MS / 10
+    assert summary["tokens"]["per_product"] > 0 and summary["cost_usd"]["per_product"] > 0
+    # Прогрев идёт мимо кэша, поэтому замеряемый прогон — одни промахи.
+    assert summary["llm_cache"] == {"hits": 0, "lookups": 3, "hit_rate": 0.0}
+    # Три товара параллельно: стена меньше суммы времени обработки.
+    assert summary["wall_time_s"] < sum(s["total_ms"] for s in report["samples"]) / 1000 * 0.8
+    # Логи mock-прогона удаляются, ответы кэшируются под mock-моделью.
+    assert not AIProcessingLog.objects.exists()
+    assert set(LLMResponseCache.objects.values_list("model", flat=True)) == {report["config"]["model"]}
+
+    warm = _benchmark(tmp_path, "warm")["summary"]
+    assert warm["llm_cache"] == {"hits": 3, "lookups": 3, "hit_rate": 1.0}
+    assert warm["cost_usd"]["total"] == 0
+    assert warm["latency_ms"]["llm"]["p99"] < LATENCY_MS
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [0.4, 0.1, 0.3, 0.2]
+    assert percentile(values, 50) == pytest.approx(0.25)
+    assert percentile(values, 99) == pytest.approx(0.397)
+    assert percentile([], 95) == 0.0
@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from apps.ai.models import AIProcessingLog, AIProcessingStatus
+from apps.ai.services.bulk_generator import BulkContentGenerator, TokenBucket
+from apps.ai.services.content_generator import ContentGenerator
+from apps.ai.services.llm_client import LLMClient
+from apps.catalog.models import Product
+
+LATENCY = 0.2
+
+
+def _content(prompt):
+    return {
+        "ru": {"generated_title": "Название", "generated_description": f"Описание {len(prompt)}"},
+        "en": {"generated_title": "Title", "generated_description": f"Description {len(prompt)}"},
+    }
+
+
+class FakeOpenAIServer:
+    """Локальный /v1/chat/completions: задержка ответа и 429 на первый запрос."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests += 1
+                    number = server.requests
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                time.sleep(LATENCY)
+                with server.lock:
+                    server.in_flight -= 1
+                if number == 1:
+                    payload, status = {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, 429
+                else:
+                    prompt = body["messages"][-1]["content"]
+                    payload, status = {
+                        "id": f"chatcmpl-{number}",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": body["model"],
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": json.dumps(_content(prompt))},
+                        }],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+                    }, 200
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def openai_server(settings, monkeypatch):
+    server = FakeOpenAIServer()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+    settings.OPENAI_API_KEY = "test-key"
+    settings.AI_CONFIG = {**settings.AI_CONFIG, "RESPONSE_CACHE_ENABLED": True}
+    yield server
+    server.httpd.shutdown()
+
+
+@pytest.fixture
+def generator(openai_server):
+    generator = ContentGenerator.__new__(ContentGenerator)
+    generator.llm = LLMClient()
+    generator.media_processor = SimpleNamespace(get_product_images_batch=lambda urls: [])
+    generator.vector_store = None
+    return generator
+
+
+@pytest.mark.django_db
+def test_bulk_run_processes_products_concurrently_and_retries_429(openai_server, generator):
+    products = [
+        Product.objects.create(
+            name=f"Bulk product {index}",
+            slug=f"bulk-product-{index}",
+            product_type="accessories",
+            price=10,
+            currency="TRY",
+            description=f"Source description {'x' * index}",
+        )
+        for index in range(4)
+    ]
+    ids = [product.id for product in products]
+
+    started = time.monotonic()
+    summary = BulkContentGenerator(generator, concurrency=4, rpm=0, tpm=0).run(
+        ids, processing_type="description_only"
+    )
+    elapsed = time.monotonic() - started
+
+    assert summary["failed"] == [] and len(summary["processed"]) == 4
+    logs = AIProcessingLog.objects.filter(product_id__in=ids)
+    assert {log.status for log in logs} <= {AIProcessingStatus.COMPLETED, AIProcessingStatus.MODERATION}
+    assert len({log.input_data["bulk_run_id"] for log in logs}) == 1
+    assert all(float(log.cost_usd) > 0 for log in logs)
+    # 4 ответа + один 429, повторённый клиентом; запросы шли параллельно.
+    assert openai_server.requests == 5
+    assert openai_server.max_in_flight > 1
+    assert elapsed < 5 * LATENCY + 2
+
+    # Уже обработанные товары пропускаются; force с skip_llm_cache=False берёт ответы из кэша.
+    assert BulkContentGenerator(generator).run(ids, processing_type="description_only")["skipped"] == ids
+    again = BulkContentGenerator(generator).run(
+        ids, processing_type="description_only", options={"force": True, "skip_llm_cache": False}
+    )
+    assert len(again["processed"]) == 4 and openai_server.requests == 5
+    assert all(float(log.cost_usd) == 0 for log in again["processed"])
+
+    # Просто force — перегенерация мимо кэша.
+    fresh = BulkContentGenerator(generator).run(ids, processing_type="description_only", options={"force": True})
+    assert len(fresh["processed"]) == 4 and openai_server.requests == 9
+
+
+
+def _bulk_products(count, prefix):
+    return [
+        Product.objects.create(
+            name=f"{prefix} {index}",
+            slug=f"{prefix.lower().replace(' ', '-')}-{index}",
+            product_type="accessories",
+            price=10,
+            currency="TRY",
+            description="Source description",
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_bulk_run_isolates_per_product_preparation_errors(openai_server, generator, monkeypatch):
+    broken_input, broken_prompt, healthy = _bulk_products(3, "Isolated product")
+    collect = generator._collect_input_data
+    build = generator._build_generation_request
+
+    def collect_input(product):
+        if product.pk == broken_input.pk:
+            raise ValueError("bad input")
+        return collect(product)
+
+    def build_request(product, log, processing_type):
+        if product.pk == broken_prompt.pk:
+            raise ValueError("bad prompt")
+        return build(product, log, processing_type)
+
+    monkeypatch.setattr(generator, "_collect_input_data", collect_input)
+    monkeypatch.setattr(generator, "_build_generation_request", build_request)
+
+    summary = BulkContentGenerator(generator, rpm=0, tpm=0).run(
+        [broken_input.pk, broken_prompt.pk, healthy.pk], processing_type="description_only"
+    )
+
+    assert [log.product_id for log in summary["processed"]] == [healthy.pk]
+    failed = {log.product_id: log for log in summary["failed"]}
+    assert set(failed) == {broken_input.pk, broken_prompt.pk}
+    assert failed[broken_input.pk].error_message == "bad input"
+    assert AIProcessingLog.objects.get(product=broken_prompt).status == AIProcessingStatus.FAILED
+
+
+@pytest.mark.django_db
+def test_interrupted_bulk_run_does_not_leave_processing_logs(openai_server, generator, monkeypatch):
+    products = _bulk_products(2, "Interrupted product")
+
+    async def crash(*args, **kwargs):
+        raise RuntimeError("worker lost")
+
+    monkeypatch.setattr(BulkContentGenerator, "_complete_all", crash)
+
+    with pytest.raises(RuntimeError):
+        BulkContentGenerator(generator, rpm=0, tpm=0).run(
+            [product.pk for product in products], processing_type="description_only"
+        )
+
+    assert set(AIProcessingLog.objects.values_list("status", flat=True)) == {AIProcessingStatus.FAILED}
+
+
+def test_token_bucket_paces_requests_beyond_capacity():
+    import asyncio
+
+    bucket = TokenBucket(per_minute=600, capacity=2)  # 10 в секунду, запас 2
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    started = time.monotonic()
+    asyncio.run(take(5))
+    assert 0.25 <= time.monotonic() - started < 1.0
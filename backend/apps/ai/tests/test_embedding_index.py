@@ -0,0 +1,124 @@
+import pytest
+from django.core.cache import cache
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from apps.ai.services import embedding_index
+from apps.ai.services.vector_store import QdrantManager
+from apps.catalog.models import Category
+
+VECTORS = {
+    1: ([1.0, 0.0, 0.0, 0.0], "Кепки"),
+    2: ([0.8, 0.6, 0.0, 0.0], "Панамы"),
+    3: ([0.0, 0.0, 1.0, 0.0], "Кольца"),
+}
+
+
+class CountingClient:
+    """In-memory Qdrant с подсчётом scroll/query_points и управляемым отказом."""
+
+    def __init__(self):
+        self.qdrant = QdrantClient(":memory:")
+        self.scrolls = 0
+        self.queries = 0
+        self.down = False
+
+    def scroll(self, **kwargs):
+        self.scrolls += 1
+        if self.down:
+            raise TimeoutError("qdrant timeout")
+        return self.qdrant.scroll(**kwargs)
+
+    def query_points(self, **kwargs):
+        self.queries += 1
+        return self.qdrant.query_points(**kwargs)
+
+    def upsert(self, **kwargs):
+        return self.qdrant.upsert(**kwargs)
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def get_embedding(self, text):
+        self.calls.append(text)
+        return [0.9, 0.5, 0.1, 0.0]
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    cache.clear()
+    embedding_index.clear_indexes()
+    client = CountingClient()
+    client.qdrant.create_collection(
+        "categories",
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+    client.qdrant.upsert(
+        "categories",
+        points=[
+            models.PointStruct(id=pk, vector=vector, payload={"category_name": name})
+            for pk, (vector, name) in VECTORS.items()
+        ],
+    )
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(embedding_index, "_get_llm", lambda: embeddings)
+    manager = QdrantManager.__new__(QdrantManager)
+    manager.client = client
+    yield manager, client, embeddings
+    embedding_index.clear_indexes()
+
+
+@pytest.mark.django_db
+def test_category_search_uses_in_process_index_and_cached_query_embedding(manager):
+    manager, client, embeddings = manager
+
+    first = manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+    second = manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+
+    expected = client.qdrant.query_points("categories", query=[0.9, 0.5, 0.1, 0.0], limit=2).points
+    assert [hit["id"] for hit in first] == [hit.id for hit in expected] == [2, 1]
+    assert [hit["score"] for hit in first] == pytest.approx([hit.score for hit in expected], abs=1e-5)
+    assert first[0]["category_name"] == "Панамы"
+    assert second == first
+    assert embeddings.calls == ["Бейсболка хлопковая"]
+    assert (client.scrolls, client.queries) == (1, 0)
+
+    # Эмбеддинг переживает сброс LRU процесса — он лежит в общем кэше.
+    embedding_index.clear_indexes()
+    manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+    assert len(embeddings.calls) == 1 and client.scrolls == 2
+
+    # Сохранение категории в БД векторы не меняет — матрица не перечитывается.
+    Category.objects.create(name="Береты", slug="berets")
+    manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+    assert client.scrolls == 2
+
+    # Upsert вектора категории меняет версию — матрица перечитывается один раз.
+    manager.upsert_category(4, [0.0, 1.0, 0.0, 0.0], {"category_name": "Береты"})
+    manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+    manager.search_similar_categories_by_text("Бейсболка хлопковая", top_k=2)
+    assert client.scrolls == 3
+
+
+@pytest.mark.django_db
+def test_template_save_does_not_bump_template_index():
+    from apps.ai.models import AITemplate
+
+    cache.clear()
+    AITemplate.objects.create(name="RAG шаблон", template_type="description", content="Пример")
+    assert embedding_index.get_index_version("templates") == 0
+
+
+@pytest.mark.django_db
+def test_search_keeps_previous_index_when_qdrant_is_down(manager):
+    manager, client, embeddings = manager
+    assert manager.search_similar_categories([1.0, 0.0, 0.0, 0.0], limit=1)[0]["id"] == 1
+
+    client.down = True
+    embedding_index.bump_index_version("categories")
+    assert manager.search_similar_categories([0.0, 0.0, 1.0, 0.0], limit=1)[0]["id"] == 3
+    # Повторная попытка загрузки — не раньше RAG_INDEX_RETRY_SECONDS.
+    assert manager.search_similar_categories([0.0, 0.0, 1.0, 0.0], limit=1)[0]["id"] == 3
+    assert (client.scrolls, client.queries) == (2, 0)
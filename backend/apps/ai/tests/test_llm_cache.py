@@ -0,0 +1,93 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from apps.ai.models import LLMResponseCache
+from apps.ai.services import llm_cache
+from apps.ai.services.llm_client import LLMClient
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        text = json.dumps({"answer": len(self.calls)})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150),
+            model_dump=lambda: {"id": f"resp-{len(self.calls)}"},
+        )
+
+
+@pytest.fixture
+def client(settings):
+    settings.AI_CONFIG = {**settings.AI_CONFIG, "RESPONSE_CACHE_ENABLED": True, "RESPONSE_CACHE_TTL": 3600}
+    llm = LLMClient.__new__(LLMClient)
+    llm.model = llm.vision_model = "gpt-4o-mini"
+    llm.pricing = {"gpt-4o-mini": {"input": 0.00015, "output": 0.0006}}
+    completions = FakeCompletions()
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return llm, completions
+
+
+@pytest.mark.django_db
+def test_repeated_prompt_is_served_from_cache_with_zero_cost(client):
+    llm, completions = client
+
+    first = llm.generate_content("system", "user prompt", temperature=0.2, cache_version="1")
+    second = llm.generate_content("system", "  user prompt\n", temperature=0.2, cache_version="1")
+
+    assert len(completions.calls) == 1
+    assert second["content"] == first["content"] == {"answer": 1}
+    assert first["cost_usd"] > 0 and first["cache"]["hit"] is False
+    assert second["cost_usd"] == 0.0
+    assert second["tokens"]["total"] == 0
+    assert second["cache"] == {
+        "hit": True,
+        "key": first["cache"]["key"],
+        "tokens": first["tokens"],
+        "cost_usd": first["cost_usd"],
+    }
+    # Попадание в Redis не пишет в БД — счётчик переносится при очистке.
+    entry = LLMResponseCache.objects.get(key=first["cache"]["key"])
+    assert entry.hit_count == 0
+    assert llm_cache.flush_hit_counts() == 1
+    entry.refresh_from_db()
+    assert entry.hit_count == 1
+    assert llm_cache.flush_hit_counts() == 0
+
+
+@pytest.mark.django_db
+def test_cache_key_follows_temperature_version_and_image_digest(client):
+    llm, completions = client
+    image_a = [{"base64": "data:image/jpeg;base64,AAAA"}]
+    image_b = [{"base64": "data:image/jpeg;base64,BBBB"}]
+
+    llm.generate_content("system", "prompt", temperature=0.2)
+    llm.generate_content("system", "prompt", temperature=0.7)
+    llm.generate_content("system", "prompt", temperature=0.2, cache_version="2")
+    llm.generate_content("system", "prompt", temperature=0.2, use_cache=False)
+    llm.analyze_images(image_a, "describe")
+    llm.analyze_images(image_a, "describe")
+    llm.analyze_images(image_b, "describe")
+
+    assert len(completions.calls) == 6
+    # use_cache=False не читает и не пишет кэш.
+    assert LLMResponseCache.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_db_fallback_hit_is_counted_immediately():
+    from django.core.cache import cache
+
+    llm_cache.store("fallback-key", "gpt-4o-mini", {"content": "{}"})
+    cache.clear()
+
+    assert llm_cache.lookup("fallback-key") == {"content": "{}"}
+    assert LLMResponseCache.objects.get(key="fallback-key").hit_count == 1
+    # Следующее попадание уже из Redis — в БД до очистки не пишется.
+    assert llm_cache.lookup("fallback-key") == {"content": "{}"}
+    assert LLMResponseCache.objects.get(key="fallback-key").hit_count == 1
@@ -77,3 +77,27 @@ def test_enqueue_marks_log_failed_when_broker_publish_fails(
     log = AIProcessingLog.objects.get(product=product)
     assert log.status == AIProcessingStatus.FAILED
     assert "broker unavailable" in log.error_message
+
+
+@pytest.mark.django_db
+def test_forced_reprocess_bypasses_llm_response_cache(monkeypatch, product):
+    from apps.ai import tasks
+
+    seen = []
+
+    class _Generator:
+        def process_product(self, product_id, processing_type, auto_apply, options, log_entry_id):
+            seen.append(dict(options))
+            return AIProcessingLog.objects.create(
+                product_id=product_id, processing_type=processing_type, status=AIProcessingStatus.MODERATION, input_data={},
+            )
+
+    monkeypatch.setattr(tasks, "ContentGenerator", _Generator)
+    monkeypatch.setattr(tasks, "_sync_variant_titles", lambda *args: None)
+    monkeypatch.setattr(tasks, "_schedule_followups", lambda *args: None)
+
+    tasks.process_product_ai_task.run(product_id=product.id, force=True)
+    tasks.process_product_ai_task.run(product_id=product.id)
+
+    assert seen[0]["skip_llm_cache"] is True
+    assert "skip_llm_cache" not in seen[1]
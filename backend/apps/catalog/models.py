@@ -1761,7 +1761,8 @@ class Product(models.Model):
             logger = logging.getLogger(__name__)
             logger.error(f"Error updating currency prices for product {self.id}: {str(e)}\n{traceback.format_exc()}")
     
-    def _get_variant_price_info(self):
+    def get_variant_price_source(self):
+        """(модель варианта, id) для ProductVariantPrice shadow-товара или None."""
         ext = self.external_data or {}
         source_variant_id = ext.get("source_variant_id")
         if not source_variant_id:
@@ -1777,6 +1778,16 @@ class Product(models.Model):
         variant_model = variant_model_map.get(product_type)
         if not variant_model:
             return None
+        return variant_model, source_variant_id
+
+    def _get_variant_price_info(self):
+        # Может быть заполнено заранее пакетной загрузкой (orders.pricing).
+        if hasattr(self, "_variant_price_info_cache"):
+            return self._variant_price_info_cache
+        source = self.get_variant_price_source()
+        if not source:
+            return None
+        variant_model, source_variant_id = source
         try:
             from django.contrib.contenttypes.models import ContentType
             from .currency_models import ProductVariantPrice
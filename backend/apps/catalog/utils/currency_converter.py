@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import Dict, Optional, Tuple
 import logging
@@ -7,6 +9,11 @@ from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
+# Курсы пар, уже запрошенные в текущем блоке rate_memo() (None — курса нет).
+_rate_memo: ContextVar[Optional[Dict[Tuple[str, str], Optional[Decimal]]]] = ContextVar(
+    "currency_rate_memo", default=None
+)
+
 
 class CurrencyConverter:
     """Утилита для конвертации валют с учетом маржи"""
@@ -44,20 +51,7 @@ class CurrencyConverter:
             return amount, amount, amount
         
         # Получаем курс конвертации с автообновлением при отсутствии
-        rate_service = CurrencyRateService()
-        rate = rate_service.get_rate(from_currency, to_currency)
-        if rate is None:
-            try:
-                should_refresh = cache.add("currency_rates_refresh_lock", True, 600)
-            except Exception as e:
-                logger.warning(f"Cache lock add failed: {e}")
-                should_refresh = False
-            if should_refresh:
-                logger.warning(f"Rate missing for {from_currency} → {to_currency}, attempting update")
-                success, message = rate_service.update_rates()
-                if not success:
-                    logger.error(f"Rate update failed: {message}")
-            rate = rate_service.get_rate(from_currency, to_currency)
+        rate = self._resolve_rate(from_currency, to_currency)
         if rate is None:
             logger.error(f"No rate found for {from_currency} → {to_currency} after update attempt")
             raise ValueError(f"Currency rate not available: {from_currency} → {to_currency}")
@@ -81,6 +75,41 @@ class CurrencyConverter:
         
         return amount_decimal, converted_price, price_with_margin
     
+    def _resolve_rate(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
+        """Курс пары; при отсутствии — одна попытка обновить курсы (под общим lock)."""
+        memo = _rate_memo.get()
+        if memo is not None and (from_currency, to_currency) in memo:
+            return memo[(from_currency, to_currency)]
+        rate_service = CurrencyRateService()
+        rate = rate_service.get_rate(from_currency, to_currency)
+        if rate is None:
+            try:
+                should_refresh = cache.add("currency_rates_refresh_lock", True, 600)
+            except Exception as e:
+                logger.warning(f"Cache lock add failed: {e}")
+                should_refresh = False
+            if should_refresh:
+                logger.warning(f"Rate missing for {from_currency} → {to_currency}, attempting update")
+                success, message = rate_service.update_rates()
+                if not success:
+                    logger.error(f"Rate update failed: {message}")
+            rate = rate_service.get_rate(from_currency, to_currency)
+        if memo is not None:
+            memo[(from_currency, to_currency)] = rate
+        return rate
+
+    @contextmanager
+    def rate_memo(self, rates: Optional[Dict[Tuple[str, str], Optional[Decimal]]] = None):
+        """Внутри блока курс каждой пары читается один раз (в т.ч. отсутствие курса).
+
+        rates — словарь, который можно переиспользовать между блоками одного расчёта.
+        """
+        token = _rate_memo.set({} if rates is None else rates)
+        try:
+            yield
+        finally:
+            _rate_memo.reset(token)
+
     def convert_to_multiple_currencies(
         self, 
         amount: Decimal, 
@@ -21,11 +21,15 @@ def get_effective_product_markup(product):
     return Decimal("0"), None
 
 
-def apply_product_markup(amount, product):
-    """Накладывает товарную наценку поверх уже рассчитанной публичной цены."""
+def apply_product_markup(amount, product, margin=None):
+    """Накладывает товарную наценку поверх уже рассчитанной публичной цены.
+
+    margin — уже найденный процент (get_effective_product_markup), чтобы не искать его повторно.
+    """
     if amount is None:
         return None
-    margin, _ = get_effective_product_markup(product)
+    if margin is None:
+        margin, _ = get_effective_product_markup(product)
     value = Decimal(str(amount))
     if margin <= 0:
         return value
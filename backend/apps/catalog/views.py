@@ -1995,9 +1995,9 @@ class ProductViewSet(SmartSlugLookupMixin, FacetedModelViewSetMixin, viewsets.Re
         if request.query_params.get("color"):
             filters["color"] = request.query_params["color"]
         try:
-            from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+            from apps.recommendations.services.qdrant_registry import get_recommendation_engine
             from apps.recommendations.services.reranker import BusinessReranker
-            engine = QdrantRecommendationEngine()
+            engine = get_recommendation_engine()
             reranker = BusinessReranker()
             similar_list = engine.find_similar(
                 product_id=product.id,
@@ -2006,30 +2006,24 @@ class ProductViewSet(SmartSlugLookupMixin, FacetedModelViewSetMixin, viewsets.Re
                 filters=filters or None,
                 exclude_same_brand=exclude_brand,
             )
-            reranked = reranker.rerank(similar_list, product, strategy=strategy, request=request)
+            # Теневые варианты отсекаются реранкером по feature store,
+            # карточки собираются только для итоговых n_results.
+            reranked = reranker.rerank(
+                similar_list, product, strategy=strategy, request=request, limit=n_results,
+            )
             rec_ids = [r["product"]["id"] for r in reranked]
 
-            # Исключаем теневые варианты (shadow variants) из результатов
-            if rec_ids:
-                shadow_ids = set(
-                    Product.objects.filter(id__in=rec_ids).filter(
-                        models.Q(external_data__has_key='source_variant_id') |
-                        models.Q(external_data__has_key='source_variant_slug')
-                    ).values_list('id', flat=True)
-                )
-                if shadow_ids:
-                    reranked = [r for r in reranked if r["product"]["id"] not in shadow_ids]
-                    rec_ids = [rid for rid in rec_ids if rid not in shadow_ids]
-
             if rec_ids:
-                session_key = getattr(request.session, "session_key", None) or ""
+                from apps.recommendations.services.user_profiles import visitor_session_id
                 from apps.recommendations.tasks import log_recommendation_event
+                session_key = visitor_session_id(request)
                 log_recommendation_event.delay(
                     event_type="impression",
                     source_product_id=product.id,
                     recommended_ids=rec_ids,
                     algorithm="vector_combined",
                     session_id=session_key,
+                    user_id=request.user.id if request.user.is_authenticated else None,
                 )
             if request.query_params.get('view') == 'card':
                 reranked = [
@@ -2068,8 +2062,8 @@ class ProductViewSet(SmartSlugLookupMixin, FacetedModelViewSetMixin, viewsets.Re
         product = self.get_object()
         n_results = int(request.query_params.get("limit", 12))
         try:
-            from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
-            engine = QdrantRecommendationEngine()
+            from apps.recommendations.services.qdrant_registry import get_recommendation_engine
+            engine = get_recommendation_engine()
             similar_list = engine.find_similar(
                 product_id=product.id,
                 vector_type="image",
@@ -0,0 +1,398 @@
+"""Гостевая корзина в Redis.
+
+Анонимная корзина хранится в hash ``guest-cart:<token>`` (поле ``meta`` с валютой
+и промокодом, поля ``item:<id>`` с JSON позиций) и не создаёт ни строк
+``django_session``, ни ``Cart``. Токен — подписанная cookie ``guest_cart`` либо
+ключ клиента из X-Cart-Session / cookie ``cart_session``.
+
+В БД корзина попадает только при авторизации (первый запрос корзины или
+оформления заказа с JWT): позиции переносятся одним ``bulk_create``.
+
+GuestCart повторяет ту часть интерфейса Cart, которую читают CartSerializer и
+CartViewSet (items.all(), items_count, promo_code, currency, save(), quantity_of,
+add_item, set_quantity, remove_item, clear_items), поэтому контракт API не меняется.
+"""
+import json
+import logging
+import threading
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.catalog.models import Product, ProductImage
+
+from .models import Cart, CartItem, PromoCode
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "guest_cart"
+COOKIE_SALT = "orders.guest_cart"
+KEY_PREFIX = "guest-cart:"
+META_FIELD = "meta"
+SEQ_FIELD = "seq"
+ITEM_PREFIX = "item:"
+MAX_TOKEN_LENGTH = 128
+
+_lock = threading.Lock()
+_client = None
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "GUEST_CART_BACKEND", "redis") == "redis"
+
+
+def get_client():
+    """Общий клиент Redis (пул соединений redis-py сам пересоздаётся после fork)."""
+    global _client
+    with _lock:
+        if _client is None:
+            import redis
+
+            _client = redis.Redis.from_url(
+                settings.GUEST_CART_REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=1,
+                socket_timeout=1,
+            )
+        return _client
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "GUEST_CART_TTL_DAYS", 30)) * 24 * 60 * 60
+
+
+def _product_prefetch():
+    return (
+        "translations",
+        Prefetch("images", queryset=ProductImage.objects.all().order_by("is_main", "sort_order")),
+        "medicine_item__gallery_images",
+        "supplement_item__gallery_images",
+        "medical_equipment_item__gallery_images",
+        "tableware_item__gallery_images",
+        "accessory_item__gallery_images",
+        "incense_item__gallery_images",
+    )
+
+
+def read_token(request) -> Optional[str]:
+    """Токен гостевой корзины: подписанная cookie, затем ключ клиента."""
+    token = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=_ttl())
+    if not token:
+        token = request.META.get("HTTP_X_CART_SESSION") or request.COOKIES.get("cart_session")
+    if token and len(token) <= MAX_TOKEN_LENGTH:
+        return token
+    return None
+
+
+def set_cookie(response, token: str) -> None:
+    response.set_signed_cookie(
+        COOKIE_NAME,
+        token,
+        salt=COOKIE_SALT,
+        max_age=_ttl(),
+        httponly=True,
+        samesite="Lax",
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def _parse_dt(value):
+    return parse_datetime(value) if value else None
+
+
+class GuestCartItems(list):
+    """Список позиций с методами менеджера, которые вызывают сериализаторы и view."""
+
+    def all(self):
+        return self
+
+    def exists(self) -> bool:
+        return bool(self)
+
+    def count(self) -> int:
+        return len(self)
+
+    def get(self, pk=None):
+        for item in self:
+            if str(item.pk) == str(pk):
+                return item
+        raise CartItem.DoesNotExist("Guest cart item not found")
+
+
+class GuestCart:
+    """Корзина гостя в Redis с интерфейсом Cart."""
+
+    id = pk = None
+    user = user_id = None
+
+    def __init__(self, token: str, data: Optional[Dict[str, str]] = None, client=None, issued: bool = False):
+        self.session_key = token
+        self.client = client or get_client()
+        # Токен сгенерирован сервером — cookie выставляется после первой записи.
+        self.issued = issued
+        self.written = False
+        self._load(self.client.hgetall(self.key) if data is None else data)
+
+    @property
+    def key(self) -> str:
+        return f"{KEY_PREFIX}{self.session_key}"
+
+    def _load(self, data: Dict[str, str]) -> None:
+        meta = json.loads(data.get(META_FIELD) or "{}")
+        now = timezone.now()
+        self.currency = meta.get("currency") or "RUB"
+        self.promo_code_id = meta.get("promo_code_id")
+        self.created_at = _parse_dt(meta.get("created_at")) or now
+        self.updated_at = _parse_dt(meta.get("updated_at")) or now
+        self._lines = {
+            int(field[len(ITEM_PREFIX):]): json.loads(value)
+            for field, value in data.items()
+            if field.startswith(ITEM_PREFIX)
+        }
+        self._items = None
+        self._promo_code = None
+
+    @property
+    def items(self) -> GuestCartItems:
+        if self._items is None:
+            self._items = self._build_items()
+        return self._items
+
+    def _build_items(self) -> GuestCartItems:
+        product_ids = {line["product_id"] for line in self._lines.values()}
+        products = {}
+        if product_ids:
+            products = {
+                product.id: product
+                for product in Product.objects.filter(id__in=product_ids).prefetch_related(*_product_prefetch())
+            }
+        items = GuestCartItems()
+        for line_id, line in sorted(self._lines.items()):
+            product = products.get(line["product_id"])
+            if product is None:
+                continue
+            items.append(CartItem(
+                id=line_id,
+                product=product,
+                quantity=line["quantity"],
+                price=Decimal(line["price"]),
+                currency=line["currency"],
+                chosen_size=line.get("chosen_size") or "",
+                created_at=_parse_dt(line.get("created_at")),
+                updated_at=_parse_dt(line.get("updated_at")),
+            ))
+        return items
+
+    @property
+    def items_count(self) -> int:
+        return sum(line["quantity"] for line in self._lines.values())
+
+    @property
+    def promo_code(self) -> Optional[PromoCode]:
+        if self.promo_code_id is None:
+            return None
+        if self._promo_code is None or self._promo_code.pk != self.promo_code_id:
+            self._promo_code = PromoCode.objects.filter(pk=self.promo_code_id).first()
+        return self._promo_code
+
+    @promo_code.setter
+    def promo_code(self, value: Optional[PromoCode]) -> None:
+        self._promo_code = value
+        self.promo_code_id = value.pk if value is not None else None
+
+    def _meta(self) -> str:
+        return json.dumps({
+            "currency": self.currency,
+            "promo_code_id": self.promo_code_id,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        })
+
+    def _write(self, lines: Optional[Dict[int, dict]] = None, delete: Iterable[int] = ()) -> None:
+        self.updated_at = timezone.now()
+        mapping = {META_FIELD: self._meta()}
+        for line_id, line in (lines or {}).items():
+            mapping[f"{ITEM_PREFIX}{line_id}"] = json.dumps(line)
+        pipe = self.client.pipeline()
+        fields = [f"{ITEM_PREFIX}{line_id}" for line_id in delete]
+        if fields:
+            pipe.hdel(self.key, *fields)
+        pipe.hset(self.key, mapping=mapping)
+        pipe.expire(self.key, _ttl())
+        pipe.execute()
+        self.written = True
+        self._items = None
+
+    def save(self, update_fields=None) -> None:
+        self._write()
+
+    def quantity_of(self, product_id: int, chosen_size: str) -> int:
+        line_id = self._find(product_id, chosen_size)
+        return self._lines[line_id]["quantity"] if line_id is not None else 0
+
+    def _find(self, product_id: int, chosen_size: str) -> Optional[int]:
+        for line_id, line in self._lines.items():
+            if line["product_id"] == product_id and (line.get("chosen_size") or "") == (chosen_size or ""):
+                return line_id
+        return None
+
+    def add_item(self, product: Product, quantity: int, chosen_size: str, price, currency: str) -> None:
+        """Добавляет количество к позиции товар + размер; валюта корзины — валюта позиции.
+
+        Hash перечитывается под WATCH и пишется в MULTI (redis-py повторяет при
+        WatchError), поэтому параллельные добавления не теряют количество и не
+        создают двух позиций одного товара.
+        """
+        def update(pipe):
+            data = pipe.hgetall(self.key)
+            self._load(data)
+            now = timezone.now().isoformat()
+            seq = max(int(data.get(SEQ_FIELD) or 0), *self._lines, 0)
+            line_id = self._find(product.id, chosen_size)
+            if line_id is None:
+                line_id = seq = seq + 1
+                line = {"product_id": product.id, "chosen_size": chosen_size or "", "quantity": 0, "created_at": now}
+            else:
+                line = self._lines[line_id]
+            line.update({
+                "quantity": line["quantity"] + quantity,
+                "price": str(price),
+                "currency": currency,
+                "updated_at": now,
+            })
+            self._lines[line_id] = line
+            self.currency = currency
+            self.updated_at = timezone.now()
+            pipe.multi()
+            pipe.hset(self.key, mapping={
+                META_FIELD: self._meta(),
+                SEQ_FIELD: seq,
+                f"{ITEM_PREFIX}{line_id}": json.dumps(line),
+            })
+            pipe.expire(self.key, _ttl())
+
+        self.client.transaction(update, self.key)
+        self.written = True
+        self._items = None
+
+    def set_quantity(self, line_id, quantity: int) -> None:
+        line = self._lines[int(line_id)]
+        line.update({"quantity": quantity, "updated_at": timezone.now().isoformat()})
+        self._write({int(line_id): line})
+
+    def remove_item(self, line_id) -> bool:
+        try:
+            line_id = int(line_id)
+        except (TypeError, ValueError):
+            return False
+        if self._lines.pop(line_id, None) is None:
+            return False
+        self._write(delete=[line_id])
+        return True
+
+    def clear_items(self) -> None:
+        if not self._lines:
+            return
+        line_ids = list(self._lines)
+        self._lines = {}
+        self._write(delete=line_ids)
+
+    def delete(self) -> None:
+        self.client.delete(self.key)
+
+    def promote(self, user) -> Optional[Cart]:
+        """Переносит позиции в БД-корзину пользователя одним bulk_create.
+
+        Позиции, которые уже есть в корзине пользователя (товар + размер), не
+        дублируются. Hash удаляется после коммита транзакции.
+        """
+        if not self._lines:
+            return None
+        with transaction.atomic():
+            cart = Cart.objects.filter(user=user).first()
+            if cart is None:
+                cart = Cart.objects.create(user=user, currency=self.currency)
+            existing = set(cart.items.values_list("product_id", "chosen_size"))
+            product_ids = set(
+                Product.objects.filter(id__in={line["product_id"] for line in self._lines.values()})
+                .values_list("id", flat=True)
+            )
+            new_items = []
+            for _line_id, line in sorted(self._lines.items()):
+                identity = (line["product_id"], line.get("chosen_size") or "")
+                if identity in existing or line["product_id"] not in product_ids:
+                    continue
+                existing.add(identity)
+                new_items.append(CartItem(
+                    cart=cart,
+                    product_id=line["product_id"],
+                    quantity=line["quantity"],
+                    price=Decimal(line["price"]),
+                    currency=line["currency"],
+                    chosen_size=identity[1],
+                ))
+            CartItem.objects.bulk_create(new_items)
+            if self.promo_code_id and not cart.promo_code_id:
+                cart.promo_code_id = self.promo_code_id
+                cart.save(update_fields=["promo_code", "updated_at"])
+            transaction.on_commit(self.delete)
+        logger.info("guest_cart.promote user_id=%s items=%s", user.pk, len(new_items))
+        return cart
+
+
+def _import_legacy_cart(cart: GuestCart) -> None:
+    """Переносит анонимную БД-корзину (до перехода на Redis) в hash и удаляет её."""
+    legacy = Cart.objects.filter(session_key=cart.session_key, user=None).first()
+    if legacy is None:
+        return
+    lines = {}
+    for index, item in enumerate(legacy.items.order_by("id"), start=1):
+        lines[index] = {
+            "product_id": item.product_id,
+            "chosen_size": item.chosen_size or "",
+            "quantity": item.quantity,
+            "price": str(item.price),
+            "currency": item.currency,
+            "created_at": item.created_at.isoformat(),
+            "updated_at": item.updated_at.isoformat(),
+        }
+    cart.currency = legacy.currency
+    cart.promo_code_id = legacy.promo_code_id
+    cart.created_at = legacy.created_at
+    cart._lines = lines
+    if lines:
+        cart.client.hset(cart.key, SEQ_FIELD, len(lines))
+    cart._write(lines)
+    legacy.delete()
+
+
+def load(request) -> GuestCart:
+    """Гостевая корзина запроса. Пустая корзина ничего не пишет в Redis."""
+    token = read_token(request)
+    issued = token is None
+    if issued:
+        token = uuid.uuid4().hex
+    client = get_client()
+    data = client.hgetall(f"{KEY_PREFIX}{token}")
+    cart = GuestCart(token, data=data, client=client, issued=issued)
+    if not data and not issued and getattr(settings, "GUEST_CART_IMPORT_LEGACY", True):
+        _import_legacy_cart(cart)
+    return cart
+
+
+def promote_for_user(request, user) -> Optional[Cart]:
+    """Переносит гостевую корзину запроса в корзину пользователя (вход или оформление)."""
+    token = read_token(request)
+    if not token:
+        return None
+    client = get_client()
+    data = client.hgetall(f"{KEY_PREFIX}{token}")
+    if not data:
+        return None
+    return GuestCart(token, data=data, client=client).promote(user)
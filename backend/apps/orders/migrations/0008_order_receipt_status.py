@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_update_currency_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='receipt_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хэш чека'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='receipt_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Формируется'), ('ready', 'Готов'), ('failed', 'Ошибка')], max_length=16, verbose_name='Статус чека'),
+        ),
+    ]
@@ -190,16 +190,60 @@ class Cart(models.Model):
         if not self.promo_code:
             return 0
         cart_currency = (self.currency or 'RUB').upper()
-        is_valid, error = self.promo_code.is_valid(cart_total=self.total_amount, cart_currency=cart_currency)
+        total = self.total_amount
+        is_valid, error = self.promo_code.is_valid(cart_total=total, cart_currency=cart_currency)
         if not is_valid:
             return 0
-        return self.promo_code.calculate_discount(self.total_amount, currency=cart_currency)
+        return self.promo_code.calculate_discount(total, currency=cart_currency)
     
     @property
     def final_amount(self):
         """Итоговая сумма с учётом скидки."""
         return round(self.total_amount - self.discount_amount, 2)
 
+    # Изменение позиций — тот же интерфейс, что у guest_cart.GuestCart: CartViewSet
+    # не различает БД- и Redis-корзину.
+
+    def quantity_of(self, product_id: int, chosen_size: str) -> int:
+        item = self.items.filter(product_id=product_id, chosen_size=chosen_size or "").first()
+        return item.quantity if item else 0
+
+    def add_item(self, product, quantity: int, chosen_size: str, price, currency: str) -> None:
+        """Добавляет количество к позиции товар + размер; валюта корзины — валюта позиции.
+
+        Количество прибавляется через F(), цена и валюта обновляются по актуальному товару.
+        """
+        item, created = CartItem.objects.get_or_create(
+            cart=self,
+            product=product,
+            chosen_size=chosen_size or "",
+            defaults={"quantity": quantity, "price": price, "currency": currency},
+        )
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(
+                quantity=models.F("quantity") + quantity,
+                price=price,
+                currency=currency,
+                updated_at=timezone.now(),
+            )
+        if self.currency != currency:
+            self.currency = currency
+            self.save(update_fields=["currency", "updated_at"])
+
+    def set_quantity(self, line_id, quantity: int) -> None:
+        self.items.filter(pk=line_id).update(quantity=quantity, updated_at=timezone.now())
+
+    def remove_item(self, line_id) -> bool:
+        try:
+            line_id = int(line_id)
+        except (TypeError, ValueError):
+            return False
+        deleted, _rows = self.items.filter(pk=line_id).delete()
+        return bool(deleted)
+
+    def clear_items(self) -> None:
+        self.items.all().delete()
+
 
 class CartItem(models.Model):
     """Позиция в корзине."""
@@ -265,6 +309,11 @@ class Order(models.Model):
         DELIVERED = "delivered", _("Доставлен")
         CANCELLED = "cancelled", _("Отменен")
 
+    class ReceiptStatus(models.TextChoices):
+        PENDING = "pending", _("Формируется")
+        READY = "ready", _("Готов")
+        FAILED = "failed", _("Ошибка")
+
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="orders", verbose_name=_("Пользователь"))
     number = models.CharField(_("Номер заказа"), max_length=32, unique=True)
     status = models.CharField(_("Статус"), max_length=32, choices=OrderStatus.choices, default=OrderStatus.NEW)
@@ -293,6 +342,9 @@ class Order(models.Model):
     comment = models.TextField(_("Комментарий"), blank=True)
     
     receipt_url = models.URLField(_("Ссылка на чек (PDF)"), blank=True, null=True, max_length=1000)
+    receipt_status = models.CharField(_("Статус чека"), max_length=16, choices=ReceiptStatus.choices, blank=True)
+    # sha256 содержимого чека (без времени выдачи): PDF в R2 лежит по этому ключу.
+    receipt_hash = models.CharField(_("Хэш чека"), max_length=64, blank=True)
 
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
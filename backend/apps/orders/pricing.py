@@ -0,0 +1,230 @@
+"""Однопроходный расчёт цен корзины.
+
+Один ответ корзины раньше пересчитывал цену каждой позиции многократно: строка
+(price, total, converted_*/final_*, prices_in_currencies), total_amount корзины
+(он же вызывался из discount/final_amount и порога бесплатной доставки) и
+get_shipping_options, каждый раз заново читая ProductPrice, варианты и курсы.
+
+CartPricingContext живёт в serializer.context на время одного ответа:
+
+* preload() одним проходом загружает для всех товаров ProductPrice, бренды,
+  категории с предками, варианты и ProductVariantPrice (цены, старые цены,
+  тарифы доставки);
+* курс каждой пары валют (и его отсутствие) запрашивается один раз (convert());
+* значения по позициям и итоги корзины мемоизируются (value()).
+
+Формулы остаются в CartItemSerializer/CartSerializer — контекст только
+избавляет их от повторных запросов и пересчётов.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q, prefetch_related_objects
+
+from apps.catalog.currency_models import ProductVariantPrice
+from apps.catalog.models import (
+    BookVariant,
+    ClothingVariant,
+    FurnitureVariant,
+    JewelryVariant,
+    Product,
+    ShoeVariant,
+)
+from apps.catalog.utils.currency_converter import currency_converter
+from apps.catalog.utils.product_markup import apply_product_markup, get_effective_product_markup
+
+CONTEXT_KEY = "cart_pricing"
+
+# Модели вариантов, из которых get_shipping_options берёт ProductVariantPrice (по product_type).
+SHIPPING_VARIANT_MODELS = {
+    "clothing": ClothingVariant,
+    "shoes": ShoeVariant,
+    "jewelry": JewelryVariant,
+    "furniture": FurnitureVariant,
+    "books": BookVariant,
+}
+# Варианты, у которых берётся old_price, если у shadow-товара его нет.
+OLD_PRICE_VARIANT_MODELS = {
+    "clothing": ClothingVariant,
+    "shoes": ShoeVariant,
+    "furniture": FurnitureVariant,
+}
+
+
+def shipping_variant_source(product) -> Optional[Tuple[Any, Any]]:
+    """(модель варианта, id) для тарифов доставки позиции или None."""
+    ext = getattr(product, "external_data", None)
+    if not ext or ("source_variant_id" not in ext and "jewelry_variant_id" not in ext):
+        return None
+    variant_model = SHIPPING_VARIANT_MODELS.get(product.product_type)
+    if variant_model is None:
+        return None
+    return variant_model, ext.get("source_variant_id") or ext.get("jewelry_variant_id")
+
+
+def old_price_variant_source(product) -> Optional[Tuple[Any, str]]:
+    """(модель варианта, slug) для старой цены shadow-товара или None."""
+    ext = getattr(product, "external_data", {}) or {}
+    variant_slug = ext.get("source_variant_slug")
+    variant_model = OLD_PRICE_VARIANT_MODELS.get(ext.get("effective_type") or ext.get("source_type"))
+    if variant_slug and variant_model is not None:
+        return variant_model, variant_slug
+    return None
+
+
+def _pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except Exception:
+        return None
+
+
+def _object_id(value):
+    try:
+        return ProductVariantPrice._meta.get_field("object_id").to_python(value)
+    except Exception:
+        return None
+
+
+class CartPricingContext:
+    """Цены одной корзины в валюте ответа: пакетная загрузка и мемоизация."""
+
+    def __init__(self, cart, currency: str):
+        self.cart = cart
+        self.currency = (currency or "RUB").upper()
+        items = getattr(cart, "items", None)
+        self.items = list(items.all()) if items is not None else []
+        self._product_ids = set()
+        self._values: Dict[tuple, Any] = {}
+        self._rates: Dict[Tuple[str, str], Optional[Decimal]] = {}
+        self._variants: Dict[tuple, Any] = {}
+        self._variants_by_slug: Dict[tuple, Any] = {}
+        self._variant_prices: Dict[tuple, ProductVariantPrice] = {}
+
+    @classmethod
+    def for_serializer(cls, serializer, cart) -> "CartPricingContext":
+        """Контекст корзины из serializer.context (создаётся один раз на ответ)."""
+        context = serializer.context
+        pricing = context.get(CONTEXT_KEY)
+        if pricing is None or pricing.cart is not cart:
+            pricing = cls(cart, serializer._get_preferred_currency(context.get("request")))
+            pricing.preload()
+            context[CONTEXT_KEY] = pricing
+        return pricing
+
+    @staticmethod
+    def item_key(item):
+        pk = getattr(item, "pk", None)
+        return pk if pk is not None else id(item)
+
+    def value(self, key: tuple, compute: Callable[[], Any]):
+        try:
+            return self._values[key]
+        except KeyError:
+            result = self._values[key] = compute()
+            return result
+
+    def convert(self, amount, from_currency: str, to_currency: str, apply_margin: bool = True):
+        """currency_converter.convert_price с курсом пары, запрошенным один раз на корзину."""
+        with currency_converter.rate_memo(self._rates):
+            return currency_converter.convert_price(amount, from_currency, to_currency, apply_margin=apply_margin)
+
+    def apply_markup(self, amount, product):
+        """apply_product_markup с процентом наценки, найденным один раз на товар."""
+        key = ("markup", getattr(product, "pk", None) or id(product))
+        margin = self.value(key, lambda: get_effective_product_markup(product)[0])
+        return apply_product_markup(amount, product, margin=margin)
+
+    def covers(self, product) -> bool:
+        """Варианты и цены товара загружены preload() (иначе — обычные запросы)."""
+        return getattr(product, "pk", None) in self._product_ids
+
+    def shipping_variant_price(self, product) -> Optional[ProductVariantPrice]:
+        source = shipping_variant_source(product)
+        if source is None:
+            return None
+        variant_model, variant_id = source
+        variant = self._variants.get((variant_model, _pk(variant_model, variant_id)))
+        if variant is None:
+            return None
+        return self._variant_prices.get((variant_model, _object_id(variant.pk)))
+
+    def old_price_variant(self, product):
+        source = old_price_variant_source(product)
+        if source is None:
+            return None
+        return self._variants_by_slug.get(source)
+
+    def preload(self) -> None:
+        """Загружает всё, что читают формулы цен и доставки, для всех позиций сразу."""
+        products = [
+            item.product for item in self.items
+            if isinstance(getattr(item, "product", None), Product)
+        ]
+        if not products:
+            return
+        self._product_ids = {product.pk for product in products}
+        prefetch_related_objects(products, "price_info", "brand", "category")
+        self._preload_category_ancestors(products)
+        self._preload_variants(products)
+
+    def _preload_category_ancestors(self, products) -> None:
+        # Правило доставки наследуется от ближайшего предка: по запросу на уровень дерева.
+        level = [product.category for product in products if product.category_id]
+        seen = set()
+        while level:
+            prefetch_related_objects(level, "parent")
+            seen.update(category.pk for category in level)
+            level = [
+                category.parent for category in level
+                if category.parent_id and category.parent_id not in seen
+            ]
+
+    def _preload_variants(self, products) -> None:
+        ids = defaultdict(set)
+        slugs = defaultdict(set)
+        price_sources = []
+        for product in products:
+            price_source = product.get_variant_price_source()
+            if price_source is not None:
+                price_sources.append((product, price_source))
+                ids[price_source[0]].add(price_source[1])
+            shipping = shipping_variant_source(product)
+            if shipping is not None:
+                ids[shipping[0]].add(shipping[1])
+            old_price = old_price_variant_source(product)
+            if old_price is not None:
+                slugs[old_price[0]].add(old_price[1])
+
+        for variant_model in set(ids) | set(slugs):
+            variant_ids = {_pk(variant_model, value) for value in ids.get(variant_model, ())} - {None}
+            condition = Q(id__in=variant_ids)
+            if slugs.get(variant_model):
+                condition |= Q(slug__in=slugs[variant_model], is_active=True)
+            queryset = variant_model.objects.filter(condition)
+            if variant_model in OLD_PRICE_VARIANT_MODELS.values():
+                queryset = queryset.select_related("product")
+            for variant in queryset:
+                if variant.pk in variant_ids:
+                    self._variants[(variant_model, variant.pk)] = variant
+                if variant.slug in slugs.get(variant_model, ()) and variant.is_active:
+                    self._variants_by_slug[(variant_model, variant.slug)] = variant
+
+        condition = Q()
+        for variant_model, values in ids.items():
+            object_ids = {_object_id(value) for value in values} - {None}
+            if object_ids:
+                content_type = ContentType.objects.get_for_model(variant_model)
+                condition |= Q(content_type=content_type, object_id__in=object_ids)
+        if condition:
+            # Как и в Product._get_variant_price_info (.first()), берём первую запись варианта.
+            for variant_price in ProductVariantPrice.objects.filter(condition).order_by("-pk"):
+                model = ContentType.objects.get_for_id(variant_price.content_type_id).model_class()
+                self._variant_prices[(model, variant_price.object_id)] = variant_price
+
+        for product, (variant_model, variant_id) in price_sources:
+            product._variant_price_info_cache = self._variant_prices.get(
+                (variant_model, _object_id(variant_id))
+            )
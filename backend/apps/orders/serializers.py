@@ -28,6 +28,7 @@ from apps.catalog.utils.currency_converter import currency_converter
 from apps.catalog.currency_models import ProductVariantPrice
 from django.contrib.contenttypes.models import ContentType
 from .models import Cart, CartItem, Order, OrderItem, PromoCode
+from .pricing import CONTEXT_KEY as PRICING_CONTEXT_KEY, CartPricingContext, old_price_variant_source
 
 VARIANT_MODEL_MAP = {
     'clothing': ClothingVariant,
@@ -941,7 +942,34 @@ class CartItemSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
+    def _pricing(self):
+        """CartPricingContext ответа корзины (None для отдельной позиции)."""
+        return self.context.get(PRICING_CONTEXT_KEY)
+
+    def _memo(self, name, obj, compute, *args):
+        pricing = self._pricing()
+        if pricing is None:
+            return compute()
+        return pricing.value((name, pricing.item_key(obj)) + args, compute)
+
+    def _convert(self, amount, from_currency, to_currency, apply_margin=True):
+        pricing = self._pricing()
+        if pricing is None:
+            return currency_converter.convert_price(amount, from_currency, to_currency, apply_margin=apply_margin)
+        return pricing.convert(amount, from_currency, to_currency, apply_margin=apply_margin)
+
+    def _apply_markup(self, amount, product):
+        from apps.catalog.utils.product_markup import apply_product_markup
+
+        pricing = self._pricing()
+        if pricing is None:
+            return apply_product_markup(amount, product)
+        return pricing.apply_markup(amount, product)
+
     def _get_base_price(self, obj):
+        return self._memo("base_price", obj, lambda: self._resolve_base_price(obj))
+
+    def _resolve_base_price(self, obj):
         product = obj.product
         base_price = getattr(product, "price", None)
         base_currency = (
@@ -962,10 +990,17 @@ class CartItemSerializer(serializers.ModelSerializer):
         return base_price, base_currency
 
     def _get_live_currency_data(self, obj, target_currency):
+        data = self._memo(
+            "live_currency_data", obj, lambda: self._resolve_live_currency_data(obj, target_currency), target_currency
+        )
+        # Копия: вызывающий код дополняет словарь (prices_in_currencies).
+        return dict(data) if data else data
+
+    def _resolve_live_currency_data(self, obj, target_currency):
         base_price, base_currency = self._get_base_price(obj)
         if base_price is None:
             return None
-        original, converted, price_with_margin = currency_converter.convert_price(
+        original, converted, price_with_margin = self._convert(
             Decimal(str(base_price)),
             base_currency,
             target_currency,
@@ -992,7 +1027,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         # Fallback: конвертируем из obj.price (валюта позиции или продукта)
         from_currency = (obj.currency or getattr(obj.product, 'currency', None) or 'RUB').upper()
         try:
-            _, _, price = currency_converter.convert_price(
+            _, _, price = self._convert(
                 Decimal(str(obj.price)),
                 from_currency,
                 preferred_currency,
@@ -1004,9 +1039,9 @@ class CartItemSerializer(serializers.ModelSerializer):
         return obj.price
 
     def get_price(self, obj):
-        from apps.catalog.utils.product_markup import apply_product_markup
-
-        return apply_product_markup(self._get_price_without_product_markup(obj), obj.product)
+        return self._memo(
+            "price", obj, lambda: self._apply_markup(self._get_price_without_product_markup(obj), obj.product)
+        )
 
     def get_total(self, obj):
         return (
@@ -1018,71 +1053,61 @@ class CartItemSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         return self._get_preferred_currency(request)
 
-    def get_old_price(self, obj):
+    def _get_old_price_source(self, obj):
+        """(old_price, валюта) товара или его варианта-источника."""
         product = obj.product
-        if not product:
-            return None
         old_price = product.old_price
         from_currency = (product.currency or 'RUB').upper()
         if old_price is None:
-            ext = getattr(product, "external_data", {}) or {}
-            variant_slug = ext.get("source_variant_slug")
-            effective_type = ext.get("effective_type") or ext.get("source_type")
-            variant_model = VARIANT_MODEL_MAP.get(effective_type)
-            if variant_slug and variant_model in (ClothingVariant, ShoeVariant, FurnitureVariant):
-                variant = variant_model.objects.filter(slug=variant_slug, is_active=True).first()
-                if variant:
-                    if variant.old_price is not None:
-                        old_price = variant.old_price
-                        from_currency = (variant.currency or product.currency or 'RUB').upper()
-                    elif getattr(variant, "product", None) is not None:
-                        parent_product = variant.product
-                        if parent_product.old_price is not None:
-                            old_price = parent_product.old_price
-                            from_currency = (parent_product.currency or variant.currency or product.currency or 'RUB').upper()
+            pricing = self._pricing()
+            if pricing is not None and pricing.covers(product):
+                variant = pricing.old_price_variant(product)
+            else:
+                variant = None
+                source = old_price_variant_source(product)
+                if source:
+                    variant_model, variant_slug = source
+                    variant = variant_model.objects.filter(slug=variant_slug, is_active=True).first()
+            if variant:
+                if variant.old_price is not None:
+                    old_price = variant.old_price
+                    from_currency = (variant.currency or product.currency or 'RUB').upper()
+                elif getattr(variant, "product", None) is not None:
+                    parent_product = variant.product
+                    if parent_product.old_price is not None:
+                        old_price = parent_product.old_price
+                        from_currency = (parent_product.currency or variant.currency or product.currency or 'RUB').upper()
+        return old_price, from_currency
+
+    def get_old_price(self, obj):
+        product = obj.product
+        if not product:
+            return None
+        return self._memo("old_price", obj, lambda: self._resolve_old_price(obj))
+
+    def _resolve_old_price(self, obj):
+        old_price, from_currency = self._get_old_price_source(obj)
         if old_price is None:
             return None
         request = self.context.get('request')
         preferred_currency = self._get_preferred_currency(request)
         try:
-            _, _, price_with_margin = currency_converter.convert_price(
+            _, _, price_with_margin = self._convert(
                 Decimal(old_price),
                 from_currency,
                 preferred_currency,
                 apply_margin=True,
             )
-            from apps.catalog.utils.product_markup import apply_product_markup
-
-            return apply_product_markup(price_with_margin, product)
+            return self._apply_markup(price_with_margin, obj.product)
         except Exception:
             return old_price
 
     def get_old_price_formatted(self, obj):
-        product = obj.product
-        if not product:
-            return None
-        old_price = product.old_price
-        from_currency = (product.currency or 'RUB').upper()
-        if old_price is None:
-            ext = getattr(product, "external_data", {}) or {}
-            variant_slug = ext.get("source_variant_slug")
-            effective_type = ext.get("effective_type") or ext.get("source_type")
-            variant_model = VARIANT_MODEL_MAP.get(effective_type)
-            if variant_slug and variant_model in (ClothingVariant, ShoeVariant, FurnitureVariant):
-                variant = variant_model.objects.filter(slug=variant_slug, is_active=True).first()
-                if variant:
-                    if variant.old_price is not None:
-                        old_price = variant.old_price
-                        from_currency = (variant.currency or product.currency or 'RUB').upper()
-                    elif getattr(variant, "product", None) is not None:
-                        parent_product = variant.product
-                        if parent_product.old_price is not None:
-                            old_price = parent_product.old_price
-                            from_currency = (parent_product.currency or variant.currency or product.currency or 'RUB').upper()
+        old_price = self.get_old_price(obj)
         if old_price is None:
             return None
         preferred_currency = self._get_preferred_currency(self.context.get('request'))
-        return f"{self.get_old_price(obj)} {preferred_currency}"
+        return f"{old_price} {preferred_currency}"
     
     def get_converted_price_rub(self, obj):
         """Получает конвертированную цену в RUB."""
@@ -1105,10 +1130,8 @@ class CartItemSerializer(serializers.ModelSerializer):
     def get_final_price_rub(self, obj):
         """Получает финальную цену в RUB с маржой."""
         try:
-            from apps.catalog.utils.product_markup import apply_product_markup
-
             data = self._get_live_currency_data(obj, "RUB")
-            return apply_product_markup(data["price_with_margin"], obj.product) if data else None
+            return self._apply_markup(data["price_with_margin"], obj.product) if data else None
         except Exception:
             pass
         return None
@@ -1116,10 +1139,8 @@ class CartItemSerializer(serializers.ModelSerializer):
     def get_final_price_usd(self, obj):
         """Получает финальную цену в USD с маржой."""
         try:
-            from apps.catalog.utils.product_markup import apply_product_markup
-
             data = self._get_live_currency_data(obj, "USD")
-            return apply_product_markup(data["price_with_margin"], obj.product) if data else None
+            return self._apply_markup(data["price_with_margin"], obj.product) if data else None
         except Exception:
             pass
         return None
@@ -1138,16 +1159,12 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     def get_prices_in_currencies(self, obj):
         """Получает актуальные публичные цены во всех валютах."""
-        from apps.catalog.utils.product_markup import apply_product_markup
-
         prices = {}
         for currency in ("RUB", "USD", "KZT", "EUR", "TRY", "USDT"):
             try:
                 data = self._get_live_currency_data(obj, currency)
                 if data:
-                    data["price_with_margin"] = apply_product_markup(
-                        data["price_with_margin"], obj.product
-                    )
+                    data["price_with_margin"] = self._apply_markup(data["price_with_margin"], obj.product)
                     prices[currency] = data
             except Exception:
                 continue
@@ -1238,6 +1255,25 @@ class CartSerializer(serializers.ModelSerializer):
         }
         return language_currency_map.get(language_code, default_currency)
 
+    def to_representation(self, instance):
+        # Один контекст цен на ответ: строки, итоги и доставка читают общие кэши.
+        CartPricingContext.for_serializer(self, instance)
+        return super().to_representation(instance)
+
+    def _pricing(self, obj):
+        pricing = self.context.get(PRICING_CONTEXT_KEY)
+        return pricing if pricing is not None and pricing.cart is obj else None
+
+    def _items(self, obj):
+        pricing = self._pricing(obj)
+        return pricing.items if pricing is not None else obj.items.all()
+
+    def _memo(self, name, obj, compute):
+        pricing = self._pricing(obj)
+        if pricing is None:
+            return compute()
+        return pricing.value(("cart", name), compute)
+
     def get_currency(self, obj):
         """Получает валюту корзины (предпочитаемая валюта)."""
         request = self.context.get('request')
@@ -1245,9 +1281,12 @@ class CartSerializer(serializers.ModelSerializer):
     
     def get_total_amount(self, obj):
         """Сумма тех же публичных цен, которые возвращаются у строк корзины."""
+        return self._memo("total_amount", obj, lambda: self._calculate_total_amount(obj))
+
+    def _calculate_total_amount(self, obj):
         item_serializer = CartItemSerializer(context=self.context)
         total = Decimal('0')
-        for item in obj.items.all():
+        for item in self._items(obj):
             try:
                 price = item_serializer.get_price(item)
                 total += Decimal(str(price or 0)) * item.quantity
@@ -1258,6 +1297,9 @@ class CartSerializer(serializers.ModelSerializer):
     
     def get_discount_amount(self, obj):
         """Рассчитать скидку по промокоду."""
+        return self._memo("discount_amount", obj, lambda: self._calculate_discount_amount(obj))
+
+    def _calculate_discount_amount(self, obj):
         if not obj.promo_code:
             return 0
 
@@ -1289,11 +1331,14 @@ class CartSerializer(serializers.ModelSerializer):
         """Товары с категорийным правилом quote и мебель без явного правила требуют расчёта менеджером."""
         from apps.orders.shipping_pricing import product_shipping_requires_quote
 
-        for item in obj.items.all():
-            product = item.product
-            if product and product_shipping_requires_quote(product):
-                return True
-        return False
+        def requires_quote():
+            for item in self._items(obj):
+                product = item.product
+                if product and product_shipping_requires_quote(product):
+                    return True
+            return False
+
+        return self._memo("shipping_requires_quote", obj, requires_quote)
 
     def get_free_shipping_threshold(self, obj):
         """
@@ -1327,11 +1372,15 @@ class CartSerializer(serializers.ModelSerializer):
 
     def get_shipping_options(self, obj):
         """Возвращает варианты доставки и их стоимость для всей корзины."""
+        return self._memo("shipping_options", obj, lambda: self._calculate_shipping_options(obj))
+
+    def _calculate_shipping_options(self, obj):
         if self.get_shipping_requires_quote(obj):
             return {'air': 0.0, 'sea': 0.0, 'ground': 0.0}
 
         request = self.context.get('request')
         preferred_currency = self._get_preferred_currency(request)
+        pricing = self._pricing(obj)
 
         from apps.catalog.currency_models import GlobalCurrencySettings, ProductVariantPrice
         from django.contrib.contenttypes.models import ContentType
@@ -1363,8 +1412,9 @@ class CartSerializer(serializers.ModelSerializer):
                 return 0
             if shipping_base_currency.upper() == preferred_currency.upper():
                 return float(cost)
+            convert = pricing.convert if pricing is not None else currency_converter.convert_price
             try:
-                _, converted, _ = currency_converter.convert_price(
+                _, converted, _ = convert(
                     Decimal(str(cost)),
                     shipping_base_currency,
                     preferred_currency,
@@ -1374,14 +1424,16 @@ class CartSerializer(serializers.ModelSerializer):
             except Exception:
                 return float(cost)
 
-        for item in obj.items.all():
+        for item in self._items(obj):
             if not item.product:
                 continue
 
             price_info = getattr(item.product, 'price_info', None)
             variant_price = None
 
-            if item.product.external_data and (
+            if pricing is not None and pricing.covers(item.product):
+                variant_price = pricing.shipping_variant_price(item.product)
+            elif item.product.external_data and (
                 'source_variant_id' in item.product.external_data or 'jewelry_variant_id' in item.product.external_data
             ):
                 variant_model = None
@@ -1789,6 +1841,7 @@ class OrderSerializer(serializers.ModelSerializer):
     shipping_amount = serializers.SerializerMethodField()
     discount_amount = serializers.SerializerMethodField()
     total_amount = serializers.SerializerMethodField()
+    receipt_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -1800,9 +1853,19 @@ class OrderSerializer(serializers.ModelSerializer):
             'payment_method', 'payment_status', 'comment',
             'promo_code',
             'items',
+            'receipt_status', 'receipt_url',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['number', 'status', 'user', 'subtotal_amount', 'total_amount', 'currency', 'created_at', 'updated_at']
+        read_only_fields = [
+            'number', 'status', 'user', 'subtotal_amount', 'total_amount', 'currency',
+            'receipt_status', 'receipt_url', 'created_at', 'updated_at',
+        ]
+
+    def get_receipt_url(self, obj):
+        """Ссылка на PDF, только когда чек готов (пока pending — None)."""
+        if obj.receipt_status == Order.ReceiptStatus.READY:
+            return obj.receipt_url
+        return None
 
     def _get_preferred_currency(self, request, fallback: str = 'RUB') -> str:
         if not request:
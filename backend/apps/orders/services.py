@@ -6,10 +6,16 @@ TODO: Функционал чеков временно отключен. Буд
 """
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
 from decimal import Decimal
 from typing import Any, Dict, List
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.core.files.base import ContentFile  # noqa: F401 – kept for potential future use
@@ -28,6 +34,13 @@ from apps.users.models import UserAddress
 
 from .models import Order
 
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с шаблоном emails/order_receipt.html — старые PDF не переиспользуются.
+RECEIPT_TEMPLATE_VERSION = 1
+# Сколько секунд повторные запросы не ставят рендер того же чека в очередь снова.
+RECEIPT_RENDER_LOCK_TTL = 10 * 60
+
 
 SHIPPING_METHOD_TRANSLATIONS = {
     "ru": {
@@ -350,43 +363,89 @@ def render_receipt_html(
     return render_to_string("emails/order_receipt.html", context)
 
 
+class _ReceiptHashEncoder(DjangoJSONEncoder):
+    """Decimal без хвостовых нулей: 0 в памяти и 0.00 из БД дают один хэш."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return format(o.normalize(), "f")
+        return super().default(o)
+
+
+def receipt_content_hash(receipt: Dict[str, Any], locale: str = "ru") -> str:
+    """sha256 содержимого чека. Время выдачи и updated_at заказа не учитываются,
+    поэтому повторные запросы и дубли webhook'ов получают тот же хэш."""
+    meta = {k: v for k, v in (receipt.get("meta") or {}).items() if k not in ("issued_at", "updated_at")}
+    content = {k: v for k, v in receipt.items() if k not in ("issued_at", "meta")}
+    raw = json.dumps(
+        {"v": RECEIPT_TEMPLATE_VERSION, "locale": locale, "receipt": content, "meta": meta},
+        cls=_ReceiptHashEncoder,
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_receipt_key(content_hash: str) -> str:
+    return get_r2_path(f"receipts/{content_hash}.pdf")
+
+
+def render_receipt_pdf(order: Order, receipt: Dict[str, Any], locale: str = "ru") -> bytes:
+    html_string = render_receipt_html(order, receipt, locale=locale)
+    from weasyprint import HTML  # lazy import — требует системных библиотек Pango/Cairo
+    return HTML(string=html_string).write_pdf()
+
+
+def _load_stored_receipt(s3, bucket_name: str, file_key: str) -> bytes | None:
+    try:
+        return s3.get_object(Bucket=bucket_name, Key=file_key)["Body"].read()
+    except Exception:
+        return None
+
+
 def generate_and_save_receipt(order: Order, locale: str = "ru") -> tuple[str | None, bytes | None]:
     """Генерирует PDF-версию чека и сохраняет её в Cloudflare R2 (или ином S3-хранилище).
     Возвращает (URL чека на CDN, сырые байты PDF).
-    """
-    import logging
-    logger = logging.getLogger(__name__)
 
+    PDF хранится по хэшу содержимого: если чек с тем же содержимым уже загружен
+    (повторная отправка, дубль webhook'а), он переиспользуется без рендера.
+    """
     try:
         if not settings.R2_CONFIG.get("endpoint_url") or not settings.R2_CONFIG.get("bucket_name"):
             return None, None
-        html_string = render_receipt_html(order, locale=locale)
-        from weasyprint import HTML  # lazy import — требует системных библиотек Pango/Cairo
-        pdf_file = HTML(string=html_string).write_pdf()
+        loc = "en" if (locale or "").strip().lower() == "en" else "ru"
+        receipt = build_order_receipt_payload(order, locale=loc)
+        content_hash = receipt_content_hash(receipt, loc)
 
-        # Настраиваем boto3 клиент для работы с R2
-        file_key = get_r2_path(f"receipts/{order.number}.pdf")
+        file_key = get_receipt_key(content_hash)
         s3 = get_r2_client()
         bucket_name = settings.R2_CONFIG['bucket_name']
 
-        # Загружаем PDF в бакет
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=file_key,
-            Body=pdf_file,
-            ContentType='application/pdf',
-            ContentDisposition=f'inline; filename="{get_receipt_filename(order)}"',
-        )
+        pdf_file = _load_stored_receipt(s3, bucket_name, file_key)
+        if pdf_file is None:
+            pdf_file = render_receipt_pdf(order, receipt, locale=loc)
+            # Загружаем PDF в бакет
+            s3.put_object(
+                Bucket=bucket_name,
+                Key=file_key,
+                Body=pdf_file,
+                ContentType='application/pdf',
+                ContentDisposition=f'inline; filename="{get_receipt_filename(order)}"',
+            )
+        else:
+            logger.info("Receipt %s for order %s reused from storage", content_hash[:12], order.number)
 
         cdn_url = settings.AI_R2_SETTINGS.get('cdn_url', '').rstrip('/')
         if not cdn_url:
             cdn_url = f"{settings.R2_CONFIG['endpoint_url']}/{bucket_name}"
 
         receipt_url = f"{cdn_url}/{file_key}"
-        
+
         # Сохраняем URL в заказ
         order.receipt_url = receipt_url
-        order.save(update_fields=['receipt_url'])
+        order.receipt_hash = content_hash
+        order.receipt_status = Order.ReceiptStatus.READY
+        order.save(update_fields=['receipt_url', 'receipt_hash', 'receipt_status'])
 
         return receipt_url, pdf_file
 
@@ -395,3 +454,37 @@ def generate_and_save_receipt(order: Order, locale: str = "ru") -> tuple[str | N
         logger.error(f"CRITICAL ERROR generating/saving receipt for order {order.number}: {str(e)}")
         logger.error(traceback.format_exc())
         return None, None
+
+
+def request_order_receipt(order: Order, locale: str = "ru") -> tuple[str, str | None]:
+    """Статус PDF-чека для API: (status, url).
+
+    Готовый чек с актуальным содержимым отдаётся сразу; иначе заказ помечается
+    pending и рендер ставится в очередь receipts (не чаще раза в
+    RECEIPT_RENDER_LOCK_TTL на одно содержимое). Неудачный рендер отдаётся как
+    failed один раз: статус и блокировка сбрасываются, следующий запрос ставит
+    рендер заново.
+    """
+    loc = "en" if (locale or "").strip().lower() == "en" else "ru"
+    content_hash = receipt_content_hash(build_order_receipt_payload(order, locale=loc), loc)
+    if (
+        order.receipt_status == Order.ReceiptStatus.READY
+        and order.receipt_hash == content_hash
+        and order.receipt_url
+    ):
+        return Order.ReceiptStatus.READY, order.receipt_url
+
+    lock_key = f"receipt-render:{order.pk}:{content_hash}"
+    if order.receipt_status == Order.ReceiptStatus.FAILED:
+        Order.objects.filter(pk=order.pk, receipt_status=Order.ReceiptStatus.FAILED).update(receipt_status="")
+        order.receipt_status = ""
+        cache.delete(lock_key)
+        return Order.ReceiptStatus.FAILED, None
+
+    if cache.add(lock_key, True, RECEIPT_RENDER_LOCK_TTL):
+        from .tasks import render_order_receipt_task
+
+        Order.objects.filter(pk=order.pk).update(receipt_status=Order.ReceiptStatus.PENDING)
+        order.receipt_status = Order.ReceiptStatus.PENDING
+        transaction.on_commit(lambda: render_order_receipt_task.delay(order.pk, locale=loc))
+    return Order.ReceiptStatus.PENDING, None
@@ -0,0 +1,293 @@
+"""Пакетная проверка и списание остатков при оформлении заказа.
+
+Раньше каждая позиция корзины отдельно блокировала вариант, размер и Product
+(несколько запросов на строку), а блокировки держались весь цикл создания
+OrderItem. StockReservation группирует позиции по конкретной модели остатка:
+
+* одна ``select_for_update`` на модель, строки блокируются в фиксированном
+  порядке моделей и по возрастанию pk — параллельные оформления не
+  взаимоблокируются;
+* выбор строки остатка и проверка количества — в памяти, по тем же правилам,
+  что и ``_get_stock_for_cart_product`` (размер варианта → вариант → размер
+  базового товара → Product);
+* списание — один ``UPDATE ... CASE`` на модель.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from apps.catalog.models import (
+    ClothingProduct,
+    ClothingProductSize,
+    ClothingVariant,
+    ClothingVariantSize,
+    JewelryProduct,
+    JewelryVariant,
+    JewelryVariantSize,
+    Product,
+    ShoeProduct,
+    ShoeProductSize,
+    ShoeVariant,
+    ShoeVariantSize,
+)
+
+# product_type → (модель варианта, модель размера варианта) для source_variant_id.
+VARIANT_MODELS = {
+    "clothing": (ClothingVariant, ClothingVariantSize),
+    "shoes": (ShoeVariant, ShoeVariantSize),
+}
+# source_type → (базовая модель, модель её размеров).
+BASE_PRODUCT_MODELS = {
+    "base_clothing": (ClothingProduct, ClothingProductSize),
+    "base_shoes": (ShoeProduct, ShoeProductSize),
+}
+# Порядок блокировок: сначала родительские строки, затем размеры, Product последним.
+PARENT_MODELS = (ClothingVariant, ShoeVariant, JewelryVariant, ClothingProduct, ShoeProduct)
+SIZE_MODELS = (ClothingVariantSize, ShoeVariantSize, JewelryVariantSize, ClothingProductSize, ShoeProductSize)
+
+StockLine = Tuple[Product, Optional[str], int]
+
+
+def _to_pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except (TypeError, ValueError, DjangoValidationError):
+        return None
+
+
+def _size_parent_field(size_model) -> str:
+    return "product_id" if size_model in (ClothingProductSize, ShoeProductSize) else "variant_id"
+
+
+class StockReservation:
+    """Блокирует, проверяет и списывает остатки набора позиций (внутри transaction.atomic())."""
+
+    def __init__(self, lines: Iterable[StockLine]):
+        self.lines = [
+            (product, (chosen_size or "").strip(), quantity)
+            for product, chosen_size, quantity in lines
+            if product is not None and quantity > 0
+        ]
+        self._parents: Dict[type, Dict] = defaultdict(dict)
+        self._sizes: Dict[type, Dict[tuple, object]] = defaultdict(dict)
+
+    def reserve(self) -> None:
+        if not self.lines:
+            return
+        self._lock_parents()
+        self._lock_sizes()
+        targets = [self._resolve(product, size) for product, size, _quantity in self.lines]
+        product_rows = self._lock_products(
+            {product.pk for (product, _size, _quantity), target in zip(self.lines, targets) if target is None}
+        )
+
+        needed: Dict[Tuple[type, object], int] = defaultdict(int)
+        rows = {}
+        for (product, _size, quantity), target in zip(self.lines, targets):
+            row = target if target is not None else product_rows.get(product.pk)
+            if row is None or row.stock_quantity is None:
+                continue
+            key = (type(row), row.pk)
+            needed[key] += quantity
+            rows[key] = row
+
+        for key, quantity in needed.items():
+            if rows[key].stock_quantity < quantity:
+                raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
+
+        by_model: Dict[type, List[Tuple[object, int]]] = defaultdict(list)
+        for key, quantity in needed.items():
+            by_model[key[0]].append((key[1], quantity))
+        for model, decrements in by_model.items():
+            self._apply(model, decrements, rows)
+
+    def _lock_parents(self) -> None:
+        ids: Dict[type, set] = defaultdict(set)
+        for product, _size, _quantity in self.lines:
+            external = product.external_data or {}
+            normalized_type = (product.product_type or "").lower()
+            source_type = (external.get("source_type") or "").lower()
+            if external.get("source_variant_id") and normalized_type in VARIANT_MODELS:
+                variant_model = VARIANT_MODELS[normalized_type][0]
+                ids[variant_model].add(_to_pk(variant_model, external["source_variant_id"]))
+            if external.get("jewelry_variant_id") and normalized_type == "jewelry":
+                ids[JewelryVariant].add(_to_pk(JewelryVariant, external["jewelry_variant_id"]))
+            if source_type in BASE_PRODUCT_MODELS:
+                base_model = BASE_PRODUCT_MODELS[source_type][0]
+                ids[base_model].add(_to_pk(base_model, external.get("source_id")))
+        for model in PARENT_MODELS:
+            model_ids = ids.get(model, set()) - {None}
+            if not model_ids:
+                continue
+            queryset = model.objects.select_for_update().filter(id__in=model_ids, is_active=True).order_by("pk")
+            self._parents[model] = {row.pk: row for row in queryset}
+
+    def _lock_sizes(self) -> None:
+        wanted: Dict[type, Tuple[set, set]] = defaultdict(lambda: (set(), set()))
+        for product, size, _quantity in self.lines:
+            if not size:
+                continue
+            for size_model, parent in self._size_candidates(product):
+                parent_ids, sizes = wanted[size_model]
+                parent_ids.add(parent.pk)
+                sizes.add(size)
+        for size_model in SIZE_MODELS:
+            if size_model not in wanted:
+                continue
+            parent_ids, sizes = wanted[size_model]
+            parent_field = _size_parent_field(size_model)
+            if size_model is JewelryVariantSize:
+                condition = Q(size_display__in=sizes) | Q(size_value__in=sizes)
+            else:
+                condition = Q(size__in=sizes)
+            queryset = (
+                size_model.objects.select_for_update()
+                .filter(condition, **{f"{parent_field}__in": parent_ids})
+                .order_by("pk")
+            )
+            index = self._sizes[size_model]
+            for row in queryset:
+                parent_id = getattr(row, parent_field)
+                if size_model is JewelryVariantSize:
+                    index.setdefault((parent_id, "display", row.size_display), row)
+                    index.setdefault((parent_id, "value", row.size_value), row)
+                else:
+                    index.setdefault((parent_id, row.size), row)
+
+    def _size_candidates(self, product):
+        """(модель размера, заблокированная родительская строка) для позиции."""
+        external = product.external_data or {}
+        normalized_type = (product.product_type or "").lower()
+        source_type = (external.get("source_type") or "").lower()
+        if external.get("source_variant_id") and normalized_type in VARIANT_MODELS:
+            variant_model, size_model = VARIANT_MODELS[normalized_type]
+            variant = self._parents[variant_model].get(_to_pk(variant_model, external["source_variant_id"]))
+            if variant is not None:
+                yield size_model, variant
+        if external.get("jewelry_variant_id") and normalized_type == "jewelry":
+            variant = self._parents[JewelryVariant].get(_to_pk(JewelryVariant, external["jewelry_variant_id"]))
+            if variant is not None:
+                yield JewelryVariantSize, variant
+        if source_type in BASE_PRODUCT_MODELS:
+            base_model, size_model = BASE_PRODUCT_MODELS[source_type]
+            base_obj = self._parents[base_model].get(_to_pk(base_model, external.get("source_id")))
+            if base_obj is not None:
+                yield size_model, base_obj
+
+    def _size_row(self, size_model, parent, size: str):
+        if not size:
+            return None
+        index = self._sizes.get(size_model, {})
+        if size_model is JewelryVariantSize:
+            row = index.get((parent.pk, "display", size)) or index.get((parent.pk, "value", size))
+        else:
+            row = index.get((parent.pk, size))
+        return row if row is not None and row.stock_quantity is not None else None
+
+    def _resolve(self, product, size: str):
+        """Строка, с которой списывается остаток позиции; None — остаток Product."""
+        for size_model, parent in self._size_candidates(product):
+            row = self._size_row(size_model, parent, size)
+            if row is not None:
+                return row
+            # У базового товара без размера остаток берётся с Product, как и раньше.
+            if size_model not in (ClothingProductSize, ShoeProductSize) and parent.stock_quantity is not None:
+                return parent
+        return None
+
+    def _lock_products(self, product_ids) -> Dict:
+        if not product_ids:
+            return {}
+        queryset = Product.objects.select_for_update().filter(pk__in=product_ids).order_by("pk")
+        return {row.pk: row for row in queryset}
+
+    def _apply(self, model, decrements: List[Tuple[object, int]], rows) -> None:
+        sold_out = [pk for pk, quantity in decrements if rows[(model, pk)].stock_quantity == quantity]
+        model.objects.filter(pk__in=[pk for pk, _quantity in decrements]).update(
+            stock_quantity=Case(
+                *[When(pk=pk, then=F("stock_quantity") - Value(quantity)) for pk, quantity in decrements],
+                default=F("stock_quantity"),
+                output_field=model._meta.get_field("stock_quantity"),
+            ),
+            is_available=Case(
+                When(pk__in=sold_out, then=Value(False)),
+                default=F("is_available"),
+            ),
+            updated_at=timezone.now(),
+        )
+        for pk, quantity in decrements:
+            row = rows[(model, pk)]
+            row.stock_quantity -= quantity
+            if row.stock_quantity == 0:
+                row.is_available = False
+
+
+def reserve_stock(lines: Iterable[StockLine]) -> None:
+    """Списывает остатки позиций (product, chosen_size, quantity) пакетно.
+
+    Должно вызываться внутри transaction.atomic(). При нехватке любой позиции
+    поднимает ValidationError, ничего не списав.
+    """
+    StockReservation(lines).reserve()
+
+
+def validate_jewelry_sizes(items) -> Optional[str]:
+    """Проверяет выбранные размеры украшений в корзине. Возвращает текст ошибки или None."""
+    variant_ids = set()
+    base_slugs = set()
+    for item in items:
+        product = item.product
+        if not product or product.product_type != "jewelry":
+            continue
+        external = product.external_data or {}
+        variant_id = external.get("jewelry_variant_id") or external.get("source_variant_id")
+        if variant_id:
+            variant_ids.add(_to_pk(JewelryVariant, variant_id))
+        else:
+            base_slugs.add(product.slug)
+
+    variants = {}
+    if variant_ids - {None}:
+        variants = {
+            variant.pk: variant
+            for variant in JewelryVariant.objects.filter(id__in=variant_ids - {None}, is_active=True)
+            .prefetch_related("sizes")
+        }
+    sized_slugs = set()
+    if base_slugs:
+        base_products = JewelryProduct.objects.filter(slug__in=base_slugs, is_active=True)
+        sized_slugs = set(
+            JewelryVariantSize.objects.filter(variant__product__in=base_products)
+            .values_list("variant__product__slug", flat=True)
+            .distinct()
+        )
+
+    for item in items:
+        product = item.product
+        if not product or product.product_type != "jewelry":
+            continue
+        external = product.external_data or {}
+        variant_id = external.get("jewelry_variant_id") or external.get("source_variant_id")
+        if not variant_id:
+            if product.slug in sized_slugs and not item.chosen_size:
+                return _("Укажите размер для товара в корзине")
+            continue
+        variant = variants.get(_to_pk(JewelryVariant, variant_id))
+        sizes = list(variant.sizes.all()) if variant is not None else []
+        if not sizes:
+            continue
+        if not item.chosen_size:
+            return _("Укажите размер для товара в корзине")
+        size_obj = next((size for size in sizes if size.size_display == item.chosen_size), None)
+        if size_obj is None:
+            size_obj = next((size for size in sizes if size.size_value == item.chosen_size), None)
+        if size_obj is None:
+            return _("Размер не найден для товара в корзине")
+        if not size_obj.is_available:
+            return _("Размер недоступен для покупки")
+    return None
@@ -11,6 +11,7 @@ import logging
 import socket
 
 import requests
+from celery import chain
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.core.mail.backends.smtp import EmailBackend
@@ -284,6 +285,39 @@ def _send_email_via_api(message) -> bool:
     return False
 
 
+@app.task
+def render_order_receipt_task(order_id: int, locale: str = "ru") -> str | None:
+    """Рендерит PDF-чек в очереди receipts и сохраняет его по хэшу содержимого.
+
+    Не падает: следующие за ней в цепочке письмо и Telegram должны уйти и без PDF
+    (письмо само повторит генерацию и уйдёт в ретрай).
+    """
+    try:
+        order = Order.objects.select_related("user", "shipping_address", "promo_code").prefetch_related("items").get(id=order_id)
+    except Order.DoesNotExist:
+        logger.warning("render_order_receipt_task: order %s not found", order_id)
+        return None
+    receipt_url, _pdf = generate_and_save_receipt(order, locale=locale)
+    if not receipt_url:
+        Order.objects.filter(pk=order.pk).exclude(receipt_status=Order.ReceiptStatus.READY).update(
+            receipt_status=Order.ReceiptStatus.FAILED
+        )
+    return receipt_url
+
+
+def enqueue_order_receipt(order_id: int, locale: str = "ru", email: str | None = None) -> None:
+    """Сначала рендер чека, затем письмо — оно берёт готовый PDF из R2.
+
+    Telegram-уведомление о заказе сюда не входит: оно ставится отдельно и не
+    ждёт очередь receipts.
+    """
+    render = render_order_receipt_task.si(order_id, locale=locale)
+    if email:
+        chain(render, send_order_receipt_task.si(order_id, email, locale=locale)).apply_async()
+    else:
+        render.apply_async()
+
+
 # TODO: Функционал чеков временно отключен. Будет доработан позже.
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=60, max_retries=3)
 def send_order_receipt_task(
@@ -353,7 +387,8 @@ def notify_new_order_telegram(self, _email_result=None, order_id: int = None, lo
     """Уведомляет (Telegram) о создании нового заказа.
     Может запускаться как Celery link после send_order_receipt_task — тогда первым аргументом
     приходит результат предыдущей задачи (_email_result), который игнорируется.
-    PDF чека берётся из order.receipt_url (уже загружен в R2 email-задачей).
+    Ставится отдельно от рендера чека: PDF берётся из order.receipt_url, а если
+    чек ещё не готов — формируется здесь же.
     """
     if order_id is None:
         logger.warning("notify_new_order_telegram: order_id not provided")
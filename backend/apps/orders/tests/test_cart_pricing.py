@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Category, Product
+from apps.orders.models import Cart, CartItem
+from apps.orders.pricing import CONTEXT_KEY
+from apps.orders.serializers import CartItemSerializer, CartSerializer
+from apps.users.models import User
+
+# Таблицы, которые читают формулы цен и доставки (изображения и переводы строк — не сюда).
+PRICING_TABLES = (
+    "catalog_currencyrate",
+    "catalog_productprice",
+    "catalog_productvariantprice",
+    "catalog_category",
+    "catalog_brand",
+    "catalog_globalcurrencysettings",
+    "catalog_margin",
+    "catalog_clothingvariant",
+    "catalog_shoevariant",
+    "catalog_furniturevariant",
+)
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(email="pricing@example.com", username="pricing", password="password")
+
+
+def _fill_cart(user, count):
+    parent = Category.objects.create(name="Parent", slug=f"pricing-parent-{count}")
+    child = Category.objects.create(name="Child", slug=f"pricing-child-{count}", parent=parent)
+    cart = Cart.objects.create(user=user, currency="RUB")
+    for index in range(count):
+        product = Product.objects.create(
+            name=f"Pricing item {count}-{index}",
+            slug=f"pricing-item-{count}-{index}",
+            product_type="medicines",
+            category=child,
+            price=Decimal("100") + index,
+            old_price=Decimal("150"),
+            currency="RUB",
+            stock_quantity=10,
+        )
+        CartItem.objects.create(cart=cart, product=product, quantity=2, price=product.price, currency="RUB")
+    return cart
+
+
+def _cart_queries(user):
+    client = APIClient(HTTP_X_CURRENCY="RUB")
+    client.force_authenticate(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/orders/cart")
+    assert response.status_code == 200
+    pricing_queries = [
+        query["sql"] for query in queries.captured_queries
+        if any(f'"{table}' in query["sql"].split(" WHERE ")[0] for table in PRICING_TABLES)
+    ]
+    return response.data, len(pricing_queries)
+
+
+@pytest.mark.django_db
+def test_cart_pricing_query_count_does_not_grow_with_items():
+    small_user = User.objects.create_user(email="small@example.com", username="small", password="password")
+    big_user = User.objects.create_user(email="big@example.com", username="big", password="password")
+    _fill_cart(small_user, 1)
+    _fill_cart(big_user, 4)
+
+    _cart_queries(small_user)  # прогрев кэшей настроек и курсов
+    small, small_queries = _cart_queries(small_user)
+    big, big_queries = _cart_queries(big_user)
+
+    assert len(big["items"]) == 4
+    assert big["total_amount"] == float(sum(Decimal(str(item["price"])) * 2 for item in big["items"]))
+    assert big_queries == small_queries
+
+
+@pytest.mark.django_db
+def test_item_price_is_resolved_once_per_response(user, monkeypatch):
+    cart = _fill_cart(user, 3)
+    calls = []
+    original = CartItemSerializer._get_price_without_product_markup
+
+    def counting(self, obj):
+        calls.append(obj.pk)
+        return original(self, obj)
+
+    monkeypatch.setattr(CartItemSerializer, "_get_price_without_product_markup", counting)
+    serializer = CartSerializer(cart)
+    data = serializer.data
+
+    # Цена строки, total строки, итог корзины, скидка и порог доставки — один расчёт на позицию.
+    assert sorted(calls) == sorted(item.pk for item in cart.items.all())
+    assert data["final_amount"] == data["total_amount"]
+    assert serializer.context[CONTEXT_KEY].cart is cart
@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+import fakeredis
+import pytest
+from django.contrib.sessions.models import Session
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Product
+from apps.orders import guest_cart
+from apps.orders.models import Cart, CartItem
+from apps.users.models import User
+
+
+@pytest.fixture
+def redis_store(monkeypatch, settings):
+    settings.GUEST_CART_BACKEND = "redis"
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(guest_cart, "get_client", lambda: client)
+    return client
+
+
+@pytest.fixture
+def products(db):
+    return [
+        Product.objects.create(
+            name=f"Guest item {index}",
+            slug=f"guest-item-{index}",
+            product_type="medicines",
+            price=Decimal("100") * index,
+            currency="RUB",
+            stock_quantity=5,
+        )
+        for index in (1, 2)
+    ]
+
+
+@pytest.mark.django_db
+def test_guest_cart_lives_in_redis_without_session_or_cart_rows(redis_store, products):
+    client = APIClient(HTTP_X_CART_SESSION="guest-1", HTTP_X_CURRENCY="RUB")
+
+    assert client.get("/api/orders/cart").data["items"] == []
+    assert redis_store.keys("guest-cart:*") == []
+
+    client.post("/api/orders/cart/add", {"product_id": products[0].id, "quantity": 2}, format="json")
+    data = client.post("/api/orders/cart/add", {"product_id": products[1].id}, format="json").data
+    assert [item["product"] for item in data["items"]] == [products[0].id, products[1].id]
+    assert data["items_count"] == 3
+
+    line_id = data["items"][0]["id"]
+    data = client.post(f"/api/orders/cart/{line_id}/update", {"quantity": 4}, format="json").data
+    assert data["items"][0]["quantity"] == 4
+    too_many = client.post(f"/api/orders/cart/{line_id}/update", {"quantity": 6}, format="json")
+    assert too_many.status_code == 400
+    data = client.delete(f"/api/orders/cart/{data['items'][1]['id']}/remove").data
+    assert data["items_count"] == 4
+
+    assert not Cart.objects.exists()
+    assert not Session.objects.exists()
+
+
+@pytest.mark.django_db
+def test_cart_without_client_key_gets_signed_cookie(redis_store, products):
+    client = APIClient()
+
+    response = client.get("/api/orders/cart")
+    assert guest_cart.COOKIE_NAME not in response.cookies
+
+    response = client.post("/api/orders/cart/add", {"product_id": products[0].id}, format="json")
+    assert guest_cart.COOKIE_NAME in response.cookies
+    # APIClient повторно отправляет cookie — корзина находится по подписанному токену.
+    assert client.get("/api/orders/cart").data["items_count"] == 1
+
+
+@pytest.mark.django_db
+def test_guest_cart_is_promoted_on_first_authenticated_request(
+    redis_store, products, django_capture_on_commit_callbacks
+):
+    user = User.objects.create_user(email="guest@example.com", username="guest", password="password")
+    existing = Cart.objects.create(user=user, currency="RUB")
+    CartItem.objects.create(cart=existing, product=products[1], quantity=1, price=Decimal("200"), currency="RUB")
+
+    client = APIClient(HTTP_X_CART_SESSION="guest-2")
+    client.post("/api/orders/cart/add", {"product_id": products[0].id}, format="json")
+    client.post("/api/orders/cart/add", {"product_id": products[1].id, "quantity": 3}, format="json")
+
+    client.force_authenticate(user)
+    with django_capture_on_commit_callbacks(execute=True):
+        data = client.get("/api/orders/cart").data
+
+    assert data["id"] == existing.id
+    items = {item["product"]: item["quantity"] for item in data["items"]}
+    # Позиция, которая уже была у пользователя, не дублируется.
+    assert items == {products[0].id: 1, products[1].id: 1}
+    assert redis_store.keys("guest-cart:*") == []
+
+
+@pytest.mark.django_db
+def test_legacy_anonymous_db_cart_is_moved_to_redis(redis_store, products):
+    legacy = Cart.objects.create(session_key="legacy-guest", currency="RUB")
+    CartItem.objects.create(cart=legacy, product=products[0], quantity=2, price=Decimal("100"), currency="RUB")
+
+    data = APIClient(HTTP_X_CART_SESSION="legacy-guest").get("/api/orders/cart").data
+
+    assert data["items_count"] == 2
+    assert not Cart.objects.exists()
+    assert redis_store.exists("guest-cart:legacy-guest")
+
+
+@pytest.mark.django_db
+def test_guest_cart_add_logs_event_for_session_profile(
+    redis_store, products, monkeypatch, django_capture_on_commit_callbacks
+):
+    from apps.recommendations import tasks as recommendation_tasks
+    from apps.recommendations.models import RecommendationEvent
+
+    monkeypatch.setattr(
+        recommendation_tasks.log_product_actions, "delay", recommendation_tasks.log_product_actions,
+    )
+    client = APIClient(HTTP_X_CART_SESSION="guest-events")
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post("/api/orders/cart/add", {"product_id": products[0].id}, format="json")
+
+    event = RecommendationEvent.objects.get()
+    assert (event.event_type, event.algorithm, event.session_id) == ("cart_add", "direct", "guest-events")
+    assert event.recommended_product_id == products[0].id and event.user_id is None
+
+
+def test_concurrent_adds_do_not_lose_quantity(redis_store, products):
+    first = guest_cart.GuestCart("race", client=redis_store)
+    second = guest_cart.GuestCart("race", client=redis_store)
+
+    # Обе копии прочитаны до записи — как два параллельных запроса.
+    first.add_item(products[0], 1, "", Decimal("100"), "RUB")
+    second.add_item(products[0], 2, "", Decimal("100"), "RUB")
+    second.add_item(products[1], 1, "", Decimal("200"), "RUB")
+
+    cart = guest_cart.GuestCart("race", client=redis_store)
+    assert [(item.product_id, item.quantity) for item in cart.items] == [(products[0].id, 3), (products[1].id, 1)]
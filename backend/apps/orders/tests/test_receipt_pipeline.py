@@ -0,0 +1,145 @@
+import io
+from decimal import Decimal
+
+import pytest
+from rest_framework.test import APIClient
+
+from apps.orders import services, tasks
+from apps.orders.models import Order, OrderItem
+from apps.users.models import User
+
+
+class FakeR2:
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise KeyError(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts += 1
+        self.objects[Key] = Body
+
+
+@pytest.fixture
+def order(db):
+    user = User.objects.create_user(email="receipt@example.com", username="receipt", password="password")
+    order = Order.objects.create(
+        number="RCPT-1",
+        user=user,
+        subtotal_amount=Decimal("200.00"),
+        total_amount=Decimal("200.00"),
+        currency="RUB",
+        contact_name="Customer",
+        contact_phone="+900000000000",
+        contact_email="receipt@example.com",
+    )
+    OrderItem.objects.create(
+        order=order, product_name="Item", price=Decimal("100.00"), quantity=2, total=Decimal("200.00")
+    )
+    return order
+
+
+@pytest.fixture
+def storage(settings, monkeypatch):
+    settings.R2_CONFIG = {**settings.R2_CONFIG, "endpoint_url": "https://r2.example.com", "bucket_name": "media"}
+    settings.AI_R2_SETTINGS = {**settings.AI_R2_SETTINGS, "cdn_url": "https://cdn.example.com"}
+    fake = FakeR2()
+    renders = []
+
+    def render(order, receipt, locale="ru"):
+        renders.append(order.number)
+        return b"%PDF-" + order.number.encode()
+
+    monkeypatch.setattr(services, "get_r2_client", lambda: fake)
+    monkeypatch.setattr(services, "render_receipt_pdf", render)
+    return fake, renders
+
+
+@pytest.mark.django_db
+def test_receipt_hash_ignores_issue_time_but_follows_content(order):
+    first = services.receipt_content_hash(services.build_order_receipt_payload(order))
+    assert services.receipt_content_hash(services.build_order_receipt_payload(order)) == first
+
+    order.payment_status = "paid"
+    order.save(update_fields=["payment_status"])
+    assert services.receipt_content_hash(services.build_order_receipt_payload(order)) != first
+
+
+@pytest.mark.django_db
+def test_generate_receipt_reuses_stored_pdf_with_same_content(order, storage):
+    fake, renders = storage
+
+    url, pdf = services.generate_and_save_receipt(order)
+    again_url, again_pdf = services.generate_and_save_receipt(Order.objects.get(pk=order.pk))
+
+    assert renders == ["RCPT-1"] and fake.puts == 1
+    assert (again_url, again_pdf) == (url, pdf)
+    order.refresh_from_db()
+    assert order.receipt_status == Order.ReceiptStatus.READY
+    assert url == f"https://cdn.example.com/{services.get_receipt_key(order.receipt_hash)}"
+
+
+@pytest.mark.django_db
+def test_receipt_pdf_endpoint_is_pending_until_rendered(order, storage, monkeypatch, django_capture_on_commit_callbacks):
+    queued = []
+    monkeypatch.setattr(
+        tasks.render_order_receipt_task, "delay", lambda order_id, locale="ru": queued.append(order_id)
+    )
+    client = APIClient()
+    client.force_authenticate(order.user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first = client.get("/api/orders/orders/receipt-pdf/RCPT-1")
+        second = client.get("/api/orders/orders/receipt-pdf/RCPT-1")
+
+    assert (first.status_code, second.status_code) == (202, 202)
+    assert first.data == {"status": "pending"}
+    assert queued == [order.pk]  # повторный запрос не ставит рендер второй раз
+
+    tasks.render_order_receipt_task(order.pk)
+    ready = client.get("/api/orders/orders/receipt-pdf/RCPT-1")
+    assert ready.status_code == 200
+    assert ready.data["status"] == "ready"
+    assert ready.data["url"].endswith(".pdf")
+
+
+@pytest.mark.django_db
+def test_failed_render_is_reported_then_retried(order, storage, monkeypatch, django_capture_on_commit_callbacks):
+    queued = []
+    monkeypatch.setattr(
+        tasks.render_order_receipt_task, "delay", lambda order_id, locale="ru": queued.append(order_id)
+    )
+    monkeypatch.setattr(services, "render_receipt_pdf", lambda *args, **kwargs: 1 / 0)
+    client = APIClient()
+    client.force_authenticate(order.user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert client.get("/api/orders/orders/receipt-pdf/RCPT-1").status_code == 202
+        tasks.render_order_receipt_task(order.pk)
+        failed = client.get("/api/orders/orders/receipt-pdf/RCPT-1")
+        retried = client.get("/api/orders/orders/receipt-pdf/RCPT-1")
+
+    assert (failed.status_code, failed.data) == (503, {"status": "failed"})
+    assert retried.status_code == 202
+    assert queued == [order.pk, order.pk]
+
+
+def test_telegram_is_not_chained_after_receipt_render(monkeypatch):
+    chained = []
+
+    class _Chain:
+        def __init__(self, *signatures):
+            chained.append([signature.task for signature in signatures])
+
+        def apply_async(self):
+            pass
+
+    monkeypatch.setattr(tasks, "chain", _Chain)
+
+    tasks.enqueue_order_receipt(1, email="receipt@example.com")
+
+    assert chained == [["apps.orders.tasks.render_order_receipt_task", "apps.orders.tasks.send_order_receipt_task"]]
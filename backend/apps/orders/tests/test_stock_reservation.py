@@ -0,0 +1,117 @@
+import uuid
+from decimal import Decimal
+
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from apps.catalog.models import (
+    Category,
+    ClothingProduct,
+    ClothingVariant,
+    ClothingVariantSize,
+    Product,
+)
+from apps.orders.stock import reserve_stock
+
+
+@pytest.fixture
+def stock(db):
+    suffix = uuid.uuid4().hex[:8]
+    category = Category.objects.create(name="Clothing", slug=f"stock-clothing-{suffix}")
+    parent = ClothingProduct.objects.create(
+        name="Stock parent",
+        slug=f"stock-parent-{suffix}",
+        category=category,
+        price=100,
+        currency="TRY",
+        is_active=True,
+    )
+    variant = ClothingVariant.objects.create(
+        product=parent,
+        name="Red",
+        slug=f"stock-red-{suffix}",
+        price=100,
+        currency="TRY",
+        stock_quantity=5,
+        is_active=True,
+    )
+    size_m = ClothingVariantSize.objects.create(variant=variant, size="M", stock_quantity=2)
+    size_l = ClothingVariantSize.objects.create(variant=variant, size="L", stock_quantity=None)
+
+    def shadow(index):
+        return Product.objects.create(
+            name=f"Shadow {index}",
+            slug=f"stock-shadow-{suffix}-{index}",
+            product_type="clothing",
+            price=Decimal("100"),
+            currency="TRY",
+            external_data={"source_variant_id": variant.pk, "source_type": "clothing"},
+        )
+
+    plain = [
+        Product.objects.create(
+            name=f"Plain {index}",
+            slug=f"stock-plain-{suffix}-{index}",
+            product_type="medicines",
+            price=Decimal("10"),
+            currency="RUB",
+            stock_quantity=3,
+        )
+        for index in range(3)
+    ]
+    unlimited = Product.objects.create(
+        name="Unlimited",
+        slug=f"stock-unlimited-{suffix}",
+        product_type="medicines",
+        price=Decimal("10"),
+        currency="RUB",
+        stock_quantity=None,
+    )
+    return {
+        "variant": variant,
+        "size_m": size_m,
+        "size_l": size_l,
+        "shadow": shadow,
+        "plain": plain,
+        "unlimited": unlimited,
+    }
+
+
+@pytest.mark.django_db
+def test_reserve_stock_picks_size_variant_or_product_row_like_single_line(stock):
+    shadow_m, shadow_l = stock["shadow"](1), stock["shadow"](2)
+    lines = [
+        (shadow_m, "M", 2),  # размер варианта с остатком
+        (shadow_l, "L", 1),  # у размера нет лимита — списывается вариант
+        (stock["unlimited"], "", 4),
+    ] + [(product, "", 3 if index == 0 else 1) for index, product in enumerate(stock["plain"])]
+
+    with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+        reserve_stock(lines)
+
+    stock["size_m"].refresh_from_db()
+    stock["variant"].refresh_from_db()
+    assert (stock["size_m"].stock_quantity, stock["size_m"].is_available) == (0, False)
+    assert stock["variant"].stock_quantity == 4
+    plain = [Product.objects.get(pk=product.pk) for product in stock["plain"]]
+    assert [(product.stock_quantity, product.is_available) for product in plain] == [
+        (0, False), (2, True), (2, True)
+    ]
+    # Блокировка варианта, размеров и Product + по одному UPDATE на модель (+ savepoint).
+    statements = [query["sql"] for query in queries.captured_queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+    assert len(statements) == 6
+
+
+@pytest.mark.django_db
+def test_reserve_stock_checks_summed_quantity_and_writes_nothing_on_shortage(stock):
+    lines = [(stock["shadow"](1), "", 3), (stock["shadow"](2), "", 3), (stock["plain"][0], "", 1)]
+
+    with pytest.raises(serializers.ValidationError):
+        with transaction.atomic():
+            reserve_stock(lines)
+
+    stock["variant"].refresh_from_db()
+    assert stock["variant"].stock_quantity == 5
+    assert Product.objects.get(pk=stock["plain"][0].pk).stock_quantity == 3
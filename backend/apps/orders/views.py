@@ -13,6 +13,7 @@ from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from redis.exceptions import RedisError
 
 from api.authentication import JWTSafeAuthentication
 
@@ -26,14 +27,16 @@ from apps.catalog.models import (
     ShoeProductSize,
     ShoeVariant,
     ShoeVariantSize,
-    JewelryProduct,
     JewelryVariant,
     JewelryVariantSize,
 )
 from apps.catalog.utils.currency_converter import currency_converter
 from apps.users.models import UserAddress
 
+from . import guest_cart
+from .guest_cart import GuestCart
 from .models import Cart, CartItem, Order, OrderItem, PromoCode
+from .stock import reserve_stock, validate_jewelry_sizes
 
 # Crypto payment (lazy to avoid circular import / optional dependency)
 def _create_crypto_invoice(number: str, total, cart_currency: str, locale: str = "") -> tuple[dict | None, dict | None]:
@@ -137,13 +140,18 @@ from .serializers import (
     CartItemSerializer,
     CartSerializer,
     CreateOrderSerializer,
-    OrderReceiptSerializer,  # TODO: Функционал чеков временно отключен. Будет доработан позже.
+    OrderReceiptSerializer,
     OrderSerializer,
     PromoCodeSerializer,
     UpdateCartItemSerializer,
 )
-from .services import build_order_receipt_payload, render_receipt_html, get_order_customer_email  # TODO: Функционал чеков временно отключен. Будет доработан позже.
-from .tasks import send_order_receipt_task, notify_new_order_telegram  # TODO: Функционал чеков временно отключен. Будет доработан позже.
+from .services import (
+    build_order_receipt_payload,
+    get_order_customer_email,
+    render_receipt_html,
+    request_order_receipt,
+)
+from .tasks import enqueue_order_receipt, notify_new_order_telegram, send_order_receipt_task
 
 logger = logging.getLogger(__name__)
 
@@ -275,142 +283,19 @@ def _get_stock_for_cart_product(product: Product, chosen_size: Optional[str]) ->
 
 
 def _decrement_stock_for_cart_item(product: Product, chosen_size: Optional[str], quantity: int) -> None:
-    """Атомарно списывает остаток (если он ограничен).
+    """Атомарно списывает остаток одной позиции (если он ограничен).
 
-    Должно вызываться внутри transaction.atomic().
+    Должно вызываться внутри transaction.atomic(). Для нескольких позиций —
+    stock.reserve_stock (одна блокировка и один UPDATE на модель).
     """
-    if quantity <= 0:
-        return
-
-    external = getattr(product, "external_data", None) or {}
-    source_variant_id = external.get("source_variant_id")
-    jewelry_variant_id = external.get("jewelry_variant_id")
-    source_type = (external.get("source_type") or "").lower()
-    source_id = external.get("source_id")
-    normalized_type = (getattr(product, "product_type", None) or "").lower()
-    size_value = (chosen_size or "").strip()
+    reserve_stock([(product, chosen_size, quantity)])
 
-    if source_variant_id and normalized_type in {"clothing", "shoes"}:
-        if normalized_type == "clothing":
-            variant = ClothingVariant.objects.select_for_update().filter(id=source_variant_id, is_active=True).first()
-            if not variant:
-                source_variant_id = None
-            else:
-                if size_value:
-                    size_obj = ClothingVariantSize.objects.select_for_update().filter(variant=variant, size=size_value).first()
-                    if size_obj and size_obj.stock_quantity is not None:
-                        if size_obj.stock_quantity < quantity:
-                            raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                        size_obj.stock_quantity = size_obj.stock_quantity - quantity
-                        if size_obj.stock_quantity == 0:
-                            size_obj.is_available = False
-                        size_obj.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                        return
-                if variant.stock_quantity is not None:
-                    if variant.stock_quantity < quantity:
-                        raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                    variant.stock_quantity = variant.stock_quantity - quantity
-                    if variant.stock_quantity == 0:
-                        variant.is_available = False
-                    variant.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                    return
 
-        if normalized_type == "shoes":
-            variant = ShoeVariant.objects.select_for_update().filter(id=source_variant_id, is_active=True).first()
-            if not variant:
-                source_variant_id = None
-            else:
-                if size_value:
-                    size_obj = ShoeVariantSize.objects.select_for_update().filter(variant=variant, size=size_value).first()
-                    if size_obj and size_obj.stock_quantity is not None:
-                        if size_obj.stock_quantity < quantity:
-                            raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                        size_obj.stock_quantity = size_obj.stock_quantity - quantity
-                        if size_obj.stock_quantity == 0:
-                            size_obj.is_available = False
-                        size_obj.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                        return
-                if variant.stock_quantity is not None:
-                    if variant.stock_quantity < quantity:
-                        raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                    variant.stock_quantity = variant.stock_quantity - quantity
-                    if variant.stock_quantity == 0:
-                        variant.is_available = False
-                    variant.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                    return
-
-    if jewelry_variant_id and normalized_type == "jewelry":
-        variant = JewelryVariant.objects.select_for_update().filter(id=jewelry_variant_id, is_active=True).first()
-        if variant:
-            if size_value:
-                size_obj = JewelryVariantSize.objects.select_for_update().filter(
-                    variant=variant, size_display=size_value
-                ).first()
-                if not size_obj:
-                    size_obj = JewelryVariantSize.objects.select_for_update().filter(
-                        variant=variant, size_value=size_value
-                    ).first()
-                if size_obj and size_obj.stock_quantity is not None:
-                    if size_obj.stock_quantity < quantity:
-                        raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                    size_obj.stock_quantity = size_obj.stock_quantity - quantity
-                    if size_obj.stock_quantity == 0:
-                        size_obj.is_available = False
-                    size_obj.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                    return
-            if variant.stock_quantity is not None:
-                if variant.stock_quantity < quantity:
-                    raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                variant.stock_quantity = variant.stock_quantity - quantity
-                if variant.stock_quantity == 0:
-                    variant.is_available = False
-                variant.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                return
-
-    if source_type == "base_clothing":
-        base_obj = ClothingProduct.objects.select_for_update().filter(id=source_id, is_active=True).first()
-        if base_obj and size_value:
-            size_obj = ClothingProductSize.objects.select_for_update().filter(
-                product=base_obj, size=size_value
-            ).first()
-            if size_obj and size_obj.stock_quantity is not None:
-                if size_obj.stock_quantity < quantity:
-                    raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                size_obj.stock_quantity = size_obj.stock_quantity - quantity
-                if size_obj.stock_quantity == 0:
-                    size_obj.is_available = False
-                size_obj.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                return
-
-    if source_type == "base_shoes":
-        base_obj = ShoeProduct.objects.select_for_update().filter(id=source_id, is_active=True).first()
-        if base_obj and size_value:
-            size_obj = ShoeProductSize.objects.select_for_update().filter(
-                product=base_obj, size=size_value
-            ).first()
-            if size_obj and size_obj.stock_quantity is not None:
-                if size_obj.stock_quantity < quantity:
-                    raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-                size_obj.stock_quantity = size_obj.stock_quantity - quantity
-                if size_obj.stock_quantity == 0:
-                    size_obj.is_available = False
-                size_obj.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-                return
-
-    # fallback: Product
-    locked_product = Product.objects.select_for_update().get(pk=product.pk)
-    if locked_product.stock_quantity is None:
-        return
-    if locked_product.stock_quantity < quantity:
-        raise serializers.ValidationError({"detail": _("Недостаточно товара в наличии")})
-    locked_product.stock_quantity = locked_product.stock_quantity - quantity
-    if locked_product.stock_quantity == 0:
-        locked_product.is_available = False
-    locked_product.save(update_fields=["stock_quantity", "is_available", "updated_at"])
-
-
-def _get_cart_with_prefetch(cart: Cart):
+def _get_cart_with_prefetch(cart):
     """Корзина с prefetch для позиций, товаров и изображений (в т.ч. domain_item)."""
+    if isinstance(cart, GuestCart):
+        # Позиции гостевой корзины собираются из Redis с тем же prefetch товаров.
+        return cart
     from django.db.models import Prefetch
     from apps.catalog.models import ProductImage
     return Cart.objects.filter(pk=cart.pk).prefetch_related(
@@ -426,30 +311,79 @@ def _get_cart_with_prefetch(cart: Cart):
     ).get()
 
 
-def _get_or_create_cart(request) -> Cart:
-    """Получить или создать корзину для пользователя или сессии.
-    Для анонимных клиентов поддерживаем пользовательский ключ из заголовка X-Cart-Session
-    и из cookie cart_session (fallback для случаев, когда заголовок не передан).
+def _copy_items_to_cart(source: Cart, cart: Cart) -> None:
+    """Переносит позиции анонимной БД-корзины одним bulk_create (без дублей товар+размер)."""
+    existing = set(cart.items.values_list('product_id', 'chosen_size'))
+    new_items = []
+    for item in source.items.all():
+        if (item.product_id, item.chosen_size) in existing:
+            continue
+        existing.add((item.product_id, item.chosen_size))
+        new_items.append(CartItem(
+            cart=cart,
+            product_id=item.product_id,
+            quantity=item.quantity,
+            price=item.price,
+            currency=item.currency,
+            chosen_size=item.chosen_size,
+        ))
+    CartItem.objects.bulk_create(new_items)
+
+
+def _log_product_actions(request, event_type: str, product_ids) -> None:
+    """Событие cart_add / purchase для профилей рекомендаций (после коммита транзакции)."""
+    from apps.recommendations.services.user_profiles import visitor_session_id
+    from apps.recommendations.tasks import log_product_actions
+
+    product_ids = list(product_ids)
+    user_id = request.user.id if request.user.is_authenticated else None
+    session_id = visitor_session_id(request)
+
+    def send():
+        try:
+            log_product_actions.delay(event_type, product_ids, session_id=session_id, user_id=user_id)
+        except Exception as e:
+            logger.warning("recommendation event %s not queued: %s", event_type, e)
+
+    transaction.on_commit(send)
+
+
+def _get_or_create_cart(request):
+    """Получить или создать корзину для пользователя или гостя.
+
+    Гостевая корзина (GUEST_CART_BACKEND=redis) живёт в Redis и не создаёт ни
+    django_session, ни Cart; в БД она переносится при первом запросе с
+    авторизацией. Ключ гостя — подписанная cookie guest_cart, заголовок
+    X-Cart-Session или cookie cart_session. При недоступном Redis используется
+    прежняя анонимная БД-корзина.
     """
     user = request.user if getattr(request, 'user', None) and request.user.is_authenticated else None
 
+    if guest_cart.is_enabled():
+        try:
+            if not user:
+                cart = guest_cart.load(request)
+                request._guest_cart = cart
+                return cart
+            promoted = guest_cart.promote_for_user(request, user)
+            if promoted is not None:
+                return promoted
+        except RedisError as e:
+            logger.warning("guest cart store unavailable, using DB cart: %s", e)
+
     # 1) Ключ из заголовка (для фронтенда) или cookie (fallback)
     header_session = request.META.get('HTTP_X_CART_SESSION') or getattr(request, 'headers', {}).get('X-Cart-Session')
     cookie_session = getattr(request, 'COOKIES', {}).get('cart_session')
     custom_session = header_session or cookie_session
 
-    # 2) Стандартная сессия Django
-    django_session = None
-    if hasattr(request, 'session'):
-        django_session = request.session.session_key
-        if not django_session:
-            # Гарантируем наличие session_key, если потребуется
-            request.session.save()
-            django_session = request.session.session_key
-
     session_key = None
     if not user:
-        session_key = custom_session or django_session
+        session_key = custom_session
+        # 2) Стандартная сессия Django — только для клиентов без собственного ключа
+        if not session_key and hasattr(request, 'session'):
+            if not request.session.session_key:
+                request.session.save()
+            session_key = request.session.session_key
         if not session_key:
             session_key = str(uuid.uuid4())
             if hasattr(request, 'session'):
@@ -458,47 +392,19 @@ def _get_or_create_cart(request) -> Cart:
     # Если пользователь авторизован, сначала ищем его корзину
     if user:
         cart = Cart.objects.filter(user=user).first()
-        
-        # Если у пользователя есть корзина, но она пустая, проверяем анонимную корзину для переноса
-        if cart and not cart.items.exists() and custom_session:
+        anonymous_cart = None
+        if custom_session:
             anonymous_cart = Cart.objects.filter(session_key=custom_session, user=None).first()
-            if anonymous_cart and anonymous_cart.items.exists():
-                # Копируем товары из анонимной корзины в существующую корзину пользователя
-                for item in anonymous_cart.items.all():
-                    CartItem.objects.create(
-                        cart=cart,
-                        product=item.product,
-                        quantity=item.quantity,
-                        price=item.price,
-                        currency=item.currency
-                    )
-                # Удаляем анонимную корзину
+        if anonymous_cart and anonymous_cart.items.exists():
+            # Переносим товары из анонимной корзины в корзину пользователя
+            with transaction.atomic():
+                if cart is None:
+                    cart = Cart.objects.create(user=user, currency=anonymous_cart.currency)
+                _copy_items_to_cart(anonymous_cart, cart)
                 anonymous_cart.delete()
-                return cart
-        
+            return cart
         if cart:
-            # Если нашли корзину пользователя, возвращаем её
             return cart
-        
-        # Если у пользователя нет корзины, но есть анонимная корзина с session_key,
-        # то переносим товары из анонимной корзины в корзину пользователя
-        if custom_session:
-            anonymous_cart = Cart.objects.filter(session_key=custom_session, user=None).first()
-            if anonymous_cart and anonymous_cart.items.exists():
-                # Создаем новую корзину для пользователя
-                cart = Cart.objects.create(user=user, currency=anonymous_cart.currency)
-                # Копируем товары из анонимной корзины
-                for item in anonymous_cart.items.all():
-                    CartItem.objects.create(
-                        cart=cart,
-                        product=item.product,
-                        quantity=item.quantity,
-                        price=item.price,
-                        currency=item.currency
-                    )
-                # Удаляем анонимную корзину
-                anonymous_cart.delete()
-                return cart
 
     # Создаем новую корзину
     cart, created = Cart.objects.get_or_create(
@@ -521,6 +427,14 @@ class CartViewSet(viewsets.ViewSet):
     # Исключаем SessionAuthentication: она применяет CSRF к POST/DELETE даже при AllowAny
     authentication_classes = [JWTSafeAuthentication]
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cart = getattr(request, '_guest_cart', None)
+        if cart is not None and cart.issued and cart.written:
+            # Ключ гостевой корзины выдан сервером — сохраняем его в подписанной cookie
+            guest_cart.set_cookie(response, cart.session_key)
+        return response
+
     @extend_schema(
         description="Получить текущую корзину",
         responses=CartSerializer,
@@ -624,8 +538,7 @@ class CartViewSet(viewsets.ViewSet):
         chosen_size = serializer.validated_data.get('chosen_size', '')
 
         # Проверка остатка (учитываем суммарное количество в корзине)
-        existing = CartItem.objects.filter(cart=cart, product=product, chosen_size=chosen_size).first()
-        new_total_qty = quantity + (existing.quantity if existing else 0)
+        new_total_qty = quantity + cart.quantity_of(product.id, chosen_size)
         available_stock, _source = _get_stock_for_cart_product(product, chosen_size)
         if available_stock is not None and new_total_qty > available_stock:
             raise serializers.ValidationError({
@@ -633,36 +546,9 @@ class CartViewSet(viewsets.ViewSet):
                 "available": available_stock,
             })
 
-        item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            chosen_size=chosen_size,
-            defaults={
-                'quantity': quantity,
-                'price': item_price,
-                'currency': preferred_currency,
-                'chosen_size': chosen_size,
-            }
-        )
-        if not created:
-            # Если уже есть, обновляем цену/валюту по актуальному товару
-            updated = False
-            if item.price != item_price:
-                item.price = item_price
-                updated = True
-            if item.currency != preferred_currency:
-                item.currency = preferred_currency
-                updated = True
-            item.quantity += quantity
-            if updated:
-                item.save(update_fields=['price', 'currency', 'quantity', 'updated_at'])
-            else:
-                item.save(update_fields=['quantity', 'updated_at'])
-
-        # Синхронизируем валюту корзины под валюту последнего товара (простая модель)
-        if cart.currency != preferred_currency:
-            cart.currency = preferred_currency
-            cart.save(update_fields=['currency', 'updated_at'])
+        _log_product_actions(request, "cart_add", [product.id])
+        # Валюта корзины синхронизируется с валютой последнего товара (простая модель)
+        cart.add_item(product, quantity, chosen_size, item_price, preferred_currency)
         cart = _get_cart_with_prefetch(cart)
         return Response(CartSerializer(cart, context={'request': request}).data)
 
@@ -715,8 +601,7 @@ class CartViewSet(viewsets.ViewSet):
                 "available": available_stock,
             })
 
-        item.quantity = desired_qty
-        item.save()
+        cart.set_quantity(item.pk, desired_qty)
         cart = _get_cart_with_prefetch(cart)
         return Response(CartSerializer(cart, context={'request': request}).data)
 
@@ -742,11 +627,8 @@ class CartViewSet(viewsets.ViewSet):
     @action(detail=True, methods=['delete'], url_path='remove')
     def remove_item(self, request, pk=None):
         cart = _get_or_create_cart(request)
-        try:
-            item = cart.items.get(pk=pk)
-        except CartItem.DoesNotExist:
+        if not cart.remove_item(pk):
             return Response({"detail": _("Позиция не найдена")}, status=404)
-        item.delete()
         cart = _get_cart_with_prefetch(cart)
         return Response(CartSerializer(cart, context={'request': request}).data)
 
@@ -772,7 +654,7 @@ class CartViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'], url_path='clear')
     def clear(self, request):
         cart = _get_or_create_cart(request)
-        cart.items.all().delete()
+        cart.clear_items()
         cart = _get_cart_with_prefetch(cart)
         return Response(CartSerializer(cart, context={'request': request}).data)
 
@@ -991,6 +873,27 @@ class OrderViewSet(viewsets.ViewSet):
         serializer = OrderReceiptSerializer(receipt)
         return Response(serializer.data)
 
+    @extend_schema(
+        description=(
+            "PDF-чек заказа. 200 {status: ready, url} — PDF готов; "
+            "202 {status: pending} — PDF формируется в фоне, запрос можно повторить; "
+            "503 {status: failed} — рендер не удался, следующий запрос поставит его заново."
+        ),
+        responses=None,
+    )
+    @action(detail=False, methods=['get'], url_path=r'receipt-pdf/(?P<number>[^/]+)')
+    def receipt_pdf(self, request, number: str):
+        order = self._get_order_for_user(request.user, number)
+        locale = request.META.get('HTTP_ACCEPT_LANGUAGE', 'ru').split(',')[0].split('-')[0]
+        if locale not in ('ru', 'en'):
+            locale = 'ru'
+        receipt_status, url = request_order_receipt(order, locale=locale)
+        if url:
+            return Response({"status": receipt_status, "url": url})
+        if receipt_status == Order.ReceiptStatus.FAILED:
+            return Response({"status": receipt_status}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"status": receipt_status}, status=status.HTTP_202_ACCEPTED)
+
     # TODO: Функционал чеков временно отключен. Будет доработан позже.
     # Включает: формирование чека, отправку по email, интеграцию с админкой.
     @extend_schema(description="Отправить чек по email", request=None, responses=None)
@@ -1059,36 +962,19 @@ class OrderViewSet(viewsets.ViewSet):
         serializer = CreateOrderSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        for item in cart.items.select_related('product').all():
-            product = item.product
-            if not product:
-                continue
-            if product.product_type == 'jewelry':
-                ext = product.external_data or {}
-                variant_id = ext.get('jewelry_variant_id') or ext.get('source_variant_id')
-                if variant_id:
-                    variant = JewelryVariant.objects.filter(id=variant_id, is_active=True).prefetch_related('sizes').first()
-                    if variant and variant.sizes.exists():
-                        if not item.chosen_size:
-                            return Response({"detail": _("Укажите размер для товара в корзине")}, status=400)
-                        size_obj = variant.sizes.filter(size_display=item.chosen_size).first()
-                        if not size_obj:
-                            size_obj = variant.sizes.filter(size_value=item.chosen_size).first()
-                        if not size_obj:
-                            return Response({"detail": _("Размер не найден для товара в корзине")}, status=400)
-                        if not size_obj.is_available:
-                            return Response({"detail": _("Размер недоступен для покупки")}, status=400)
-                else:
-                    base_obj = JewelryProduct.objects.filter(slug=product.slug, is_active=True).first()
-                    if base_obj:
-                        has_sizes = JewelryVariantSize.objects.filter(variant__product=base_obj).exists()
-                        if has_sizes and not item.chosen_size:
-                            return Response({"detail": _("Укажите размер для товара в корзине")}, status=400)
+        cart_items = list(cart.items.select_related('product').all())
+        size_error = validate_jewelry_sizes(cart_items)
+        if size_error:
+            return Response({"detail": size_error}, status=400)
 
         # Расчет сумм и конвертация валют
         # Используем логику из CartSerializer для правильной конвертации валют
+        from apps.orders.pricing import CartPricingContext
         from apps.orders.serializers import CartSerializer
+        cart = _get_cart_with_prefetch(cart)
         cart_serializer = CartSerializer(cart, context={'request': request})
+        # Итоги, доставка и строки заказа считаются по одному контексту цен
+        CartPricingContext.for_serializer(cart_serializer, cart)
         
         order_currency = cart_serializer.get_currency(cart)
         subtotal = cart_serializer.get_total_amount(cart)
@@ -1228,13 +1114,14 @@ class OrderViewSet(viewsets.ViewSet):
                     total=Decimal(str(item_price)) * item.quantity,
                 )
             cart.items.all().delete()
+            _log_product_actions(request, "purchase", [item.product_id for item in cart_items])
             response_data = OrderSerializer(order).data
             response_data["payment_data"] = payment_data
             return Response(response_data, status=201)
         else:
-            # Позиции заказа + атомарное списание остатка
-            for item in cart.items.select_related('product').all():
-                _decrement_stock_for_cart_item(item.product, item.chosen_size, item.quantity)
+            # Атомарное списание остатка всех позиций, затем позиции заказа
+            reserve_stock((item.product, item.chosen_size, item.quantity) for item in cart_items)
+            for item in cart_items:
                 item_price = converted_prices.get(item.id, item.price)
                 OrderItem.objects.create(
                     order=order,
@@ -1246,6 +1133,7 @@ class OrderViewSet(viewsets.ViewSet):
                     total=Decimal(str(item_price)) * item.quantity,
                 )
             cart.items.all().delete()
+            _log_product_actions(request, "purchase", [item.product_id for item in cart_items])
 
             from django.db import transaction
 
@@ -1253,11 +1141,11 @@ class OrderViewSet(viewsets.ViewSet):
             # чтобы избежать race condition, когда Celery ищет еще не созданный заказ.
             # Берём email покупателя и не отправляем на админские адреса
             receipt_email = get_order_customer_email(order)
-            if receipt_email:
-                transaction.on_commit(
-                    lambda: send_order_receipt_task.delay(order.id, receipt_email, locale=locale)
-                )
-            
+            # PDF рендерится в очереди receipts, письмо идёт следом с готовым файлом.
+            order.receipt_status = Order.ReceiptStatus.PENDING
+            order.save(update_fields=['receipt_status'])
+            transaction.on_commit(lambda: enqueue_order_receipt(order.id, locale, email=receipt_email))
+            # Telegram не ждёт рендер чека: при необходимости задача сама сформирует PDF.
             transaction.on_commit(
                 lambda: notify_new_order_telegram.delay(order_id=order.id, locale=locale)
             )
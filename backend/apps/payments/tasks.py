@@ -40,7 +40,7 @@ def notify_crypto_payment_confirmed(self, order_id: int) -> None:
     Работает gracefully: если Telegram не настроен — просто логирует без ошибки.
     """
     from apps.orders.models import Order
-    from apps.orders.tasks import send_order_receipt_task
+    from apps.orders.tasks import enqueue_order_receipt
 
     try:
         order = Order.objects.select_related("user").get(id=order_id)
@@ -112,10 +112,10 @@ def notify_crypto_payment_confirmed(self, order_id: int) -> None:
         user_email = get_order_customer_email(order)
         if user_email:
             # Отправка чека по email
-            send_order_receipt_task.delay(order_id=order.id, email=user_email)
+            enqueue_order_receipt(order.id, email=user_email)
             logger.info("Triggered order receipt email for order %s to %s", order.number, user_email)
     except Exception as e:
-        logger.error("Failed to trigger send_order_receipt_task for order %s: %s", order.number, e)
+        logger.error("Failed to enqueue receipt for order %s: %s", order.number, e)
 
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=30, max_retries=3)
@@ -108,10 +108,12 @@ class CryptoWebhookView(APIView):
                 return Response({"ok": True}, status=200)
             from django.db import transaction
             from apps.orders.models import Order
-            from apps.orders.views import _decrement_stock_for_cart_item
+            from apps.orders.stock import reserve_stock
             with transaction.atomic():
-                for item in order.items.select_related("product").all():
-                    _decrement_stock_for_cart_item(item.product, item.chosen_size, item.quantity)
+                reserve_stock(
+                    (item.product, item.chosen_size, item.quantity)
+                    for item in order.items.select_related("product").all()
+                )
                 order.status = Order.OrderStatus.PAID
                 order.payment_status = "paid"
                 order.save(update_fields=["status", "payment_status"])
@@ -1,6 +1,13 @@
 """Admin for recommendations app."""
 from django.contrib import admin
-from .models import ProductVector, RecommendationEvent, UserEmbedding
+from .models import (
+    EmbeddingCache,
+    ProductRankingFeatures,
+    ProductVector,
+    RecommendationEvent,
+    SimilarProducts,
+    UserEmbedding,
+)
 
 
 @admin.register(ProductVector)
@@ -31,8 +38,32 @@ class RecommendationEventAdmin(admin.ModelAdmin):
 
 @admin.register(UserEmbedding)
 class UserEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ("user", "last_updated", "price_sensitivity")
+    list_display = ("user", "session_id", "last_updated", "price_sensitivity")
     list_filter = ("price_sensitivity",)
-    search_fields = ("user__email", "user__username")
+    search_fields = ("user__email", "user__username", "session_id")
     raw_id_fields = ("user",)
     readonly_fields = ("last_updated",)
+
+
+@admin.register(EmbeddingCache)
+class EmbeddingCacheAdmin(admin.ModelAdmin):
+    list_display = ("model_name", "content_hash", "dimension", "created_at")
+    list_filter = ("model_name",)
+    search_fields = ("content_hash",)
+    readonly_fields = ("model_name", "content_hash", "dimension", "created_at")
+    exclude = ("vector",)
+
+
+@admin.register(SimilarProducts)
+class SimilarProductsAdmin(admin.ModelAdmin):
+    list_display = ("product", "vector_type", "is_stale", "computed_at")
+    list_filter = ("vector_type", "is_stale")
+    raw_id_fields = ("product",)
+    readonly_fields = ("neighbor_ids", "scores", "attributes", "computed_at")
+
+
+@admin.register(ProductRankingFeatures)
+class ProductRankingFeaturesAdmin(admin.ModelAdmin):
+    list_display = ("product", "price_rub", "is_available", "clicks", "cart_adds", "purchases", "updated_at")
+    list_filter = ("is_available", "is_shadow_variant")
+    raw_id_fields = ("product",)
@@ -0,0 +1,29 @@
+"""Построение/обновление предрасчитанной таблицы похожих товаров."""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.recommendations.models import SimilarProducts
+from apps.recommendations.services.similar_index import refresh_similar_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Рассчитать top-N соседей для товаров без строки SimilarProducts или помеченных stale. "
+        "С --full помечает все строки на пересчёт."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=64, help="Товаров на один батч запросов в Qdrant")
+        parser.add_argument("--max-products", type=int, default=None, help="Ограничить число товаров за запуск")
+        parser.add_argument("--full", action="store_true", help="Пересчитать все строки")
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            marked = SimilarProducts.objects.update(is_stale=True, stale_at=timezone.now())
+            self.stdout.write(self.style.WARNING(f"Помечено на пересчёт: {marked}"))
+        result = refresh_similar_products(batch_size=options["batch"], max_products=options["max_products"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано: {result['refreshed']}, удалено неактивных: {result['deleted']}"
+            )
+        )
@@ -0,0 +1,91 @@
+"""Миграция коллекции product_recommendations: квантование, payload-индексы, blue/green через алиас."""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.recommendations.services import collection_migration
+from apps.recommendations.services.qdrant_registry import get_qdrant_client
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Создать новую коллекцию product_recommendations (int8-квантование с rescoring, "
+        "payload-индексы по полям фильтров), заполнить её копированием точек или полной "
+        "переиндексацией (--reindex) и атомарно переключить алиас. "
+        "На время миграции запись в коллекцию приостанавливается (удаления идут в обе), "
+        "после переключения изменённые за это время товары ставятся в очередь индексации."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--in-place",
+            action="store_true",
+            help="Без копирования: включить квантование и индексы у текущей коллекции",
+        )
+        parser.add_argument(
+            "--reindex",
+            action="store_true",
+            help="Заполнить новую коллекцию переиндексацией товаров вместо копирования точек",
+        )
+        parser.add_argument("--batch", type=int, default=256, help="Размер батча копирования/индексации")
+        parser.add_argument(
+            "--drop-old",
+            action="store_true",
+            help="Удалить предыдущую коллекцию после переключения алиаса",
+        )
+
+    def handle(self, *args, **options):
+        client = get_qdrant_client()
+        if options["in_place"]:
+            name = collection_migration.upgrade_in_place(client, QdrantRecommendationEngine)
+            self.stdout.write(self.style.SUCCESS(f"Коллекция {name}: квантование и payload-индексы включены"))
+            return
+
+        fill = self._reindex(options["batch"]) if options["reindex"] else None
+        started = timezone.now()
+        try:
+            result = collection_migration.migrate_collection(
+                client,
+                QdrantRecommendationEngine,
+                batch_size=options["batch"],
+                fill=fill,
+                drop_old=options["drop_old"],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        queued = collection_migration.reindex_changed_since(started)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Алиас {result['alias']} -> {result['collection']} "
+                f"(было: {result['previous'] or '—'}, точек: {result['points']}, "
+                f"на переиндексацию: {queued})"
+            )
+        )
+
+    def _reindex(self, batch_size):
+        from django.db.models import Q
+        from apps.catalog.models import Product
+        from apps.recommendations.tasks import index_product_vectors
+
+        def fill(collection_name):
+            ids = list(
+                Product.objects.filter(is_available=True)
+                .exclude(
+                    Q(product_type__in=["clothing", "shoes"])
+                    & (
+                        Q(external_data__has_key="source_variant_id")
+                        | Q(external_data__has_key="source_variant_slug")
+                    )
+                )
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            for offset in range(0, len(ids), batch_size):
+                result = index_product_vectors(
+                    product_ids=ids[offset : offset + batch_size],
+                    collection_name=collection_name,
+                )
+                self.stdout.write(f"{offset + len(ids[offset : offset + batch_size])}/{len(ids)}: "
+                                  f"ошибок {len(result['errors'])}")
+
+        return fill
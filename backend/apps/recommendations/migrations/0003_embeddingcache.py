@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recommendations", "0002_rename_rec_pv_cat_active_recommendat_categor_25ecfa_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCache",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("model_name", models.CharField(max_length=120)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("dimension", models.PositiveSmallIntegerField()),
+                ("vector", models.BinaryField(help_text="float32 little-endian")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Кэш эмбеддинга",
+                "verbose_name_plural": "Кэш эмбеддингов",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model_name", "content_hash"),
+                        name="rec_embedding_cache_model_hash_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
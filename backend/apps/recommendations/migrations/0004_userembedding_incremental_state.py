@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recommendations", "0003_embeddingcache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userembedding",
+            name="preference_weight",
+            field=models.FloatField(default=0.0, help_text="Суммарный затухающий вес событий в preference_vector"),
+        ),
+        migrations.AddField(
+            model_name="userembedding",
+            name="last_event_id",
+            field=models.BigIntegerField(default=0, help_text="Последнее учтённое RecommendationEvent.id"),
+        ),
+        migrations.AddField(
+            model_name="userembedding",
+            name="last_event_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
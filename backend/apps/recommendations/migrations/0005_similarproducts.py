@@ -0,0 +1,36 @@
+# Generated by Django 5.2.10 on 2026-10-18 22:45
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0200_harden_dynamic_attributes"),
+        ("recommendations", "0004_userembedding_incremental_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarProducts",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("vector_type", models.CharField(choices=[("text", "Текстовый"), ("image", "Изображение"), ("combined", "Комбинированный")], default="combined", max_length=20)),
+                ("neighbor_ids", django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ("scores", django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, default=list, size=None)),
+                ("attributes", models.JSONField(blank=True, default=list, help_text="[category_id, brand_id, price, color] для каждого соседа")),
+                ("is_stale", models.BooleanField(db_index=True, default=False)),
+                ("computed_at", models.DateTimeField()),
+                ("product", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="precomputed_similar", to="catalog.product")),
+            ],
+            options={
+                "verbose_name": "Похожие товары (предрасчёт)",
+                "verbose_name_plural": "Похожие товары (предрасчёт)",
+                "indexes": [django.contrib.postgres.indexes.GinIndex(fields=["neighbor_ids"], name="rec_similar_neighbors_gin")],
+                "constraints": [models.UniqueConstraint(fields=("product", "vector_type"), name="rec_similar_product_type_uniq")],
+            },
+        ),
+    ]
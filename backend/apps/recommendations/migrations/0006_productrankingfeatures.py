@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-18 22:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0200_harden_dynamic_attributes"),
+        ("recommendations", "0005_similarproducts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRankingFeatures",
+            fields=[
+                ("product", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="ranking_features", serialize=False, to="catalog.product")),
+                ("price", models.FloatField(blank=True, null=True)),
+                ("currency", models.CharField(blank=True, max_length=5)),
+                ("price_rub", models.FloatField(blank=True, help_text="Цена в базовой валюте (RUB)", null=True)),
+                ("is_available", models.BooleanField(default=True)),
+                ("stock_quantity", models.IntegerField(blank=True, null=True)),
+                ("brand_id", models.IntegerField(blank=True, null=True)),
+                ("category_id", models.IntegerField(blank=True, null=True)),
+                ("is_shadow_variant", models.BooleanField(default=False)),
+                ("product_created_at", models.DateTimeField(blank=True, null=True)),
+                ("product_updated_at", models.DateTimeField(blank=True, null=True)),
+                ("impressions", models.PositiveIntegerField(default=0)),
+                ("clicks", models.PositiveIntegerField(default=0)),
+                ("cart_adds", models.PositiveIntegerField(default=0)),
+                ("purchases", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Признаки ранжирования товара",
+                "verbose_name_plural": "Признаки ранжирования товаров",
+            },
+        ),
+    ]
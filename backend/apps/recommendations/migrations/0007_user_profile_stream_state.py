@@ -0,0 +1,53 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0006_productrankingfeatures'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventStreamCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Курсор потока событий',
+                'verbose_name_plural': 'Курсоры потока событий',
+            },
+        ),
+        migrations.AddField(
+            model_name='userembedding',
+            name='recent_event_ids',
+            field=models.JSONField(blank=True, default=list, help_text='Учтённые события из окна перечитывания (RECSYS_PROFILE_CURSOR_OVERLAP)'),
+        ),
+        migrations.AddField(
+            model_name='userembedding',
+            name='session_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='recommendationevent',
+            name='algorithm',
+            field=models.CharField(choices=[('vector_text', 'Векторный (текст)'), ('vector_image', 'Векторный (изображение)'), ('vector_combined', 'Векторный (комбинированный)'), ('collaborative', 'Коллаборативный'), ('trending', 'Тренды'), ('hybrid', 'Гибрид'), ('direct', 'Без рекомендации')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='userembedding',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='userembedding',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True), models.Q(('session_id', ''), _negated=True)), fields=('session_id',), name='rec_user_embedding_session_uniq'),
+        ),
+    ]
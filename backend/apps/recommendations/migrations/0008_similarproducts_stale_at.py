@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0007_user_profile_stream_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarproducts',
+            name='stale_at',
+            field=models.DateTimeField(blank=True, help_text='Последняя пометка на пересчёт; снимается, только если расчёт начат позже', null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 """Models for the recommendation system (vector RecSys on Qdrant)."""
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.conf import settings
 
@@ -70,6 +72,7 @@ class RecommendationEvent(models.Model):
         ("collaborative", "Коллаборативный"),
         ("trending", "Тренды"),
         ("hybrid", "Гибрид"),
+        ("direct", "Без рекомендации"),
     ]
 
     user = models.ForeignKey(
@@ -113,12 +116,18 @@ class RecommendationEvent(models.Model):
 
 
 class UserEmbedding(models.Model):
-    """User preference vector for personalized recommendations."""
+    """
+    User preference vector for personalized recommendations.
+    Anonymous visitors get a profile keyed by session_id (user is empty).
+    """
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="embedding",
+        null=True,
+        blank=True,
     )
+    session_id = models.CharField(max_length=100, blank=True, db_index=True)
     preference_vector = models.JSONField(null=True, blank=True)
     category_weights = models.JSONField(
         default=dict,
@@ -137,12 +146,157 @@ class UserEmbedding(models.Model):
         ],
         default="medium",
     )
+    preference_weight = models.FloatField(
+        default=0.0,
+        help_text="Суммарный затухающий вес событий в preference_vector",
+    )
+    last_event_id = models.BigIntegerField(
+        default=0,
+        help_text="Последнее учтённое RecommendationEvent.id",
+    )
+    recent_event_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Учтённые события из окна перечитывания (RECSYS_PROFILE_CURSOR_OVERLAP)",
+    )
+    last_event_at = models.DateTimeField(null=True, blank=True)
     last_updated = models.DateTimeField(auto_now=True)
 
-    def update_from_behavior(self):
-        """Update vector from view/purchase history. Stub for first phase."""
-        pass
+    def update_from_behavior(self, events, vectors, prices=None, categories=None):
+        """
+        Fold new events into the profile (exponentially decayed weighted mean).
+        See apps.recommendations.services.user_profiles.
+        """
+        from .services.user_profiles import apply_events
+        return apply_events(self, events, vectors, prices or {}, categories or {})
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session_id"],
+                condition=models.Q(user__isnull=True) & ~models.Q(session_id=""),
+                name="rec_user_embedding_session_uniq",
+            ),
+        ]
         verbose_name = "Эмбеддинг пользователя"
         verbose_name_plural = "Эмбеддинги пользователей"
+
+
+class EventStreamCursor(models.Model):
+    """Position of an incremental RecommendationEvent consumer (e.g. user profiles)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Курсор потока событий"
+        verbose_name_plural = "Курсоры потока событий"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
+
+
+class EmbeddingCache(models.Model):
+    """
+    Encoder output keyed by (model name, hash of the encoder input).
+    Lets reindexing skip the models when name/description/category/image are unchanged.
+    """
+    model_name = models.CharField(max_length=120)
+    content_hash = models.CharField(max_length=64)
+    dimension = models.PositiveSmallIntegerField()
+    vector = models.BinaryField(help_text="float32 little-endian")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model_name", "content_hash"],
+                name="rec_embedding_cache_model_hash_uniq",
+            ),
+        ]
+        verbose_name = "Кэш эмбеддинга"
+        verbose_name_plural = "Кэш эмбеддингов"
+
+    def __str__(self):
+        return f"{self.model_name}:{self.content_hash[:12]}"
+
+
+class SimilarProducts(models.Model):
+    """
+    Precomputed top-N neighbours of a product (offline job, see
+    services.similar_index). Filter attributes of the neighbours are stored
+    alongside so the `similar` endpoint filters in memory without Qdrant.
+    """
+    product = models.ForeignKey(
+        "catalog.Product",
+        on_delete=models.CASCADE,
+        related_name="precomputed_similar",
+    )
+    vector_type = models.CharField(
+        max_length=20, choices=ProductVector.VECTOR_TYPES, default="combined"
+    )
+    neighbor_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    scores = ArrayField(models.FloatField(), default=list, blank=True)
+    attributes = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="[category_id, brand_id, price, color] для каждого соседа",
+    )
+    is_stale = models.BooleanField(default=False, db_index=True)
+    stale_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Последняя пометка на пересчёт; снимается, только если расчёт начат позже",
+    )
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "vector_type"],
+                name="rec_similar_product_type_uniq",
+            ),
+        ]
+        indexes = [
+            GinIndex(fields=["neighbor_ids"], name="rec_similar_neighbors_gin"),
+        ]
+        verbose_name = "Похожие товары (предрасчёт)"
+        verbose_name_plural = "Похожие товары (предрасчёт)"
+
+    def __str__(self):
+        return f"{self.product_id}:{self.vector_type} ({len(self.neighbor_ids)})"
+
+
+class ProductRankingFeatures(models.Model):
+    """
+    Denormalized reranking features of a product (services.rerank_features).
+    The reranker scores candidates from these rows and hydrates only the final top-N.
+    """
+    product = models.OneToOneField(
+        "catalog.Product",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ranking_features",
+    )
+    price = models.FloatField(null=True, blank=True)
+    currency = models.CharField(max_length=5, blank=True)
+    price_rub = models.FloatField(null=True, blank=True, help_text="Цена в базовой валюте (RUB)")
+    is_available = models.BooleanField(default=True)
+    stock_quantity = models.IntegerField(null=True, blank=True)
+    brand_id = models.IntegerField(null=True, blank=True)
+    category_id = models.IntegerField(null=True, blank=True)
+    is_shadow_variant = models.BooleanField(default=False)
+    product_created_at = models.DateTimeField(null=True, blank=True)
+    product_updated_at = models.DateTimeField(null=True, blank=True)
+    impressions = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+    cart_adds = models.PositiveIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Признаки ранжирования товара"
+        verbose_name_plural = "Признаки ранжирования товаров"
+
+    def __str__(self):
+        return f"Ranking features for {self.product_id}"
@@ -1,12 +1,21 @@
-"""Recommendation services (vector engine, encoders, reranker)."""
-from .vector_engine import QdrantRecommendationEngine
-from .text_encoder import TextEncoder
-from .image_encoder import CLIPEncoder
-from .reranker import BusinessReranker
-
-__all__ = [
-    "QdrantRecommendationEngine",
-    "TextEncoder",
-    "CLIPEncoder",
-    "BusinessReranker",
-]
+"""Recommendation services (vector engine, encoders, reranker).
+
+Exports are resolved lazily: importing e.g. ``services.qdrant_registry`` must not
+load sentence-transformers/torch into every process that talks to Qdrant.
+"""
+from importlib import import_module
+
+_EXPORTS = {
+    "QdrantRecommendationEngine": ".vector_engine",
+    "TextEncoder": ".text_encoder",
+    "CLIPEncoder": ".image_encoder",
+    "BusinessReranker": ".reranker",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,339 @@
+"""Schema and blue/green migration of the product_recommendations collection.
+
+QdrantRecommendationEngine.COLLECTION_NAME is an alias that points at a
+versioned physical collection (``product_recommendations_<timestamp>``):
+
+* vectors are stored on disk and quantized to int8 (scalar quantization kept
+  in RAM), and searches rescore the top candidates with the original vectors;
+* every field _build_filter uses has a payload index;
+* a migration builds a new collection, fills it by copying points or by a
+  full reindex, reconciles it with the live one and swaps the alias in one
+  atomic operation, so readers never see a half-filled collection.
+
+While a migration runs, upserts through the alias are paused (the products
+keep an outdated ProductVector.last_synced) and deletes go to both
+collections; after the swap the products changed since the start are queued
+for reindexing into the new collection (reindex_changed_since).
+
+A collection of the pre-alias schema (physical name ``product_recommendations``)
+cannot become an alias under its own name, so the alias has its own name and
+adopts the legacy collection first; the legacy collection is dropped only
+after the alias has moved away from it.
+"""
+import logging
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_KEY = "recsys:collection-migration:{alias}"
+# Пауза записи снимается сама, если миграция упала, не дойдя до finally.
+MIGRATION_PAUSE_TIMEOUT = 6 * 60 * 60
+
+# Поля фильтров _build_filter -> тип payload-индекса.
+PAYLOAD_INDEXES = {
+    "is_active": "bool",
+    "product_id": "integer",
+    "category_id": "integer",
+    "brand_id": "integer",
+    "price": "float",
+    "color": "keyword",
+    "encoder": "keyword",
+}
+
+
+def quantization_enabled() -> bool:
+    return bool(getattr(settings, "RECSYS_VECTOR_QUANTIZATION", True))
+
+
+def quantization_config():
+    from qdrant_client.http import models as qmodels
+    if not quantization_enabled():
+        return None
+    return qmodels.ScalarQuantization(
+        scalar=qmodels.ScalarQuantizationConfig(
+            type=qmodels.ScalarType.INT8,
+            quantile=0.99,
+            always_ram=True,
+        )
+    )
+
+
+def search_params():
+    """Search over int8 vectors with rescoring of oversampled candidates by the originals."""
+    from qdrant_client.http import models as qmodels
+    if not quantization_enabled():
+        return None
+    return qmodels.SearchParams(
+        quantization=qmodels.QuantizationSearchParams(
+            rescore=True,
+            oversampling=float(getattr(settings, "RECSYS_QUANTIZATION_OVERSAMPLING", 2.0)),
+        )
+    )
+
+
+def vectors_config(engine_cls) -> Dict:
+    from qdrant_client.http import models as qmodels
+    on_disk = quantization_enabled()
+    return {
+        name: qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE, on_disk=on_disk)
+        for name, size in (
+            ("text", engine_cls.TEXT_VECTOR_SIZE),
+            ("image", engine_cls.IMAGE_VECTOR_SIZE),
+            ("combined", engine_cls.COMBINED_VECTOR_SIZE),
+        )
+    }
+
+
+def _index_schema(kind: str):
+    from qdrant_client.http import models as qmodels
+    if kind == "integer":
+        return qmodels.IntegerIndexParams(type="integer", lookup=True, range=False, on_disk=True)
+    if kind == "float":
+        return qmodels.FloatIndexParams(type="float", on_disk=True)
+    if kind == "keyword":
+        return qmodels.KeywordIndexParams(type="keyword", on_disk=True)
+    return qmodels.BoolIndexParams(type="bool", on_disk=True)
+
+
+def ensure_payload_indexes(client, collection_name: str) -> None:
+    """Create missing payload indexes (idempotent)."""
+    try:
+        existing = set(client.get_collection(collection_name).payload_schema or {})
+    except Exception:
+        existing = set()
+    for field, kind in PAYLOAD_INDEXES.items():
+        if field in existing:
+            continue
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=_index_schema(kind),
+                wait=True,
+            )
+        except Exception as e:
+            logger.warning("Payload index %s.%s: %s", collection_name, field, e)
+
+
+def create_collection(client, name: str, engine_cls) -> None:
+    client.create_collection(
+        collection_name=name,
+        vectors_config=vectors_config(engine_cls),
+        quantization_config=quantization_config(),
+        on_disk_payload=True,
+    )
+    ensure_payload_indexes(client, name)
+
+
+def new_collection_name(alias: str) -> str:
+    return f"{alias}_{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def resolve_alias(client, alias: str) -> Optional[str]:
+    """Physical collection behind the alias, or None when the alias does not exist."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+
+def _collection_names(client):
+    return {collection.name for collection in client.get_collections().collections}
+
+
+def migration_target(alias: str) -> Optional[str]:
+    """Collection being filled by a running migration of the alias (writes are paused)."""
+    return cache.get(MIGRATION_KEY.format(alias=alias))
+
+
+def adopt_legacy_collection(client, engine_cls) -> Optional[str]:
+    """
+    Point the alias at the legacy collection (or at the legacy alias target)
+    when the alias does not exist yet. Returns the adopted collection.
+    """
+    alias = engine_cls.COLLECTION_NAME
+    legacy = engine_cls.LEGACY_COLLECTION_NAME
+    if resolve_alias(client, alias) is not None:
+        return None
+    physical = resolve_alias(client, legacy)
+    if physical is None and legacy in _collection_names(client):
+        physical = legacy
+    if physical is None:
+        return None
+    logger.warning("Serving legacy collection %s through alias %s", physical, alias)
+    swap_alias(client, alias, physical)
+    return physical
+
+
+def swap_alias(client, alias: str, target: str) -> Optional[str]:
+    """Point the alias at target atomically; returns the previous collection."""
+    from qdrant_client.http import models as qmodels
+    previous = resolve_alias(client, alias)
+    operations = []
+    if previous is not None:
+        operations.append(qmodels.DeleteAliasOperation(delete_alias=qmodels.DeleteAlias(alias_name=alias)))
+    operations.append(
+        qmodels.CreateAliasOperation(create_alias=qmodels.CreateAlias(collection_name=target, alias_name=alias))
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def copy_points(client, source: str, target: str, batch_size: int = 256) -> int:
+    """Copy all points with vectors and payload via scroll + batched upsert."""
+    from qdrant_client.http import models as qmodels
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            client.upsert(
+                collection_name=target,
+                points=[
+                    qmodels.PointStruct(id=record.id, vector=record.vector, payload=record.payload)
+                    for record in records
+                ],
+                wait=True,
+            )
+            copied += len(records)
+        if offset is None:
+            return copied
+
+
+def _point_ids(client, collection_name: str, batch_size: int) -> Set:
+    ids = set()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(record.id for record in records)
+        if offset is None:
+            return ids
+
+
+def _copy_ids(client, source: str, target: str, ids: Iterable, batch_size: int) -> None:
+    from qdrant_client.http import models as qmodels
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        records = client.retrieve(
+            collection_name=source, ids=ids[start : start + batch_size], with_payload=True, with_vectors=True,
+        )
+        if records:
+            client.upsert(
+                collection_name=target,
+                points=[qmodels.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records],
+                wait=True,
+            )
+
+
+def reconcile_points(client, source: str, target: str, batch_size: int = 256) -> Dict[str, int]:
+    """
+    Bring the copy in line with the live collection: delete points removed
+    during the copy, copy points the scroll missed. Upserts are paused, so
+    the live collection can only lose points meanwhile.
+    """
+    from qdrant_client.http import models as qmodels
+    # Сначала читается копия: удаление между чтениями даёт «лишнюю» точку, а не «потерянную».
+    target_ids = _point_ids(client, target, batch_size)
+    source_ids = _point_ids(client, source, batch_size)
+    extra = target_ids - source_ids
+    missing = source_ids - target_ids
+    if extra:
+        client.delete(
+            collection_name=target,
+            points_selector=qmodels.PointIdsList(points=list(extra)),
+            wait=True,
+        )
+    if missing:
+        _copy_ids(client, source, target, missing, batch_size)
+    return {"deleted": len(extra), "copied": len(missing)}
+
+
+def migrate_collection(client, engine_cls, batch_size: int = 256, fill=None, drop_old: bool = False) -> Dict:
+    """
+    Blue/green migration: new collection with the current schema, filled by
+    ``fill(target_name)`` (default: copy points from the live collection),
+    reconciled, verified and swapped in with one alias update. Upserts through
+    the alias are paused until the swap; see reindex_changed_since.
+    """
+    alias = engine_cls.COLLECTION_NAME
+    adopt_legacy_collection(client, engine_cls)
+    source = resolve_alias(client, alias)
+    target = new_collection_name(alias)
+    create_collection(client, target, engine_cls)
+    migration_key = MIGRATION_KEY.format(alias=alias)
+    cache.set(migration_key, target, MIGRATION_PAUSE_TIMEOUT)
+    try:
+        try:
+            if fill is not None:
+                fill(target)
+            elif source is not None:
+                copy_points(client, source, target, batch_size=batch_size)
+                reconcile_points(client, source, target, batch_size=batch_size)
+            actual = client.count(target, exact=True).count
+            if fill is None and source is not None:
+                # Счёт живой коллекции берётся после сверки, пока запись в неё приостановлена.
+                expected = client.count(source, exact=True).count
+                if actual != expected:
+                    raise RuntimeError(f"{target}: copied {actual} of {expected} points")
+        except Exception:
+            client.delete_collection(target)
+            raise
+        previous = swap_alias(client, alias, target)
+    finally:
+        cache.delete(migration_key)
+    if drop_old and previous and previous != target:
+        client.delete_collection(previous)
+    return {"alias": alias, "previous": previous, "collection": target, "points": actual}
+
+
+def reindex_changed_since(started, batch_size: int = 100) -> int:
+    """
+    Queue reindexing of products whose writes were paused by a migration
+    (changed or synced since `started`). Returns how many were queued.
+    """
+    from django.db.models import Q
+    from apps.catalog.models import Product
+    from apps.recommendations.tasks import index_product_vectors
+
+    ids = list(
+        Product.objects.filter(Q(updated_at__gte=started) | Q(vector_data__last_synced__gte=started))
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    for offset in range(0, len(ids), batch_size):
+        index_product_vectors.delay(product_ids=ids[offset : offset + batch_size])
+    return len(ids)
+
+
+def upgrade_in_place(client, engine_cls) -> str:
+    """Enable quantization and payload indexes on the live collection without copying."""
+    from qdrant_client.http import models as qmodels
+    alias = engine_cls.COLLECTION_NAME
+    adopt_legacy_collection(client, engine_cls)
+    name = resolve_alias(client, alias) or alias
+    client.update_collection(
+        collection_name=name,
+        vectors_config={
+            vector: qmodels.VectorParamsDiff(on_disk=quantization_enabled())
+            for vector in ("text", "image", "combined")
+        },
+        quantization_config=quantization_config(),
+    )
+    ensure_payload_indexes(client, name)
+    return name
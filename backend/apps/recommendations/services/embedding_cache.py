@@ -0,0 +1,100 @@
+"""
+Embedding cache: (encoder model name, input content hash) -> vector in EmbeddingCache.
+
+The model name includes the encoder variant (see TextEncoder/CLIPEncoder
+.cache_model_name), so vectors of the in-process fp32 models and of ml_service
+int8 models never share an entry. Entries live RECSYS_EMBEDDING_CACHE_TTL_DAYS:
+older ones are treated as misses, overwritten on the next encode and removed
+by prune_expired().
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from apps.recommendations.models import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256((value or "").encode("utf-8")).hexdigest()
+
+
+def bytes_hash(data: bytes) -> str:
+    """Key for an image input: hash of the downloaded file content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _ttl() -> Optional[timedelta]:
+    days = getattr(settings, "RECSYS_EMBEDDING_CACHE_TTL_DAYS", 30)
+    return timedelta(days=days) if days else None
+
+
+def prune_expired() -> int:
+    """Delete entries older than the TTL. Returns the number of deleted rows."""
+    ttl = _ttl()
+    if ttl is None:
+        return 0
+    deleted, _ = EmbeddingCache.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    return deleted
+
+
+def get_many(model_name: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return {}
+    rows = EmbeddingCache.objects.filter(model_name=model_name, content_hash__in=hashes)
+    ttl = _ttl()
+    if ttl is not None:
+        rows = rows.filter(created_at__gte=timezone.now() - ttl)
+    rows = rows.values_list("content_hash", "dimension", "vector")
+    result = {}
+    for key, dimension, raw in rows:
+        vector = np.frombuffer(bytes(raw), dtype="<f4")
+        if vector.size == dimension:
+            result[key] = vector.astype(np.float32)
+    return result
+
+
+def set_many(model_name: str, vectors: Dict[str, np.ndarray]) -> None:
+    if not vectors:
+        return
+    try:
+        EmbeddingCache.objects.bulk_create(
+            [
+                EmbeddingCache(
+                    model_name=model_name,
+                    content_hash=key,
+                    dimension=int(vector.size),
+                    vector=np.asarray(vector, dtype="<f4").tobytes(),
+                )
+                for key, vector in vectors.items()
+            ],
+            # Expired entries are refreshed in place (created_at restarts the TTL).
+            update_conflicts=True,
+            unique_fields=["model_name", "content_hash"],
+            update_fields=["dimension", "vector", "created_at"],
+        )
+    except Exception as e:
+        logger.warning("Failed to store %s embeddings for %s: %s", len(vectors), model_name, e)
+
+
+def encode_texts_cached(encoder, texts: List[str]) -> List[np.ndarray]:
+    """TextEncoder.encode_batch only for texts missing from the cache; empty text -> zero vector."""
+    from .text_encoder import TEXT_VECTOR_SIZE
+
+    keys = [content_hash(text) if text and text.strip() else "" for text in texts]
+    cached = get_many(encoder.cache_model_name, keys)
+    missing = sorted({key: text for key, text in zip(keys, texts) if key and key not in cached}.items())
+    if missing:
+        encoded = encoder.encode_batch([text for _, text in missing])
+        fresh = {key: np.asarray(vector, dtype=np.float32) for (key, _), vector in zip(missing, encoded)}
+        # The variant is read again: it is the one that actually produced the vectors.
+        set_many(encoder.cache_model_name, fresh)
+        cached.update(fresh)
+    return [cached[key] if key else np.zeros(TEXT_VECTOR_SIZE, dtype=np.float32) for key in keys]
@@ -1,18 +1,56 @@
-"""Image encoder for recommendations (CLIP, 512-dim)."""
+"""Image encoder for recommendations (CLIP, 512-dim).
+
+With ML_SERVICE_URL set CLIP is not loaded in-process: images go to
+ml_service (services.ml_client).
+"""
 import logging
 from io import BytesIO
-from typing import Optional, Union
+from typing import List, Optional, Sequence, Union
 import numpy as np
 import requests
 from PIL import Image
 
+from django.conf import settings
+
+from . import ml_client
+
 logger = logging.getLogger(__name__)
 
 IMAGE_VECTOR_SIZE = 512
+IMAGE_FETCH_TIMEOUT = 30
+IMAGE_BATCH_SIZE = 32
+
+
+def fetch_image_bytes(url: str, timeout: float = IMAGE_FETCH_TIMEOUT) -> Optional[bytes]:
+    """Download image file content. Returns None on any error."""
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.warning("Failed to load image from %s: %s", url, e)
+        return None
+
+
+def decode_image(data: Optional[bytes]) -> Optional[Image.Image]:
+    """Image file content -> RGB PIL image. Returns None on any error."""
+    if not data:
+        return None
+    try:
+        return Image.open(BytesIO(data)).convert("RGB")
+    except Exception as e:
+        logger.warning("Failed to decode image: %s", e)
+        return None
+
+
+def fetch_image(url: str, timeout: float = IMAGE_FETCH_TIMEOUT) -> Optional[Image.Image]:
+    """Download an image and convert it to RGB. Returns None on any error."""
+    return decode_image(fetch_image_bytes(url, timeout=timeout))
 
 
 class CLIPEncoder:
     """Encode images to vectors with CLIP."""
+    MODEL_NAME = "openai/clip-vit-base-patch32"
     _instance = None
     _model = None
     _processor = None
@@ -27,6 +65,10 @@ class CLIPEncoder:
             self._load_model()
 
     def _load_model(self):
+        if ml_client.is_enabled():
+            CLIPEncoder._model = "remote"
+            logger.info("CLIP encoder: using ml_service at %s", settings.ML_SERVICE_URL)
+            return
         try:
             import torch
             from transformers import CLIPProcessor, CLIPModel
@@ -35,7 +77,7 @@ class CLIPEncoder:
             CLIPEncoder._model = "unavailable"
             return
         logger.info("Loading CLIP model...")
-        model_name = "openai/clip-vit-base-patch32"
+        model_name = self.MODEL_NAME
         CLIPEncoder._model = CLIPModel.from_pretrained(model_name)
         CLIPEncoder._processor = CLIPProcessor.from_pretrained(model_name)
         CLIPEncoder._model.eval()
@@ -53,9 +95,16 @@ class CLIPEncoder:
     def processor(self):
         return CLIPEncoder._processor
 
+    @property
+    def cache_model_name(self) -> str:
+        """EmbeddingCache model name: the model plus the encoder variant producing vectors."""
+        return f"{self.MODEL_NAME}@{ml_client.variant('image') if self.model == 'remote' else 'fp32'}"
+
     def _encode_image_impl(self, image: Image.Image) -> Optional[np.ndarray]:
         if self.model == "unavailable" or self.model is None:
             return None
+        if self.model == "remote":
+            return ml_client.embed_images([image])[0]
         import torch
         inputs = self.processor(
             images=image,
@@ -69,6 +118,35 @@ class CLIPEncoder:
         image_features = image_features / image_features.norm(dim=-1, keepdim=True)
         return image_features.cpu().numpy().flatten().astype(np.float32)
 
+    def encode_images(
+        self,
+        images: Sequence[Optional[Image.Image]],
+        batch_size: int = IMAGE_BATCH_SIZE,
+    ) -> List[Optional[np.ndarray]]:
+        """Encode images with batched CLIP forward passes. None entries stay None."""
+        results: List[Optional[np.ndarray]] = [None] * len(images)
+        if self.model == "unavailable" or self.model is None:
+            return results
+        if self.model == "remote":
+            return ml_client.embed_images(images)
+        import torch
+        positions = [i for i, image in enumerate(images) if image is not None]
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start:start + batch_size]
+            inputs = self.processor(
+                images=[images[i] for i in chunk],
+                return_tensors="pt",
+                padding=True,
+            )
+            if torch.cuda.is_available():
+                inputs = {k: v.cuda() for k, v in inputs.items()}
+            with torch.no_grad():
+                features = self.model.get_image_features(**inputs)
+            features = features / features.norm(dim=-1, keepdim=True)
+            for position, row in zip(chunk, features.cpu().numpy().astype(np.float32)):
+                results[position] = row
+        return results
+
     def encode_image(
         self,
         image_input: Union[str, Image.Image, bytes],
@@ -96,11 +174,14 @@ class CLIPEncoder:
 
     def encode_image_from_url(self, url: str) -> Optional[np.ndarray]:
         """Load and encode image from URL."""
+        image = fetch_image(url)
+        if image is None:
+            return None
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            image = Image.open(BytesIO(response.content)).convert("RGB")
             return self._encode_image_impl(image)
+        except ml_client.MLServiceError:
+            # Недоступность сервиса — не «плохое изображение»: решает вызывающий.
+            raise
         except Exception as e:
             logger.error("Failed to encode image from %s: %s", url, e)
             return None
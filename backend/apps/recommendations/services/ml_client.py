@@ -0,0 +1,150 @@
+"""Client of the ml_service embedding endpoints.
+
+When ML_SERVICE_URL is set, TextEncoder and CLIPEncoder send their batches
+here instead of loading sentence-transformers/CLIP in the process. There is no
+fallback to in-process models: their fp32 vectors are not interchangeable with
+the service's int8 ones, so MLServiceError reaches the caller. One pooled
+httpx client per process (recreated after fork). Vectors travel as base64
+float32.
+"""
+import base64
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {502, 503, 504}
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_client = None
+# Encoder variant per model as reported by ml_service ("onnx-int8", "torch-int8", ...).
+_variants: Dict[str, str] = {}
+
+
+class MLServiceError(RuntimeError):
+    """ml_service did not return embeddings."""
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "ML_SERVICE_URL", ""))
+
+
+def encoder_backend() -> str:
+    """
+    Source of vectors written to and queried against Qdrant: "ml_service"
+    (int8 models of the service) or "local" (in-process fp32 models). Points
+    carry it in the "encoder" payload field and searches only match points of
+    the current backend; switching backends needs a reindex.
+    """
+    return "ml_service" if is_enabled() else "local"
+
+
+def _http_client():
+    global _pid, _client
+    with _lock:
+        if _client is None or _pid != os.getpid():
+            import httpx
+            _pid = os.getpid()
+            _client = httpx.Client(
+                base_url=settings.ML_SERVICE_URL.rstrip("/"),
+                timeout=getattr(settings, "ML_SERVICE_TIMEOUT", 30),
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+            )
+        return _client
+
+
+def reset_client() -> None:
+    global _client
+    with _lock:
+        client, _client = _client, None
+        _variants.clear()
+    if client is not None:
+        client.close()
+
+
+def _decode(vector: Optional[str]) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    return np.frombuffer(base64.b64decode(vector), dtype="<f4").astype(np.float32)
+
+
+def variant(kind: str) -> str:
+    """
+    Encoder variant of ml_service for "text" / "image". Vectors of different
+    variants (service int8 vs in-process fp32) must not share cache entries.
+    """
+    if kind not in _variants:
+        try:
+            models = _http_client().get("/health").json().get("models", {})
+            for name, info in models.items():
+                if info.get("variant"):
+                    _variants[name] = str(info["variant"])
+        except Exception as e:
+            logger.warning("ml_service /health is unavailable: %s", e)
+    return _variants.get(kind) or "ml_service"
+
+
+def _post(path: str, payload: dict) -> List[Optional[np.ndarray]]:
+    import httpx
+
+    payload = {**payload, "format": "base64"}
+    for attempt in range(2):
+        try:
+            response = _http_client().post(path, json=payload)
+        except httpx.TransportError as e:
+            error = e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                if response.status_code >= 400:
+                    raise MLServiceError(f"{path}: HTTP {response.status_code} {response.text[:200]}")
+                data = response.json()
+                if data.get("variant"):
+                    _variants[path.rsplit("/", 1)[-1]] = str(data["variant"])
+                return [_decode(vector) for vector in data["vectors"]]
+            error = MLServiceError(f"{path}: HTTP {response.status_code}")
+        if attempt == 0:
+            # Очередь сервиса переполнена или соединение оборвалось — одна повторная попытка.
+            time.sleep(0.2)
+    raise MLServiceError(f"{path}: {error}") from error
+
+
+def _batch_size() -> int:
+    return max(1, getattr(settings, "ML_SERVICE_BATCH_SIZE", 128))
+
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    """(len(texts), 384) float32 matrix."""
+    rows: List[np.ndarray] = []
+    size = _batch_size()
+    for start in range(0, len(texts), size):
+        rows.extend(_post("/embed/text", {"texts": [text or "" for text in texts[start : start + size]]}))
+    return np.vstack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+
+
+def _image_bytes(image) -> Optional[str]:
+    if image is None:
+        return None
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=92)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def embed_images(images: Sequence) -> List[Optional[np.ndarray]]:
+    """PIL images (None entries stay None) -> 512-dim vectors."""
+    results: List[Optional[np.ndarray]] = [None] * len(images)
+    positions = [index for index, image in enumerate(images) if image is not None]
+    size = _batch_size()
+    for start in range(0, len(positions), size):
+        chunk = positions[start : start + size]
+        vectors = _post("/embed/image", {"images": [_image_bytes(images[index]) for index in chunk]})
+        for index, vector in zip(chunk, vectors):
+            results[index] = vector
+    return results
@@ -0,0 +1,169 @@
+"""Process-wide Qdrant client and recommendation engine registry.
+
+One QdrantClient per process (HTTP keep-alive pool or a single gRPC channel),
+recreated after fork and after connection failures. Collection bootstrap
+(get_collections/create_collection) runs once per process instead of on every
+engine instantiation; `manage.py init_qdrant` and Celery worker start run it
+ahead of the first request.
+"""
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_pid: Optional[int] = None
+_client = None
+_engine = None
+_bootstrapped: set = set()
+
+
+def _create_client():
+    from qdrant_client import QdrantClient
+    return QdrantClient(
+        host=getattr(settings, "QDRANT_HOST", "qdrant"),
+        port=getattr(settings, "QDRANT_PORT", 6333),
+        grpc_port=getattr(settings, "QDRANT_GRPC_PORT", 6334),
+        prefer_grpc=getattr(settings, "QDRANT_PREFER_GRPC", False),
+        timeout=getattr(settings, "QDRANT_TIMEOUT", 10),
+    )
+
+
+def _reset_after_fork() -> None:
+    """Соединения родителя (gunicorn/celery prefork) не переиспользуем в дочернем процессе."""
+    global _pid, _client, _engine
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _client = None
+        _engine = None
+        _bootstrapped.clear()
+
+
+def _raw_client():
+    global _client
+    with _lock:
+        _reset_after_fork()
+        if _client is None:
+            _client = _create_client()
+        return _client
+
+
+def reset_qdrant_client() -> None:
+    """Drop the shared client; the next call reconnects."""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def clear_registry() -> None:
+    """Forget the client, the engine and bootstrap flags (tests, forced re-bootstrap)."""
+    global _engine
+    reset_qdrant_client()
+    with _lock:
+        _engine = None
+        _bootstrapped.clear()
+
+
+def _is_connection_error(exc: Exception) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    try:
+        from qdrant_client.http.exceptions import ResponseHandlingException
+        if isinstance(exc, ResponseHandlingException):
+            return True
+    except ImportError:
+        pass
+    try:
+        import grpc
+        if isinstance(exc, grpc.RpcError) and exc.code() in (
+            grpc.StatusCode.UNAVAILABLE,
+            grpc.StatusCode.DEADLINE_EXCEEDED,
+        ):
+            return True
+    except ImportError:
+        pass
+    return False
+
+
+class ReconnectingQdrantClient:
+    """
+    Proxy over the shared QdrantClient: on a connection-level error the client
+    is recreated and the call is retried once. Other errors propagate unchanged.
+    """
+
+    def __getattr__(self, name):
+        attr = getattr(_raw_client(), name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(_raw_client(), name)(*args, **kwargs)
+            except Exception as exc:
+                if not _is_connection_error(exc):
+                    raise
+                logger.warning("Qdrant %s failed (%s), reconnecting", name, exc)
+                reset_qdrant_client()
+                return getattr(_raw_client(), name)(*args, **kwargs)
+
+        return call
+
+
+_proxy = ReconnectingQdrantClient()
+
+
+def get_qdrant_client() -> ReconnectingQdrantClient:
+    return _proxy
+
+
+def ensure_bootstrapped(name: str, bootstrap: Callable[[], Optional[bool]], force: bool = False) -> None:
+    """
+    Run a collection bootstrap once per process. A bootstrap that raises or
+    returns False is retried on the next call.
+    """
+    with _lock:
+        _reset_after_fork()
+        if name in _bootstrapped and not force:
+            return
+    if bootstrap() is False:
+        return
+    with _lock:
+        _bootstrapped.add(name)
+
+
+def get_recommendation_engine():
+    """Shared QdrantRecommendationEngine for views and tasks."""
+    global _engine
+    with _lock:
+        _reset_after_fork()
+        if _engine is None:
+            from .vector_engine import QdrantRecommendationEngine
+            _engine = QdrantRecommendationEngine()
+        return _engine
+
+
+def warm_up() -> bool:
+    """Connect and bootstrap collections ahead of the first request (worker start)."""
+    try:
+        get_recommendation_engine()
+        from apps.ai.services.vector_store import QdrantManager
+        QdrantManager()
+        return True
+    except Exception as e:
+        logger.warning("Qdrant warm-up failed, will retry lazily: %s", e)
+        return False
@@ -0,0 +1,150 @@
+"""Reranking feature store (ProductRankingFeatures).
+
+One row per product holds everything BusinessReranker scores on: price, base-currency
+price, availability, dates, brand/category and popularity counters from
+RecommendationEvent. Rows are written on vector indexing and by a periodic
+refresh. Missing rows are built on first read, so scoring never needs the
+card prefetch.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FEATURE_FIELDS = (
+    "product_id", "price", "currency", "price_rub", "is_available", "stock_quantity",
+    "brand_id", "category_id", "is_shadow_variant", "product_created_at",
+    "impressions", "clicks", "cart_adds", "purchases",
+)
+SOURCE_FIELDS = [
+    "price", "currency", "price_rub", "is_available", "stock_quantity", "brand_id",
+    "category_id", "is_shadow_variant", "product_created_at", "product_updated_at",
+]
+POPULARITY_FIELDS = ["impressions", "clicks", "cart_adds", "purchases"]
+POPULARITY_EVENTS = {
+    "impression": "impressions",
+    "click": "clicks",
+    "cart_add": "cart_adds",
+    "purchase": "purchases",
+}
+POPULARITY_WINDOW_DAYS = 30
+
+
+def _as_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def build_features(product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """(Re)build feature rows of the products from Product in one query; keeps counters."""
+    from apps.catalog.models import Product
+    from apps.recommendations.models import ProductRankingFeatures
+
+    ids = list(product_ids)
+    if not ids:
+        return {}
+    rows = Product.objects.filter(id__in=ids).values(
+        "id", "price", "currency", "converted_price_rub", "is_available", "stock_quantity",
+        "brand_id", "category_id", "product_type", "external_data", "created_at", "updated_at",
+    )
+    objects = []
+    for row in rows:
+        external = row["external_data"] if isinstance(row["external_data"], dict) else {}
+        price = _as_float(row["price"])
+        price_rub = _as_float(row["converted_price_rub"])
+        if price_rub is None and (row["currency"] or "").upper() == "RUB":
+            price_rub = price
+        objects.append(ProductRankingFeatures(
+            product_id=row["id"],
+            price=price,
+            currency=(row["currency"] or "")[:5],
+            price_rub=price_rub,
+            is_available=row["is_available"],
+            stock_quantity=row["stock_quantity"],
+            brand_id=row["brand_id"],
+            category_id=row["category_id"],
+            is_shadow_variant=bool(
+                external.get("source_variant_id") or external.get("source_variant_slug")
+            ),
+            product_created_at=row["created_at"],
+            product_updated_at=row["updated_at"],
+        ))
+    if objects:
+        ProductRankingFeatures.objects.bulk_create(
+            objects,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=SOURCE_FIELDS + ["updated_at"],
+        )
+    return {
+        obj.product_id: {
+            **{name: getattr(obj, name) for name in FEATURE_FIELDS if name not in POPULARITY_FIELDS},
+            **{name: 0 for name in POPULARITY_FIELDS},
+        }
+        for obj in objects
+    }
+
+
+def get_features(product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Feature rows by product id; rows missing from the store are built on the fly."""
+    from apps.recommendations.models import ProductRankingFeatures
+
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return {}
+    features = {
+        row["product_id"]: row
+        for row in ProductRankingFeatures.objects.filter(product_id__in=ids).values(*FEATURE_FIELDS)
+    }
+    missing = [product_id for product_id in ids if product_id not in features]
+    if missing:
+        features.update(build_features(missing))
+    return features
+
+
+def refresh_changed_features(limit: int = 5000) -> int:
+    """Rebuild rows whose product changed after the row was written."""
+    from apps.recommendations.models import ProductRankingFeatures
+
+    ids = list(
+        ProductRankingFeatures.objects.filter(product__updated_at__gt=F("product_updated_at"))
+        .values_list("product_id", flat=True)[:limit]
+    )
+    for offset in range(0, len(ids), 500):
+        build_features(ids[offset : offset + 500])
+    return len(ids)
+
+
+def refresh_popularity(days: int = POPULARITY_WINDOW_DAYS) -> int:
+    """Recount event counters over the window (one aggregate query + bulk update)."""
+    from apps.recommendations.models import ProductRankingFeatures, RecommendationEvent
+
+    since = timezone.now() - timedelta(days=days)
+    counters: Dict[int, Dict[str, int]] = {}
+    aggregates = (
+        RecommendationEvent.objects.filter(created_at__gte=since, event_type__in=list(POPULARITY_EVENTS))
+        .values("recommended_product_id", "event_type")
+        .annotate(total=Count("id"))
+    )
+    for row in aggregates:
+        counts = counters.setdefault(row["recommended_product_id"], dict.fromkeys(POPULARITY_FIELDS, 0))
+        counts[POPULARITY_EVENTS[row["event_type"]]] = row["total"]
+
+    build_features(
+        set(counters)
+        - set(ProductRankingFeatures.objects.filter(product_id__in=list(counters)).values_list("product_id", flat=True))
+    )
+    # Товары, выпавшие из окна, обнуляем.
+    ProductRankingFeatures.objects.exclude(product_id__in=list(counters)).filter(
+        Q(impressions__gt=0) | Q(clicks__gt=0) | Q(cart_adds__gt=0) | Q(purchases__gt=0)
+    ).update(impressions=0, clicks=0, cart_adds=0, purchases=0)
+    rows: List = []
+    for row in ProductRankingFeatures.objects.filter(product_id__in=list(counters)):
+        for name, value in counters[row.product_id].items():
+            setattr(row, name, value)
+        rows.append(row)
+    ProductRankingFeatures.objects.bulk_update(rows, POPULARITY_FIELDS, batch_size=1000)
+    return len(rows)
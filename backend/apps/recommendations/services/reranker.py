@@ -1,13 +1,48 @@
 """Business reranker for recommendation results."""
-from typing import Dict, List, Any
+from typing import Dict, List, Optional
+
+import numpy as np
 from django.utils import timezone
-from datetime import timedelta
 
 from apps.catalog.models import Product
 
+from .rerank_features import get_features
+
+# Связи, нужные serialize_product_for_card для карточек рекомендаций.
+CARD_PREFETCH_RELATED = (
+    "images",
+    "medicine_item__gallery_images",
+    "supplement_item__gallery_images",
+    "medical_equipment_item__gallery_images",
+    "tableware_item__gallery_images",
+    "accessory_item__gallery_images",
+    "incense_item__gallery_images",
+    "book_item__images",
+    "book_item__book_variants__images",
+    "clothing_item__images",
+    "clothing_item__variants__images",
+    "shoe_item__images",
+    "shoe_item__variants__images",
+    "jewelry_item__images",
+    "jewelry_item__variants__images",
+    "electronics_item__images",
+    "furniture_item__images",
+    "furniture_item__variants__images",
+    "perfumery_item__images",
+    "perfumery_item__variants__images",
+    "sports_item__images",
+    "auto_part_item__images",
+)
+
 
 class BusinessReranker:
-    """Rerank candidates by business rules (price proximity, availability, freshness)."""
+    """
+    Rerank candidates by business rules (price proximity, availability, freshness,
+    popularity). Scores are computed with NumPy over the feature store
+    (services.rerank_features); only the final top-N products are loaded for cards.
+    """
+
+    FACTORS = ("relevance", "price_proximity", "availability", "freshness", "popularity")
 
     def rerank(
         self,
@@ -15,98 +50,97 @@ class BusinessReranker:
         target_product: Product,
         strategy: str = "balanced",
         request=None,
+        limit: Optional[int] = None,
     ) -> List[Dict]:
         if not candidates:
             return []
-        product_ids = [c["product_id"] for c in candidates]
+        ranked = self.rank(candidates, target_product, strategy)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return self._serialize_results(self.hydrate(ranked), request)
+
+    def rank(
+        self,
+        candidates: List[Dict],
+        target_product: Product,
+        strategy: str = "balanced",
+        features: Optional[Dict[int, Dict]] = None,
+    ) -> List[Dict]:
+        """
+        Score and sort candidates from feature rows (one query, no Product loads).
+        Candidates without features and shadow variants are dropped.
+        """
+        if features is None:
+            features = get_features([c["product_id"] for c in candidates] + [target_product.id])
+        rows = [
+            (cand, features[cand["product_id"]])
+            for cand in candidates
+            if cand["product_id"] in features and not features[cand["product_id"]]["is_shadow_variant"]
+        ]
+        if not rows:
+            return []
+        target = features.get(target_product.id) or {}
+        scores = self._score_matrix([row for _, row in rows], [cand for cand, _ in rows], target) @ self._weight_vector(strategy)
+        order = np.argsort(-scores, kind="stable")
+        return [{**rows[i][0], "business_score": float(scores[i])} for i in order]
+
+    def hydrate(self, ranked: List[Dict]) -> List[Dict]:
+        """Attach Product objects (with card prefetch) to the ranked rows."""
         products = (
-            Product.objects.filter(id__in=product_ids)
+            Product.objects.filter(id__in=[item["product_id"] for item in ranked])
             .select_related("category", "brand")
-            .prefetch_related(
-                "images",
-                "medicine_item__gallery_images",
-                "supplement_item__gallery_images",
-                "medical_equipment_item__gallery_images",
-                "tableware_item__gallery_images",
-                "accessory_item__gallery_images",
-                "incense_item__gallery_images",
-                "book_item__images",
-                "book_item__book_variants__images",
-                "clothing_item__images",
-                "clothing_item__variants__images",
-                "shoe_item__images",
-                "shoe_item__variants__images",
-                "jewelry_item__images",
-                "jewelry_item__variants__images",
-                "electronics_item__images",
-                "furniture_item__images",
-                "furniture_item__variants__images",
-                "perfumery_item__images",
-                "perfumery_item__variants__images",
-                "sports_item__images",
-                "auto_part_item__images",
-            )
+            .prefetch_related(*CARD_PREFETCH_RELATED)
         )
         product_map = {p.id: p for p in products}
-        enriched = []
-        for cand in candidates:
-            product = product_map.get(cand["product_id"])
-            if not product:
-                continue
-            score = self._calculate_score(
-                candidate=cand,
-                candidate_product=product,
-                target=target_product,
-                strategy=strategy,
-            )
-            enriched.append({
-                **cand,
-                "business_score": score,
-                "product": product,
-            })
-        enriched.sort(key=lambda x: x["business_score"], reverse=True)
-        return self._serialize_results(enriched, request)
+        return [
+            {**item, "product": product_map[item["product_id"]]}
+            for item in ranked
+            if item["product_id"] in product_map
+        ]
 
-    def _calculate_score(
-        self,
-        candidate: Dict,
-        candidate_product: Product,
-        target: Product,
-        strategy: str,
-    ) -> float:
-        base_score = float(candidate.get("score", 0))
-        factors = {
-            "relevance": base_score,
-            "price_proximity": 0.0,
-            "availability": 1.0,
-            "freshness": 0.3,
-            "popularity": 0.0,
-        }
-        if target.price and candidate_product.price:
-            try:
-                t_p = float(target.price)
-                c_p = float(candidate_product.price)
-                if max(t_p, c_p) > 0:
-                    price_ratio = min(t_p, c_p) / max(t_p, c_p)
-                    factors["price_proximity"] = min(price_ratio, 1.0)
-            except (TypeError, ValueError):
-                pass
-        if getattr(candidate_product, "stock_quantity", None) is not None:
-            factors["availability"] = min(
-                (candidate_product.stock_quantity or 0) / 10.0, 1.0
-            )
-        if getattr(candidate_product, "created_at", None):
-            days_old = (timezone.now() - candidate_product.created_at).days
-            if days_old < 7:
-                factors["freshness"] = 1.0
-            elif days_old < 30:
-                factors["freshness"] = 0.7
-            else:
-                factors["freshness"] = 0.3
-        weights = self._get_strategy_weights(strategy)
-        return sum(
-            factors.get(k, 0) * weights.get(k, 0) for k in weights
+    def _score_matrix(self, rows: List[Dict], candidates: List[Dict], target: Dict) -> np.ndarray:
+        """Factor matrix (candidates x FACTORS) in [0, 1]."""
+        n = len(rows)
+        relevance = np.array([float(c.get("score") or 0) for c in candidates])
+
+        def column(name, default=np.nan):
+            return np.array([default if r[name] is None else float(r[name]) for r in rows])
+
+        # Цены сравниваем в одной валюте; иначе — в базовой (RUB).
+        same_currency = np.array([r["currency"] == target.get("currency") for r in rows])
+        target_price = target.get("price")
+        target_rub = target.get("price_rub")
+        cand_price = np.where(same_currency, column("price"), column("price_rub"))
+        ref_price = np.where(
+            same_currency,
+            np.nan if target_price is None else float(target_price),
+            np.nan if target_rub is None else float(target_rub),
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.minimum(cand_price, ref_price) / np.maximum(cand_price, ref_price)
+        price_proximity = np.where(np.isfinite(ratio) & (ratio > 0), np.minimum(ratio, 1.0), 0.0)
+
+        stock = column("stock_quantity")
+        availability = np.where(np.isnan(stock), 1.0, np.minimum(np.nan_to_num(stock) / 10.0, 1.0))
+        availability = np.where([r["is_available"] for r in rows], availability, 0.0)
+
+        now = timezone.now()
+        days_old = np.array([
+            (now - r["product_created_at"]).days if r["product_created_at"] else np.inf for r in rows
+        ])
+        freshness = np.select([days_old < 7, days_old < 30], [1.0, 0.7], default=0.3)
+
+        engagement = np.log1p(
+            column("clicks", 0) + 3 * column("cart_adds", 0) + 5 * column("purchases", 0)
         )
+        top = engagement.max() if n else 0
+        popularity = engagement / top if top > 0 else np.zeros(n)
+
+        return np.column_stack([relevance, price_proximity, availability, freshness, popularity])
+
+    def _weight_vector(self, strategy: str) -> np.ndarray:
+        weights = self._get_strategy_weights(strategy)
+        return np.array([weights.get(name, 0.0) for name in self.FACTORS])
 
     def _get_strategy_weights(self, strategy: str) -> Dict[str, float]:
         strategies = {
@@ -148,11 +182,12 @@ class BusinessReranker:
                 "product": product_data,
                 "similarity_score": item.get("score"),
                 "business_score": round(item["business_score"], 4),
-                "reason": self._get_recommendation_reason(item),
+                "reason": self.recommendation_reason(item),
             })
         return result
 
-    def _get_recommendation_reason(self, item: Dict) -> str:
+    def recommendation_reason(self, item: Dict) -> str:
+        """Short human-readable reason for a ranked item (a row from rank())."""
         product = item["product"]
         score = item.get("score", 0)
         reasons = []
@@ -0,0 +1,239 @@
+"""Precomputed similar-products table and versioned similar-cache keys.
+
+An offline job stores the top-N neighbours of every active product in
+SimilarProducts. It reuses one retrieve and one query_batch_points per batch
+of products. The `similar` endpoint reads one row by unique index and applies
+request filters in memory. Indexing marks rows stale, both the product's own
+row and rows that list it as a neighbour (GIN on neighbor_ids), and the job
+refreshes only those. Every mark stamps stale_at; the job clears the flag only
+on rows whose last mark predates the start of their computation, so a product
+reindexed mid-run stays stale for the next run.
+
+Redis results of find_similar use a per-product version in the key, so
+invalidation is a single set_many of new versions instead of a SCAN over the
+whole keyspace.
+"""
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "rec:ver:{product_id}"
+GLOBAL_VERSION_KEY = "rec:ver:global"
+# Фильтры, которые умеет применять чтение из предрасчитанной таблицы.
+SUPPORTED_FILTERS = {"category_id", "brand_id", "price_min", "price_max", "color"}
+
+
+def similar_cache_prefix(product_id: int) -> str:
+    """Key prefix of cached similar results; changes when the product is reindexed."""
+    versions = cache.get_many([GLOBAL_VERSION_KEY, VERSION_KEY.format(product_id=product_id)])
+    return "rec:similar:{}:v{}.{}".format(
+        product_id,
+        versions.get(GLOBAL_VERSION_KEY, 0),
+        versions.get(VERSION_KEY.format(product_id=product_id), 0),
+    )
+
+
+def bump_similar_cache_versions(product_ids: Iterable[int]) -> None:
+    """Invalidate cached similar results of the products (old keys expire by TTL)."""
+    version = time.time_ns()
+    keys = {VERSION_KEY.format(product_id=product_id): version for product_id in product_ids}
+    if keys:
+        cache.set_many(keys, None)
+
+
+def bump_global_similar_cache_version() -> None:
+    cache.set(GLOBAL_VERSION_KEY, time.time_ns(), None)
+
+
+def mark_stale(product_ids: Iterable[int]) -> int:
+    """Mark rows of the products and rows listing them as neighbours for refresh."""
+    from apps.recommendations.models import SimilarProducts
+
+    ids = list(product_ids)
+    if not ids:
+        return 0
+    # Уже помеченные строки тоже получают новое время: расчёт мог начаться до этой пометки.
+    return SimilarProducts.objects.filter(
+        Q(product_id__in=ids) | Q(neighbor_ids__overlap=ids),
+    ).update(is_stale=True, stale_at=timezone.now())
+
+
+def _top_n() -> int:
+    return int(getattr(settings, "RECSYS_SIMILAR_TOP_N", 50))
+
+
+def compute_neighbors(engine, product_ids: List[int], vector_type: str = "combined", top_n: Optional[int] = None):
+    """Top-N neighbours for a batch of products: one retrieve + one batched query."""
+    from qdrant_client.http import models as qmodels
+    from apps.recommendations.models import SimilarProducts
+    from .collection_migration import search_params
+
+    top_n = top_n or _top_n()
+    vectors = engine.get_vectors(product_ids, vector_type=vector_type)
+    ids = [product_id for product_id in product_ids if product_id in vectors]
+    if not ids:
+        return []
+    responses = engine.client.query_batch_points(
+        collection_name=engine.COLLECTION_NAME,
+        requests=[
+            qmodels.QueryRequest(
+                query=vectors[product_id],
+                using=vector_type,
+                filter=engine._build_filter(exclude_product_id=product_id),
+                limit=top_n + 1,
+                with_payload=["category_id", "brand_id", "price", "color"],
+                params=search_params(),
+            )
+            for product_id in ids
+        ],
+    )
+    now = timezone.now()
+    rows = []
+    for product_id, response in zip(ids, responses):
+        neighbor_ids, scores, attributes = [], [], []
+        for hit in getattr(response, "points", response):
+            if hit.id == product_id:
+                continue
+            payload = hit.payload or {}
+            neighbor_ids.append(int(hit.id))
+            scores.append(round(float(hit.score or 0), 4))
+            attributes.append([
+                payload.get("category_id") or 0,
+                payload.get("brand_id") or 0,
+                float(payload.get("price") or 0),
+                payload.get("color") or "unknown",
+            ])
+        rows.append(SimilarProducts(
+            product_id=product_id,
+            vector_type=vector_type,
+            neighbor_ids=neighbor_ids[:top_n],
+            scores=scores[:top_n],
+            attributes=attributes[:top_n],
+            is_stale=False,
+            computed_at=now,
+        ))
+    return rows
+
+
+def refresh_similar_products(
+    engine=None,
+    batch_size: int = 64,
+    max_products: Optional[int] = None,
+    vector_type: str = "combined",
+) -> Dict[str, int]:
+    """Compute rows for active products without a row or with a stale one."""
+    from apps.recommendations.models import ProductVector, SimilarProducts
+
+    active = ProductVector.objects.filter(is_active=True).values("product_id")
+    # Строки снятых с продажи товаров больше не нужны.
+    deleted, _ = SimilarProducts.objects.filter(vector_type=vector_type).exclude(product_id__in=active).delete()
+
+    existing = SimilarProducts.objects.filter(vector_type=vector_type)
+    stale_ids = list(
+        existing.filter(is_stale=True).order_by("product_id").values_list("product_id", flat=True)[:max_products]
+    )
+    missing_ids = list(
+        ProductVector.objects.filter(is_active=True)
+        .exclude(product_id__in=existing.values("product_id"))
+        .order_by("product_id")
+        .values_list("product_id", flat=True)[:max_products]
+    )
+    todo = stale_ids + missing_ids
+    if max_products is not None:
+        todo = todo[:max_products]
+    if not todo:
+        return {"refreshed": 0, "deleted": deleted}
+    if engine is None:
+        from .qdrant_registry import get_recommendation_engine
+        engine = get_recommendation_engine()
+
+    refreshed = 0
+    for offset in range(0, len(todo), batch_size):
+        started = timezone.now()
+        rows = compute_neighbors(engine, todo[offset : offset + batch_size], vector_type=vector_type)
+        if not rows:
+            continue
+        # is_stale существующих строк не перезаписывается: пометка, сделанная во
+        # время расчёта, должна пережить эту запись.
+        SimilarProducts.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product", "vector_type"],
+            update_fields=["neighbor_ids", "scores", "attributes", "computed_at"],
+        )
+        SimilarProducts.objects.filter(
+            Q(stale_at__isnull=True) | Q(stale_at__lt=started),
+            vector_type=vector_type,
+            product_id__in=[row.product_id for row in rows],
+            is_stale=True,
+        ).update(is_stale=False, stale_at=None)
+        refreshed += len(rows)
+    return {"refreshed": refreshed, "deleted": deleted}
+
+
+def _matches(attributes: List[Any], filters: Dict[str, Any], exclude_brand_id: Optional[int]) -> bool:
+    category_id, brand_id, price, color = attributes
+    if exclude_brand_id is not None and brand_id == exclude_brand_id:
+        return False
+    if "category_id" in filters and category_id != filters["category_id"]:
+        return False
+    if "brand_id" in filters and brand_id != filters["brand_id"]:
+        return False
+    if "price_min" in filters and price < float(filters["price_min"]):
+        return False
+    if "price_max" in filters and price > float(filters["price_max"]):
+        return False
+    if "color" in filters and color != str(filters["color"]).lower():
+        return False
+    return True
+
+
+def get_precomputed_similar(
+    product_id: int,
+    vector_type: str = "combined",
+    n_results: int = 12,
+    filters: Optional[Dict[str, Any]] = None,
+    exclude_brand_id: Optional[int] = None,
+) -> Optional[List[Dict]]:
+    """
+    Neighbours from the table in find_similar format, or None when the row is
+    missing/stale or the filters leave fewer than n_results of a truncated list.
+    """
+    from apps.recommendations.models import SimilarProducts
+
+    filters = filters or {}
+    if set(filters) - SUPPORTED_FILTERS:
+        return None
+    row = (
+        SimilarProducts.objects.filter(product_id=product_id, vector_type=vector_type, is_stale=False)
+        .values_list("neighbor_ids", "scores", "attributes")
+        .first()
+    )
+    if row is None:
+        return None
+    neighbor_ids, scores, attributes = row
+    similar = []
+    for neighbor_id, score, attrs in zip(neighbor_ids, scores, attributes):
+        if not _matches(attrs, filters, exclude_brand_id):
+            continue
+        similar.append({
+            "product_id": neighbor_id,
+            "score": score,
+            "payload": {
+                "category_id": attrs[0], "brand_id": attrs[1], "price": attrs[2], "color": attrs[3],
+            },
+            "vector_type": vector_type,
+        })
+        if len(similar) == n_results:
+            return similar
+    # Список обрезан по top_n — после фильтрации могли потеряться подходящие соседи.
+    if len(neighbor_ids) >= _top_n():
+        return None
+    return similar
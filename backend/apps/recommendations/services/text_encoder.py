@@ -1,8 +1,15 @@
-"""Text encoder for recommendations (sentence-transformers, 384-dim)."""
+"""Text encoder for recommendations (sentence-transformers, 384-dim).
+
+With ML_SERVICE_URL set the model is not loaded in-process: batches go to
+ml_service (services.ml_client).
+"""
 import logging
-from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from django.conf import settings
+
+from . import ml_client
+
 logger = logging.getLogger(__name__)
 
 TEXT_VECTOR_SIZE = 384
@@ -10,8 +17,10 @@ TEXT_VECTOR_SIZE = 384
 
 class TextEncoder:
     """Encode text to vectors. Multilingual model (Russian, Turkish)."""
+    MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     _instance = None
     _model = None
+    _remote = False
 
     def __new__(cls):
         if cls._instance is None:
@@ -19,12 +28,17 @@ class TextEncoder:
         return cls._instance
 
     def __init__(self):
-        if TextEncoder._model is None:
-            self._load_model()
+        if TextEncoder._model is None and not TextEncoder._remote:
+            if ml_client.is_enabled():
+                TextEncoder._remote = True
+                logger.info("Text encoder: using ml_service at %s", settings.ML_SERVICE_URL)
+            else:
+                self._load_model()
 
     def _load_model(self):
+        from sentence_transformers import SentenceTransformer
         logger.info("Loading text encoder model...")
-        model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+        model_name = self.MODEL_NAME
         TextEncoder._model = SentenceTransformer(model_name)
         logger.info("Text encoder loaded: %s", model_name)
 
@@ -32,11 +46,18 @@ class TextEncoder:
     def model(self):
         return TextEncoder._model
 
+    @property
+    def cache_model_name(self) -> str:
+        """EmbeddingCache model name: the model plus the encoder variant producing vectors."""
+        return f"{self.MODEL_NAME}@{ml_client.variant('text') if TextEncoder._remote else 'fp32'}"
+
     def encode(self, text: str) -> np.ndarray:
         """Encode text to 384-dim vector."""
         if not text or not str(text).strip():
             return np.zeros(TEXT_VECTOR_SIZE, dtype=np.float32)
         text = str(text)[:2000]
+        if TextEncoder._remote:
+            return ml_client.embed_texts([text])[0]
         embedding = self.model.encode(
             text,
             convert_to_numpy=True,
@@ -47,6 +68,8 @@ class TextEncoder:
     def encode_batch(self, texts: list) -> np.ndarray:
         """Encode a batch of texts."""
         texts = [ (t[:2000] if t else "") for t in texts ]
+        if TextEncoder._remote:
+            return ml_client.embed_texts(texts)
         embeddings = self.model.encode(
             texts,
             convert_to_numpy=True,
@@ -0,0 +1,294 @@
+"""Incremental user preference profiles from RecommendationEvent micro-batches.
+
+Each run reads events after the cursor stored in EventStreamCursor (plus an
+overlap window, so events committed out of id order are not lost), fetches
+the involved product vectors from Qdrant in one request and folds the events
+into UserEmbedding as an exponentially decayed weighted mean:
+
+    W' = W * decay + w
+    v' = (v * W * decay + w * x) / W'
+
+where decay = 0.5 ** (dt / half_life). The same update keeps category shares
+and the average viewed price. The cost is O(new events), with no rescan of history.
+Events without a user go to the session profile (UserEmbedding.session_id).
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CURSOR_NAME = "user-embeddings"
+# Показ рекомендаций на странице товара = просмотр исходного товара.
+VIEW_WEIGHT = 1.0
+EVENT_WEIGHTS = {
+    "click": 1.5,
+    "cart_add": 4.0,
+    "purchase": 8.0,
+}
+MIN_CATEGORY_SHARE = 0.01
+
+# (event_id, product_id, weight, created_at)
+Signal = Tuple[int, int, float, Any]
+# ("user", user_id) или ("session", session_id)
+ProfileKey = Tuple[str, Any]
+
+
+def event_signal(event: Dict[str, Any]) -> Optional[Tuple[int, float]]:
+    """Product and weight an event contributes to the profile."""
+    if event["event_type"] == "impression":
+        return event["source_product_id"], VIEW_WEIGHT
+    weight = EVENT_WEIGHTS.get(event["event_type"])
+    if weight is None:
+        return None
+    return event["recommended_product_id"], weight
+
+
+def visitor_session_id(request) -> str:
+    """Key of an anonymous visitor's events and profile: Django session or guest-cart token."""
+    session_key = getattr(getattr(request, "session", None), "session_key", None)
+    if session_key:
+        return session_key
+    # Гостевая корзина в Redis не создаёт django_session — берём её токен.
+    from apps.orders.guest_cart import read_token
+    from apps.recommendations.models import RecommendationEvent
+    max_length = RecommendationEvent._meta.get_field("session_id").max_length
+    return (read_token(request) or "")[:max_length]
+
+
+def _half_life_seconds() -> float:
+    return float(getattr(settings, "RECSYS_PROFILE_HALF_LIFE_DAYS", 14)) * 86400
+
+
+def _cursor_overlap() -> int:
+    return max(0, int(getattr(settings, "RECSYS_PROFILE_CURSOR_OVERLAP", 500)))
+
+
+def _seen_events(profile, overlap: int) -> Tuple[int, Set[int]]:
+    """Events the profile already holds: every id <= floor plus the ids in the returned set."""
+    recent = set(getattr(profile, "recent_event_ids", None) or [])
+    # Профиль без recent_event_ids (до перечитывания окна) знает только last_event_id.
+    floor = profile.last_event_id - overlap if recent else profile.last_event_id
+    return floor, recent
+
+
+def apply_events(profile, signals: Iterable[Signal], vectors, prices, categories, overlap: int = 0) -> int:
+    """
+    Fold signals not yet seen by the profile into it. Returns how many were applied.
+
+    Events within `overlap` ids below profile.last_event_id are applied unless
+    listed in profile.recent_event_ids (late commits from the cursor overlap window).
+    """
+    half_life = _half_life_seconds()
+    vector = (
+        np.asarray(profile.preference_vector, dtype=np.float64)
+        if profile.preference_vector
+        else None
+    )
+    total = float(profile.preference_weight or 0.0)
+    shares = {key: float(value) for key, value in (profile.category_weights or {}).items()}
+    avg_price = float(profile.avg_price_viewed) if profile.avg_price_viewed is not None else None
+    last_at = profile.last_event_at
+    floor, recent = _seen_events(profile, overlap)
+    applied = 0
+
+    for event_id, product_id, weight, created_at in sorted(signals, key=lambda item: item[0]):
+        if event_id <= floor or event_id in recent:
+            continue
+        decay = 1.0
+        if last_at is not None and created_at > last_at:
+            decay = 0.5 ** ((created_at - last_at).total_seconds() / half_life)
+        kept = total * decay
+        total = kept + weight
+
+        point = vectors.get(product_id)
+        if point is not None:
+            point = np.asarray(point, dtype=np.float64)
+            if vector is None or vector.shape != point.shape:
+                vector = point
+            else:
+                vector = (vector * kept + point * weight) / total
+
+        category = categories.get(product_id)
+        if category:
+            shares = {key: value * kept / total for key, value in shares.items()}
+            shares[category] = shares.get(category, 0.0) + weight / total
+
+        price = prices.get(product_id)
+        if price:
+            avg_price = price if avg_price is None else (avg_price * kept + price * weight) / total
+
+        last_at = created_at if last_at is None or created_at > last_at else last_at
+        profile.last_event_id = max(profile.last_event_id, event_id)
+        recent.add(event_id)
+        applied += 1
+
+    if not applied:
+        return 0
+    profile.preference_vector = vector.astype(np.float32).tolist() if vector is not None else profile.preference_vector
+    profile.preference_weight = total
+    profile.category_weights = {
+        key: round(value, 4) for key, value in sorted(shares.items(), key=lambda kv: -kv[1])
+        if value >= MIN_CATEGORY_SHARE
+    }
+    profile.avg_price_viewed = Decimal(str(round(avg_price, 2))) if avg_price is not None else None
+    profile.last_event_at = last_at
+    if overlap:
+        profile.recent_event_ids = sorted(i for i in recent if i > profile.last_event_id - overlap)
+    return applied
+
+
+def _load_cursor() -> int:
+    from apps.recommendations.models import EventStreamCursor, UserEmbedding
+
+    cursor = EventStreamCursor.objects.filter(name=CURSOR_NAME).values_list("last_event_id", flat=True).first()
+    if cursor is not None:
+        return cursor
+    # Первый запуск на существующих профилях — продолжаем с их максимума, а не с начала истории.
+    return UserEmbedding.objects.aggregate(last=Max("last_event_id"))["last"] or 0
+
+
+def _save_cursor(last_event_id: int) -> None:
+    from apps.recommendations.models import EventStreamCursor
+
+    EventStreamCursor.objects.update_or_create(name=CURSOR_NAME, defaults={"last_event_id": last_event_id})
+
+
+def _profile_key(event: Dict[str, Any]) -> Optional[ProfileKey]:
+    if event["user_id"]:
+        return ("user", event["user_id"])
+    if event["session_id"]:
+        return ("session", event["session_id"])
+    return None
+
+
+def _load_profiles(keys: Iterable[ProfileKey]) -> Dict[ProfileKey, Any]:
+    from apps.recommendations.models import UserEmbedding
+
+    user_ids = [value for kind, value in keys if kind == "user"]
+    session_ids = [value for kind, value in keys if kind == "session"]
+    profiles = {}
+    if user_ids:
+        profiles.update(
+            (("user", profile.user_id), profile)
+            for profile in UserEmbedding.objects.filter(user_id__in=user_ids)
+        )
+    if session_ids:
+        profiles.update(
+            (("session", profile.session_id), profile)
+            for profile in UserEmbedding.objects.filter(user__isnull=True, session_id__in=session_ids)
+        )
+    return profiles
+
+
+def process_new_events(batch_size: int = 2000, engine=None) -> Dict[str, Any]:
+    """Consume one micro-batch of events and update user and session profiles."""
+    from apps.catalog.models import Product
+    from apps.recommendations.models import RecommendationEvent, UserEmbedding
+
+    cursor = _load_cursor()
+    overlap = _cursor_overlap()
+    # Окно [cursor - overlap, cursor] перечитывается: события с меньшим id могли
+    # закоммититься позже прошлого прогона. Повторы отсекает recent_event_ids профиля.
+    events = list(
+        RecommendationEvent.objects.filter(id__gt=max(cursor - overlap, 0))
+        .order_by("id")
+        .values(
+            "id", "user_id", "session_id", "event_type", "source_product_id",
+            "recommended_product_id", "created_at",
+        )[:batch_size + overlap]
+    )
+    new_events = sum(1 for event in events if event["id"] > cursor)
+    if not new_events and not overlap:
+        return {"events": 0, "users": 0, "applied": 0}
+
+    signals: Dict[ProfileKey, List[Signal]] = defaultdict(list)
+    seen_views = set()
+    for event in events:
+        key = _profile_key(event)
+        signal = event_signal(event)
+        if key is None or signal is None:
+            continue
+        product_id, weight = signal
+        if event["event_type"] == "impression":
+            # Один показ блока пишет по строке на каждый рекомендованный товар.
+            view_key = (key, product_id)
+            if view_key in seen_views:
+                continue
+            seen_views.add(view_key)
+        signals[key].append((event["id"], product_id, weight, event["created_at"]))
+
+    profiles = _load_profiles(list(signals))
+    # Из окна перечитывания в работу идут только ещё не учтённые профилем события.
+    pending = {}
+    for key, rows in signals.items():
+        if key in profiles:
+            rows = _unseen(profiles[key], rows, overlap)
+        if rows:
+            pending[key] = rows
+    product_ids = {signal[1] for rows in pending.values() for signal in rows}
+    vectors = {}
+    if product_ids:
+        try:
+            if engine is None:
+                from .qdrant_registry import get_recommendation_engine
+                engine = get_recommendation_engine()
+            vectors = engine.get_vectors(sorted(product_ids), vector_type="combined")
+        except Exception as e:
+            # Курсор не двигаем: батч повторится, когда Qdrant станет доступен.
+            logger.warning("User embeddings: product vectors unavailable, batch deferred: %s", e)
+            return {"events": 0, "users": 0, "applied": 0, "status": "vectors_unavailable"}
+    prices, categories = {}, {}
+    for product_id, price, category_slug in Product.objects.filter(id__in=product_ids).values_list(
+        "id", "price", "category__slug"
+    ):
+        if price is not None:
+            prices[product_id] = float(price)
+        if category_slug:
+            categories[product_id] = category_slug
+
+    to_update, to_create = [], []
+    applied = 0
+    now = timezone.now()
+    for key, profile_signals in pending.items():
+        profile = profiles.get(key)
+        is_new = profile is None
+        if is_new:
+            kind, value = key
+            profile = UserEmbedding(
+                user_id=value if kind == "user" else None,
+                session_id=value if kind == "session" else "",
+                preference_vector=None,
+                category_weights={},
+            )
+        count = apply_events(profile, profile_signals, vectors, prices, categories, overlap=overlap)
+        if not count:
+            continue
+        applied += count
+        profile.last_updated = now
+        (to_create if is_new else to_update).append(profile)
+    if to_update:
+        UserEmbedding.objects.bulk_update(
+            to_update,
+            [
+                "preference_vector", "preference_weight", "category_weights", "avg_price_viewed",
+                "last_event_id", "recent_event_ids", "last_event_at", "last_updated",
+            ],
+        )
+    if to_create:
+        UserEmbedding.objects.bulk_create(to_create, ignore_conflicts=True)
+
+    if events and events[-1]["id"] > cursor:
+        _save_cursor(events[-1]["id"])
+    return {"events": new_events, "users": len(to_update) + len(to_create), "applied": applied}
+
+
+def _unseen(profile, signals: List[Signal], overlap: int) -> List[Signal]:
+    floor, recent = _seen_events(profile, overlap)
+    return [signal for signal in signals if signal[0] > floor and signal[0] not in recent]
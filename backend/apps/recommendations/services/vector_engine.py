@@ -1,10 +1,10 @@
 """Vector recommendation engine (Qdrant)."""
 from __future__ import annotations
 
+import copy
 import hashlib
 import logging
-import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 from django.conf import settings
@@ -14,14 +14,23 @@ from django.utils import timezone
 from apps.catalog.models import Product
 from apps.recommendations.models import ProductVector
 
+from .ml_client import encoder_backend
+from .collection_migration import (
+    adopt_legacy_collection,
+    create_collection,
+    migration_target,
+    new_collection_name,
+    resolve_alias,
+    search_params,
+    swap_alias,
+)
+
 logger = logging.getLogger(__name__)
 
 
 def _get_qdrant_client():
-    from qdrant_client import QdrantClient
-    host = os.environ.get("QDRANT_HOST", "qdrant")
-    port = int(os.environ.get("QDRANT_PORT", 6333))
-    return QdrantClient(host=host, port=port)
+    from .qdrant_registry import get_qdrant_client
+    return get_qdrant_client()
 
 
 class QdrantRecommendationEngine:
@@ -29,62 +38,53 @@ class QdrantRecommendationEngine:
     Vector recommendation engine on Qdrant.
     Supports text, image, and combined vectors.
     """
-    COLLECTION_NAME = "product_recommendations"
+    # Алиас на версионированную физическую коллекцию (см. collection_migration).
+    COLLECTION_NAME = "product_recommendations_live"
+    # Физическая коллекция схемы до алиасов; подхватывается алиасом при bootstrap.
+    LEGACY_COLLECTION_NAME = "product_recommendations"
     TEXT_VECTOR_SIZE = 384
     IMAGE_VECTOR_SIZE = 512
     COMBINED_VECTOR_SIZE = 512  # weighted average of normalized text (padded) + image
+    PRODUCT_VECTOR_SYNC_FIELDS = [
+        "qdrant_id", "category_id", "price", "brand_id", "color", "is_active", "last_synced", "updated_at",
+    ]
 
-    def __init__(self):
-        self.client = _get_qdrant_client()
-        self._ensure_collection_exists()
+    def __init__(self, client=None):
+        from .qdrant_registry import ensure_bootstrapped
+        self.client = client if client is not None else _get_qdrant_client()
+        ensure_bootstrapped(f"recommendations:{self.COLLECTION_NAME}", self._ensure_collection_exists)
 
     def _ensure_collection_exists(self):
         try:
-            from qdrant_client.http import models as qmodels
-            existing = [c.name for c in self.client.get_collections().collections]
-            if self.COLLECTION_NAME not in existing:
-                self._create_collection()
-                logger.info("Created Qdrant collection: %s", self.COLLECTION_NAME)
+            existing = {c.name for c in self.client.get_collections().collections}
+            if self.COLLECTION_NAME in existing:
+                return
+            if resolve_alias(self.client, self.COLLECTION_NAME) is None:
+                if adopt_legacy_collection(self.client, type(self)) is None:
+                    self._create_collection()
         except Exception as e:
             logger.error("Failed to check/create collection: %s", e)
             raise
 
     def _create_collection(self):
-        from qdrant_client.http import models as qmodels
-        self.client.create_collection(
-            collection_name=self.COLLECTION_NAME,
-            vectors_config={
-                "text": qmodels.VectorParams(
-                    size=self.TEXT_VECTOR_SIZE,
-                    distance=qmodels.Distance.COSINE,
-                ),
-                "image": qmodels.VectorParams(
-                    size=self.IMAGE_VECTOR_SIZE,
-                    distance=qmodels.Distance.COSINE,
-                ),
-                "combined": qmodels.VectorParams(
-                    size=self.COMBINED_VECTOR_SIZE,
-                    distance=qmodels.Distance.COSINE,
-                ),
-            },
-        )
-        for field, schema in [("category_id", "integer"), ("price", "float"), ("is_active", "bool")]:
-            try:
-                self.client.create_payload_index(
-                    collection_name=self.COLLECTION_NAME,
-                    field_name=field,
-                    field_schema=schema,
-                )
-            except Exception as e:
-                logger.warning("Payload index %s: %s", field, e)
+        """Versioned collection (int8 quantization, payload indexes) behind the alias."""
+        name = new_collection_name(self.COLLECTION_NAME)
+        create_collection(self.client, name, type(self))
+        swap_alias(self.client, self.COLLECTION_NAME, name)
+        logger.info("Created Qdrant collection %s (alias %s)", name, self.COLLECTION_NAME)
+
+    def for_collection(self, collection_name: str) -> "QdrantRecommendationEngine":
+        """The same engine writing to another physical collection (blue/green reindex)."""
+        engine = copy.copy(self)
+        engine.COLLECTION_NAME = collection_name
+        return engine
 
     def _product_payload(self, product: Product, image_url: Optional[str] = None) -> Dict[str, Any]:
         if image_url is None:
             image_url = product.main_image or ""
             if not image_url and hasattr(product, "images"):
-                first = product.images.filter(image_url__isnull=False).exclude(image_url="").first()
-                if first:
-                    image_url = first.image_url or ""
+                # .all() uses prefetch_related("images") when the caller did it.
+                image_url = next((img.image_url for img in product.images.all() if img.image_url), "")
         return {
             "product_id": product.id,
             "title": product.name,
@@ -97,6 +97,7 @@ class QdrantRecommendationEngine:
             "is_active": product.is_available,
             "created_at": product.created_at.isoformat() if product.created_at else None,
             "image_url": image_url or None,
+            "encoder": encoder_backend(),
         }
 
     def _extract_color(self, product: Product) -> str:
@@ -129,64 +130,104 @@ class QdrantRecommendationEngine:
             return combined.tolist()
         return image_vector
 
-    def upsert_product(
+    def _build_point(
         self,
         product: Product,
         text_vector: List[float],
         image_vector: Optional[List[float]] = None,
         combined_vector: Optional[List[float]] = None,
-    ) -> bool:
+    ):
         from qdrant_client.http import models as qmodels
         payload = self._product_payload(product)
-        if combined_vector is None and image_vector is not None:
-            combined_vector = self._compute_combined_vector(text_vector, image_vector)
-        vectors = {"text": text_vector}
-        if image_vector is not None:
-            vectors["image"] = image_vector
-        if combined_vector is not None:
-            vectors["combined"] = combined_vector
-        else:
+        if combined_vector is None:
             combined_vector = self._compute_combined_vector(
                 text_vector,
-                image_vector or list(np.zeros(self.IMAGE_VECTOR_SIZE, dtype=np.float32)),
+                image_vector if image_vector is not None
+                else list(np.zeros(self.IMAGE_VECTOR_SIZE, dtype=np.float32)),
             )
-            vectors["combined"] = combined_vector
-        point = qmodels.PointStruct(
-            id=product.id,
-            vector=vectors,
-            payload=payload,
-        )
-        self.client.upsert(
-            collection_name=self.COLLECTION_NAME,
-            points=[point],
+        vectors = {"text": text_vector, "combined": combined_vector}
+        if image_vector is not None:
+            vectors["image"] = image_vector
+        return qmodels.PointStruct(id=product.id, vector=vectors, payload=payload)
+
+    def upsert_product(
+        self,
+        product: Product,
+        text_vector: List[float],
+        image_vector: Optional[List[float]] = None,
+        combined_vector: Optional[List[float]] = None,
+    ) -> bool:
+        return self.upsert_products([(product, text_vector, image_vector, combined_vector)])
+
+    def upsert_products(
+        self,
+        items: List[Tuple[Product, List[float], Optional[List[float]], Optional[List[float]]]],
+    ) -> bool:
+        """
+        Upsert a batch of (product, text_vector, image_vector, combined_vector):
+        one Qdrant request, bulk ProductVector sync, one cache invalidation pass.
+        """
+        if not items:
+            return True
+        if self.indexing_paused():
+            # Идёт blue/green миграция: last_synced не обновляется, товары
+            # переиндексируются в новую коллекцию после переключения алиаса.
+            logger.info("Upsert of %d products deferred: collection migration in progress", len(items))
+            return False
+        points = [self._build_point(*item) for item in items]
+        self.client.upsert(collection_name=self.COLLECTION_NAME, points=points)
+        products = [item[0] for item in items]
+        self._sync_product_vectors(products, [point.payload for point in points])
+        from .rerank_features import build_features
+        build_features([product.id for product in products])
+        self._invalidate_similar_cache_many([product.id for product in products])
+        return True
+
+    def indexing_paused(self) -> bool:
+        return migration_target(self.COLLECTION_NAME) is not None
+
+    def _sync_product_vectors(self, products: List[Product], payloads: List[Dict[str, Any]]) -> None:
+        now = timezone.now()
+        existing = ProductVector.objects.in_bulk(
+            [product.id for product in products], field_name="product_id"
         )
-        ProductVector.objects.update_or_create(
-            product=product,
-            defaults={
+        to_update, to_create = [], []
+        for product, payload in zip(products, payloads):
+            values = {
                 "qdrant_id": str(product.id),
                 "category_id": product.category_id,
                 "price": product.price,
                 "brand_id": product.brand_id,
                 "color": payload["color"],
                 "is_active": product.is_available,
-                "last_synced": timezone.now(),
-            },
-        )
-        self._invalidate_similar_cache(product.id)
-        return True
+                "last_synced": now,
+                "updated_at": now,
+            }
+            row = existing.get(product.id)
+            if row is None:
+                to_create.append(ProductVector(product=product, **values))
+                continue
+            for field_name, value in values.items():
+                setattr(row, field_name, value)
+            to_update.append(row)
+        if to_update:
+            ProductVector.objects.bulk_update(to_update, self.PRODUCT_VECTOR_SYNC_FIELDS)
+        if to_create:
+            ProductVector.objects.bulk_create(to_create)
 
     def _invalidate_similar_cache(self, product_id: int) -> None:
-        """Сбрасывает кэш похожих товаров и no_vector после индексации."""
-        import redis
-        from django.conf import settings
+        self._invalidate_similar_cache_many([product_id])
+
+    def _invalidate_similar_cache_many(self, product_ids: List[int]) -> None:
+        """Новые версии ключей кэша похожих товаров + пометка предрасчёта на обновление."""
+        from .similar_index import bump_similar_cache_versions, mark_stale
+        if not product_ids:
+            return
         try:
-            redis_url = getattr(settings, "REDIS_URL", "redis://localhost:6379/0")
-            client = redis.from_url(redis_url)
-            for pattern in (f"*rec:similar:{product_id}:*", f"*rec:no_vector:{product_id}:*"):
-                for key in client.scan_iter(match=pattern, count=50):
-                    client.delete(key)
+            bump_similar_cache_versions(product_ids)
         except Exception as e:
-            logger.warning("Failed to invalidate similar cache for product %s: %s", product_id, e)
+            logger.warning("Failed to invalidate similar cache for products %s: %s", sorted(product_ids), e)
+        mark_stale(product_ids)
 
     def _build_filter(
         self,
@@ -203,6 +244,7 @@ class QdrantRecommendationEngine:
                 match=qmodels.MatchValue(value=True),
             )
         )
+        must.append(self._encoder_condition())
         if exclude_product_id is not None:
             must_not.append(
                 qmodels.FieldCondition(
@@ -248,6 +290,18 @@ class QdrantRecommendationEngine:
                 )
         return qmodels.Filter(must=must, must_not=must_not) if (must or must_not) else None
 
+    def _encoder_condition(self):
+        """Only points built by the current encoder backend (ml_client.encoder_backend)."""
+        from qdrant_client.http import models as qmodels
+        backend = encoder_backend()
+        condition = qmodels.FieldCondition(key="encoder", match=qmodels.MatchValue(value=backend))
+        if backend != "local":
+            return condition
+        # Точки без поля encoder записаны до появления ml_service — локальными моделями.
+        return qmodels.Filter(
+            should=[condition, qmodels.IsEmptyCondition(is_empty=qmodels.PayloadField(key="encoder"))],
+        )
+
     def _get_product_vector(self, product_id: int, vector_type: str) -> Optional[List[float]]:
         try:
             result = self.client.retrieve(
@@ -275,11 +329,33 @@ class QdrantRecommendationEngine:
         filters: Optional[Dict] = None,
         exclude_same_brand: bool = False,
     ) -> List[Dict]:
-        cache_key = f"rec:similar:{product_id}:{vector_type}:{hashlib.md5(str(sorted((filters or {}).items())).encode()).hexdigest()}"
+        from .similar_index import get_precomputed_similar, similar_cache_prefix
+        # Кэш проверяется до запросов бренда и предрасчитанной таблицы; бренд
+        # определяется товаром, поэтому в ключе достаточно флага.
+        prefix = similar_cache_prefix(product_id)
+        cache_key = (
+            f"{prefix}:{vector_type}:{n_results}:{int(exclude_same_brand)}:"
+            f"{hashlib.md5(str(sorted((filters or {}).items())).encode()).hexdigest()}"
+        )
         cached = cache.get(cache_key)
         if cached is not None:
             return cached
-        no_vector_key = f"rec:no_vector:{product_id}:{vector_type}"
+        exclude_brand_id = None
+        if exclude_same_brand:
+            brand_id = Product.objects.filter(pk=product_id).values_list("brand_id", flat=True).first()
+            if brand_id is not None:
+                exclude_brand_id = brand_id
+        precomputed = get_precomputed_similar(
+            product_id,
+            vector_type=vector_type,
+            n_results=n_results,
+            filters=filters,
+            exclude_brand_id=exclude_brand_id,
+        )
+        if precomputed is not None:
+            cache.set(cache_key, precomputed, 1800)
+            return precomputed
+        no_vector_key = f"{prefix}:no_vector:{vector_type}"
         if cache.get(no_vector_key) is not None:
             return []
         target_vector = self._get_product_vector(product_id, vector_type)
@@ -287,11 +363,6 @@ class QdrantRecommendationEngine:
             logger.warning("No vector found for product %s", product_id)
             cache.set(no_vector_key, 1, 3600)
             return []
-        exclude_brand_id = None
-        if exclude_same_brand:
-            brand_id = Product.objects.filter(pk=product_id).values_list("brand_id", flat=True).first()
-            if brand_id is not None:
-                exclude_brand_id = brand_id
         qfilter = self._build_filter(
             filters=filters,
             exclude_product_id=product_id,
@@ -304,6 +375,7 @@ class QdrantRecommendationEngine:
                 limit=n_results + 1,
                 query_filter=qfilter,
                 using=vector_type if vector_type in ("text", "image", "combined") else None,
+                search_params=search_params(),
             )
         except TypeError:
             results = self.client.query_points(
@@ -329,6 +401,113 @@ class QdrantRecommendationEngine:
         cache.set(cache_key, similar[:n_results], 1800)
         return similar[:n_results]
 
+    def _get_product_vectors(self, product_id: int) -> Dict[str, List[float]]:
+        """All named vectors of a point in one retrieve."""
+        try:
+            result = self.client.retrieve(
+                collection_name=self.COLLECTION_NAME,
+                ids=[product_id],
+                with_vectors=True,
+            )
+        except Exception as e:
+            logger.error("Error retrieving vectors for %s: %s", product_id, e)
+            return {}
+        if not result:
+            return {}
+        vectors = getattr(result[0], "vector", None)
+        if isinstance(vectors, dict):
+            return vectors
+        return {"combined": vectors} if vectors is not None else {}
+
+    def get_vectors(self, product_ids: List[int], vector_type: str = "combined") -> Dict[int, List[float]]:
+        """Named vector of many points in one retrieve (only the requested vector)."""
+        if not product_ids:
+            return {}
+        result = self.client.retrieve(
+            collection_name=self.COLLECTION_NAME,
+            ids=list(product_ids),
+            with_vectors=[vector_type],
+        )
+        vectors = {}
+        for point in result or []:
+            vector = getattr(point, "vector", None)
+            if isinstance(vector, dict):
+                vector = vector.get(vector_type)
+            if vector is not None:
+                vectors[int(point.id)] = vector
+        return vectors
+
+    def find_similar_batch(
+        self,
+        product_id: int,
+        queries: List[Dict[str, Any]],
+    ) -> Dict[str, List[Dict]]:
+        """
+        Several filtered similarity queries for one product in a single
+        query_batch_points request. queries: [{"key", "vector_type",
+        "n_results", "filters"}]; returns {key: [match, ...]}.
+        """
+        if not queries:
+            return {}
+        spec = sorted(
+            (q["key"], q.get("vector_type", "combined"), int(q.get("n_results", 12)),
+             sorted((q.get("filters") or {}).items()))
+            for q in queries
+        )
+        from .similar_index import similar_cache_prefix
+        prefix = similar_cache_prefix(product_id)
+        cache_key = f"{prefix}:batch:{hashlib.md5(str(spec).encode()).hexdigest()}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        empty = {q["key"]: [] for q in queries}
+        # Keyed by the requested vector types: a point lacking "image" must not
+        # hide its "combined" neighbours from another batch.
+        vector_types = sorted({q.get("vector_type", "combined") for q in queries})
+        no_vector_key = f"{prefix}:no_vector:{','.join(vector_types)}"
+        if cache.get(no_vector_key) is not None:
+            return empty
+        vectors = self._get_product_vectors(product_id)
+        from qdrant_client.http import models as qmodels
+        requests, keys = [], []
+        for query in queries:
+            vector_type = query.get("vector_type", "combined")
+            target_vector = vectors.get(vector_type)
+            if target_vector is None:
+                continue
+            n_results = int(query.get("n_results", 12))
+            requests.append(qmodels.QueryRequest(
+                query=target_vector,
+                using=vector_type,
+                filter=self._build_filter(filters=query.get("filters"), exclude_product_id=product_id),
+                limit=n_results + 1,
+                with_payload=True,
+                params=search_params(),
+            ))
+            keys.append((query["key"], vector_type, n_results))
+        if not requests:
+            logger.warning("No vector found for product %s", product_id)
+            cache.set(no_vector_key, 1, 3600)
+            return empty
+        responses = self.client.query_batch_points(
+            collection_name=self.COLLECTION_NAME,
+            requests=requests,
+        )
+        results = dict(empty)
+        for (key, vector_type, n_results), response in zip(keys, responses):
+            results[key] = [
+                {
+                    "product_id": getattr(hit, "id", hit),
+                    "score": round(float(getattr(hit, "score", 0) or 0), 4),
+                    "payload": getattr(hit, "payload", None) or {},
+                    "vector_type": vector_type,
+                }
+                for hit in getattr(response, "points", response)
+                if getattr(hit, "id", hit) != product_id
+            ][:n_results]
+        cache.set(cache_key, results, 1800)
+        return results
+
     def find_similar_by_image(
         self,
         image_url: str,
@@ -348,6 +527,7 @@ class QdrantRecommendationEngine:
                 limit=n_results,
                 query_filter=qfilter,
                 using="image",
+                search_params=search_params(),
             )
         except TypeError:
             results = self.client.query_points(
@@ -373,9 +553,10 @@ class QdrantRecommendationEngine:
         n_results: int = 20,
         filters: Optional[Dict] = None,
     ) -> List[Dict]:
+        from .embedding_cache import encode_texts_cached
         from .text_encoder import TextEncoder
         encoder = TextEncoder()
-        query_vector = encoder.encode(query).tolist()
+        query_vector = encode_texts_cached(encoder, [query])[0].tolist()
         qfilter = self._build_filter(filters=filters)
         try:
             results = self.client.query_points(
@@ -384,6 +565,7 @@ class QdrantRecommendationEngine:
                 limit=n_results,
                 query_filter=qfilter,
                 using="text",
+                search_params=search_params(),
             )
         except TypeError:
             results = self.client.query_points(
@@ -419,7 +601,8 @@ class QdrantRecommendationEngine:
                     match=qmodels.MatchValue(value=pid),
                 )
             )
-        qfilter = qmodels.Filter(must=[qmodels.FieldCondition(key="is_active", match=qmodels.MatchValue(value=True))], must_not=must_not) if must_not else self._build_filter(filters=None)
+        qfilter = self._build_filter(filters=None)
+        qfilter.must_not = must_not
         try:
             results = self.client.query_points(
                 collection_name=self.COLLECTION_NAME,
@@ -427,6 +610,7 @@ class QdrantRecommendationEngine:
                 limit=n_results * 2,
                 query_filter=qfilter,
                 using="combined",
+                search_params=search_params(),
             )
         except TypeError:
             results = self.client.query_points(
@@ -446,15 +630,18 @@ class QdrantRecommendationEngine:
         ]
 
     def delete_product(self, product_id: int) -> None:
-        try:
-            from qdrant_client.http import models as qmodels
-            self.client.delete(
-                collection_name=self.COLLECTION_NAME,
-                points_selector=qmodels.PointIdsList(points=[product_id]),
-            )
-        except Exception as e:
-            logger.warning("Qdrant delete product %s: %s", product_id, e)
+        from qdrant_client.http import models as qmodels
+        # Во время миграции удаление применяется и к заполняемой коллекции.
+        for collection_name in filter(None, (self.COLLECTION_NAME, migration_target(self.COLLECTION_NAME))):
+            try:
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=qmodels.PointIdsList(points=[product_id]),
+                )
+            except Exception as e:
+                logger.warning("Qdrant delete product %s from %s: %s", product_id, collection_name, e)
         ProductVector.objects.filter(product_id=product_id).delete()
+        self._invalidate_similar_cache_many([product_id])
 
     def get_collection_stats(self) -> Dict[str, Any]:
         info = self.client.get_collection(self.COLLECTION_NAME)
@@ -1,4 +1,5 @@
 """Celery tasks for recommendations (indexing, event logging)."""
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 import logging
 
@@ -30,7 +31,8 @@ def _working_product_image_url(product):
         except Exception:
             pass
 
-    first_img = product.images.exclude(image_file="").first()
+    # .all() берёт prefetch_related("images"), без лишнего запроса на товар.
+    first_img = next((img for img in product.images.all() if img.image_file), None)
     image_file = getattr(first_img, "image_file", None) if first_img else None
     image_name = getattr(image_file, "name", "") or ""
     try:
@@ -41,20 +43,102 @@ def _working_product_image_url(product):
     return ""
 
 
+def _product_embedding_text(product):
+    return " ".join(
+        filter(
+            None,
+            [
+                product.name,
+                product.description or "",
+                product.category.name if product.category else "",
+            ],
+        )
+    )
+
+
+def _prepare_image_inputs(pool, products):
+    """
+    Resolve image URLs and start downloading image files in the pool, so the
+    next chunk downloads while the current one is being encoded.
+    """
+    from .services.image_encoder import fetch_image_bytes
+
+    urls = list(pool.map(_working_product_image_url, products))
+    return [pool.submit(fetch_image_bytes, url) if url else None for url in urls]
+
+
+def _encode_and_upsert_chunk(products, downloads, engine, text_encoder, image_encoder):
+    from .services import embedding_cache, ml_client
+    from .services.image_encoder import decode_image
+
+    text_vectors = embedding_cache.encode_texts_cached(
+        text_encoder, [_product_embedding_text(product) for product in products]
+    )
+
+    blobs = []
+    for product, download in zip(products, downloads):
+        try:
+            blobs.append(download.result() if download is not None else None)
+        except Exception as e:
+            logger.warning("Failed to load image for product %s: %s", product.id, e)
+            blobs.append(None)
+    # CLIP-вектор кэшируется по содержимому файла: подменённое по тому же URL
+    # изображение пересчитывается, а одинаковые файлы по разным URL — нет.
+    keys = [embedding_cache.bytes_hash(blob) if blob else "" for blob in blobs]
+    cached = embedding_cache.get_many(image_encoder.cache_model_name, keys)
+    image_vectors = [cached.get(key) for key in keys]
+    images = [
+        decode_image(blob) if key and key not in cached else None
+        for key, blob in zip(keys, blobs)
+    ]
+    if any(image is not None for image in images):
+        try:
+            encoded = image_encoder.encode_images(images)
+        except ml_client.MLServiceError:
+            # Без image-векторов товары не индексируются: чанк уйдёт в errors и
+            # останется с устаревшим last_synced до следующей синхронизации.
+            raise
+        except Exception as e:
+            logger.warning("Batch image encoding failed for products %s: %s", [p.id for p in products], e)
+            encoded = [None] * len(products)
+        fresh = {}
+        for row, vector in enumerate(encoded):
+            if vector is not None:
+                image_vectors[row] = vector
+                fresh[keys[row]] = vector
+        embedding_cache.set_many(image_encoder.cache_model_name, fresh)
+
+    return engine.upsert_products([
+        (
+            product,
+            text_vectors[row].tolist(),
+            image_vectors[row].tolist() if image_vectors[row] is not None else None,
+            None,
+        )
+        for row, product in enumerate(products)
+    ])
+
+
 @shared_task(acks_late=False)
-def index_product_vectors(product_ids=None, batch_size=100):
+def index_product_vectors(product_ids=None, batch_size=100, collection_name=None):
     """
     Index products into Qdrant.
     If product_ids is None, select products without vector_data or with last_synced < updated_at.
+    collection_name: write into this physical collection instead of the live alias (blue/green reindex).
     """
     from apps.catalog.models import Product
+    from django.conf import settings
     from django.db.models import Q, F
-    from .models import ProductVector
-    from .services.vector_engine import QdrantRecommendationEngine
+    from .services.qdrant_registry import get_recommendation_engine
     from .services.text_encoder import TextEncoder
     from .services.image_encoder import CLIPEncoder
 
-    engine = QdrantRecommendationEngine()
+    engine = get_recommendation_engine()
+    if collection_name:
+        engine = engine.for_collection(collection_name)
+    elif engine.indexing_paused():
+        # Товары подхватит reindex_changed_since после миграции коллекции.
+        return {"indexed": 0, "errors": [], "remaining": 0, "status": "paused"}
     text_encoder = TextEncoder()
     image_encoder = CLIPEncoder()
 
@@ -93,39 +177,25 @@ def index_product_vectors(product_ids=None, batch_size=100):
         total_to_index = base_qs.count()
         queryset = base_qs[:batch_size]
 
+    products = list(queryset)
+    chunk_size = max(1, getattr(settings, "RECSYS_INDEX_CHUNK_SIZE", 32))
+    chunks = [products[start:start + chunk_size] for start in range(0, len(products), chunk_size)]
     total = 0
     errors = []
-    for product in queryset:
-        try:
-            text = " ".join(
-                filter(
-                    None,
-                    [
-                        product.name,
-                        product.description or "",
-                        product.category.name if product.category else "",
-                    ],
-                )
-            )
-            text_vector = text_encoder.encode(text).tolist()
-            image_vector = None
-            img_url = _working_product_image_url(product)
-            if img_url:
-                try:
-                    img_emb = image_encoder.encode_image_from_url(img_url)
-                    if img_emb is not None:
-                        image_vector = img_emb.tolist()
-                except Exception as e:
-                    logger.warning("Failed to encode image for product %s: %s", product.id, e)
-            engine.upsert_product(
-                product=product,
-                text_vector=text_vector,
-                image_vector=image_vector,
-            )
-            total += 1
-        except Exception as e:
-            errors.append({"product_id": product.id, "error": str(e)})
-            logger.exception("Index product %s failed", product.id)
+    # Конвейер: пока энкодеры считают текущий чанк, изображения следующего уже качаются.
+    # Векторы с неизменным входом (текст/изображение) берутся из EmbeddingCache.
+    with ThreadPoolExecutor(max_workers=max(1, getattr(settings, "RECSYS_IMAGE_FETCH_WORKERS", 8))) as pool:
+        prepared = _prepare_image_inputs(pool, chunks[0]) if chunks else None
+        for index, chunk in enumerate(chunks):
+            current = prepared
+            if index + 1 < len(chunks):
+                prepared = _prepare_image_inputs(pool, chunks[index + 1])
+            try:
+                if _encode_and_upsert_chunk(chunk, current, engine, text_encoder, image_encoder):
+                    total += len(chunk)
+            except Exception as e:
+                errors.extend({"product_id": product.id, "error": str(e)} for product in chunk)
+                logger.exception("Index products %s failed", [product.id for product in chunk])
 
     return {
         "indexed": total,
@@ -150,7 +220,7 @@ def sync_all_products_to_qdrant():
         )
     )
     total = base_qs.count()
-    batch_size = 25
+    batch_size = 100
     batches = (total // batch_size) + 1
     for offset in range(0, total, batch_size):
         ids = list(
@@ -161,7 +231,7 @@ def sync_all_products_to_qdrant():
 
 
 @shared_task(acks_late=False)
-def sync_stale_products_to_qdrant(batch_size=25, max_products=200):
+def sync_stale_products_to_qdrant(batch_size=100, max_products=2000):
     """Ночная инкрементальная индексация только новых/изменённых товаров."""
     from django.core.cache import cache
     from django.db.models import F, Q
@@ -200,6 +270,33 @@ def sync_stale_products_to_qdrant(batch_size=25, max_products=200):
     }
 
 
+@shared_task(acks_late=False)
+def refresh_similar_products(batch_size=64, max_products=5000):
+    """Пересчитать таблицу похожих товаров для новых и помеченных stale товаров."""
+    from django.core.cache import cache
+    from .services.similar_index import refresh_similar_products as refresh
+
+    lock_key = "recsys:similar-products:lock"
+    if not cache.add(lock_key, "1", timeout=60 * 30):
+        return {"status": "already_running"}
+    try:
+        stats = refresh(batch_size=batch_size, max_products=max_products)
+    finally:
+        cache.delete(lock_key)
+    return {**stats, "status": "ok"}
+
+
+@shared_task(acks_late=False)
+def refresh_ranking_features(limit=5000, popularity=False):
+    """Обновить feature store реранкера: изменённые товары и (опционально) счётчики популярности."""
+    from .services.rerank_features import refresh_changed_features, refresh_popularity
+
+    result = {"changed": refresh_changed_features(limit=limit)}
+    if popularity:
+        result["popularity"] = refresh_popularity()
+    return result
+
+
 @shared_task
 def log_recommendation_event(
     event_type,
@@ -207,12 +304,14 @@ def log_recommendation_event(
     recommended_ids,
     algorithm,
     session_id="",
+    user_id=None,
 ):
     """Create RecommendationEvent records for each recommended product."""
     from .models import RecommendationEvent
 
-    for position, rec_id in enumerate(recommended_ids, 1):
-        RecommendationEvent.objects.create(
+    RecommendationEvent.objects.bulk_create([
+        RecommendationEvent(
+            user_id=user_id,
             event_type=event_type,
             source_product_id=source_product_id,
             recommended_product_id=rec_id,
@@ -220,6 +319,56 @@ def log_recommendation_event(
             position=position,
             session_id=session_id or "",
         )
+        for position, rec_id in enumerate(recommended_ids, 1)
+    ])
+
+
+@shared_task
+def log_product_actions(event_type, product_ids, session_id="", user_id=None):
+    """
+    Record cart_add / purchase of products outside a recommendation block
+    (algorithm "direct"), so user profiles and popularity see them.
+    """
+    from .models import RecommendationEvent
+
+    RecommendationEvent.objects.bulk_create([
+        RecommendationEvent(
+            user_id=user_id,
+            event_type=event_type,
+            source_product_id=product_id,
+            recommended_product_id=product_id,
+            algorithm="direct",
+            position=1,
+            session_id=session_id or "",
+        )
+        for product_id in dict.fromkeys(product_ids)
+    ])
+
+
+@shared_task(acks_late=False)
+def update_user_embeddings(batch_size=None, max_batches=10):
+    """Инкрементально обновить профили пользователей новыми событиями рекомендаций."""
+    from django.conf import settings
+    from django.core.cache import cache
+    from .services.user_profiles import process_new_events
+
+    lock_key = "recsys:user-embeddings:lock"
+    if not cache.add(lock_key, "1", timeout=60 * 10):
+        return {"status": "already_running"}
+    batch_size = batch_size or getattr(settings, "RECSYS_PROFILE_BATCH_SIZE", 2000)
+    totals = {"events": 0, "users": 0, "applied": 0}
+    try:
+        for _ in range(max_batches):
+            stats = process_new_events(batch_size=batch_size)
+            for key in totals:
+                totals[key] += stats[key]
+            if stats.get("status"):
+                return {**totals, "status": stats["status"]}
+            if stats["events"] < batch_size:
+                break
+    finally:
+        cache.delete(lock_key)
+    return {**totals, "status": "ok"}
 
 
 @shared_task
@@ -266,3 +415,11 @@ def cleanup_temp_images():
     except Exception as e:
         logger.error("Error running cleanup_temp_images: %s", e)
         return {"error": str(e)}
+
+
+@shared_task(acks_late=False)
+def prune_embedding_cache():
+    """Удалить из EmbeddingCache записи старше RECSYS_EMBEDDING_CACHE_TTL_DAYS."""
+    from .services import embedding_cache
+
+    return {"deleted": embedding_cache.prune_expired()}
@@ -0,0 +1,173 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from apps.catalog.models import Product
+from apps.recommendations import tasks
+from apps.recommendations.models import EmbeddingCache, ProductVector
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+
+
+class _FakeTextEncoder:
+    MODEL_NAME = "fake-text"
+    cache_model_name = "fake-text@fp32"
+    calls = []
+
+    def encode_batch(self, texts):
+        self.calls.append(list(texts))
+        return np.ones((len(texts), 384), dtype=np.float32)
+
+
+class _FakeCLIPEncoder:
+    MODEL_NAME = "fake-clip"
+    cache_model_name = "fake-clip@fp32"
+    calls = []
+
+    def encode_images(self, images):
+        self.calls.append(list(images))
+        return [np.ones(512, dtype=np.float32) if image is not None else None for image in images]
+
+
+class _FakeQdrantClient:
+    def __init__(self):
+        self.upserts = []
+
+    def get_collections(self):
+        return types.SimpleNamespace(collections=[types.SimpleNamespace(name=QdrantRecommendationEngine.COLLECTION_NAME)])
+
+    def upsert(self, collection_name, points):
+        self.upserts.append(points)
+
+
+@pytest.fixture
+def fake_models(monkeypatch, settings):
+    """Энкодеры подменяются: в тестовом окружении нет torch/sentence-transformers."""
+    settings.RECSYS_INDEX_CHUNK_SIZE = 2
+    _FakeTextEncoder.calls = []
+    _FakeCLIPEncoder.calls = []
+    text_module = types.ModuleType("apps.recommendations.services.text_encoder")
+    text_module.TextEncoder = _FakeTextEncoder
+    text_module.TEXT_VECTOR_SIZE = 384
+    monkeypatch.setitem(sys.modules, "apps.recommendations.services.text_encoder", text_module)
+    from apps.recommendations.services import image_encoder, qdrant_registry, vector_engine
+
+    qdrant_registry.clear_registry()
+
+    monkeypatch.setattr(image_encoder, "CLIPEncoder", _FakeCLIPEncoder)
+    client = _FakeQdrantClient()
+    monkeypatch.setattr(vector_engine, "_get_qdrant_client", lambda: client)
+    invalidated = []
+    monkeypatch.setattr(
+        vector_engine.QdrantRecommendationEngine,
+        "_invalidate_similar_cache_many",
+        lambda self, ids: invalidated.append(list(ids)),
+    )
+    monkeypatch.setattr(tasks, "_working_product_image_url", lambda product: product.main_image or "")
+    loaded = []
+    # Содержимое файла по URL (без query string); тест может подменить его.
+    files = {}
+
+    def fetch_image_bytes(url):
+        loaded.append(url)
+        return files.get(url.split("?", 1)[0], b"image:" + url.split("?", 1)[0].encode())
+
+    monkeypatch.setattr(image_encoder, "fetch_image_bytes", fetch_image_bytes)
+    monkeypatch.setattr(image_encoder, "decode_image", lambda data: "img" if data else None)
+    yield types.SimpleNamespace(client=client, invalidated=invalidated, loaded=loaded, files=files)
+    qdrant_registry.clear_registry()
+
+
+@pytest.mark.django_db
+def test_index_product_vectors_encodes_and_upserts_in_chunks(fake_models):
+    products = [
+        Product.objects.create(
+            name=f"Indexed {index}", slug=f"indexed-{index}", product_type="accessories",
+            price=10, currency="TRY", main_image=f"https://e.com/{index}.jpg" if index % 2 else "",
+        )
+        for index in range(5)
+    ]
+    ProductVector.objects.create(product=products[0], qdrant_id=str(products[0].id))
+
+    result = tasks.index_product_vectors(product_ids=[product.id for product in products])
+
+    assert result == {"indexed": 5, "errors": [], "remaining": 0}
+    assert [len(call) for call in _FakeTextEncoder.calls] == [2, 2, 1]
+    assert [len(points) for points in fake_models.client.upserts] == [2, 2, 1]
+    assert sorted(fake_models.loaded) == ["https://e.com/1.jpg", "https://e.com/3.jpg"]
+    points = {point.id: point for batch in fake_models.client.upserts for point in batch}
+    assert "image" in points[products[1].id].vector
+    assert "image" not in points[products[0].id].vector
+    assert ProductVector.objects.filter(last_synced__isnull=False).count() == 5
+    assert len(fake_models.invalidated) == 3
+
+
+@pytest.mark.django_db
+def test_reindex_after_price_change_reuses_cached_embeddings(fake_models):
+    product = Product.objects.create(
+        name="Cached", slug="cached-embedding", product_type="accessories",
+        price=10, currency="TRY", main_image="https://e.com/cached.jpg?X-Amz-Signature=1",
+    )
+    tasks.index_product_vectors(product_ids=[product.id])
+    assert EmbeddingCache.objects.count() == 2
+
+    Product.objects.filter(pk=product.pk).update(
+        price=12, main_image="https://e.com/cached.jpg?X-Amz-Signature=2"
+    )
+    _FakeTextEncoder.calls = []
+    _FakeCLIPEncoder.calls = []
+    fake_models.loaded.clear()
+
+    result = tasks.index_product_vectors(product_ids=[product.id])
+
+    assert result["indexed"] == 1
+    assert _FakeTextEncoder.calls == []
+    # Файл скачивается заново (ключ — его содержимое), но CLIP не вызывается.
+    assert _FakeCLIPEncoder.calls == []
+    assert len(fake_models.loaded) == 1
+    point = fake_models.client.upserts[-1][0]
+    assert point.payload["price"] == 12.0
+    assert "image" in point.vector
+
+
+@pytest.mark.django_db
+def test_image_replaced_at_same_url_is_encoded_again(fake_models):
+    product = Product.objects.create(
+        name="Replaced", slug="replaced-image", product_type="accessories",
+        price=10, currency="TRY", main_image="https://e.com/replaced.jpg",
+    )
+    tasks.index_product_vectors(product_ids=[product.id])
+    fake_models.files["https://e.com/replaced.jpg"] = b"new photo"
+    _FakeCLIPEncoder.calls = []
+
+    tasks.index_product_vectors(product_ids=[product.id])
+
+    assert len(_FakeCLIPEncoder.calls) == 1
+    assert EmbeddingCache.objects.filter(model_name="fake-clip@fp32").count() == 2
+
+
+@pytest.mark.django_db
+def test_expired_embeddings_are_misses_and_pruned(fake_models, settings):
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from apps.recommendations.services import embedding_cache
+
+    settings.RECSYS_EMBEDDING_CACHE_TTL_DAYS = 30
+    product = Product.objects.create(
+        name="Expiring", slug="expiring-embedding", product_type="accessories", price=10, currency="TRY",
+    )
+    tasks.index_product_vectors(product_ids=[product.id])
+    EmbeddingCache.objects.update(created_at=timezone.now() - timedelta(days=31))
+    _FakeTextEncoder.calls = []
+
+    tasks.index_product_vectors(product_ids=[product.id])
+
+    # Просроченная запись не используется и перезаписывается свежей.
+    assert len(_FakeTextEncoder.calls) == 1
+    assert EmbeddingCache.objects.filter(created_at__gte=timezone.now() - timedelta(days=1)).count() == 1
+    EmbeddingCache.objects.update(created_at=timezone.now() - timedelta(days=31))
+    assert embedding_cache.prune_expired() == 1
+    assert not EmbeddingCache.objects.exists()
@@ -0,0 +1,124 @@
+import types
+
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Category, Product
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+from apps.recommendations.views import RecommendationViewSet
+
+
+class _FakeBatchClient:
+    def __init__(self, hits):
+        self.hits = hits
+        self.retrieves = 0
+        self.batches = []
+
+    def retrieve(self, collection_name, ids, with_vectors):
+        self.retrieves += 1
+        return [types.SimpleNamespace(vector={"combined": [0.1] * 4, "image": [0.2] * 4})]
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches.append(requests)
+        return [
+            types.SimpleNamespace(points=[
+                types.SimpleNamespace(id=pid, score=0.9, payload={}) for pid in self.hits.get(request.using, [])
+            ])
+            for request in requests
+        ]
+
+
+def _engine(client):
+    engine = QdrantRecommendationEngine.__new__(QdrantRecommendationEngine)
+    engine.client = client
+    return engine
+
+
+def _product(name, category=None, **extra):
+    return Product.objects.create(
+        name=name, slug=name.lower().replace(" ", "-"), product_type="clothing",
+        category=category, price=100, currency="TRY", **extra,
+    )
+
+
+@pytest.mark.django_db
+def test_find_similar_batch_reads_vectors_once_and_sends_one_request():
+    cache.clear()
+    client = _FakeBatchClient({"combined": [1, 2, 3], "image": [4]})
+    engine = _engine(client)
+
+    result = engine.find_similar_batch(1, [
+        {"key": "similar", "vector_type": "combined", "n_results": 2},
+        {"key": "visual", "vector_type": "image", "n_results": 5},
+        {"key": "look", "vector_type": "combined", "n_results": 1, "filters": {"category_id": 7}},
+    ])
+
+    assert client.retrieves == 1
+    assert len(client.batches) == 1 and len(client.batches[0]) == 3
+    assert [row["product_id"] for row in result["similar"]] == [2, 3]
+    assert [row["product_id"] for row in result["visual"]] == [4]
+    assert [row["product_id"] for row in result["look"]] == [2]
+
+    engine.find_similar_batch(1, [{"key": "similar", "vector_type": "combined", "n_results": 2},
+                                  {"key": "visual", "vector_type": "image", "n_results": 5},
+                                  {"key": "look", "vector_type": "combined", "n_results": 1,
+                                   "filters": {"category_id": 7}}])
+    assert len(client.batches) == 1
+
+
+@pytest.mark.django_db
+def test_missing_image_vector_does_not_hide_combined_batch():
+    cache.clear()
+    client = _FakeBatchClient({"combined": [2, 3], "image": [4]})
+    client.retrieve = lambda collection_name, ids, with_vectors: [
+        types.SimpleNamespace(vector={"combined": [0.1] * 4})
+    ]
+    engine = _engine(client)
+
+    visual = engine.find_similar_batch(1, [{"key": "visual", "vector_type": "image", "n_results": 5}])
+    similar = engine.find_similar_batch(1, [{"key": "similar", "vector_type": "combined", "n_results": 2}])
+
+    assert visual == {"visual": []}
+    assert [row["product_id"] for row in similar["similar"]] == [2, 3]
+
+
+@pytest.mark.django_db
+def test_bundle_endpoint_returns_all_sections_from_one_batch(monkeypatch):
+    cache.clear()
+    shoes = Category.objects.create(name="Обувь", slug="shoes")
+    base = _product("Base Shirt", category=Category.objects.create(name="Одежда", slug="clothing"))
+    similar = _product("Similar Shirt")
+    shoe = _product("Matching Shoe", category=shoes)
+    shadow = _product("Shadow Variant", external_data={"source_variant_id": "v1"})
+    client = _FakeBatchClient({"combined": [base.id, similar.id, shoe.id, shadow.id], "image": [similar.id]})
+    monkeypatch.setattr(RecommendationViewSet, "_get_engine", lambda self: _engine(client))
+
+    response = APIClient().get("/api/recommendations/bundle/", {"product_id": base.id})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(client.batches) == 1
+    assert {row["product"]["id"] for row in data["similar"]} == {similar.id, shoe.id}
+    assert [row["product"]["id"] for row in data["visually_similar"]] == [similar.id]
+    look = data["complete_the_look"]
+    assert [entry["relation_type"] for entry in look] == ["shoes"]
+    assert all(item["product"]["id"] != shadow.id for item in look[0]["items"])
+
+
+@pytest.mark.django_db
+def test_bundle_endpoint_hides_engine_error_details(monkeypatch):
+    cache.clear()
+    base = _product("Lonely Shirt")
+
+    class _Broken:
+        def find_similar_batch(self, product_id, queries):
+            raise RuntimeError("qdrant at 10.0.0.5:6333 refused connection")
+
+    monkeypatch.setattr(RecommendationViewSet, "_get_engine", lambda self: _Broken())
+
+    response = APIClient().get("/api/recommendations/bundle/", {"product_id": base.id})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["similar"] == [] and "10.0.0.5" not in data["error"]
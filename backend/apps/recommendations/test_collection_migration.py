@@ -0,0 +1,125 @@
+import pytest
+from django.core.cache import cache
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+
+from apps.recommendations.services import collection_migration
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+
+
+def _engine(client):
+    engine = QdrantRecommendationEngine.__new__(QdrantRecommendationEngine)
+    engine.client = client
+    return engine
+
+
+def _point(product_id):
+    vector = [0.0] * 512
+    vector[product_id] = 1.0
+    return qmodels.PointStruct(
+        id=product_id,
+        vector={"text": [1.0] + [0.0] * 383, "image": vector, "combined": vector},
+        payload={"product_id": product_id, "is_active": True, "category_id": 1, "price": 10.0},
+    )
+
+
+@pytest.fixture
+def client():
+    return QdrantClient(":memory:")
+
+
+def test_new_collection_is_quantized_and_served_through_alias(client, monkeypatch):
+    engine = _engine(client)
+    created, indexed = {}, []
+    original_create = client.create_collection
+    monkeypatch.setattr(client, "create_collection", lambda **kwargs: created.update(kwargs) or original_create(**kwargs))
+    monkeypatch.setattr(client, "create_payload_index", lambda **kwargs: indexed.append(kwargs["field_name"]))
+
+    engine._ensure_collection_exists()
+
+    alias = QdrantRecommendationEngine.COLLECTION_NAME
+    physical = collection_migration.resolve_alias(client, alias)
+    assert physical == created["collection_name"] and physical.startswith(f"{alias}_")
+    # Локальный режим Qdrant не хранит эти настройки — проверяем запрос на создание.
+    assert created["quantization_config"].scalar.type == qmodels.ScalarType.INT8
+    assert created["vectors_config"]["combined"].on_disk is True
+    assert set(indexed) == set(collection_migration.PAYLOAD_INDEXES)
+
+    client.upsert(alias, [_point(1), _point(2)])
+    assert [row["product_id"] for row in engine.find_similar_batch(1, [
+        {"key": "similar", "vector_type": "combined", "n_results": 5},
+    ])["similar"]] == [2]
+
+
+def test_migration_copies_points_and_swaps_alias_atomically(client, monkeypatch):
+    alias = QdrantRecommendationEngine.COLLECTION_NAME
+    legacy = QdrantRecommendationEngine.LEGACY_COLLECTION_NAME
+    # Старая схема: физическая коллекция без алиаса и без квантования.
+    client.create_collection(legacy, vectors_config=collection_migration.vectors_config(QdrantRecommendationEngine))
+    client.upsert(legacy, [_point(index) for index in range(1, 6)])
+    names = iter([f"{alias}_blue", f"{alias}_green"])
+    monkeypatch.setattr(collection_migration, "new_collection_name", lambda base: next(names))
+    swaps = []
+    original_swap = collection_migration.swap_alias
+    monkeypatch.setattr(
+        collection_migration, "swap_alias",
+        lambda c, a, target: swaps.append((target, {x.name for x in c.get_collections().collections}))
+        or original_swap(c, a, target),
+    )
+
+    first = collection_migration.migrate_collection(client, QdrantRecommendationEngine, batch_size=2, drop_old=True)
+    second = collection_migration.migrate_collection(client, QdrantRecommendationEngine, drop_old=True)
+
+    # Алиас сначала подхватывает старую коллекцию, и она удаляется только после переключения.
+    assert swaps[0] == (legacy, {legacy})
+    assert legacy in swaps[1][1]
+    assert first == {"alias": alias, "previous": legacy, "collection": f"{alias}_blue", "points": 5}
+    assert second["previous"] == f"{alias}_blue"
+    assert collection_migration.resolve_alias(client, alias) == f"{alias}_green"
+    assert {c.name for c in client.get_collections().collections} == {f"{alias}_green"}
+    assert client.count(alias).count == 5
+
+
+@pytest.mark.django_db
+def test_writes_are_paused_and_deletes_reach_both_collections_during_copy(client, monkeypatch):
+    cache.clear()
+    engine = _engine(client)
+    engine._ensure_collection_exists()
+    alias = QdrantRecommendationEngine.COLLECTION_NAME
+    client.upsert(alias, [_point(index) for index in range(1, 5)])
+    monkeypatch.setattr(collection_migration, "new_collection_name", lambda base: f"{alias}_next")
+    monkeypatch.setattr(engine, "_sync_product_vectors", lambda *args: pytest.fail("upsert must be deferred"))
+    copy_points = collection_migration.copy_points
+
+    def copy_with_live_traffic(c, source, target, batch_size=256):
+        copied = copy_points(c, source, target, batch_size=batch_size)
+        assert engine.indexing_paused()
+        assert engine.upsert_products([(object(), [0.0] * 384, None, None)]) is False
+        # Удаление после копирования точки: без сверки она осталась бы в новой коллекции.
+        engine.delete_product(2)
+        c.delete(source, points_selector=qmodels.PointIdsList(points=[3]))
+        return copied
+
+    monkeypatch.setattr(collection_migration, "copy_points", copy_with_live_traffic)
+
+    result = collection_migration.migrate_collection(client, QdrantRecommendationEngine)
+
+    assert result["points"] == 2
+    assert not engine.indexing_paused()
+    assert {point.id for point in client.scroll(alias, limit=10)[0]} == {1, 4}
+
+
+def test_failed_fill_keeps_live_alias(client, monkeypatch):
+    alias = QdrantRecommendationEngine.COLLECTION_NAME
+    _engine(client)._ensure_collection_exists()
+    live = collection_migration.resolve_alias(client, alias)
+    monkeypatch.setattr(collection_migration, "new_collection_name", lambda base: f"{alias}_broken")
+
+    def fill(name):
+        raise RuntimeError("encoder crashed")
+
+    with pytest.raises(RuntimeError):
+        collection_migration.migrate_collection(client, QdrantRecommendationEngine, fill=fill)
+
+    assert collection_migration.resolve_alias(client, alias) == live
+    assert f"{alias}_broken" not in {c.name for c in client.get_collections().collections}
@@ -0,0 +1,104 @@
+import base64
+import json
+import sys
+
+import httpx
+import numpy as np
+import pytest
+
+from rest_framework.test import APIClient
+
+from apps.recommendations.services import ml_client
+from apps.recommendations.services.text_encoder import TextEncoder
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+from apps.recommendations.views import RecommendationViewSet
+
+
+def _encode(vector):
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+@pytest.fixture
+def ml_service(settings, monkeypatch):
+    settings.ML_SERVICE_URL = "http://ml_service:8001"
+    settings.ML_SERVICE_BATCH_SIZE = 2
+    calls = []
+    failures = {"count": 1}
+
+    def handler(request):
+        payload = json.loads(request.content)
+        calls.append(payload)
+        if failures["count"]:
+            failures["count"] -= 1
+            return httpx.Response(503, json={"detail": "text queue is full"})
+        vectors = [_encode([float(len(text)), 1.0]) for text in payload["texts"]]
+        return httpx.Response(200, json={"model": "m", "variant": "onnx-int8", "dimension": 2, "vectors": vectors})
+
+    client = httpx.Client(base_url=settings.ML_SERVICE_URL, transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ml_client, "_http_client", lambda: client)
+    monkeypatch.setattr(ml_client.time, "sleep", lambda seconds: None)
+    return calls
+
+
+def test_embed_texts_chunks_and_retries_busy_service(ml_service):
+    matrix = ml_client.embed_texts(["a", "bb", "ccc"])
+
+    assert matrix.dtype == np.float32
+    assert matrix[:, 0].tolist() == [1.0, 2.0, 3.0]
+    # Первый запрос получил 503 и был повторён, затем остаток — отдельным чанком.
+    assert [call["texts"] for call in ml_service] == [["a", "bb"], ["a", "bb"], ["ccc"]]
+    assert all(call["format"] == "base64" for call in ml_service)
+
+
+def test_text_encoder_delegates_to_service_without_loading_model(ml_service, monkeypatch):
+    monkeypatch.setattr(TextEncoder, "_instance", None)
+    monkeypatch.setattr(TextEncoder, "_model", None)
+    monkeypatch.setattr(TextEncoder, "_remote", False)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+
+    encoder = TextEncoder()
+
+    assert encoder.encode("abcd").tolist() == [4.0, 1.0]
+    assert encoder.encode_batch(["x", ""]).shape == (2, 2)
+    assert encoder.model is None
+
+
+def test_service_errors_are_raised(settings, monkeypatch):
+    settings.ML_SERVICE_URL = "http://ml_service:8001"
+    client = httpx.Client(
+        base_url=settings.ML_SERVICE_URL,
+        transport=httpx.MockTransport(lambda request: httpx.Response(413, json={"detail": "too many"})),
+    )
+    monkeypatch.setattr(ml_client, "_http_client", lambda: client)
+
+    with pytest.raises(ml_client.MLServiceError):
+        ml_client.embed_texts(["a"])
+
+
+def test_search_by_image_answers_503_when_service_is_down(monkeypatch):
+    class _Engine:
+        def find_similar_by_image(self, image_url, n_results):
+            raise ml_client.MLServiceError("ml_service unavailable")
+
+    monkeypatch.setattr(RecommendationViewSet, "_get_engine", lambda self: _Engine())
+
+    response = APIClient().post(
+        "/api/recommendations/search_by_image", {"image_url": "https://cdn.test/a.jpg"}, format="json"
+    )
+
+    assert response.status_code == 503
+    assert response.json()["error"] == "encoder_unavailable"
+
+
+def test_search_filter_keeps_encoder_backends_apart(settings):
+    engine = QdrantRecommendationEngine.__new__(QdrantRecommendationEngine)
+
+    settings.ML_SERVICE_URL = "http://ml_service:8001"
+    remote = engine._build_filter(filters=None).must[-1]
+    assert remote.key == "encoder" and remote.match.value == "ml_service"
+
+    settings.ML_SERVICE_URL = ""
+    local = engine._build_filter(filters=None).must[-1]
+    # Локальный поиск видит и старые точки без поля encoder.
+    assert [getattr(c, "key", None) for c in local.should] == ["encoder", None]
+    assert local.should[0].match.value == "local"
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+
+from apps.recommendations.services import qdrant_registry
+
+
+class _FakeClient:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = 0
+        self.closed = False
+
+    def query_points(self, **kwargs):
+        self.calls += 1
+        if self.fail_times:
+            self.fail_times -= 1
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    def upsert(self, **kwargs):
+        raise ValueError("bad point")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def created_clients(monkeypatch):
+    qdrant_registry.clear_registry()
+    clients = []
+
+    def create():
+        client = _FakeClient(fail_times=1 if not clients else 0)
+        clients.append(client)
+        return client
+
+    monkeypatch.setattr(qdrant_registry, "_create_client", create)
+    yield clients
+    qdrant_registry.clear_registry()
+
+
+def test_client_is_shared_and_reconnects_after_connection_error(created_clients):
+    client = qdrant_registry.get_qdrant_client()
+
+    assert client.query_points(collection_name="x") == "ok"
+    assert len(created_clients) == 2
+    assert created_clients[0].closed
+    assert client.query_points(collection_name="x") == "ok"
+    assert len(created_clients) == 2
+
+
+def test_non_connection_errors_are_not_retried(created_clients):
+    with pytest.raises(ValueError):
+        qdrant_registry.get_qdrant_client().upsert(collection_name="x", points=[])
+    assert len(created_clients) == 1
+
+
+def test_bootstrap_runs_once_per_process_and_retries_failures():
+    qdrant_registry.clear_registry()
+    calls = []
+
+    def failing():
+        calls.append("fail")
+        return False
+
+    def ok():
+        calls.append("ok")
+
+    qdrant_registry.ensure_bootstrapped("test", failing)
+    qdrant_registry.ensure_bootstrapped("test", ok)
+    qdrant_registry.ensure_bootstrapped("test", ok)
+
+    assert calls == ["fail", "ok"]
+    qdrant_registry.clear_registry()
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.catalog.models import Product
+from apps.recommendations.models import ProductRankingFeatures, RecommendationEvent
+from apps.recommendations.services import rerank_features
+from apps.recommendations.services.reranker import BusinessReranker
+
+
+def _product(name, **extra):
+    values = {"product_type": "clothing", "price": 100, "currency": "TRY", **extra}
+    return Product.objects.create(name=name, slug=name.lower().replace(" ", "-"), **values)
+
+
+@pytest.mark.django_db
+def test_rank_scores_from_feature_store_and_drops_shadow_variants():
+    target = _product("Target")
+    close = _product("Close Price", price=110)
+    far = _product("Far Price", price=1000)
+    sold_out = _product("Sold Out", price=100, is_available=False)
+    shadow = _product("Shadow", external_data={"source_variant_id": "v1"})
+    Product.objects.filter(id=far.id).update(created_at=timezone.now() - timedelta(days=90))
+    candidates = [
+        {"product_id": pid, "score": 0.8} for pid in (far.id, sold_out.id, shadow.id, close.id)
+    ]
+
+    ranked = BusinessReranker().rank(candidates, target, "balanced")
+
+    assert [item["product_id"] for item in ranked] == [close.id, sold_out.id, far.id]
+    assert ranked[0]["business_score"] == pytest.approx(0.4 * 0.8 + 0.2 * 100 / 110 + 0.2 + 0.1)
+    assert ProductRankingFeatures.objects.filter(product_id=shadow.id, is_shadow_variant=True).exists()
+
+
+@pytest.mark.django_db
+def test_rerank_hydrates_only_the_final_top_n():
+    target = _product("Target")
+    products = [_product(f"Candidate {index}", price=100 + index) for index in range(6)]
+    candidates = [{"product_id": product.id, "score": 0.9} for product in products]
+    rerank_features.build_features([target.id] + [product.id for product in products])
+    reranker = BusinessReranker()
+    hydrated = []
+    original = reranker.hydrate
+    reranker.hydrate = lambda ranked: hydrated.extend(item["product_id"] for item in ranked) or original(ranked)
+
+    results = reranker.rerank(candidates, target, limit=2)
+
+    assert hydrated == [products[0].id, products[1].id]
+    assert [row["product"]["id"] for row in results] == hydrated
+
+
+@pytest.mark.django_db
+def test_refresh_popularity_counts_window_events():
+    source = _product("Source")
+    popular = _product("Popular")
+    stale = _product("Stale")
+    rerank_features.build_features([stale.id])
+    ProductRankingFeatures.objects.filter(product_id=stale.id).update(clicks=7)
+    for event_type in ("impression", "click", "click", "purchase"):
+        RecommendationEvent.objects.create(
+            event_type=event_type, source_product=source, recommended_product=popular,
+            algorithm="vector_combined", position=1,
+        )
+
+    assert rerank_features.refresh_popularity() == 1
+
+    row = ProductRankingFeatures.objects.get(product_id=popular.id)
+    assert (row.impressions, row.clicks, row.cart_adds, row.purchases) == (1, 2, 0, 1)
+    assert ProductRankingFeatures.objects.get(product_id=stale.id).clicks == 0
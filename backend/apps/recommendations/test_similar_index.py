@@ -0,0 +1,139 @@
+import types
+
+import pytest
+from django.core.cache import cache
+
+from apps.catalog.models import Product
+from apps.recommendations.models import ProductVector, SimilarProducts
+from apps.recommendations.services import similar_index
+from apps.recommendations.services.vector_engine import QdrantRecommendationEngine
+
+
+class _FakeClient:
+    def __init__(self, neighbours):
+        self.neighbours = neighbours
+        self.retrieves = 0
+        self.batches = 0
+        self.queries = 0
+
+    def retrieve(self, collection_name, ids, with_vectors):
+        self.retrieves += 1
+        return [types.SimpleNamespace(id=pid, vector={"combined": [float(pid)] * 4}) for pid in ids]
+
+    def _points(self, product_id):
+        return [
+            types.SimpleNamespace(id=pid, score=score, payload=payload)
+            for pid, score, payload in self.neighbours.get(product_id, [])
+        ]
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches += 1
+        return [types.SimpleNamespace(points=self._points(int(request.query[0]))) for request in requests]
+
+    def query_points(self, collection_name, query, limit, query_filter, using=None, **kwargs):
+        self.queries += 1
+        return types.SimpleNamespace(points=self._points(int(query[0]))[:limit])
+
+
+def _engine(client):
+    engine = QdrantRecommendationEngine.__new__(QdrantRecommendationEngine)
+    engine.client = client
+    return engine
+
+
+@pytest.fixture
+def catalog():
+    cache.clear()
+    products = [
+        Product.objects.create(name=f"Item {index}", slug=f"item-{index}", product_type="clothing",
+                               price=100 * index, currency="TRY")
+        for index in range(1, 4)
+    ]
+    for product in products:
+        ProductVector.objects.create(product=product, qdrant_id=str(product.id), is_active=True)
+    first, second, third = (product.id for product in products)
+    client = _FakeClient({
+        first: [
+            (second, 0.9, {"category_id": 5, "brand_id": 1, "price": 200.0, "color": "красный"}),
+            (third, 0.8, {"category_id": 6, "brand_id": 2, "price": 300.0, "color": "синий"}),
+        ],
+        second: [(first, 0.9, {"category_id": 5, "brand_id": 1, "price": 100.0, "color": "unknown"})],
+    })
+    return types.SimpleNamespace(ids=(first, second, third), client=client, engine=_engine(client))
+
+
+@pytest.mark.django_db
+def test_refresh_builds_rows_in_batches_and_find_similar_reads_them(catalog):
+    first, second, third = catalog.ids
+
+    stats = similar_index.refresh_similar_products(engine=catalog.engine, batch_size=10)
+
+    assert stats == {"refreshed": 3, "deleted": 0}
+    assert catalog.client.retrieves == 1 and catalog.client.batches == 1
+    row = SimilarProducts.objects.get(product_id=first)
+    assert row.neighbor_ids == [second, third]
+
+    result = catalog.engine.find_similar(first, n_results=5, filters={"price_min": 250})
+    assert [item["product_id"] for item in result] == [third]
+    result = catalog.engine.find_similar(first, n_results=5, filters={"color": "Красный"})
+    assert [item["product_id"] for item in result] == [second]
+    assert catalog.client.queries == 0
+
+    # Свежие строки повторно не пересчитываются.
+    assert similar_index.refresh_similar_products(engine=catalog.engine)["refreshed"] == 0
+
+
+@pytest.mark.django_db
+def test_invalidation_marks_neighbours_stale_and_bumps_cache_version(catalog):
+    first, second, third = catalog.ids
+    similar_index.refresh_similar_products(engine=catalog.engine)
+    SimilarProducts.objects.filter(product_id=first).delete()
+
+    catalog.engine.find_similar(first, n_results=5)
+    catalog.engine.find_similar(first, n_results=5)
+    assert catalog.client.queries == 1
+    prefix = similar_index.similar_cache_prefix(first)
+
+    catalog.engine._invalidate_similar_cache_many([third])
+    assert similar_index.similar_cache_prefix(first) == prefix
+    assert list(SimilarProducts.objects.filter(is_stale=True).values_list("product_id", flat=True)) == [third]
+
+    catalog.engine._invalidate_similar_cache_many([first])
+    assert similar_index.similar_cache_prefix(first) != prefix
+    assert set(SimilarProducts.objects.filter(is_stale=True).values_list("product_id", flat=True)) == {
+        second, third,
+    }
+    catalog.engine.find_similar(first, n_results=5)
+    assert catalog.client.queries == 2
+
+
+@pytest.mark.django_db
+def test_stale_mark_made_during_compute_survives_refresh(catalog, monkeypatch):
+    first, second, third = catalog.ids
+    similar_index.refresh_similar_products(engine=catalog.engine)
+    similar_index.mark_stale([first])
+    compute = similar_index.compute_neighbors
+
+    def compute_while_reindexing(engine, product_ids, **kwargs):
+        rows = compute(engine, product_ids, **kwargs)
+        # Товар переиндексирован, пока считались соседи.
+        similar_index.mark_stale([first])
+        return rows
+
+    monkeypatch.setattr(similar_index, "compute_neighbors", compute_while_reindexing)
+    assert similar_index.refresh_similar_products(engine=catalog.engine)["refreshed"] == 2
+
+    assert SimilarProducts.objects.get(product_id=first).is_stale
+    monkeypatch.setattr(similar_index, "compute_neighbors", compute)
+    similar_index.refresh_similar_products(engine=catalog.engine)
+    assert not SimilarProducts.objects.filter(is_stale=True).exists()
+
+
+@pytest.mark.django_db
+def test_find_similar_cache_hit_skips_database(catalog, django_assert_num_queries):
+    first, _, _ = catalog.ids
+    similar_index.refresh_similar_products(engine=catalog.engine)
+    expected = catalog.engine.find_similar(first, n_results=5, exclude_same_brand=True)
+
+    with django_assert_num_queries(0):
+        assert catalog.engine.find_similar(first, n_results=5, exclude_same_brand=True) == expected
@@ -0,0 +1,152 @@
+import types
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.catalog.models import Category, Product
+from apps.recommendations.models import EventStreamCursor, RecommendationEvent, UserEmbedding
+from apps.recommendations.services.user_profiles import apply_events, process_new_events
+from apps.users.models import User
+
+
+class _FakeEngine:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = []
+
+    def get_vectors(self, product_ids, vector_type="combined"):
+        self.calls.append(list(product_ids))
+        return {pid: self.vectors[pid] for pid in product_ids if pid in self.vectors}
+
+
+def test_apply_events_decays_old_preferences():
+    now = timezone.now()
+    profile = types.SimpleNamespace(
+        preference_vector=[1.0, 0.0], preference_weight=4.0, category_weights={"shoes": 1.0},
+        avg_price_viewed=None, last_event_id=10, last_event_at=now - timedelta(days=14),
+    )
+
+    applied = apply_events(
+        profile,
+        [(9, 1, 1.0, now), (11, 2, 2.0, now)],
+        vectors={2: [0.0, 1.0]}, prices={2: 100.0}, categories={2: "clothing"},
+    )
+
+    # Событие 9 уже учтено; вес старого профиля за период полураспада 4 -> 2.
+    assert applied == 1
+    assert profile.last_event_id == 11
+    assert profile.preference_weight == pytest.approx(4.0)
+    assert profile.preference_vector == pytest.approx([0.5, 0.5])
+    assert profile.category_weights == {"clothing": 0.5, "shoes": 0.5}
+    assert float(profile.avg_price_viewed) == 100.0
+
+
+@pytest.mark.django_db
+def test_process_new_events_updates_only_new_events(settings):
+    cache.clear()
+    user = User.objects.create_user(username="buyer", email="buyer@example.com", password="pass12345")
+    first = Product.objects.create(
+        name="First", slug="first", product_type="shoes", price=100, currency="TRY",
+        category=Category.objects.create(name="Кроссовки", slug="sneakers"),
+    )
+    second = Product.objects.create(name="Second", slug="second", product_type="clothing", price=300, currency="TRY")
+    engine = _FakeEngine({first.id: [1.0, 0.0], second.id: [0.0, 1.0]})
+
+    # Показ блока = просмотр исходного товара, строки одного показа схлопываются.
+    for position in (1, 2):
+        RecommendationEvent.objects.create(
+            user=user, event_type="impression", source_product=first,
+            recommended_product=second, algorithm="vector_combined", position=position,
+        )
+    RecommendationEvent.objects.create(
+        source_product=first, recommended_product=second, event_type="click", algorithm="vector_combined", position=1,
+    )
+
+    stats = process_new_events(engine=engine)
+    profile = UserEmbedding.objects.get(user=user)
+    assert stats["applied"] == 1
+    assert profile.preference_vector == [1.0, 0.0]
+    assert profile.category_weights == {"sneakers": 1.0}
+
+    RecommendationEvent.objects.create(
+        user=user, event_type="purchase", source_product=first,
+        recommended_product=second, algorithm="vector_combined", position=1,
+    )
+    stats = process_new_events(engine=engine)
+    profile.refresh_from_db()
+    assert stats == {"events": 1, "users": 1, "applied": 1}
+    assert engine.calls[-1] == [second.id]
+    assert profile.preference_weight == pytest.approx(9.0)
+    assert profile.preference_vector[1] > profile.preference_vector[0]
+    assert profile.last_event_id == RecommendationEvent.objects.latest("id").id
+    assert EventStreamCursor.objects.get(name="user-embeddings").last_event_id == profile.last_event_id
+
+    assert process_new_events(engine=engine)["events"] == 0
+    profile.refresh_from_db()
+    assert profile.preference_weight == pytest.approx(9.0)
+
+
+def _event(product, event_type="click", **extra):
+    return RecommendationEvent.objects.create(
+        event_type=event_type, source_product=product, recommended_product=product,
+        algorithm="direct", position=1, **extra,
+    )
+
+
+@pytest.mark.django_db
+def test_late_committed_event_in_overlap_window_is_applied_once(settings):
+    settings.RECSYS_PROFILE_CURSOR_OVERLAP = 10
+    user = User.objects.create_user(username="late", email="late@example.com", password="pass12345")
+    product = Product.objects.create(name="Late", slug="late", product_type="shoes", price=50, currency="TRY")
+    engine = _FakeEngine({product.id: [1.0, 0.0]})
+    late = _event(product, user=user)
+    _event(product, user=user)
+    # Событие с меньшим id ещё не закоммичено к первому прогону.
+    RecommendationEvent.objects.filter(pk=late.pk).update(user=None)
+
+    process_new_events(engine=engine)
+    profile = UserEmbedding.objects.get(user=user)
+    assert profile.preference_weight == pytest.approx(1.5)
+
+    RecommendationEvent.objects.filter(pk=late.pk).update(user=user)
+    stats = process_new_events(engine=engine)
+    profile.refresh_from_db()
+    assert stats["applied"] == 1
+    assert profile.preference_weight == pytest.approx(3.0)
+
+    assert process_new_events(engine=engine)["applied"] == 0
+
+
+@pytest.mark.django_db
+def test_vector_failure_keeps_cursor_and_retries_batch():
+    user = User.objects.create_user(username="retry", email="retry@example.com", password="pass12345")
+    product = Product.objects.create(name="Retry", slug="retry", product_type="shoes", price=50, currency="TRY")
+    _event(product, user=user)
+
+    class _Down:
+        def get_vectors(self, product_ids, vector_type="combined"):
+            raise ConnectionError("qdrant down")
+
+    assert process_new_events(engine=_Down())["status"] == "vectors_unavailable"
+    assert not EventStreamCursor.objects.exists()
+    assert not UserEmbedding.objects.exists()
+
+    stats = process_new_events(engine=_FakeEngine({product.id: [0.0, 1.0]}))
+    assert stats["applied"] == 1
+    assert UserEmbedding.objects.get(user=user).preference_vector == [0.0, 1.0]
+
+
+@pytest.mark.django_db
+def test_anonymous_events_build_session_profile():
+    product = Product.objects.create(name="Guest", slug="guest", product_type="shoes", price=50, currency="TRY")
+    _event(product, event_type="cart_add", session_id="sess-1")
+    _event(product)  # без пользователя и сессии — некому приписать
+
+    stats = process_new_events(engine=_FakeEngine({product.id: [1.0, 0.0]}))
+
+    profile = UserEmbedding.objects.get(session_id="sess-1")
+    assert stats["applied"] == 1
+    assert profile.user_id is None
+    assert profile.preference_weight == pytest.approx(4.0)
@@ -1,4 +1,6 @@
-"""API views for recommendations (search_by_image, personalized, complete_the_look)."""
+"""API views for recommendations (search_by_image, personalized, complete_the_look, bundle)."""
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,14 +9,18 @@ from rest_framework.permissions import AllowAny
 from apps.catalog.card_payload import compact_card_product_payload
 from apps.feedback.review_aggregates import attach_review_aggregates
 
+from .services.ml_client import MLServiceError
+
+logger = logging.getLogger(__name__)
+
 
 class RecommendationViewSet(viewsets.ViewSet):
     """API for vector recommendations (search by image, personalized, complete the look)."""
     permission_classes = [AllowAny]
 
     def _get_engine(self):
-        from .services.vector_engine import QdrantRecommendationEngine
-        return QdrantRecommendationEngine()
+        from .services.qdrant_registry import get_recommendation_engine
+        return get_recommendation_engine()
 
     @staticmethod
     def _serialize_matches(matches, request):
@@ -63,6 +69,12 @@ class RecommendationViewSet(viewsets.ViewSet):
                 image_url=image_url,
                 n_results=n_results,
             )
+        except MLServiceError as e:
+            logger.warning("search_by_image: ml_service unavailable: %s", e)
+            return Response(
+                {"error": "encoder_unavailable", "message": "Image search is temporarily unavailable."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
         except ValueError as e:
             if str(e) == "invalid_image_url":
                 return Response(
@@ -119,14 +131,21 @@ class RecommendationViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["get"])
     def personalized(self, request):
         """GET /api/recommendations/personalized/ — personalized or trending."""
-        if not request.user.is_authenticated:
-            return self._get_trending(request)
         from .models import UserEmbedding
-        user_emb, _ = UserEmbedding.objects.get_or_create(
-            user=request.user,
-            defaults={"preference_vector": None},
-        )
-        if user_emb.preference_vector is None:
+        if request.user.is_authenticated:
+            user_emb, _ = UserEmbedding.objects.get_or_create(
+                user=request.user,
+                defaults={"preference_vector": None},
+            )
+        else:
+            # Гостю — профиль его сессии, если события уже накопились.
+            from .services.user_profiles import visitor_session_id
+            session_key = visitor_session_id(request)
+            user_emb = (
+                UserEmbedding.objects.filter(user__isnull=True, session_id=session_key).first()
+                if session_key else None
+            )
+        if user_emb is None or user_emb.preference_vector is None:
             return self._get_trending(request)
         viewed = getattr(request, "_viewed_product_ids", []) or []
         try:
@@ -194,18 +213,28 @@ class RecommendationViewSet(viewsets.ViewSet):
         from apps.catalog.models import Product
         from django.shortcuts import get_object_or_404
         product = get_object_or_404(Product, pk=product_id)
-        complementary = self._get_complementary_categories(product)
+        complementary = [
+            (cat_id, relation_type)
+            for cat_id, relation_type in self._get_complementary_categories(product)
+            if cat_id is not None
+        ]
         engine = self._get_engine()
+        # Все категории — одним query_batch_points, вектор товара читается один раз.
+        matches = engine.find_similar_batch(
+            product.id,
+            [
+                {
+                    "key": f"look:{cat_id}",
+                    "vector_type": "combined",
+                    "n_results": 3,
+                    "filters": {"category_id": cat_id},
+                }
+                for cat_id, _ in complementary
+            ],
+        )
         results = []
         for cat_id, relation_type in complementary:
-            if cat_id is None:
-                continue
-            similar = engine.find_similar(
-                product_id=product.id,
-                vector_type="combined",
-                n_results=3,
-                filters={"category_id": cat_id},
-            )
+            similar = matches.get(f"look:{cat_id}") or []
             if similar:
                 results.append({
                     "relation_type": relation_type,
@@ -217,6 +246,136 @@ class RecommendationViewSet(viewsets.ViewSet):
             "complementary_items": results,
         })
 
+    @action(detail=False, methods=["get"])
+    def bundle(self, request):
+        """
+        GET /api/recommendations/bundle/?product_id=... — блоки страницы товара
+        (similar, visually_similar, complete_the_look) одним запросом к Qdrant и
+        одним проходом сериализации карточек.
+        """
+        product_id = request.query_params.get("product_id")
+        if not product_id:
+            return Response(
+                {"error": "product_id required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        from apps.catalog.models import Product
+        from apps.catalog.serializers import serialize_product_for_card
+        from django.shortcuts import get_object_or_404
+        from .services.rerank_features import get_features
+        from .services.reranker import CARD_PREFETCH_RELATED, BusinessReranker
+
+        def _limit(name, default):
+            try:
+                return max(0, min(int(request.query_params.get(name, default)), 50))
+            except (TypeError, ValueError):
+                return default
+
+        similar_limit = _limit("similar_limit", 12)
+        visual_limit = _limit("visual_limit", 12)
+        look_limit = _limit("look_limit", 2)
+        strategy = request.query_params.get("strategy", "balanced")
+        product = get_object_or_404(Product.objects.select_related("category", "brand"), pk=product_id)
+        complementary = [
+            (cat_id, relation_type)
+            for cat_id, relation_type in self._get_complementary_categories(product)
+            if cat_id is not None
+        ]
+        queries = []
+        if similar_limit:
+            queries.append({"key": "similar", "vector_type": "combined", "n_results": similar_limit * 2})
+        if visual_limit:
+            queries.append({"key": "visual", "vector_type": "image", "n_results": visual_limit})
+        if look_limit:
+            queries.extend(
+                {
+                    "key": f"look:{cat_id}",
+                    "vector_type": "combined",
+                    "n_results": look_limit + 1,
+                    "filters": {"category_id": cat_id},
+                }
+                for cat_id, _ in complementary
+            )
+        payload = {
+            "base_product_id": product.id,
+            "similar": [],
+            "visually_similar": [],
+            "complete_the_look": [],
+        }
+        try:
+            matches = self._get_engine().find_similar_batch(product.id, queries)
+        except Exception:
+            logger.exception("Recommendation bundle unavailable for product_id=%s", product.id)
+            return Response({**payload, "error": "Рекомендации временно недоступны"})
+
+        # Отбор и ранжирование — по feature store; карточки собираются только
+        # для попавших в ответ товаров.
+        reranker = BusinessReranker()
+        ids = {match["product_id"] for rows in matches.values() for match in rows}
+        features = get_features(list(ids) + [product.id])
+
+        def pick(rows, limit):
+            return [
+                match for match in rows
+                if match["product_id"] in features and not features[match["product_id"]]["is_shadow_variant"]
+            ][:limit]
+
+        similar = reranker.rank(matches.get("similar") or [], product, strategy, features=features)[:similar_limit]
+        visual = pick(matches.get("visual") or [], visual_limit)
+        looks = [
+            (cat_id, relation_type, pick(matches.get(f"look:{cat_id}") or [], look_limit))
+            for cat_id, relation_type in complementary
+        ]
+        chosen = {match["product_id"] for match in similar + visual}
+        chosen.update(match["product_id"] for _, _, rows in looks for match in rows)
+        products = (
+            Product.objects.filter(id__in=chosen)
+            .select_related("category", "brand")
+            .prefetch_related(*CARD_PREFETCH_RELATED)
+        )
+        product_map = {item.id: item for item in products}
+        cards = {}
+
+        def card(item):
+            if item.id not in cards:
+                cards[item.id] = compact_card_product_payload(serialize_product_for_card(item, request))
+            return cards[item.id]
+
+        def match_rows(rows):
+            out = []
+            for match in rows:
+                item = product_map.get(match["product_id"])
+                if item is None:
+                    continue
+                row = dict(match)
+                row.pop("payload", None)
+                row["product"] = card(item)
+                out.append(row)
+            return out
+
+        for ranked in similar:
+            item = product_map.get(ranked["product_id"])
+            if item is None:
+                continue
+            ranked = {**ranked, "product": item}
+            payload["similar"].append({
+                "product": card(item),
+                "similarity_score": ranked.get("score"),
+                "business_score": round(ranked["business_score"], 4),
+                "reason": reranker.recommendation_reason(ranked),
+            })
+        payload["visually_similar"] = match_rows(visual)
+        for cat_id, relation_type, rows in looks:
+            items = match_rows(rows)
+            if items:
+                payload["complete_the_look"].append({
+                    "relation_type": relation_type,
+                    "category_id": cat_id,
+                    "items": items,
+                })
+        attach_review_aggregates(list(cards.values()))
+        return Response(payload)
+
     def _get_trending(self, request):
         """Fallback: recent/trending products."""
         from apps.catalog.models import Product
@@ -268,13 +427,12 @@ class RecommendationViewSet(viewsets.ViewSet):
         slug = getattr(product.category, "slug", None) or ""
         product_type = getattr(product, "product_type", "") or ""
         keys = [slug, product_type]
-        out = []
-        for key in keys:
-            if not key:
-                continue
-            comps = mapping.get(key, [])
-            for comp in comps:
-                cat = Category.objects.filter(slug=comp).first()
-                if cat:
-                    out.append((cat.id, comp))
+        # slug категории и product_type часто совпадают — без повторов одной категории.
+        wanted = list(dict.fromkeys(comp for key in keys if key for comp in mapping.get(key, [])))
+        if not wanted:
+            return []
+        category_ids = {}
+        for cat_id, cat_slug in Category.objects.filter(slug__in=wanted).order_by("pk").values_list("id", "slug"):
+            category_ids.setdefault(cat_slug, cat_id)
+        out = [(category_ids[comp], comp) for comp in wanted if comp in category_ids]
         return out[:4] if out else []
@@ -1149,6 +1149,7 @@ class ScrapingSessionAdmin(admin.ModelAdmin):
                 "fields": [
                     ("products_found", "products_created"),
                     ("products_updated", "products_skipped"),
+                    "products_unchanged",
                     ("pages_processed", "errors_count"),
                 ]
             },
@@ -1202,10 +1203,11 @@ class ScrapingSessionAdmin(admin.ModelAdmin):
         return format_html(
             '<span style="color: green;">+{}</span> / '
             '<span style="color: blue;">~{}</span> / '
-            '<span style="color: gray;">-{}</span>',
+            '<span style="color: gray;">-{} (без изменений: {})</span>',
             int(obj.products_created),
             int(obj.products_updated),
             int(obj.products_skipped),
+            int(obj.products_unchanged),
         )
 
     products_stats.short_description = "Создано / Обновлено / Пропущено"
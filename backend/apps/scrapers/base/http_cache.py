@@ -0,0 +1,126 @@
+"""Дисковый кэш страниц источников для условных GET-запросов парсеров.
+
+Для каждого URL хранится ETag/Last-Modified, sha256 тела и само тело в gzip.
+Повторный запрос отправляется с If-None-Match/If-Modified-Since; ответ 304 или
+тело с тем же хэшем означает, что страница не изменилась с прошлой загрузки
+(см. ScrapedProduct.source_unchanged). Валидаторы сохраняются при загрузке, а не
+после записи товара, поэтому сервис интеграции пропускает такую карточку только
+если совпал и отпечаток последней успешной записи (ScrapedProductFingerprint).
+
+Кэш включается настройкой SCRAPER_HTTP_CACHE_DIR (путь к постоянному тому).
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def content_digest(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedPage:
+    """Метаданные закэшированной страницы (без тела)."""
+
+    url: str
+    content_sha256: str
+    etag: str = ""
+    last_modified: str = ""
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """Кэш страниц в каталоге: ``<root>/<xx>/<sha256(url)>.json`` + ``.html.gz``."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    @classmethod
+    def from_settings(cls) -> Optional["PageCache"]:
+        try:
+            from django.conf import settings
+
+            root = str(getattr(settings, "SCRAPER_HTTP_CACHE_DIR", "") or "").strip()
+        except Exception:
+            return None
+        return cls(root) if root else None
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        folder = self.root / key[:2]
+        return folder / f"{key}.json", folder / f"{key}.html.gz"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not body_path.exists():
+            return None
+        return CachedPage(
+            url=url,
+            content_sha256=str(meta.get("content_sha256") or ""),
+            etag=str(meta.get("etag") or ""),
+            last_modified=str(meta.get("last_modified") or ""),
+        )
+
+    def read_body(self, url: str) -> Optional[str]:
+        _, body_path = self._paths(url)
+        try:
+            return gzip.decompress(body_path.read_bytes()).decode("utf-8")
+        except (OSError, EOFError, UnicodeDecodeError, gzip.BadGzipFile):
+            return None
+
+    def store(self, url: str, body: str, *, etag: str = "", last_modified: str = "") -> bool:
+        """Сохраняет ответ 200. Возвращает True, если тело совпало с закэшированным."""
+        digest = content_digest(body)
+        previous = self.lookup(url)
+        unchanged = bool(previous and previous.content_sha256 == digest)
+        meta_path, body_path = self._paths(url)
+        try:
+            if not unchanged:
+                self._write_atomic(body_path, gzip.compress(body.encode("utf-8")))
+            meta = {
+                "url": url,
+                "content_sha256": digest,
+                "etag": etag or "",
+                "last_modified": last_modified or "",
+                "fetched_at": timezone.now().isoformat(),
+            }
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            # Кэш — оптимизация: ошибка записи не должна ронять парсинг.
+            logger.warning("Не удалось сохранить страницу %s в HTTP-кэш: %s", url, e)
+        return unchanged
@@ -0,0 +1,108 @@
+"""Бюджет запросов к хосту источника (token bucket) с адаптивным backoff.
+
+Вежливость парсера задаётся числом запросов в секунду на хост, а не фиксированной
+паузой после каждого ответа: время сетевого ожидания засчитывается в интервал, а
+параллельные запросы (BaseScraper.fetch_many) делят один бюджет. На 429/503
+скорость хоста временно снижается вдвое и восстанавливается постепенно.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# Нижняя граница скорости после серии 429/503: один запрос в 30 секунд.
+MIN_REQUESTS_PER_SECOND = 1 / 30
+# Восстановление после штрафа: +10% базовой скорости за каждый успешный ответ.
+RECOVERY_STEP = 0.1
+DEFAULT_PENALTY_SECONDS = 5.0
+MAX_PENALTY_SECONDS = 120.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Секунды из заголовка Retry-After (форма HTTP-date не используется источниками)."""
+    try:
+        seconds = float(str(value or "").strip())
+    except ValueError:
+        return None
+    return min(max(seconds, 0.0), MAX_PENALTY_SECONDS)
+
+
+class HostRateLimiter:
+    """Token bucket одного хоста, общий для всех потоков процесса."""
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        self.base_rate = float(requests_per_second)
+        self.rate = self.base_rate
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, requests_per_second: float, burst: int = 1) -> None:
+        with self._lock:
+            self.base_rate = float(requests_per_second)
+            self.rate = min(self.rate, self.base_rate)
+            self.capacity = max(1, int(burst))
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(float(self.capacity), self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """Блокирует поток до появления токена. Возвращает время ожидания в секундах."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                else:
+                    delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """Источник ответил 429/503: пауза для хоста и снижение скорости вдвое."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate / 2)
+            pause = retry_after if retry_after is not None else DEFAULT_PENALTY_SECONDS
+            self._paused_until = max(self._paused_until, now + pause)
+            self._tokens = 0.0
+
+    def reward(self) -> None:
+        """Успешный ответ: постепенно возвращаемся к базовой скорости."""
+        if self.rate >= self.base_rate:
+            return
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+
+_limiters: Dict[str, HostRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(url: str, requests_per_second: float, burst: int = 1) -> HostRateLimiter:
+    """Лимитер хоста из реестра процесса.
+
+    Бюджет задаётся один раз — первым обращением к хосту; последующие вызовы
+    получают тот же лимитер без перенастройки, чтобы параллельные парсеры с
+    разными настройками не переключали скорость друг другу. Явно изменить
+    бюджет можно через HostRateLimiter.configure().
+    """
+    host = (urlparse(url).netloc or url).lower()
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = HostRateLimiter(requests_per_second, burst=burst)
+            _limiters[host] = limiter
+        return limiter
@@ -1,11 +1,14 @@
 """Базовый класс для всех парсеров."""
 
 import logging
+import threading
 import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urljoin, urlparse
 
 import httpx
@@ -15,6 +18,8 @@ from fake_useragent import UserAgent
 
 from apps.http_errors import ExternalAccessBlockedError, raise_for_blocked_status
 
+from .http_cache import PageCache
+from .rate_limit import HostRateLimiter, get_host_limiter, parse_retry_after
 from .selectors import DataSelector, SelectorConfig
 from .utils import clean_text, normalize_price, extract_currency
 
@@ -66,6 +71,10 @@ class ScrapedProduct:
     
     # Аналоги (muadilleri/eşdeğerleri)
     analogs: List[Dict[str, Any]] = field(default_factory=list)
+
+    # Все страницы карточки пришли из HTTP-кэша неизменными (304 или тот же хэш):
+    # сервис интеграции может не перезаписывать уже существующий товар.
+    source_unchanged: bool = False
     
     def to_dict(self) -> Dict[str, Any]:
         """Преобразует объект в словарь."""
@@ -107,6 +116,24 @@ ScrapedProductDetailResult = Union[Optional[ScrapedProduct], List[ScrapedProduct
 ScraperAccessBlockedError = ExternalAccessBlockedError
 
 
+class PageChangeScope:
+    """Страницы, загруженные внутри BaseScraper.tracking_page_changes()."""
+
+    def __init__(self):
+        self.fetched = 0
+        self.changed = 0
+
+    def record(self, unchanged: bool) -> None:
+        self.fetched += 1
+        if not unchanged:
+            self.changed += 1
+
+    @property
+    def unchanged(self) -> bool:
+        """True, если были загрузки и ни одна страница не изменилась."""
+        return self.fetched > 0 and self.changed == 0
+
+
 class BaseScraper(ABC):
     """Базовый абстрактный класс для всех парсеров."""
 
@@ -116,6 +143,13 @@ class BaseScraper(ABC):
     # поэтому она отключена — см. tasks.run_scraper_task.
     SUPPORTS_PAGE_CHUNKING = False
 
+    # Сколько запросов fetch_many держит в полёте одновременно. Скорость при этом
+    # ограничена бюджетом хоста (requests_per_second), а не числом потоков.
+    FETCH_CONCURRENCY = 4
+    # Сколько заранее загруженных страниц держит буфер fetch_many(prefetch=True);
+    # при переполнении вытесняются самые старые.
+    PREFETCH_BUFFER_SIZE = 100
+
     def __init__(self,
                  base_url: str,
                  delay_range: tuple = (1, 3),
@@ -133,6 +167,19 @@ class BaseScraper(ABC):
         self.username = username
         self.password = password
         self.max_products = None  # Лимит товаров
+        # Бюджет запросов к хосту; None — выводится из delay_range (см. _get_rate_limiter).
+        self.requests_per_second: Optional[float] = None
+        # Страницы, заранее загруженные fetch_many(prefetch=True) и ещё не прочитанные.
+        # Значение — (HTML, страница не изменилась по HTTP-кэшу).
+        self._prefetched_pages: Dict[str, Tuple[str, bool]] = {}
+        self._prefetch_lock = threading.Lock()
+        # Потоки fetch_many ходят через собственные httpx.Client (см. _worker_clients).
+        self._thread_state = threading.local()
+        # Условные GET по ETag/Last-Modified; None — SCRAPER_HTTP_CACHE_DIR не задан.
+        self.http_cache: Optional[PageCache] = PageCache.from_settings()
+        # Открытые области tracking_page_changes().
+        self._page_scopes: List["PageChangeScope"] = []
+        self._page_scopes_lock = threading.Lock()
         self.pages_processed = 0
         # None — парсер не сообщает; True/False — явный сигнал для Celery,
         # нужен ли следующий постраничный чанк.
@@ -158,6 +205,7 @@ class BaseScraper(ABC):
         
         # HTTP клиент
         self.client = None
+        self._client_kwargs: Dict[str, Any] = {}
         
         # Заголовки по умолчанию
         self.default_headers = {
@@ -216,14 +264,60 @@ class BaseScraper(ABC):
                 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
             except Exception:
                 pass
+        self._client_kwargs = client_kwargs
         self.client = httpx.Client(**client_kwargs)
-    
+
+    def _http_client(self) -> httpx.Client:
+        """Клиент текущего потока: у потоков fetch_many свой, иначе основной."""
+        return getattr(self._thread_state, "client", None) or self.client
+
+    @contextmanager
+    def _worker_clients(self) -> Iterator[Callable[[], None]]:
+        """Отдельный httpx.Client на каждый поток пула fetch_many.
+
+        Клиент создаётся с настройками основного и копирует его текущие
+        заголовки и cookies (configure_request_identity, прогрев), так что
+        отпечаток запросов не меняется; общий клиент между потоками не делится.
+        Возвращает initializer для ThreadPoolExecutor; клиенты закрываются на выходе.
+        """
+        clients: List[httpx.Client] = []
+        lock = threading.Lock()
+
+        def init_worker() -> None:
+            client = httpx.Client(**self._client_kwargs)
+            if self.client is not None:
+                client.headers.update(self.client.headers)
+                client.cookies.update(self.client.cookies)
+            self._thread_state.client = client
+            with lock:
+                clients.append(client)
+
+        try:
+            yield init_worker
+        finally:
+            with lock:
+                for client in clients:
+                    client.close()
+
+    def _remember_prefetched(self, url: str, html: str, unchanged: bool = False) -> None:
+        """Кладёт страницу в буфер предзагрузки, вытесняя самые старые сверх лимита."""
+        with self._prefetch_lock:
+            self._prefetched_pages.pop(url, None)
+            self._prefetched_pages[url] = (html, unchanged)
+            while len(self._prefetched_pages) > self.PREFETCH_BUFFER_SIZE:
+                self._prefetched_pages.pop(next(iter(self._prefetched_pages)))
+
+    def _take_prefetched(self, url: str) -> Optional[Tuple[str, bool]]:
+        with self._prefetch_lock:
+            return self._prefetched_pages.pop(url, None)
+
     def __enter__(self):
         """Контекстный менеджер - вход."""
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Контекстный менеджер - выход."""
+        self._prefetched_pages.clear()
         if self.client:
             self.client.close()
 
@@ -269,8 +363,34 @@ class BaseScraper(ABC):
             if clean_cookies:
                 ajax_session.cookies.update(clean_cookies)
     
+    def _get_rate_limiter(self, url: str) -> Optional[HostRateLimiter]:
+        """Лимитер хоста запроса.
+
+        Без явного ``requests_per_second`` бюджет равен прежней средней паузе
+        ``delay_range``: 1 / среднее(delay_range) запросов в секунду. Нулевая
+        задержка в конфигурации отключает ограничение.
+        """
+        rate = self.requests_per_second
+        if rate is None:
+            low, high = self.delay_range
+            average_delay = (float(low) + float(high)) / 2
+            if average_delay <= 0:
+                return None
+            rate = 1 / average_delay
+        if rate <= 0:
+            return None
+        return get_host_limiter(url, rate)
+
     def _make_request(self, url: str, **kwargs) -> Optional[str]:
         """Выполняет HTTP запрос с повторными попытками.
+
+        Перед каждой попыткой берётся токен из бюджета хоста (см. rate_limit):
+        пауза между запросами учитывает время ответа и общая для параллельных
+        запросов. 429/503/504 замедляют хост и ждут Retry-After.
+
+        При включённом HTTP-кэше (SCRAPER_HTTP_CACHE_DIR) простой GET уходит с
+        If-None-Match/If-Modified-Since; на 304 возвращается тело из кэша, а
+        страница отмечается неизменной (см. tracking_page_changes).
         
         Args:
             url: URL для запроса
@@ -281,22 +401,57 @@ class BaseScraper(ABC):
         """
         if not url.startswith(('http://', 'https://')):
             url = urljoin(self.base_url, url)
-        
+        if not kwargs:
+            prefetched = self._take_prefetched(url)
+            if prefetched is not None:
+                html, unchanged = prefetched
+                self._record_page_state(url, unchanged)
+                return html
+
+        # Условный запрос только для простого GET: с params/headers ответ
+        # может зависеть от аргументов, а ключ кэша — только URL.
+        cache = self.http_cache if not kwargs else None
+        cached = cache.lookup(url) if cache else None
+        limiter = self._get_rate_limiter(url)
         for attempt in range(self.max_retries + 1):
             try:
+                if limiter:
+                    limiter.acquire()
                 self.logger.info(f"Запрос к {url} (попытка {attempt + 1})")
                 
-                response = self.client.get(url, **kwargs)
+                request_kwargs = kwargs
+                if cached:
+                    request_kwargs = {"headers": cached.conditional_headers()}
+                client = self._http_client()
+                response = client.get(url, **request_kwargs)
+                if cached and response.status_code == 304:
+                    body = cache.read_body(url)
+                    if body is not None:
+                        if limiter:
+                            limiter.reward()
+                        self._record_page_state(url, True)
+                        return body
+                    # Тело в кэше повреждено — перезапрашиваем без условных заголовков
+                    # (это отдельный запрос к хосту — тоже в пределах бюджета).
+                    cached = None
+                    if limiter:
+                        limiter.acquire()
+                    response = client.get(url, **kwargs)
                 response.raise_for_status()
+                if limiter:
+                    limiter.reward()
                 
-                # Задержка между запросами со случайным разбросом (jitter)
-                if attempt < self.max_retries:
-                    import random
-                    base_delay = self.delay_range[0] + (self.delay_range[1] - self.delay_range[0]) * (attempt / self.max_retries)
-                    jitter = random.uniform(0.5, 2.0) # Добавляем от 0.5 до 2.0 сек рандома
-                    time.sleep(base_delay + jitter)
-                
-                return response.text
+                text = response.text
+                unchanged = False
+                if cache:
+                    unchanged = cache.store(
+                        url,
+                        text,
+                        etag=response.headers.get("ETag", ""),
+                        last_modified=response.headers.get("Last-Modified", ""),
+                    )
+                self._record_page_state(url, unchanged)
+                return text
                 
             except httpx.HTTPStatusError as e:
                 self.logger.warning(f"HTTP ошибка {e.response.status_code} для {url}")
@@ -307,7 +462,11 @@ class BaseScraper(ABC):
                 )
                 if e.response.status_code in [429, 503, 504]:  # Rate limiting, server errors
                     if attempt < self.max_retries:
-                        time.sleep(2 ** attempt)  # Exponential backoff
+                        retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                        if limiter:
+                            limiter.penalize(retry_after)
+                        else:
+                            time.sleep(retry_after if retry_after is not None else 2 ** attempt)
                         continue
                     raise
                 break
@@ -324,6 +483,91 @@ class BaseScraper(ABC):
                 raise
         
         return None
+
+    def _record_page_state(self, url: str, unchanged: bool) -> None:
+        """Запоминает, изменилась ли страница, и учитывает её в открытых областях."""
+        self._thread_state.last_page_unchanged = unchanged
+        with self._page_scopes_lock:
+            for scope in self._page_scopes:
+                scope.record(unchanged)
+
+    @contextmanager
+    def tracking_page_changes(self) -> Iterator[PageChangeScope]:
+        """Считает страницы, загруженные внутри блока (включая потоки fetch_many).
+
+        ``scope.unchanged`` истинно, когда все страницы пришли из HTTP-кэша
+        неизменными — парсер ставит по нему ``ScrapedProduct.source_unchanged``.
+        """
+        scope = PageChangeScope()
+        with self._page_scopes_lock:
+            self._page_scopes.append(scope)
+        try:
+            yield scope
+        finally:
+            with self._page_scopes_lock:
+                self._page_scopes.remove(scope)
+
+    def fetch_many(
+        self,
+        urls: Iterable[str],
+        *,
+        max_workers: Optional[int] = None,
+        prefetch: Union[bool, Collection[str]] = False,
+    ) -> List[Optional[str]]:
+        """Загружает несколько страниц параллельно в пределах бюджета хоста.
+
+        Возвращает HTML в порядке ``urls``; страница, которую не удалось получить,
+        даёт None (ошибка логируется). Отказ доступа (401/403/407) и мягкий лимит
+        Celery пробрасываются, оставшиеся загрузки отменяются.
+
+        prefetch=True дополнительно кладёт ответы в буфер, из которого их заберёт
+        следующий ``_make_request`` того же URL: так парсер может заранее загрузить
+        карточки страницы, не меняя код разбора деталей. Вместо True можно передать
+        набор URL — в буфер попадут только они. Вместе со страницей буфер хранит её
+        состояние по HTTP-кэшу для tracking_page_changes().
+        """
+        urls = [
+            url if url.startswith(('http://', 'https://')) else urljoin(self.base_url, url)
+            for url in urls
+        ]
+        if not urls:
+            return []
+        workers = max(1, min(max_workers or self.FETCH_CONCURRENCY, len(urls)))
+
+        def fetch(url: str) -> Tuple[Optional[str], bool]:
+            self._thread_state.last_page_unchanged = False
+            try:
+                html = self._make_request(url)
+            except (ExternalAccessBlockedError, SoftTimeLimitExceeded):
+                raise
+            except Exception as e:
+                self.logger.warning(f"Не удалось загрузить {url}: {e}")
+                return None, False
+            return html, self._thread_state.last_page_unchanged
+
+        if workers == 1:
+            results = [fetch(url) for url in urls]
+        else:
+            with self._worker_clients() as init_worker:
+                executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix=f"{self.get_name()}-fetch",
+                    initializer=init_worker,
+                )
+                try:
+                    results = list(executor.map(fetch, urls))
+                finally:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+        if prefetch:
+            wanted = None if prefetch is True else {
+                url if url.startswith(('http://', 'https://')) else urljoin(self.base_url, url)
+                for url in prefetch
+            }
+            for url, (html, unchanged) in zip(urls, results):
+                if html is not None and (wanted is None or url in wanted):
+                    self._remember_prefetched(url, html, unchanged)
+        return [html for html, _ in results]
     
     def _parse_page(self, html: str, url: str) -> DataSelector:
         """Создает селектор для парсинга страницы.
@@ -1,11 +1,22 @@
-"""Система селекторов для извлечения данных из HTML."""
+"""Система селекторов для извлечения данных из HTML.
 
+Страница разбирается один раз; CSS-выборки кэшируются на DataSelector, поэтому
+набор SelectorConfig с общими селекторами (extract_multiple) проходит дерево по
+одному разу на уникальный селектор. Дерево строит подключаемый backend:
+BeautifulSoup+lxml (по умолчанию) или selectolax (Lexbor), если пакет установлен
+и выбран настройкой SCRAPER_HTML_BACKEND.
+"""
+
+import logging
+from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Dict, List, Optional, Union
 from bs4 import BeautifulSoup, Tag
 import re
 
+logger = logging.getLogger(__name__)
+
 
 class SelectorType(Enum):
     """Типы селекторов."""
@@ -52,18 +63,152 @@ class SelectorConfig:
     transformations: List[str] = field(default_factory=list)
 
 
+class HtmlBackend(ABC):
+    """Интерфейс дерева разбора для DataSelector."""
+
+    name = ""
+
+    @abstractmethod
+    def parse(self, html: str) -> Any:
+        """Корень дерева разбора страницы."""
+
+    @abstractmethod
+    def select(self, node: Any, css: str) -> List[Any]:
+        """Потомки node, подходящие под CSS-селектор, в порядке документа."""
+
+    @abstractmethod
+    def node_key(self, node: Any) -> Any:
+        """Идентичность узла дерева (обёртки узлов могут создаваться заново)."""
+
+    @abstractmethod
+    def text(self, node: Any, separator: str = "") -> str:
+        """Текст узла без пробелов по краям; separator — между текстовыми узлами."""
+
+    @abstractmethod
+    def attr(self, node: Any, name: str) -> Any:
+        """Значение атрибута или пустая строка."""
+
+    @abstractmethod
+    def outer_html(self, node: Any) -> str:
+        """HTML узла вместе с тегом."""
+
+
+class SoupBackend(HtmlBackend):
+    """BeautifulSoup с парсером lxml — прежнее поведение DataSelector."""
+
+    name = "bs4"
+
+    def parse(self, html: str) -> BeautifulSoup:
+        return BeautifulSoup(html, "lxml")
+
+    def select(self, node: Tag, css: str) -> List[Tag]:
+        return node.select(css)
+
+    def node_key(self, node: Tag) -> int:
+        return id(node)
+
+    def text(self, node: Tag, separator: str = "") -> str:
+        return node.get_text(separator, strip=True)
+
+    def attr(self, node: Tag, name: str) -> Any:
+        return node.get(name, "")
+
+    def outer_html(self, node: Tag) -> str:
+        return str(node)
+
+
+class SelectolaxBackend(HtmlBackend):
+    """selectolax (Lexbor): разбор и CSS-выборки на C, в разы быстрее bs4."""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser_class = LexborHTMLParser
+
+    def parse(self, html: str) -> Any:
+        return self._parser_class(html or "")
+
+    def select(self, node: Any, css: str) -> List[Any]:
+        return list(node.css(css))
+
+    def node_key(self, node: Any) -> int:
+        return node.mem_id
+
+    def text(self, node: Any, separator: str = "") -> str:
+        return node.text(separator=separator, strip=True)
+
+    def attr(self, node: Any, name: str) -> Any:
+        return node.attributes.get(name) or ""
+
+    def outer_html(self, node: Any) -> str:
+        return node.html or ""
+
+
+HTML_BACKENDS = {
+    SoupBackend.name: SoupBackend,
+    SelectolaxBackend.name: SelectolaxBackend,
+}
+DEFAULT_HTML_BACKEND = SoupBackend.name
+
+_backend_instances: Dict[str, HtmlBackend] = {}
+
+
+def get_html_backend(name: Optional[str] = None) -> HtmlBackend:
+    """Backend по имени или из SCRAPER_HTML_BACKEND; недоступный заменяется на bs4."""
+    if not name:
+        try:
+            from django.conf import settings
+
+            name = getattr(settings, "SCRAPER_HTML_BACKEND", "") or DEFAULT_HTML_BACKEND
+        except Exception:
+            name = DEFAULT_HTML_BACKEND
+    name = str(name).strip().lower()
+    backend = _backend_instances.get(name)
+    if backend is not None:
+        return backend
+    backend_class = HTML_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Неизвестный HTML backend: {name}")
+    try:
+        backend = backend_class()
+    except ImportError:
+        logger.warning("HTML backend %s недоступен, используется %s", name, DEFAULT_HTML_BACKEND)
+        backend = get_html_backend(DEFAULT_HTML_BACKEND)
+    _backend_instances[name] = backend
+    return backend
+
+
 class DataSelector:
     """Класс для извлечения данных из HTML с помощью селекторов."""
     
-    def __init__(self, html: str, base_url: str = ""):
+    def __init__(self, html: str, base_url: str = "", backend: Union[str, HtmlBackend, None] = None):
         """Инициализация селектора.
         
         Args:
             html: HTML код страницы
             base_url: Базовый URL для относительных ссылок
+            backend: Имя или экземпляр HtmlBackend (по умолчанию SCRAPER_HTML_BACKEND)
         """
-        self.soup = BeautifulSoup(html, 'lxml')
+        self.backend = backend if isinstance(backend, HtmlBackend) else get_html_backend(backend)
+        self.root = self.backend.parse(html)
         self.base_url = base_url
+        self._selections: Dict[str, List[Any]] = {}
+        self._selection_keys: Dict[str, set] = {}
+
+    @property
+    def soup(self) -> Optional[BeautifulSoup]:
+        """Дерево BeautifulSoup (только для backend bs4)."""
+        return self.root if isinstance(self.root, BeautifulSoup) else None
+
+    def select(self, css: str) -> List[Any]:
+        """Элементы страницы по CSS-селектору; повторный запрос берётся из кэша."""
+        elements = self._selections.get(css)
+        if elements is None:
+            elements = self.backend.select(self.root, css)
+            self._selections[css] = elements
+        return elements
         
     def extract(self, config: SelectorConfig) -> Any:
         """Извлекает данные по конфигурации селектора.
@@ -75,9 +220,16 @@ class DataSelector:
             Извлеченные данные
         """
         try:
-            # Находим элементы по селектору
-            elements = self.soup.select(config.selector)
-            
+            elements = self.select(config.selector)
+        except Exception as e:
+            if config.required:
+                raise ValueError(f"Ошибка извлечения данных по селектору {config.selector}: {e}")
+            return config.default
+        return self._extract_from(elements, config)
+
+    def _extract_from(self, elements: List[Any], config: SelectorConfig) -> Any:
+        """Применяет index/attribute/regex/transformations к найденным элементам."""
+        try:
             if not elements:
                 if config.required:
                     raise ValueError(f"Обязательный селектор не найден: {config.selector}")
@@ -117,7 +269,7 @@ class DataSelector:
                 raise ValueError(f"Ошибка извлечения данных по селектору {config.selector}: {e}")
             return config.default
     
-    def _extract_from_element(self, element: Tag, attribute: str) -> Any:
+    def _extract_from_element(self, element: Any, attribute: str) -> Any:
         """Извлекает значение атрибута из элемента.
         
         Args:
@@ -128,17 +280,17 @@ class DataSelector:
             Значение атрибута
         """
         if attribute == "text":
-            return element.get_text(strip=True)
+            return self.backend.text(element)
         elif attribute == "html":
-            return str(element)
+            return self.backend.outer_html(element)
         elif attribute == "href":
-            href = element.get('href', '')
+            href = self.backend.attr(element, 'href')
             return self._normalize_url(href) if href else ''
         elif attribute == "src":
-            src = element.get('src', '')
+            src = self.backend.attr(element, 'src')
             return self._normalize_url(src) if src else ''
         else:
-            return element.get(attribute, '')
+            return self.backend.attr(element, attribute)
     
     def _normalize_url(self, url: str) -> str:
         """Нормализует URL относительно базового."""
@@ -205,6 +357,7 @@ class DataSelector:
         """
         results = {}
         
+        # Одинаковые селекторы разных полей выбираются один раз (кэш select).
         for field_name, config in configs.items():
             results[field_name] = self.extract(config)
             
@@ -224,16 +377,32 @@ class DataSelector:
         """
         products = []
         
-        # Находим все элементы товаров
-        product_elements = self.soup.select(item_selector)
-        
-        for element in product_elements:
-            # Создаем временный селектор для текущего элемента
-            element_html = str(element)
-            element_selector = DataSelector(element_html, self.base_url)
-            
-            # Извлекаем данные товара
-            product_data = element_selector.extract_multiple(field_configs)
+        # Поля ищутся внутри элемента того же дерева — без сериализации и
+        # повторного разбора HTML каждой карточки.
+        for element in self.select(item_selector):
+            product_data = {}
+            for field_name, config in field_configs.items():
+                try:
+                    elements = self._select_within(element, config.selector)
+                except Exception as e:
+                    if config.required:
+                        raise ValueError(
+                            f"Ошибка извлечения данных по селектору {config.selector}: {e}"
+                        )
+                    product_data[field_name] = config.default
+                    continue
+                product_data[field_name] = self._extract_from(elements, config)
             products.append(product_data)
         
         return products
+
+    def _select_within(self, element: Any, css: str) -> List[Any]:
+        """Сам элемент (если подходит) и его потомки — как при разборе его HTML отдельно."""
+        found = self.backend.select(element, css)
+        keys = self._selection_keys.get(css)
+        if keys is None:
+            keys = {self.backend.node_key(node) for node in self.select(css)}
+            self._selection_keys[css] = keys
+        if self.backend.node_key(element) in keys:
+            return [element] + found
+        return found
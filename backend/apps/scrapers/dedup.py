@@ -0,0 +1,258 @@
+"""Потоковый поиск кандидатов в дубликаты: MinHash/LSH по названиям и pHash изображений.
+
+Каталог читается одним проходом ``values().iterator()`` — в памяти остаются не
+модели, а компактные numpy-массивы: по строке на товар с хэшами полос (bands)
+MinHash-подписи названия, хэшами строгих идентификаторов и кодами контекста
+(бренд, категория, тип). Кандидаты — товары с совпадающим значением в одной из
+колонок; группы находятся сортировкой колонки, без попарного перебора всего
+каталога. Дорогое сравнение (DeduplicationService._compare_products) выполняется
+только для этих пар.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_FIELDS = ("external_id", "external_url", "barcode", "sku", "gtin", "mpn")
+
+NAME_SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+# 16 полос по 4 строки: пара попадает в кандидаты с вероятностью ~50% при
+# Jaccard 0.5 и ~99.9% при Jaccard 0.8 (1 - (1 - s^4)^16).
+LSH_BANDS = 16
+# 64-битный pHash режется на 4 полосы: изображения с расстоянием Хэмминга <= 3
+# гарантированно совпадут хотя бы в одной. Порог совпадения выводится из числа
+# полос, чтобы всякая пара, признанная похожей по фото, была и кандидатом.
+IMAGE_HASH_BANDS = 4
+IMAGE_HASH_MAX_DISTANCE = IMAGE_HASH_BANDS - 1
+# Группа похожих названий/изображений больше этого размера сравнивается не
+# попарно, а со скользящим окном соседей (по хэшу названия).
+MAX_GROUP_SIZE = 200
+GROUP_WINDOW = 20
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def stable_hash64(value: str) -> int:
+    """Ненулевой 64-битный хэш строки, одинаковый между процессами."""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def name_shingles(normalized_name: str, size: int = NAME_SHINGLE_SIZE) -> Set[str]:
+    """Символьные n-граммы нормализованного названия (короткое название — целиком)."""
+    text = normalized_name or ""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[index:index + size] for index in range(len(text) - size + 1)}
+
+
+def jaccard(left: Set[str], right: Set[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def image_hash_distance(left: int, right: int) -> int:
+    return bin(left ^ right).count("1")
+
+
+def parse_image_hash(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(str(value or "").strip(), 16) if value else None
+    except ValueError:
+        return None
+
+
+class MinHasher:
+    """MinHash-подпись множества шинглов на универсальных хэшах (a*x + b) mod p."""
+
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, bands: int = LSH_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на число полос")
+        rng = np.random.default_rng(seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        # Множители для свёртки строк полосы в один uint64 (переполнение — по модулю 2^64).
+        self._band_mix = rng.integers(1, np.iinfo(np.int64).max, size=self.rows, dtype=np.uint64) | 1
+
+    def signature(self, shingles: Iterable[str]) -> Optional[np.ndarray]:
+        values = np.fromiter(
+            (zlib.crc32(item.encode("utf-8")) % _MERSENNE_PRIME for item in shingles),
+            dtype=np.uint64,
+        )
+        if not values.size:
+            return None
+        return ((self._a * values[None, :] + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def band_hashes(self, signature: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            hashes = (signature.reshape(self.bands, self.rows) * self._band_mix).sum(axis=1)
+        hashes[hashes == 0] = 1
+        return hashes
+
+
+@dataclass
+class DedupIndex:
+    """Колоночный индекс каталога для генерации пар-кандидатов."""
+
+    hasher: MinHasher = field(default_factory=MinHasher)
+    product_ids: List[int] = field(default_factory=list)
+    _name_bands: List[np.ndarray] = field(default_factory=list)
+    _identifiers: List[List[int]] = field(default_factory=list)
+    _context: List[Tuple[int, int, int]] = field(default_factory=list)
+    _name_keys: List[int] = field(default_factory=list)
+    _type_codes: Dict[str, int] = field(default_factory=dict)
+    image_hashes: Dict[int, List[int]] = field(default_factory=dict)
+
+    def add(
+        self,
+        product_id: int,
+        *,
+        normalized_name: str,
+        identifiers: Dict[str, str],
+        brand_id: Optional[int],
+        category_id: Optional[int],
+        product_type: str,
+    ) -> None:
+        signature = self.hasher.signature(name_shingles(normalized_name))
+        bands = (
+            self.hasher.band_hashes(signature)
+            if signature is not None
+            else np.zeros(self.hasher.bands, dtype=np.uint64)
+        )
+        type_code = self._type_codes.setdefault(product_type or "", len(self._type_codes) + 1)
+        self.product_ids.append(product_id)
+        self._name_bands.append(bands)
+        self._identifiers.append([
+            stable_hash64(f"{name}:{identifiers[name]}") if identifiers.get(name) else 0
+            for name in IDENTIFIER_FIELDS
+        ])
+        self._context.append((brand_id or 0, category_id or 0, type_code))
+        self._name_keys.append(stable_hash64(normalized_name) if normalized_name else 0)
+
+    def add_image_hash(self, product_id: int, image_hash: Optional[str]) -> None:
+        value = parse_image_hash(image_hash)
+        if value is not None:
+            self.image_hashes.setdefault(product_id, []).append(value)
+
+    def images_match(self, left_id: int, right_id: int) -> bool:
+        return any(
+            image_hash_distance(left, right) <= IMAGE_HASH_MAX_DISTANCE
+            for left in self.image_hashes.get(left_id, ())
+            for right in self.image_hashes.get(right_id, ())
+        )
+
+    # --- Генерация пар ---
+
+    def candidate_pairs(self) -> Set[Tuple[int, int]]:
+        """Пары (меньший id, больший id), совпавшие хотя бы по одному ключу."""
+        if len(self.product_ids) < 2:
+            return set()
+        ids = np.asarray(self.product_ids, dtype=np.int64)
+        pairs: Set[Tuple[int, int]] = set()
+
+        identifiers = np.asarray(self._identifiers, dtype=np.uint64)
+        for column in identifiers.T:
+            for group in _equal_value_groups(column):
+                # Строгий идентификатор — сильный сигнал сам по себе: все пары группы.
+                self._add_all_pairs(ids[group], pairs)
+
+        name_bands = np.vstack(self._name_bands)
+        for column in name_bands.T:
+            for group in _equal_value_groups(column):
+                self._add_contextual_pairs(group, ids, pairs)
+
+        image_rows = self._image_band_rows()
+        if image_rows is not None:
+            rows, bands = image_rows
+            for column in bands.T:
+                for group in _equal_value_groups(column):
+                    self._add_contextual_pairs(np.unique(rows[group]), ids, pairs)
+        return pairs
+
+    def _image_band_rows(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if not self.image_hashes:
+            return None
+        row_by_id = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        rows, bands = [], []
+        shift = 64 // IMAGE_HASH_BANDS
+        mask = (1 << shift) - 1
+        for product_id, hashes in self.image_hashes.items():
+            row = row_by_id.get(product_id)
+            if row is None:
+                continue
+            for value in hashes:
+                rows.append(row)
+                # +1 и номер полосы в старших битах: ноль зарезервирован под «нет значения».
+                bands.append([
+                    ((value >> (shift * band)) & mask) + 1 + (band << 32)
+                    for band in range(IMAGE_HASH_BANDS)
+                ])
+        if not rows:
+            return None
+        return np.asarray(rows, dtype=np.int64), np.asarray(bands, dtype=np.uint64)
+
+    @staticmethod
+    def _add_all_pairs(group_ids: np.ndarray, pairs: Set[Tuple[int, int]]) -> None:
+        members = sorted({int(item) for item in group_ids})
+        for index, left in enumerate(members):
+            for right in members[index + 1:]:
+                pairs.add((left, right))
+
+    def _add_contextual_pairs(
+        self, group: np.ndarray, ids: np.ndarray, pairs: Set[Tuple[int, int]]
+    ) -> None:
+        """Похожее название/изображение засчитывается только вместе с двумя из
+        трёх совпадений контекста (бренд+категория, бренд+тип, категория+тип) —
+        иначе _compare_products всё равно не наберёт порог. Поэтому группа
+        делится на подгруппы по этим парам, и большие общие названия не дают
+        квадратичного числа сравнений."""
+        subgroups: Dict[Tuple[int, int, int], List[int]] = {}
+        for row in group.tolist():
+            brand_id, category_id, type_code = self._context[row]
+            for key in (
+                (0, brand_id, category_id),
+                (1, brand_id, type_code),
+                (2, category_id, type_code),
+            ):
+                subgroups.setdefault(key, []).append(row)
+        for rows in subgroups.values():
+            if len(rows) < 2:
+                continue
+            if len(rows) > MAX_GROUP_SIZE:
+                logger.warning(
+                    "Дедупликация: группа похожих товаров из %s позиций, сравниваем с %s соседями",
+                    len(rows),
+                    GROUP_WINDOW,
+                )
+                rows = sorted(rows, key=lambda row: (self._name_keys[row], row))
+                for index, row in enumerate(rows):
+                    for neighbour in rows[index + 1:index + 1 + GROUP_WINDOW]:
+                        left, right = sorted((int(ids[row]), int(ids[neighbour])))
+                        pairs.add((left, right))
+                continue
+            self._add_all_pairs(ids[rows], pairs)
+
+
+def _equal_value_groups(column: np.ndarray) -> Iterator[np.ndarray]:
+    """Индексы строк с одинаковым ненулевым значением колонки (группы от двух строк)."""
+    present = np.flatnonzero(column)
+    if present.size < 2:
+        return
+    order = present[np.argsort(column[present], kind="stable")]
+    values = column[order]
+    boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+    for group in np.split(order, boundaries):
+        if group.size >= 2:
+            yield group
@@ -0,0 +1,291 @@
+"""Пакетная запись спарсенных товаров: снимок каталога и буфер логов на один чанк.
+
+ScraperIntegrationService обрабатывает товары по одному, и каждый товар раньше
+делал собственные SELECT'ы (поиск по external_id, по URL источника, по имени и
+бренду, бренд/категория/автор по строке) плюс отдельный INSERT лога. В пакетном
+режиме эти данные поднимаются одним-двумя запросами на весь чанк, а логи
+пишутся одним bulk_create в конце чанка.
+
+Отпечаток содержимого карточки (scraped_product_fingerprint) сравнивается с
+сохранённым в ScrapedProductFingerprint: неизменные товары пропускаются до
+тяжёлого пути обновления, новые отпечатки записываются одним upsert на чанк.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from apps.catalog.models import Author, Brand, Category, Product
+
+from .base.scraper import ScrapedProduct, _json_safe_scraped_value
+from .models import ScrapedProductFingerprint, ScrapedProductLog, ScrapingSession
+
+# Кандидаты «тот же товар по имени и бренду» — как и в одиночном режиме, не больше 5.
+SIMILAR_PRODUCTS_LIMIT = 5
+LOG_BULK_BATCH_SIZE = 200
+# Меняется при изменении состава полей отпечатка: все товары один раз пройдут полный путь.
+FINGERPRINT_VERSION = 1
+
+
+def _casefold(value: Any) -> str:
+    # lower(), а не casefold(): ближе к LOWER()/iexact в Postgres.
+    return str(value or "").strip().lower()
+
+
+def _normalize_price(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    try:
+        return str(Decimal(str(value)).normalize())
+    except (InvalidOperation, ValueError):
+        return str(value)
+
+
+def scraped_product_fingerprint(
+    scraped_product: ScrapedProduct, *, max_images: Optional[int] = None
+) -> str:
+    """Стабильный sha256 содержимого карточки после маппинга категории/бренда.
+
+    Учитываются нормализованные название и описание, цена, наличие, атрибуты,
+    аналоги и медиа-URL в исходном порядке. Время парсинга не входит. Лимит медиа
+    сессии тоже входит: при его смене набор сохранённых медиа другой.
+    """
+    payload = {
+        "v": FINGERPRINT_VERSION,
+        "source": scraped_product.source,
+        "name": " ".join(str(scraped_product.name or "").split()).lower(),
+        "description": " ".join(str(scraped_product.description or "").split()),
+        "price": _normalize_price(scraped_product.price),
+        "currency": scraped_product.currency,
+        "category": scraped_product.category,
+        "brand": _casefold(scraped_product.brand),
+        "sku": scraped_product.sku,
+        "barcode": scraped_product.barcode,
+        "is_available": scraped_product.is_available,
+        "stock_quantity": scraped_product.stock_quantity,
+        "attributes": _json_safe_scraped_value(scraped_product.attributes or {}),
+        "analogs": _json_safe_scraped_value(scraped_product.analogs or []),
+        "images": list(scraped_product.images or []),
+        "max_images": max_images,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ScrapedProductBatch:
+    """Снимок каталога для одного чанка спарсенных товаров.
+
+    Все поиски возвращают то же, что одиночные запросы ``filter(...).first()``:
+    порядок обхода совпадает с ``Meta.ordering`` модели, а первая встреченная
+    запись по ключу выигрывает. Товары, созданные или обновлённые внутри чанка,
+    регистрируются через :meth:`remember`, чтобы повтор той же карточки в
+    этом же чанке не создавал дубль.
+    """
+
+    def __init__(self, session: Optional[ScrapingSession]):
+        self.session = session
+        self._api_by_external_id: Dict[str, Product] = {}
+        self._by_external_id: Dict[str, Product] = {}
+        self._by_source_url: Dict[Tuple[str, str], Product] = {}
+        self._by_name: Dict[str, List[Product]] = {}
+        self._variant_base_by_external_id: Dict[str, Product] = {}
+        self._brands: Dict[str, Brand] = {}
+        self._categories: Dict[str, Optional[Category]] = {}
+        self._authors: Dict[Tuple[str, str], Author] = {}
+        self._logs: List[ScrapedProductLog] = []
+        self._fingerprints: Dict[Tuple[int, str], str] = {}
+        self._pending_fingerprints: Dict[Tuple[int, str], str] = {}
+
+    # --- Предзагрузка ---
+
+    def prefetch(self, products: Iterable[ScrapedProduct]) -> None:
+        """Поднимает существующие товары, варианты мебели и бренды для всего чанка."""
+        products = list(products)
+        external_ids = {
+            str(p.external_id).strip() for p in products if str(p.external_id or "").strip()
+        }
+        urls = {str(p.url).strip() for p in products if str(p.url or "").strip()}
+        names = {_casefold(p.name) for p in products if _casefold(p.name)}
+        brand_names = {_casefold(p.brand) for p in products if _casefold(p.brand)}
+
+        lookup = Q()
+        if external_ids:
+            lookup |= Q(external_id__in=external_ids)
+        if urls:
+            lookup |= Q(external_url__in=urls)
+        if lookup:
+            candidates = list(
+                Product.objects.filter(lookup).select_related("brand", "category")
+            )
+            for product in candidates:
+                self._index_by_identity(product)
+            # Для URL источника одиночный режим берёт самую раннюю запись (order_by("pk")).
+            for product in sorted(candidates, key=lambda item: item.pk):
+                self._index_by_source_url(product)
+
+        if names:
+            for product in (
+                Product.objects.annotate(_name_lower=Lower("name"))
+                .filter(_name_lower__in=names)
+                .select_related("brand", "category")
+            ):
+                self._by_name.setdefault(_casefold(product.name), []).append(product)
+
+        missing_ids = external_ids - set(self._by_external_id)
+        if missing_ids:
+            from apps.catalog.models import FurnitureVariant
+
+            for variant in FurnitureVariant.objects.filter(
+                external_id__in=missing_ids
+            ).select_related("product__base_product"):
+                base_product = variant.product.base_product if variant.product else None
+                if base_product:
+                    self._variant_base_by_external_id.setdefault(variant.external_id, base_product)
+
+        if brand_names:
+            for brand in Brand.objects.annotate(_name_lower=Lower("name")).filter(
+                _name_lower__in=brand_names
+            ):
+                self._brands.setdefault(_casefold(brand.name), brand)
+
+        product_ids = {product.pk for product in self._by_external_id.values()}
+        product_ids.update(product.pk for product in self._by_source_url.values())
+        product_ids.update(product.pk for product in self._variant_base_by_external_id.values())
+        if product_ids:
+            for product_id, source, fingerprint in ScrapedProductFingerprint.objects.filter(
+                product_id__in=product_ids
+            ).values_list("product_id", "source", "fingerprint"):
+                self._fingerprints[(product_id, source)] = fingerprint
+
+    def _index_by_identity(self, product: Product, replace: bool = False) -> None:
+        external_id = str(product.external_id or "").strip()
+        if not external_id:
+            return
+        if replace or external_id not in self._by_external_id:
+            self._by_external_id[external_id] = product
+        external_data = product.external_data if isinstance(product.external_data, dict) else {}
+        if external_data.get("source") == "api" and (replace or external_id not in self._api_by_external_id):
+            self._api_by_external_id[external_id] = product
+
+    def _index_by_source_url(self, product: Product, replace: bool = False) -> None:
+        url = str(product.external_url or "").strip()
+        external_data = product.external_data if isinstance(product.external_data, dict) else {}
+        source = str(external_data.get("source") or "").strip()
+        if not (url and source):
+            return
+        current = self._by_source_url.get((url, source))
+        # Одиночный режим берёт самую раннюю запись: более поздний товар не вытесняет её.
+        if current is None or (replace and current.pk >= product.pk):
+            self._by_source_url[(url, source)] = product
+
+    def remember(self, product: Optional[Product]) -> None:
+        """
+        Регистрирует товар, записанный внутри чанка, для следующих карточек;
+        более свежий экземпляр заменяет ранее загруженный.
+        """
+        if product is None or not product.pk:
+            return
+        self._index_by_identity(product, replace=True)
+        self._index_by_source_url(product, replace=True)
+        name_key = _casefold(product.name)
+        if name_key:
+            bucket = self._by_name.setdefault(name_key, [])
+            bucket[:] = [item for item in bucket if item.pk != product.pk]
+            bucket.append(product)
+        for key, base_product in self._variant_base_by_external_id.items():
+            if base_product.pk == product.pk:
+                self._variant_base_by_external_id[key] = product
+
+    # --- Поиск существующих товаров ---
+
+    def api_product(self, external_id: Any) -> Optional[Product]:
+        return self._api_by_external_id.get(str(external_id or "").strip())
+
+    def product_by_external_id(self, external_id: Any) -> Optional[Product]:
+        key = str(external_id or "").strip()
+        return self._by_external_id.get(key) or self._variant_base_by_external_id.get(key)
+
+    def product_by_source_url(self, url: str, source: str) -> Optional[Product]:
+        return self._by_source_url.get((url, source))
+
+    def similar_products(self, name: Any, brand_name: Any) -> List[Product]:
+        """Аналог ``filter(name__iexact=..., brand__name__iexact=...)[:5]``."""
+        brand_key = _casefold(brand_name)
+        if not brand_key:
+            return []
+        matches = [
+            product
+            for product in self._by_name.get(_casefold(name), [])
+            if product.brand_id and _casefold(product.brand.name) == brand_key
+        ]
+        matches.sort(key=lambda product: product.created_at, reverse=True)
+        return matches[:SIMILAR_PRODUCTS_LIMIT]
+
+    # --- Справочники ---
+
+    def brand(self, name: str) -> Optional[Brand]:
+        return self._brands.get(_casefold(name))
+
+    def remember_brand(self, brand: Brand) -> None:
+        self._brands[_casefold(brand.name)] = brand
+
+    def active_category(self, slug: str) -> Optional[Category]:
+        if slug not in self._categories:
+            self._categories[slug] = Category.objects.filter(slug=slug, is_active=True).first()
+        return self._categories[slug]
+
+    def author(self, first_name: str, last_name: str) -> Optional[Author]:
+        return self._authors.get((_casefold(first_name), _casefold(last_name)))
+
+    def remember_author(self, author: Author) -> None:
+        self._authors[(_casefold(author.first_name), _casefold(author.last_name))] = author
+
+    # --- Отпечатки содержимого ---
+
+    def fingerprint(self, product: Product, source: str) -> Optional[str]:
+        return self._fingerprints.get((product.pk, source))
+
+    def remember_fingerprint(self, product: Optional[Product], source: str, fingerprint: str) -> None:
+        """Ставит отпечаток в очередь на запись, если он отличается от сохранённого."""
+        if product is None or not product.pk or not source:
+            return
+        key = (product.pk, source)
+        if self._fingerprints.get(key) != fingerprint:
+            self._fingerprints[key] = fingerprint
+            self._pending_fingerprints[key] = fingerprint
+
+    def flush_fingerprints(self) -> int:
+        """Upsert изменившихся отпечатков одним запросом."""
+        if not self._pending_fingerprints:
+            return 0
+        pending, self._pending_fingerprints = self._pending_fingerprints, {}
+        ScrapedProductFingerprint.objects.bulk_create(
+            [
+                ScrapedProductFingerprint(product_id=product_id, source=source, fingerprint=fingerprint)
+                for (product_id, source), fingerprint in pending.items()
+            ],
+            batch_size=LOG_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["product", "source"],
+            update_fields=["fingerprint", "updated_at"],
+        )
+        return len(pending)
+
+    # --- Логи ---
+
+    def add_log(self, **fields: Any) -> None:
+        self._logs.append(ScrapedProductLog(session=self.session, **fields))
+
+    def flush_logs(self) -> int:
+        """Записывает накопленные логи одним bulk_create и очищает буфер."""
+        if not self._logs:
+            return 0
+        logs, self._logs = self._logs, []
+        ScrapedProductLog.objects.bulk_create(logs, batch_size=LOG_BULK_BATCH_SIZE)
+        return len(logs)
@@ -0,0 +1,137 @@
+"""Бенчмарк HTML backend'ов DataSelector на сохранённых страницах.
+
+Источники страниц:
+- строковые константы ``*_HTML`` из тестов парсеров (apps/scrapers/test_*_parser.py);
+- файлы ``*.html`` из каталогов/путей, переданных аргументами (реальные выгрузки).
+
+Для каждого backend'а меряется разбор страницы и извлечение типового набора
+SelectorConfig (карточка товара + медицинские атрибуты ilacabak).
+"""
+
+import importlib
+import json
+import pkgutil
+import statistics
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+import apps.scrapers as scrapers_package
+from apps.scrapers.base.selectors import HTML_BACKENDS, DataSelector, SelectorConfig, get_html_backend
+from apps.scrapers.parsers.ilacabak import IlacabakParser
+
+
+def _benchmark_configs() -> Dict[str, SelectorConfig]:
+    # required снимаем: фикстуры других источников не обязаны содержать поля ilacabak.
+    configs = {
+        name: replace(config, required=False)
+        for name, config in IlacabakParser(base_url="https://ilacabak.com").product_detail_selectors.items()
+    }
+    for name, css in (
+        ("links", "a[href]"),
+        ("images", "img[src]"),
+        ("headings", "h1, h2"),
+        ("og_image", 'meta[property="og:image"]'),
+        ("scripts", "script"),
+    ):
+        configs[name] = SelectorConfig(
+            selector=css,
+            attribute="content" if name == "og_image" else "text",
+            all_elements=name != "og_image",
+        )
+    return configs
+
+
+def _fixture_pages() -> List[Tuple[str, str]]:
+    """HTML-константы тестов парсеров (модули с pytest недоступны в проде — пропускаются)."""
+    pages = []
+    for module_info in pkgutil.iter_modules(scrapers_package.__path__):
+        if not (module_info.name.startswith("test_") and module_info.name.endswith("_parser")):
+            continue
+        try:
+            module = importlib.import_module(f"apps.scrapers.{module_info.name}")
+        except ImportError:
+            continue
+        for attr_name in sorted(dir(module)):
+            value = getattr(module, attr_name)
+            if attr_name.endswith("_HTML") and isinstance(value, str) and value.strip():
+                pages.append((f"{module_info.name}.{attr_name}", value))
+    return pages
+
+
+def _file_pages(paths: List[str]) -> List[Tuple[str, str]]:
+    pages = []
+    for raw_path in paths:
+        path = Path(raw_path)
+        if not path.exists():
+            raise CommandError(f"Путь не найден: {path}")
+        files = sorted(path.rglob("*.html")) if path.is_dir() else [path]
+        for file_path in files:
+            pages.append((str(file_path), file_path.read_text(encoding="utf-8", errors="replace")))
+    return pages
+
+
+class Command(BaseCommand):
+    """Сравнение скорости HTML backend'ов DataSelector."""
+
+    help = "Бенчмарк разбора HTML (DataSelector) на сохранённых страницах"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Файлы или каталоги с сохранёнными .html (по умолчанию — фикстуры тестов парсеров)",
+        )
+        parser.add_argument(
+            "--backends",
+            default=",".join(HTML_BACKENDS),
+            help="Список backend'ов через запятую",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Повторов на страницу")
+        parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+
+    def handle(self, *args, **options):
+        pages = _file_pages(options["paths"]) if options["paths"] else _fixture_pages()
+        if not pages:
+            raise CommandError("Нет страниц для бенчмарка")
+        repeat = max(1, options["repeat"])
+        configs = _benchmark_configs()
+
+        report = {"pages": len(pages), "repeat": repeat, "backends": {}}
+        for name in [item.strip() for item in options["backends"].split(",") if item.strip()]:
+            backend = get_html_backend(name)
+            if backend.name != name:
+                self.stderr.write(f"Backend {name} недоступен — пропущен")
+                continue
+            parse_ms, extract_ms = [], []
+            for _, html in pages:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    selector = DataSelector(html, "https://example.com", backend=backend)
+                    parsed = time.perf_counter()
+                    selector.extract_multiple(configs)
+                    finished = time.perf_counter()
+                    parse_ms.append((parsed - started) * 1000)
+                    extract_ms.append((finished - parsed) * 1000)
+            total_ms = [p + e for p, e in zip(parse_ms, extract_ms)]
+            report["backends"][name] = {
+                "parse_ms_mean": round(statistics.fmean(parse_ms), 3),
+                "extract_ms_mean": round(statistics.fmean(extract_ms), 3),
+                "total_ms_mean": round(statistics.fmean(total_ms), 3),
+                "total_ms_median": round(statistics.median(total_ms), 3),
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"Страниц: {report['pages']}, повторов: {repeat}")
+        self.stdout.write(f"{'backend':<12}{'разбор, мс':>12}{'извлечение, мс':>16}{'всего, мс':>12}")
+        for name, row in report["backends"].items():
+            self.stdout.write(
+                f"{name:<12}{row['parse_ms_mean']:>12.3f}{row['extract_ms_mean']:>16.3f}"
+                f"{row['total_ms_mean']:>12.3f}"
+            )
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0199_refresh_currency_margin_snapshots"),
+        ("scrapers", "0021_sitescrapertask_target_brand"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scrapingsession",
+            name="products_unchanged",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Часть пропущенных: карточка источника не изменилась с прошлого прохода",
+                verbose_name="Без изменений",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ScrapedProductFingerprint",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source", models.CharField(max_length=100, verbose_name="Источник")),
+                ("fingerprint", models.CharField(max_length=64, verbose_name="Отпечаток")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Дата обновления")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scrape_fingerprints",
+                        to="catalog.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Отпечаток карточки",
+                "verbose_name_plural": "Отпечатки карточек",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "source"), name="scrapers_fingerprint_product_source_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -205,6 +205,11 @@ class ScrapingSession(models.Model):
     products_created = models.PositiveIntegerField(_("Создано товаров"), default=0)
     products_updated = models.PositiveIntegerField(_("Обновлено товаров"), default=0)
     products_skipped = models.PositiveIntegerField(_("Пропущено товаров"), default=0)
+    products_unchanged = models.PositiveIntegerField(
+        _("Без изменений"),
+        default=0,
+        help_text=_("Часть пропущенных: карточка источника не изменилась с прошлого прохода"),
+    )
     errors_count = models.PositiveIntegerField(_("Количество ошибок"), default=0)
 
     # Временные метки
@@ -365,6 +370,36 @@ class ScrapedProductLog(models.Model):
         return f"{self.product_name} - {self.get_action_display()}"
 
 
+class ScrapedProductFingerprint(models.Model):
+    """Отпечаток содержимого карточки источника, из которой последний раз обновлялся товар.
+
+    Если при повторном парсинге отпечаток совпадает, товар не проходит полный
+    путь обновления (атрибуты, варианты, размеры, медиа).
+    """
+
+    product = models.ForeignKey(
+        "catalog.Product",
+        on_delete=models.CASCADE,
+        related_name="scrape_fingerprints",
+        verbose_name=_("Товар"),
+    )
+    source = models.CharField(_("Источник"), max_length=100)
+    fingerprint = models.CharField(_("Отпечаток"), max_length=64)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Отпечаток карточки")
+        verbose_name_plural = _("Отпечатки карточек")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "source"], name="scrapers_fingerprint_product_source_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}:{self.source}"
+
+
 class ProductDuplicateCandidate(models.Model):
     """Кандидат в дубликаты товаров для ручной модерации."""
 
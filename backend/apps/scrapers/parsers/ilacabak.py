@@ -248,7 +248,8 @@ class IlacabakParser(BaseScraper):
     def parse_product_detail(self, product_url: str) -> Optional[ScrapedProduct]:
         """Парсит детальную страницу товара."""
         try:
-            html = self._make_request(product_url)
+            with self.tracking_page_changes() as pages:
+                html = self._make_request(product_url)
             if not html:
                 return None
             
@@ -263,6 +264,7 @@ class IlacabakParser(BaseScraper):
             
             # Нормализуем данные
             product = self._normalize_ilacabak_product(product_data, product_url)
+            product.source_unchanged = pages.unchanged
             
             return product if self.validate_product(product) else None
             
@@ -17,6 +17,9 @@ class IlacFiyatiParser(BaseScraper):
     # Настоящая пагинация через ?pg= и поддержка start_page — авточепочка безопасна.
     SUPPORTS_PAGE_CHUNKING = True
 
+    # Вкладки, из которых parse_product_detail дополнительно собирает аналоги.
+    ANALOG_TAB_KEYS = ("equivalents", "sgk_equivalents")
+
     DETAIL_TABS = {
         "ilac_bilgileri": {
             "path": "ilac-bilgileri",
@@ -193,27 +196,30 @@ class IlacFiyatiParser(BaseScraper):
 
     def _fetch_detail_tabs(self, product_url: str) -> Dict[str, Dict[str, str]]:
         base_url = self._canonical_product_url(product_url)
+        tab_urls = {key: f"{base_url}/{tab['path']}" for key, tab in self.DETAIL_TABS.items()}
+        # Вкладки независимы — грузим их параллельно в пределах бюджета хоста.
+        # Вкладки аналогов повторно читает parse_product_detail — отдаём их из
+        # буфера вместо второго запроса к тем же URL.
+        analog_urls = [tab_urls[key] for key in self.ANALOG_TAB_KEYS if key in tab_urls]
+        pages = dict(zip(tab_urls, self.fetch_many(tab_urls.values(), prefetch=analog_urls)))
         tabs: Dict[str, Dict[str, str]] = {}
         for key, tab in self.DETAIL_TABS.items():
-            tab_url = f"{base_url}/{tab['path']}"
+            html = pages.get(key)
+            if not html:
+                continue
             try:
-                html = self._make_request(tab_url)
-                if not html:
-                    continue
                 soup = BeautifulSoup(html, "html.parser")
                 text = self._extract_tab_text(soup, key)
                 if text:
                     tabs[key] = {
                         "title": tab["title"],
-                        "url": tab_url,
+                        "url": tab_urls[key],
                         "text": text,
                     }
             except SoftTimeLimitExceeded:
                 raise
-            except ScraperAccessBlockedError:
-                raise
             except Exception as e:
-                self.logger.warning(f"Не удалось получить вкладку {tab['path']} для {product_url}: {e}")
+                self.logger.warning(f"Не удалось разобрать вкладку {tab['path']} для {product_url}: {e}")
         return tabs
 
     @staticmethod
@@ -311,10 +317,11 @@ class IlacFiyatiParser(BaseScraper):
         previous_page_urls = None
 
         def extract_product_urls(html):
-            soup = BeautifulSoup(html, 'html.parser')
+            # С листинга нужны только ссылки — разбор backend'ом SCRAPER_HTML_BACKEND.
+            selector = self._parse_page(html, self.base_url)
             urls = []
-            for link in soup.select('a[href*="/ilaclar/"], a[href*="/takviye-edici-gida/"]'):
-                href = link.get('href')
+            for link in selector.select('a[href*="/ilaclar/"], a[href*="/takviye-edici-gida/"]'):
+                href = selector.backend.attr(link, 'href')
                 if not href or 'pg=' in href:
                     continue
                 path_parts = urlparse(href).path.strip('/').split('/')
@@ -357,6 +364,11 @@ class IlacFiyatiParser(BaseScraper):
                     self.has_more_pages = False
                     break
 
+                # Карточки страницы загружаются заранее и параллельно; разбор ниже
+                # заберёт их из буфера без повторного запроса.
+                remaining = self.max_products - count if self.max_products else len(product_urls)
+                self.fetch_many(product_urls[:remaining], prefetch=True)
+
                 for product_url in product_urls:
                     if self.max_products and count >= self.max_products:
                         return
@@ -382,6 +394,19 @@ class IlacFiyatiParser(BaseScraper):
         Парсит детальную страницу товара.
         Извлекает название, цену и характеристики.
         """
+        try:
+            with self.tracking_page_changes() as pages:
+                product = self._parse_product_detail_page(product_url)
+        finally:
+            # Неиспользованные вкладки аналогов (ранний выход из разбора) не копим.
+            base_url = self._canonical_product_url(product_url)
+            for key in self.ANALOG_TAB_KEYS:
+                self._take_prefetched(f"{base_url}/{self.DETAIL_TABS[key]['path']}")
+        if product is not None:
+            product.source_unchanged = pages.unchanged
+        return product
+
+    def _parse_product_detail_page(self, product_url: str) -> Optional[ScrapedProduct]:
         try:
             self.logger.info(f"Парсинг деталей товара: {product_url}")
             html = self._make_request(product_url)
@@ -580,10 +605,8 @@ class IlacFiyatiParser(BaseScraper):
             for path, source_tab in sub_paths:
                 sub_url = canonical_product_url + path
                 try:
-                    # Добавляем небольшую паузу, чтобы не злить сервер
-                    import time
-                    time.sleep(1.5)
-                    
+                    # Обычно уже загружена вместе с вкладками (_fetch_detail_tabs);
+                    # иначе запрос идёт в пределах бюджета хоста.
                     sub_html = self._make_request(sub_url)
                     if sub_html:
                         sub_soup = BeautifulSoup(sub_html, 'html.parser')
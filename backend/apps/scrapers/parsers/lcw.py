@@ -8,6 +8,7 @@ from urllib.parse import quote_plus, urljoin, urlparse
 from bs4 import BeautifulSoup
 
 from ..base.scraper import BaseScraper, ScrapedProduct
+from ..base.selectors import DataSelector
 from ..base.utils import clean_text, extract_currency, normalize_price
 
 
@@ -94,12 +95,12 @@ class LcwParser(BaseScraper):
         if not html:
             return []
 
-        soup = BeautifulSoup(html, "html.parser")
+        selector = self._parse_page(html, self.base_url)
         categories: List[Dict[str, Any]] = []
         seen_urls = set()
 
-        for anchor in soup.select("a[href]"):
-            href = anchor.get("href", "").strip()
+        for anchor in selector.select("a[href]"):
+            href = str(selector.backend.attr(anchor, "href")).strip()
             if not self._is_category_url(href):
                 continue
 
@@ -107,7 +108,7 @@ class LcwParser(BaseScraper):
             if absolute_url in seen_urls:
                 continue
 
-            name = clean_text(anchor.get_text(" ", strip=True))
+            name = clean_text(selector.backend.text(anchor, " "))
             if not name or len(name) < 2:
                 continue
 
@@ -161,9 +162,11 @@ class LcwParser(BaseScraper):
             if not html:
                 self.has_more_pages = False
                 break
-            soup = BeautifulSoup(html, "html.parser")
+            # Листинг разбирается backend'ом SCRAPER_HTML_BACKEND: со страницы
+            # нужны только ссылки карточек и их текст.
+            selector = self._parse_page(html, self.base_url)
 
-            page_urls = self._extract_listing_product_urls(html)
+            page_urls = self._listing_product_urls(selector)
             if previous_page_urls and page_urls == previous_page_urls:
                 self.logger.info(
                     "LCW: страница %s повторяет %s, каталог исчерпан.",
@@ -174,8 +177,8 @@ class LcwParser(BaseScraper):
                 break
 
             new_on_page = 0
-            for anchor in soup.select("a[href]"):
-                href = anchor.get("href", "").strip()
+            for anchor in selector.select("a[href]"):
+                href = str(selector.backend.attr(anchor, "href")).strip()
                 if not self._is_product_url(href):
                     continue
 
@@ -201,7 +204,9 @@ class LcwParser(BaseScraper):
                 else:
                     product = self.parse_product_detail(product_url)
                 if not product:
-                    product = self._build_list_product(anchor, product_url, category_url)
+                    product = self._build_list_product(
+                        selector.backend.text(anchor, " "), product_url, category_url
+                    )
 
                 group_id = ""
                 if product and isinstance(product.attributes, dict):
@@ -235,12 +240,11 @@ class LcwParser(BaseScraper):
 
     def _extract_listing_product_urls(self, html: str) -> Set[str]:
         """Канонические URL товаров страницы без загрузки detail."""
-        soup = BeautifulSoup(html or "", "html.parser")
-        return {
-            urljoin(self.base_url, anchor.get("href", "").strip())
-            for anchor in soup.select("a[href]")
-            if self._is_product_url(anchor.get("href", "").strip())
-        }
+        return self._listing_product_urls(self._parse_page(html or "", self.base_url))
+
+    def _listing_product_urls(self, selector: DataSelector) -> Set[str]:
+        hrefs = (str(selector.backend.attr(anchor, "href")).strip() for anchor in selector.select("a[href]"))
+        return {urljoin(self.base_url, href) for href in hrefs if self._is_product_url(href)}
 
     def parse_product_detail(self, product_url: str) -> Optional[ScrapedProduct]:
         return self._parse_product_group(product_url, visited_urls=set())
@@ -283,14 +287,15 @@ class LcwParser(BaseScraper):
         )
 
         variants = [self._variant_payload_from_parsed(current_variant, sort_order=0)]
-        for sort_order, variant_url in enumerate(group_urls[1:], start=1):
-            self.logger.info(
-                "LCW: fetching variant %d/%d for %s",
-                sort_order + 1,
-                len(group_urls),
-                product_url,
-            )
-            variant_html = self._make_request(variant_url)
+        self.logger.info(
+            "LCW: fetching %d variants for %s",
+            len(group_urls) - 1,
+            product_url,
+        )
+        variant_pages = self.fetch_many(group_urls[1:])
+        for sort_order, (variant_url, variant_html) in enumerate(
+            zip(group_urls[1:], variant_pages), start=1
+        ):
             if not variant_html:
                 continue
             parsed_variant = self._parse_single_variant(variant_url, variant_html)
@@ -360,11 +365,11 @@ class LcwParser(BaseScraper):
 
     def _build_list_product(
         self,
-        anchor,
+        anchor_text: str,
         product_url: str,
         category_url: str,
     ) -> Optional[ScrapedProduct]:
-        anchor_text = clean_text(anchor.get_text(" ", strip=True))
+        anchor_text = clean_text(anchor_text)
         if not anchor_text:
             return None
 
@@ -402,9 +407,12 @@ class LcwParser(BaseScraper):
         sku = self._extract_sku(page_text)
         brand = self._extract_attribute_value(page_text, "Marka")
         category = self._extract_heading_category(soup) or self._extract_attribute_value(page_text, "Ürün Tipi")
-        description = self._extract_description_from_soup(soup)
+        # Текстовое описание строится по page_text один раз — и для основного
+        # пути, и для fallback (раньше страница заново сериализовалась в текст).
+        rich_description = self._extract_description(page_text)
+        description = self._extract_description_from_soup(soup, rich_description=rich_description)
         if not description:
-            fallback_description = self._extract_description(page_text)
+            fallback_description = rich_description
             if fallback_description and not self._looks_like_navigation_dump(fallback_description):
                 description = fallback_description
         attributes = self._extract_attributes(page_text)
@@ -481,8 +489,14 @@ class LcwParser(BaseScraper):
         matches = sum(1 for marker in self.NAVIGATION_NOISE_MARKERS if marker in value)
         return matches >= 4
 
-    def _extract_description_from_soup(self, soup: BeautifulSoup) -> str:
-        rich_from_text = self._build_rich_description(soup.get_text("\n", strip=True))
+    def _extract_description_from_soup(
+        self, soup: BeautifulSoup, rich_description: Optional[str] = None
+    ) -> str:
+        rich_from_text = (
+            rich_description
+            if rich_description is not None
+            else self._build_rich_description(soup.get_text("\n", strip=True))
+        )
         if rich_from_text and not any(
             marker in rich_from_text
             for marker in ("Ürün İçeriği ve Özellikleri", "Bakım Bilgileri", "Kumaş Rehberi")
@@ -4,13 +4,16 @@ import logging
 import re
 import hashlib
 import threading
+import time
 from contextlib import contextmanager
 from urllib.parse import urlparse
 from celery.exceptions import SoftTimeLimitExceeded
 from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Optional, Any, Tuple
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
+from django.db.models.fields.json import KT
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
 
@@ -41,6 +44,8 @@ from .models import (
     ScrapedProductLog,
     SiteScraperTask,
 )
+from .ingestion import ScrapedProductBatch, scraped_product_fingerprint
+from .dedup import IDENTIFIER_FIELDS, DedupIndex, jaccard, name_shingles
 from .parsers.registry import get_parser
 from .parsers.lcw import LcwParser
 from .parsers.zara import ZaraParser
@@ -66,6 +71,7 @@ from apps.catalog.models import (
     MedicineProduct,
     Author,
     ProductAuthor,
+    ProductImage,
 )
 from apps.catalog.scraper_category_mapping import resolve_category_and_product_type
 from apps.catalog.ikea_category_mapping import resolve_ikea_category
@@ -77,6 +83,12 @@ import datetime
 BRAND_CLEAR_PRODUCT_TYPES = {"books"}
 DEFAULT_ASSUMED_STOCK_QUANTITY = 1000
 SCRAPER_TASK_SEEN_TTL = 7 * 24 * 60 * 60
+# Размер чанка пакетной записи: одна транзакция, одна предзагрузка, один bulk_create логов.
+DEFAULT_INGEST_CHUNK_SIZE = 500
+# Потоковый парсинг категории: буфер сбрасывается часто, чтобы checkpoint сессии
+# отставал от парсера не больше чем на N карточек или T секунд.
+DEFAULT_STREAM_FLUSH_SIZE = 20
+DEFAULT_STREAM_FLUSH_SECONDS = 30
 
 
 def _scraper_task_product_cache_key(site_task_id: int, identity: str) -> str:
@@ -333,6 +345,8 @@ class ScraperIntegrationService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.catalog_normalizer = CatalogNormalizer()
+        # Снимок каталога текущего чанка (см. _process_scraped_products); вне чанка — None.
+        self._ingest_batch: Optional[ScrapedProductBatch] = None
 
     def _normalize_and_get_author(self, name: str) -> Optional[Author]:
         lowered = name.lower().strip()
@@ -355,6 +369,11 @@ class ScraperIntegrationService:
             first_name = clean_name.title()
             last_name = ""
             
+        batch = self._ingest_batch
+        author = batch.author(first_name, last_name) if batch else None
+        if author:
+            return author
+
         # Поиск независимый от регистра для предотвращения дублей
         author = Author.objects.filter(
             first_name__iexact=first_name, 
@@ -367,6 +386,8 @@ class ScraperIntegrationService:
                 last_name=last_name, 
                 bio=""
             )
+        if batch:
+            batch.remember_author(author)
         return author
 
     def _strip_variant_noise(self, name: str) -> str:
@@ -893,6 +914,7 @@ class ScraperIntegrationService:
                 session.products_created = results["created"]
                 session.products_updated = results["updated"]
                 session.products_skipped = results["skipped"]
+                session.products_unchanged = results.get("unchanged", 0)
                 session.save()
 
                 # Обновляем статистику конфигурации
@@ -1004,10 +1026,11 @@ class ScraperIntegrationService:
 
             # Определяем тип парсинга по URL
             if is_category:
-                # Парсинг категории — инкрементальная обработка: каждый товар
-                # сохраняется в БД сразу после парсинга, не накапливается в памяти.
-                incremental_results = {"found": 0, "created": 0, "updated": 0, "skipped": 0, "errors": 0}
-                checkpoint = 0
+                # Парсинг категории — инкрементальная обработка: товары сохраняются
+                # в БД чанками по мере парсинга, а не накапливаются за весь листинг.
+                incremental_results = {
+                    "found": 0, "created": 0, "updated": 0, "skipped": 0, "unchanged": 0, "errors": 0,
+                }
                 # start_page передаём только парсерам с настоящей пагинацией,
                 # иначе остальные упадут на неизвестном аргументе (TypeError).
                 list_kwargs = {"max_pages": session.max_pages}
@@ -1018,10 +1041,61 @@ class ScraperIntegrationService:
                     supports_chunking = bool(getattr(parser, "SUPPORTS_PAGE_CHUNKING", False))
                 if supports_chunking:
                     list_kwargs["start_page"] = start_page
+                # Карточки копятся в небольшой буфер и пишутся пакетом (один снимок
+                # каталога и одна транзакция), как только в нём SCRAPER_STREAM_FLUSH_SIZE
+                # карточек или прошло SCRAPER_STREAM_FLUSH_SECONDS с прошлой записи —
+                # checkpoint не отстаёт от парсера. Буфер сбрасывается и при выходе
+                # из цикла — в том числе при остановке/паузе задачи.
+                flush_size, flush_seconds = self._stream_flush_budget()
+                pending: List[Tuple[ScrapedProduct, Optional[str]]] = []
+                pending_keys = set()
+                last_flush_at = time.monotonic()
+
+                def flush_pending():
+                    nonlocal last_flush_at
+                    last_flush_at = time.monotonic()
+                    if not pending:
+                        return
+                    chunk = list(pending)
+                    pending.clear()
+                    pending_keys.clear()
+                    r = self._process_scraped_products(session, [item for item, _ in chunk])
+                    for k in incremental_results:
+                        incremental_results[k] += r.get(k, 0)
+                    for _, cache_key in chunk:
+                        if cache_key:
+                            cache.set(cache_key, True, timeout=SCRAPER_TASK_SEEN_TTL)
+                    session.products_found = incremental_results["found"]
+                    session.products_created = incremental_results["created"]
+                    session.products_updated = incremental_results["updated"]
+                    session.products_skipped = incremental_results["skipped"]
+                    session.products_unchanged = incremental_results["unchanged"]
+                    session.errors_count = incremental_results["errors"]
+                    # Checkpoint после каждого чанка: два коротких UPDATE без SELECT.
+                    session_id = getattr(session, "id", None)
+                    if session_id:
+                        ScrapingSession.objects.filter(id=session_id).update(
+                            products_found=incremental_results["found"],
+                            products_created=incremental_results["created"],
+                            products_updated=incremental_results["updated"],
+                            products_skipped=incremental_results["skipped"],
+                            products_unchanged=incremental_results["unchanged"],
+                            errors_count=incremental_results["errors"],
+                        )
+                    if site_task_id:
+                        SiteScraperTask.objects.filter(id=site_task_id).update(
+                            session_id=session_id,
+                            products_found=total_scraped + incremental_results["found"],
+                            products_created=total_created + incremental_results["created"],
+                            products_updated=total_updated + incremental_results["updated"],
+                            products_skipped=total_skipped + incremental_results["skipped"],
+                            errors_count=incremental_results["errors"],
+                        )
+
                 try:
                     for product in parser.parse_product_list(start_url, **list_kwargs):
                         parser_limit = getattr(parser, "max_products", None)
-                        if parser_limit is not None and incremental_results["found"] >= parser_limit:
+                        if parser_limit is not None and incremental_results["found"] + len(pending) >= parser_limit:
                             break
                         self._ensure_site_task_not_cancelled(site_task_id, celery_task_id)
                         product_identity = _scraped_product_identity(product)
@@ -1030,7 +1104,9 @@ class ScraperIntegrationService:
                             if site_task_id and product_identity
                             else None
                         )
-                        if product_cache_key and cache.get(product_cache_key):
+                        if product_cache_key and (
+                            product_cache_key in pending_keys or cache.get(product_cache_key)
+                        ):
                             incremental_results["skipped"] += 1
                             self.logger.warning(
                                 "Повторная карточка между чанками пропущена: %s (task=%s)",
@@ -1038,53 +1114,27 @@ class ScraperIntegrationService:
                                 site_task_id,
                             )
                             continue
-                        r = self._process_scraped_products(session, [product])
-                        for k in incremental_results:
-                            incremental_results[k] += r.get(k, 0)
+                        pending.append((product, product_cache_key))
                         if product_cache_key:
-                            cache.set(
-                                product_cache_key,
-                                True,
-                                timeout=SCRAPER_TASK_SEEN_TTL,
-                            )
-                        checkpoint += 1
-                        session.products_found = incremental_results["found"]
-                        session.products_created = incremental_results["created"]
-                        session.products_updated = incremental_results["updated"]
-                        session.products_skipped = incremental_results["skipped"]
-                        session.errors_count = incremental_results["errors"]
-                        # IKEA и другие media-heavy источники могут обрабатывать один
-                        # товар несколько минут. Фиксируем checkpoint после каждого
-                        # товара: это два коротких UPDATE без дополнительных SELECT и
-                        # без заметной стоимости на фоне HTTP/R2 обработки.
-                        session_id = getattr(session, "id", None)
-                        if session_id:
-                            ScrapingSession.objects.filter(id=session_id).update(
-                                products_found=incremental_results["found"],
-                                products_created=incremental_results["created"],
-                                products_updated=incremental_results["updated"],
-                                products_skipped=incremental_results["skipped"],
-                                errors_count=incremental_results["errors"],
-                            )
-                        if site_task_id:
-                            SiteScraperTask.objects.filter(id=site_task_id).update(
-                                session_id=session_id,
-                                products_found=total_scraped + incremental_results["found"],
-                                products_created=total_created + incremental_results["created"],
-                                products_updated=total_updated + incremental_results["updated"],
-                                products_skipped=total_skipped + incremental_results["skipped"],
-                                errors_count=incremental_results["errors"],
-                            )
+                            pending_keys.add(product_cache_key)
+                        if (
+                            len(pending) >= flush_size
+                            or time.monotonic() - last_flush_at >= flush_seconds
+                        ):
+                            flush_pending()
                 except SoftTimeLimitExceeded:
-                    # Мягкий лимит времени Celery: завершаем чанк штатно — уже спарсенные
-                    # товары сохранены инкрементально, а tasks.run_scraper_task поставит
+                    # Мягкий лимит времени Celery: завершаем чанк штатно — буфер
+                    # сохраняется ниже, а tasks.run_scraper_task поставит
                     # следующий чанк (для парсеров с пагинацией). Без этого hard-лимит
                     # убивал воркер SIGKILL и обрывал всю цепочку.
                     self.logger.warning(
                         "Достигнут мягкий лимит времени — чанк завершён досрочно "
                         "(спарсено %s товаров, цепочка продолжится).",
-                        incremental_results["found"],
+                        incremental_results["found"] + len(pending),
                     )
+                finally:
+                    # Уже спарсенные карточки не теряются при остановке, паузе или ошибке.
+                    flush_pending()
                 if getattr(parser, "REPORTS_PAGES_PROCESSED", False):
                     session.pages_processed += parser.pages_processed
                 elif incremental_results["found"]:
@@ -1185,59 +1235,192 @@ class ScraperIntegrationService:
         if status == "paused":
             raise ScraperTaskPaused("Задача поставлена на паузу пользователем.")
 
+    @staticmethod
+    def _ingest_chunk_size() -> int:
+        return max(
+            1, int(getattr(settings, "SCRAPER_INGEST_CHUNK_SIZE", 0) or DEFAULT_INGEST_CHUNK_SIZE)
+        )
+
+    @staticmethod
+    def _stream_flush_budget() -> Tuple[int, float]:
+        size = int(getattr(settings, "SCRAPER_STREAM_FLUSH_SIZE", 0) or DEFAULT_STREAM_FLUSH_SIZE)
+        seconds = float(
+            getattr(settings, "SCRAPER_STREAM_FLUSH_SECONDS", 0) or DEFAULT_STREAM_FLUSH_SECONDS
+        )
+        return max(1, size), max(0.0, seconds)
+
     def _process_scraped_products(
         self, session: ScrapingSession, products: List[ScrapedProduct]
     ) -> Dict[str, int]:
-        """Обрабатывает спарсенные товары и сохраняет в каталог."""
-        results = {"found": len(products), "created": 0, "updated": 0, "skipped": 0, "errors": 0}
+        """Обрабатывает спарсенные товары и сохраняет в каталог.
 
-        for scraped_product in products:
-            try:
-                self._apply_category_mapping(session, scraped_product)
-                self._apply_brand_mapping(session, scraped_product)
-                self._apply_gender_override(session, scraped_product)
-                self._normalize_scraped_media(session, scraped_product)
-                # Блокируем авто-запуск AI во время сохранения — используем потоковый контекст
-                with scraping_in_progress_context():
-                    action, product = self._process_single_product(session, scraped_product)
-
-                # Обновляем счетчики
-                if action == "created":
-                    results["created"] += 1
-                elif action == "updated":
-                    results["updated"] += 1
-                elif action == "skipped":
-                    results["skipped"] += 1
+        Товары пишутся чанками по SCRAPER_INGEST_CHUNK_SIZE (см. _process_scraped_chunk).
+        """
+        results = {
+            "found": len(products), "created": 0, "updated": 0, "skipped": 0, "unchanged": 0, "errors": 0,
+        }
+        chunk_size = self._ingest_chunk_size()
+        for start in range(0, len(products), chunk_size):
+            chunk_results = self._process_scraped_chunk(session, products[start:start + chunk_size])
+            for key, value in chunk_results.items():
+                results[key] += value
+        return results
 
-                # Логируем результат
-                ScrapedProductLog.objects.create(
-                    session=session,
-                    product=product,
-                    external_id=scraped_product.external_id,
-                    external_url=scraped_product.url,
-                    product_name=scraped_product.name,
-                    action=action,
-                    message=f"Товар {action}",
-                    scraped_data=scraped_product.to_dict(),
-                )
+    def _process_scraped_chunk(
+        self, session: ScrapingSession, products: List[ScrapedProduct]
+    ) -> Dict[str, int]:
+        """Сохраняет один чанк товаров.
+
+        1. Вне транзакции: маппинг категории/бренда/пола.
+        2. Одним набором запросов поднимается снимок каталога (ScrapedProductBatch):
+           существующие товары по external_id/URL/имени, варианты мебели, бренды.
+           Карточки уже существующих товаров, которые не изменились с прошлого
+           прохода (HTTP 304 или тот же отпечаток содержимого), пропускаются без
+           скачивания медиа и записи. Для остальных скачиваются медиа (сеть).
+        3. В транзакции чанка каждый товар пишется в своей точке сохранения — ошибка
+           одной карточки не откатывает соседей; логи и отпечатки пишутся пакетно.
+        """
+        results = {"created": 0, "updated": 0, "skipped": 0, "unchanged": 0, "errors": 0}
+        batch = ScrapedProductBatch(session)
+        self._ingest_batch = batch
+        try:
+            mapped: List[ScrapedProduct] = []
+            for scraped_product in products:
+                try:
+                    self._apply_category_mapping(session, scraped_product)
+                    self._apply_brand_mapping(session, scraped_product)
+                    self._apply_gender_override(session, scraped_product)
+                except Exception as e:
+                    self._log_scraped_product_error(batch, scraped_product, e)
+                    results["errors"] += 1
+                    continue
+                mapped.append(scraped_product)
 
-            except Exception as e:
-                self.logger.error(f"Ошибка обработки товара {scraped_product.name}: {e}")
-                results["errors"] += 1
-
-                # Логируем ошибку
-                ScrapedProductLog.objects.create(
-                    session=session,
-                    external_id=scraped_product.external_id,
-                    external_url=scraped_product.url,
-                    product_name=scraped_product.name,
-                    action="error",
-                    message=str(e),
-                    scraped_data=scraped_product.to_dict(),
+            batch.prefetch(mapped)
+
+            prepared: List[Tuple[ScrapedProduct, str]] = []
+            for scraped_product in mapped:
+                # Отпечаток — до нормализации медиа: она подменяет URL источника на R2.
+                fingerprint = scraped_product_fingerprint(
+                    scraped_product, max_images=session.max_images_per_product
                 )
+                existing = self._find_scraped_product_in_catalog(scraped_product)
+                reason = (
+                    self._unchanged_scraped_product_reason(
+                        batch, scraped_product, existing, fingerprint
+                    )
+                    if existing is not None
+                    else ""
+                )
+                if reason:
+                    results["skipped"] += 1
+                    results["unchanged"] += 1
+                    batch.add_log(
+                        product=existing,
+                        external_id=scraped_product.external_id,
+                        external_url=scraped_product.url,
+                        product_name=scraped_product.name,
+                        action="skipped",
+                        message=reason,
+                    )
+                    continue
+                try:
+                    self._normalize_scraped_media(session, scraped_product)
+                except Exception as e:
+                    self._log_scraped_product_error(batch, scraped_product, e)
+                    results["errors"] += 1
+                    continue
+                prepared.append((scraped_product, fingerprint))
+
+            # Блокируем авто-запуск AI во время сохранения — используем потоковый контекст.
+            # Контекст охватывает и commit: on_commit-хуки сигналов чанка видят флаг парсинга.
+            with scraping_in_progress_context(), transaction.atomic():
+                for scraped_product, fingerprint in prepared:
+                    try:
+                        with transaction.atomic():
+                            action, product = self._process_single_product(
+                                session, scraped_product
+                            )
+                    except Exception as e:
+                        self._log_scraped_product_error(batch, scraped_product, e)
+                        results["errors"] += 1
+                        continue
+
+                    batch.remember(product)
+                    batch.remember_fingerprint(product, scraped_product.source, fingerprint)
+                    if action in results:
+                        results[action] += 1
+
+                    batch.add_log(
+                        product=product,
+                        external_id=scraped_product.external_id,
+                        external_url=scraped_product.url,
+                        product_name=scraped_product.name,
+                        action=action,
+                        message=f"Товар {action}",
+                        scraped_data=scraped_product.to_dict(),
+                    )
+                batch.flush_fingerprints()
+                batch.flush_logs()
+        finally:
+            self._ingest_batch = None
 
         return results
 
+    def _find_scraped_product_in_catalog(
+        self, scraped_product: ScrapedProduct
+    ) -> Optional[Product]:
+        """Уже сохранённый товар карточки: по external_id, затем по URL источника.
+
+        Пропускать как неизменную можно только такую карточку: если товар удалили
+        или прошлый проход упал до записи, карточка обрабатывается полностью.
+        """
+        if scraped_product.external_id:
+            product = self._find_existing_product_by_external_id(scraped_product.external_id)
+            if product is not None:
+                return product
+        return self._find_existing_product_by_source_url(scraped_product)
+
+    def _unchanged_scraped_product_reason(
+        self,
+        batch: ScrapedProductBatch,
+        scraped_product: ScrapedProduct,
+        existing: Product,
+        fingerprint: str,
+    ) -> str:
+        """Причина пропуска неизменной карточки или пустая строка, если нужна запись."""
+        external_data = existing.external_data if isinstance(existing.external_data, dict) else {}
+        if external_data.get("is_stub"):
+            return ""
+        # Бренд/категория, выбранные в задаче, авторитетны — расхождение надо исправить.
+        category = getattr(scraped_product, "_category_override", None)
+        brand = getattr(scraped_product, "_brand_override", None)
+        if (category and existing.category_id != category.pk) or (
+            brand and existing.brand_id != brand.pk
+        ):
+            return ""
+        # Отпечаток пишется только после успешной записи товара, поэтому сверка с
+        # ним обязательна и для 304: валидаторы HTTP-кэша сохраняются при загрузке
+        # страницы, и после упавшей записи страница уже выглядела бы «неизменной».
+        if not scraped_product.source or batch.fingerprint(existing, scraped_product.source) != fingerprint:
+            return ""
+        if scraped_product.source_unchanged:
+            return "Страница источника не изменилась"
+        return "Содержимое карточки не изменилось"
+
+    def _log_scraped_product_error(
+        self, batch: ScrapedProductBatch, scraped_product: ScrapedProduct, error: Exception
+    ) -> None:
+        self.logger.error(f"Ошибка обработки товара {scraped_product.name}: {error}")
+        batch.add_log(
+            external_id=scraped_product.external_id,
+            external_url=scraped_product.url,
+            product_name=scraped_product.name,
+            action="error",
+            message=str(error),
+            scraped_data=scraped_product.to_dict(),
+        )
+
     def _apply_gender_override(
         self, session: ScrapingSession, scraped_product: ScrapedProduct
     ) -> None:
@@ -1278,7 +1461,7 @@ class ScraperIntegrationService:
                 scraped_product.name,
                 scraped_product.url,
             )
-            flo_category = Category.objects.filter(slug=flo_slug, is_active=True).first()
+            flo_category = self._get_active_category_by_slug(flo_slug)
             if flo_category:
                 scraped_product.category = flo_slug
                 scraped_product._category_override = flo_category
@@ -1301,8 +1484,7 @@ class ScraperIntegrationService:
                 external_url=scraped_product.url,
             )
             matched_category = (
-                Category.objects.filter(slug=match.category_slug, is_active=True).first()
-                if match else None
+                self._get_active_category_by_slug(match.category_slug) if match else None
             )
             if matched_category:
                 scraped_product.category = match.category_slug
@@ -1324,6 +1506,11 @@ class ScraperIntegrationService:
             if getattr(session, "target_category_id", None):
                 scraped_product._category_override = category
 
+    def _get_active_category_by_slug(self, slug: str) -> Optional[Category]:
+        if self._ingest_batch:
+            return self._ingest_batch.active_category(slug)
+        return Category.objects.filter(slug=slug, is_active=True).first()
+
     def _apply_brand_mapping(
         self, session: ScrapingSession, scraped_product: ScrapedProduct
     ) -> None:
@@ -1594,10 +1781,14 @@ class ScraperIntegrationService:
         self, session: ScrapingSession, scraped_product: ScrapedProduct
     ) -> Tuple[str, Optional[Product]]:
         """Обрабатывает один товар."""
+        batch = self._ingest_batch
         # Проверяем, есть ли товар с таким external_id из API
-        api_product = Product.objects.filter(
-            external_id=scraped_product.external_id, external_data__source="api"  # Только из API
-        ).first()
+        if batch:
+            api_product = batch.api_product(scraped_product.external_id)
+        else:
+            api_product = Product.objects.filter(
+                external_id=scraped_product.external_id, external_data__source="api"  # Только из API
+            ).first()
 
         if api_product:
             # Товар уже есть из API - пропускаем или обновляем дополнительные данные
@@ -1605,18 +1796,9 @@ class ScraperIntegrationService:
 
         # Для парсеров (не API) тоже привязываемся по external_id, если он уже есть
         if scraped_product.external_id:
-            existing_by_external_id = Product.objects.filter(
-                external_id=scraped_product.external_id
-            ).first()
-
-            if not existing_by_external_id:
-                from apps.catalog.models import FurnitureVariant
-                variant = FurnitureVariant.objects.filter(
-                    external_id=scraped_product.external_id
-                ).select_related('product__base_product').first()
-                if variant and variant.product and variant.product.base_product:
-                    existing_by_external_id = variant.product.base_product
-
+            existing_by_external_id = self._find_existing_product_by_external_id(
+                scraped_product.external_id
+            )
             if existing_by_external_id:
                 return self._update_existing_product(
                     session,
@@ -1652,11 +1834,14 @@ class ScraperIntegrationService:
             )
 
         # Проверяем дубликаты по названию и бренду
-        similar_products = Product.objects.filter(
-            name__iexact=scraped_product.name, brand__name__iexact=scraped_product.brand
-        )[
-            :5
-        ]  # Ограничиваем поиск
+        if batch:
+            similar_products = batch.similar_products(scraped_product.name, scraped_product.brand)
+        else:
+            similar_products = Product.objects.filter(
+                name__iexact=scraped_product.name, brand__name__iexact=scraped_product.brand
+            )[
+                :5
+            ]  # Ограничиваем поиск
 
         for similar_product in similar_products:
             similarity = self._calculate_product_similarity(scraped_product, similar_product)
@@ -1674,6 +1859,23 @@ class ScraperIntegrationService:
         # Создаем новый товар
         return self._create_new_product(session, scraped_product)
 
+    def _find_existing_product_by_external_id(self, external_id: str) -> Optional[Product]:
+        """Товар по external_id, иначе базовый товар варианта мебели с этим external_id."""
+        if self._ingest_batch:
+            return self._ingest_batch.product_by_external_id(external_id)
+
+        existing = Product.objects.filter(external_id=external_id).first()
+        if existing:
+            return existing
+
+        from apps.catalog.models import FurnitureVariant
+        variant = FurnitureVariant.objects.filter(
+            external_id=external_id
+        ).select_related('product__base_product').first()
+        if variant and variant.product and variant.product.base_product:
+            return variant.product.base_product
+        return None
+
     def _find_existing_product_by_source_url(
         self,
         scraped_product: ScrapedProduct,
@@ -1689,6 +1891,8 @@ class ScraperIntegrationService:
         source = str(scraped_product.source or "").strip()
         if not source_url or not source:
             return None
+        if self._ingest_batch:
+            return self._ingest_batch.product_by_source_url(source_url, source)
 
         return (
             Product.objects.filter(
@@ -2938,12 +3142,17 @@ class ScraperIntegrationService:
             from apps.catalog.models import Brand
             brand_name = scraped_product.brand.strip()
             if not existing_product.brand:
-                brand = Brand.objects.filter(name__iexact=brand_name).first()
+                batch = self._ingest_batch
+                brand = batch.brand(brand_name) if batch else None
+                if not brand:
+                    brand = Brand.objects.filter(name__iexact=brand_name).first()
                 if not brand:
                     brand = Brand.objects.create(
                         name=brand_name,
                         slug=_make_unique_brand_slug(brand_name),
                     )
+                if batch:
+                    batch.remember_brand(brand)
                 existing_product.brand = brand
                 updated = True
 
@@ -4054,7 +4263,11 @@ class DeduplicationService:
     """Сервис дедупликации товаров между API и парсерами."""
 
     SCORE_THRESHOLD = 60.0
-    STRONG_MATCH_FIELDS = ("external_id", "external_url", "barcode", "sku", "gtin", "mpn")
+    STRONG_MATCH_FIELDS = IDENTIFIER_FIELDS
+    # Похожее (не идентичное) название: Jaccard по символьным триграммам.
+    FUZZY_NAME_THRESHOLD = 0.8
+    ITERATOR_CHUNK_SIZE = 2000
+    COMPARE_BATCH_SIZE = 500
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -4095,7 +4308,9 @@ class DeduplicationService:
         low_id, high_id = sorted([left.pk, right.pk])
         return f"{low_id}:{high_id}"
 
-    def _compare_products(self, left: Product, right: Product) -> Optional[Dict[str, Any]]:
+    def _compare_products(
+        self, left: Product, right: Product, *, image_match: bool = False
+    ) -> Optional[Dict[str, Any]]:
         score = 0.0
         reasons: List[str] = []
         signals: Dict[str, Any] = {}
@@ -4106,6 +4321,17 @@ class DeduplicationService:
             score += 35.0
             reasons.append("Совпадает нормализованное название")
             signals["normalized_name"] = left_name
+        elif left_name and right_name:
+            similarity = jaccard(name_shingles(left_name), name_shingles(right_name))
+            if similarity >= self.FUZZY_NAME_THRESHOLD:
+                score += 25.0
+                reasons.append("Похожее название")
+                signals["name_similarity"] = round(similarity, 3)
+
+        if image_match:
+            score += 20.0
+            reasons.append("Совпадает изображение (pHash)")
+            signals["image_hash"] = True
 
         for field_name, field_score, reason in (
             ("external_id", 100.0, "Совпадает внешний ID"),
@@ -4147,8 +4373,10 @@ class DeduplicationService:
         has_strong_identifier = any(field in signals for field in self.STRONG_MATCH_FIELDS)
         has_contextual_match = any(field in signals for field in ("brand_id", "category_id", "product_type"))
 
+        has_similarity = any(field in signals for field in ("normalized_name", "name_similarity", "image_hash"))
+
         qualifies = has_strong_identifier or (
-            signals.get("normalized_name") and has_contextual_match and score >= self.SCORE_THRESHOLD
+            has_similarity and has_contextual_match and score >= self.SCORE_THRESHOLD
         )
         if not qualifies:
             return None
@@ -4163,40 +4391,68 @@ class DeduplicationService:
             "duplicate_product": duplicate_product,
         }
 
-    def find_duplicates(self) -> List[Dict[str, Any]]:
-        """Находит кандидатов в дубликаты товаров по набору сигналов."""
-        candidates: List[Dict[str, Any]] = []
-        seen_pair_keys: set[str] = set()
-        products = list(
-            Product.objects.select_related("brand", "category").all()
+    def _build_dedup_index(self) -> DedupIndex:
+        """Один потоковый проход по каталогу: в индекс попадают только значения полей, не модели."""
+        index = DedupIndex()
+        rows = (
+            Product.objects.order_by("pk")
+            .annotate(
+                dedup_variant_id=KT("external_data__source_variant_id"),
+                dedup_variant_slug=KT("external_data__source_variant_slug"),
+            )
+            .values("pk", "name", "brand_id", "category_id", "product_type",
+                    "dedup_variant_id", "dedup_variant_slug", *IDENTIFIER_FIELDS)
+            .iterator(chunk_size=self.ITERATOR_CHUNK_SIZE)
+        )
+        for row in rows:
+            if row["dedup_variant_id"] or row["dedup_variant_slug"]:
+                continue
+            index.add(
+                row["pk"],
+                normalized_name=self._normalize_text(row["name"]),
+                identifiers={name: self._normalize_text(row[name]) for name in IDENTIFIER_FIELDS},
+                brand_id=row["brand_id"],
+                category_id=row["category_id"],
+                product_type=row["product_type"] or "",
+            )
+
+        image_rows = (
+            ProductImage.objects.filter(image_hash__isnull=False)
+            .exclude(image_hash="")
+            .values_list("product_id", "image_hash")
+            .iterator(chunk_size=self.ITERATOR_CHUNK_SIZE)
         )
-        products = [product for product in products if not self._is_shadow_variant_product(product)]
+        for product_id, image_hash in image_rows:
+            index.add_image_hash(product_id, image_hash)
+        return index
 
-        buckets: Dict[Tuple[str, str], List[Product]] = {}
-        for product in products:
-            for field_name in ("external_id", "external_url", "barcode", "sku", "gtin", "mpn"):
-                value = self._normalize_text(getattr(product, field_name, ""))
-                if value:
-                    buckets.setdefault((field_name, value), []).append(product)
+    def find_duplicates(self) -> List[Dict[str, Any]]:
+        """Находит кандидатов в дубликаты товаров по набору сигналов.
 
-            normalized_name = self._normalize_text(product.name)
-            if normalized_name:
-                buckets.setdefault(("name", normalized_name), []).append(product)
+        Кандидаты отбираются через MinHash/LSH (названия, pHash изображений) и
+        точные идентификаторы, после чего модели загружаются пачками только для
+        пар-кандидатов.
+        """
+        index = self._build_dedup_index()
+        pairs = sorted(index.candidate_pairs())
+        self.logger.info(
+            "Дедупликация: товаров %s, пар-кандидатов %s", len(index.product_ids), len(pairs)
+        )
 
-        for grouped_products in buckets.values():
-            if len(grouped_products) < 2:
-                continue
-            unique_products = {product.pk: product for product in grouped_products}
-            products_list = list(unique_products.values())
-            for index, left in enumerate(products_list):
-                for right in products_list[index + 1 :]:
-                    pair_key = self._build_pair_key(left, right)
-                    if pair_key in seen_pair_keys:
-                        continue
-                    seen_pair_keys.add(pair_key)
-                    comparison = self._compare_products(left, right)
-                    if comparison:
-                        candidates.append(comparison)
+        candidates: List[Dict[str, Any]] = []
+        for offset in range(0, len(pairs), self.COMPARE_BATCH_SIZE):
+            batch = pairs[offset:offset + self.COMPARE_BATCH_SIZE]
+            product_ids = {product_id for pair in batch for product_id in pair}
+            products = Product.objects.select_related("brand", "category").in_bulk(product_ids)
+            for left_id, right_id in batch:
+                left, right = products.get(left_id), products.get(right_id)
+                if left is None or right is None:
+                    continue
+                comparison = self._compare_products(
+                    left, right, image_match=index.images_match(left_id, right_id)
+                )
+                if comparison:
+                    candidates.append(comparison)
 
         candidates.sort(key=lambda item: (-item["score"], item["pair_key"]))
         return candidates
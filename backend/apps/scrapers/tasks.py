@@ -353,6 +353,7 @@ def run_scraper_task(self,
             'products_created': session.products_created,
             'products_updated': session.products_updated,
             'products_skipped': session.products_skipped,
+            'products_unchanged': session.products_unchanged,
             'pages_processed': session.pages_processed,
             'errors_count': session.errors_count,
             'duration': str(session.duration) if session.duration else None,
@@ -363,7 +364,7 @@ def run_scraper_task(self,
             f"Найдено товаров (чанк): {session.products_found}",
             f"Создано: {session.products_created}",
             f"Обновлено: {session.products_updated}",
-            f"Пропущено: {session.products_skipped}",
+            f"Пропущено: {session.products_skipped} (без изменений: {session.products_unchanged})",
             f"Обработано страниц: {session.pages_processed}",
             f"Ошибок: {session.errors_count}",
             f"Финиш: {timezone.now().isoformat()}"
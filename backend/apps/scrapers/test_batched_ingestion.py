@@ -0,0 +1,258 @@
+"""Пакетная запись чанка: общая предзагрузка каталога, savepoint на товар, bulk_create логов."""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.catalog.models import Category, Product
+from apps.scrapers.base.scraper import ScrapedProduct
+from apps.scrapers.ingestion import scraped_product_fingerprint
+from apps.scrapers.models import (
+    ScraperConfig,
+    ScrapedProductFingerprint,
+    ScrapedProductLog,
+    ScrapingSession,
+)
+from apps.scrapers.services import ScraperIntegrationService
+
+
+def _session():
+    category = Category.objects.create(name="Пакет", slug="batched-ingestion")
+    config = ScraperConfig.objects.create(
+        name="batched-cfg", parser_class="lcw", base_url="https://e.com", default_category=category
+    )
+    return ScrapingSession.objects.create(
+        scraper_config=config, start_url="https://e.com", max_pages=1, max_products=10, status="running"
+    )
+
+
+def _scraped(external_id, price=100):
+    return ScrapedProduct(
+        name=f"Товар {external_id}",
+        description="",
+        price=price,
+        currency="TRY",
+        url=f"https://e.com/p/{external_id}",
+        external_id=external_id,
+        source="lcw",
+        is_available=True,
+        stock_quantity=5,
+        attributes={},
+    )
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = ScraperIntegrationService()
+    monkeypatch.setattr(service, "_normalize_scraped_media", lambda session, product: None)
+    return service
+
+
+@pytest.mark.django_db
+def test_chunk_reuses_prefetched_products_and_writes_logs_in_one_insert(service):
+    session = _session()
+    existing = Product.objects.create(
+        name="Товар batch-1", slug="batch-1", product_type="clothing", price=100,
+        currency="TRY", external_id="batch-1", external_data={"source": "lcw"},
+    )
+
+    with CaptureQueriesContext(connection) as queries:
+        results = service._process_scraped_products(
+            session, [_scraped("batch-1", price=150), _scraped("batch-2"), _scraped("batch-2")]
+        )
+
+    assert results["found"] == 3
+    assert results["errors"] == 0
+    assert results["created"] == 1
+    # Повтор карточки внутри чанка находит товар, созданный этим же чанком.
+    assert Product.objects.filter(external_id="batch-2").count() == 1
+    existing.refresh_from_db()
+    assert existing.price == 150
+
+    log_inserts = [
+        q for q in queries.captured_queries
+        if q["sql"].startswith('INSERT INTO "scrapers_scrapedproductlog"')
+    ]
+    assert len(log_inserts) == 1
+    assert ScrapedProductLog.objects.filter(session=session).count() == 3
+    assert service._ingest_batch is None
+
+
+@pytest.mark.django_db
+def test_failed_product_is_rolled_back_alone(service, monkeypatch):
+    session = _session()
+    original = service._process_single_product
+
+    def flaky(session, scraped_product):
+        if scraped_product.external_id == "batch-bad":
+            Product.objects.create(
+                name="half-written", slug="half-written", price=1, currency="TRY",
+                external_id="batch-bad",
+            )
+            raise RuntimeError("boom")
+        return original(session, scraped_product)
+
+    monkeypatch.setattr(service, "_process_single_product", flaky)
+
+    results = service._process_scraped_products(
+        session, [_scraped("batch-ok"), _scraped("batch-bad")]
+    )
+
+    assert results["created"] == 1
+    assert results["errors"] == 1
+    assert Product.objects.filter(external_id="batch-ok").exists()
+    assert not Product.objects.filter(external_id="batch-bad").exists()
+    error_log = ScrapedProductLog.objects.get(session=session, action="error")
+    assert error_log.message == "boom"
+
+
+@pytest.mark.django_db
+def test_chunk_size_setting_splits_products_into_separate_chunks(service, settings, monkeypatch):
+    settings.SCRAPER_INGEST_CHUNK_SIZE = 2
+    session = _session()
+    chunks = []
+    monkeypatch.setattr(
+        service,
+        "_process_scraped_chunk",
+        lambda session, products: chunks.append(len(products))
+        or {"created": len(products), "updated": 0, "skipped": 0, "unchanged": 0, "errors": 0},
+    )
+
+    results = service._process_scraped_products(session, [_scraped(str(i)) for i in range(5)])
+
+    assert chunks == [2, 2, 1]
+    assert results == {
+        "found": 5, "created": 5, "updated": 0, "skipped": 0, "unchanged": 0, "errors": 0,
+    }
+
+
+def test_fingerprint_ignores_scrape_time_and_whitespace_but_not_media_order():
+    first = _scraped("fp-1")
+    first.images = ["https://e.com/a.jpg", "https://e.com/b.jpg"]
+    second = _scraped("fp-1")
+    second.images = list(first.images)
+    second.name = "  Товар   fp-1 "
+    second.scraped_at = "2026-01-01T00:00:00"
+
+    assert scraped_product_fingerprint(first) == scraped_product_fingerprint(second)
+
+    second.images.reverse()
+    assert scraped_product_fingerprint(first) != scraped_product_fingerprint(second)
+    assert scraped_product_fingerprint(first) != scraped_product_fingerprint(first, max_images=3)
+
+
+@pytest.mark.django_db
+def test_unchanged_fingerprint_skips_update_path(service, monkeypatch):
+    session = _session()
+    service._process_scraped_products(session, [_scraped("fp-2")])
+    product = Product.objects.get(external_id="fp-2")
+    assert ScrapedProductFingerprint.objects.filter(product=product, source="lcw").exists()
+
+    update_calls = []
+    original_update = service._update_existing_product
+    monkeypatch.setattr(
+        service,
+        "_update_existing_product",
+        lambda *args, **kwargs: update_calls.append(args) or original_update(*args, **kwargs),
+    )
+
+    results = service._process_scraped_products(session, [_scraped("fp-2")])
+    assert results["unchanged"] == 1
+    assert results["skipped"] == 1
+    assert update_calls == []
+
+    results = service._process_scraped_products(session, [_scraped("fp-2", price=120)])
+    assert results["updated"] == 1
+    assert results["unchanged"] == 0
+    assert len(update_calls) == 1
+    product.refresh_from_db()
+    assert product.price == 120
+
+
+@pytest.mark.django_db
+def test_category_listing_is_ingested_in_chunks_and_flushed_on_pause(service, settings, monkeypatch):
+    from apps.scrapers.models import SiteScraperTask
+    from apps.scrapers.services import ScraperTaskPaused
+
+    settings.SCRAPER_STREAM_FLUSH_SIZE = 2
+    session = _session()
+    task = SiteScraperTask.objects.create(
+        scraper_config=session.scraper_config, start_url="https://e.com/category/x",
+        max_pages=1, max_products=10, max_images_per_product=3, status="running",
+    )
+    chunks = []
+    monkeypatch.setattr(
+        service,
+        "_process_scraped_products",
+        lambda session, products: chunks.append([p.external_id for p in products])
+        or {"found": len(products), "created": len(products), "updated": 0, "skipped": 0, "errors": 0},
+    )
+
+    class Parser:
+        SUPPORTS_PAGE_CHUNKING = False
+
+        def parse_product_list(self, *args, **kwargs):
+            for index in range(5):
+                if index == 3:
+                    SiteScraperTask.objects.filter(id=task.id).update(status="paused")
+                yield _scraped(f"chunked-{index}")
+
+    with pytest.raises(ScraperTaskPaused):
+        service._run_parser_scraping(Parser(), session, task.start_url, site_task_id=task.id)
+
+    # Полный чанк пишется сразу, остаток буфера — до выхода по паузе.
+    assert chunks == [["chunked-0", "chunked-1"], ["chunked-2"]]
+    task.refresh_from_db()
+    assert task.products_found == 3
+
+
+@pytest.mark.django_db
+def test_slow_category_listing_is_flushed_on_time_budget(service, settings, monkeypatch):
+    from apps.scrapers import services as scraper_services
+
+    settings.SCRAPER_INGEST_CHUNK_SIZE = 500
+    settings.SCRAPER_STREAM_FLUSH_SIZE = 100
+    settings.SCRAPER_STREAM_FLUSH_SECONDS = 10
+    session = _session()
+    clock = iter([0, 1, 12, 13, 14, 30, 31])
+    monkeypatch.setattr(scraper_services.time, "monotonic", lambda: next(clock))
+    chunks = []
+    monkeypatch.setattr(
+        service,
+        "_process_scraped_products",
+        lambda session, products: chunks.append([p.external_id for p in products])
+        or {"found": len(products), "created": len(products), "updated": 0, "skipped": 0, "errors": 0},
+    )
+
+    class Parser:
+        SUPPORTS_PAGE_CHUNKING = False
+
+        def parse_product_list(self, *args, **kwargs):
+            for index in range(3):
+                yield _scraped(f"slow-{index}")
+
+    service._run_parser_scraping(Parser(), session, "https://e.com/category/x")
+
+    # Медленный листинг пишется по таймеру, а не ждёт 500 карточек.
+    assert chunks == [["slow-0", "slow-1"], ["slow-2"]]
+    assert ScrapingSession.objects.get(id=session.id).products_found == 3
+
+
+@pytest.mark.django_db
+def test_remembered_product_replaces_prefetched_instance():
+    from apps.scrapers.ingestion import ScrapedProductBatch
+
+    product = Product.objects.create(
+        name="Товар remember-1", slug="remember-1", product_type="clothing", price=100,
+        currency="TRY", external_id="remember-1", external_url="https://e.com/p/remember-1",
+        external_data={"source": "lcw"},
+    )
+    batch = ScrapedProductBatch(session=None)
+    batch.prefetch([_scraped("remember-1")])
+    fresh = Product.objects.get(pk=product.pk)
+    fresh.price = 200
+
+    batch.remember(fresh)
+
+    assert batch.product_by_external_id("remember-1") is fresh
+    assert batch.product_by_source_url("https://e.com/p/remember-1", "lcw") is fresh
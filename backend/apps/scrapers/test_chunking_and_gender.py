@@ -335,8 +335,8 @@ def test_duplicate_product_is_skipped_across_separate_celery_chunks(monkeypatch)
         RepeatingParser(), second_session, task.start_url, start_page=2, site_task_id=task.id
     )
 
-    assert first == {"found": 1, "created": 0, "updated": 1, "skipped": 0, "errors": 0}
-    assert second == {"found": 0, "created": 0, "updated": 0, "skipped": 1, "errors": 0}
+    assert first == {"found": 1, "created": 0, "updated": 1, "skipped": 0, "unchanged": 0, "errors": 0}
+    assert second == {"found": 0, "created": 0, "updated": 0, "skipped": 1, "unchanged": 0, "errors": 0}
 
 
 @pytest.mark.django_db
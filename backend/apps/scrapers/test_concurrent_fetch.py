@@ -0,0 +1,189 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from apps.http_errors import ExternalAccessBlockedError
+from apps.scrapers.base import rate_limit
+from apps.scrapers.base.rate_limit import HostRateLimiter, get_host_limiter, parse_retry_after
+from apps.scrapers.parsers.lcw import LcwParser
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+
+
+def _patch_get(monkeypatch, handler):
+    """Подменяет GET у всех httpx.Client — и основного, и клиентов потоков fetch_many."""
+    monkeypatch.setattr(httpx.Client, "get", lambda client, url, **kwargs: handler(url, **kwargs))
+
+
+def _response(status_code, url, text="", headers=None):
+    return httpx.Response(
+        status_code,
+        text=text,
+        headers=headers or {},
+        request=httpx.Request("GET", url),
+    )
+
+
+def test_token_bucket_spaces_requests_by_budget():
+    limiter = HostRateLimiter(requests_per_second=20)
+
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+
+    # Первый токен есть сразу, следующие три — по 1/20 с.
+    assert elapsed >= 0.14
+
+
+def test_penalty_halves_rate_and_recovers_gradually():
+    limiter = HostRateLimiter(requests_per_second=10)
+
+    limiter.penalize(retry_after=0)
+    assert limiter.rate == 5
+    limiter.reward()
+    assert limiter.rate == 6
+
+
+def test_retry_after_is_capped():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("100000") == rate_limit.MAX_PENALTY_SECONDS
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+
+def test_limiter_is_shared_per_host():
+    first = get_host_limiter("https://www.lcw.com/a", 2)
+    second = get_host_limiter("https://www.lcw.com/b?x=1", 2)
+
+    assert first is second
+    assert get_host_limiter("https://img.lcw.com/a", 2) is not first
+
+
+def test_limiter_budget_is_set_by_first_caller_only():
+    limiter = get_host_limiter("https://www.lcw.com/a", 2)
+
+    assert get_host_limiter("https://www.lcw.com/b", 10) is limiter
+    assert limiter.base_rate == 2
+
+
+def test_budget_is_derived_from_delay_range():
+    parser = LcwParser(base_url="https://www.lcw.com")
+    parser.delay_range = (1, 3)
+    assert parser._get_rate_limiter("https://www.lcw.com/x").base_rate == 0.5
+
+    parser.delay_range = (0, 0)
+    assert parser._get_rate_limiter("https://www.lcw.com/x") is None
+
+
+def test_fetch_many_runs_in_parallel_and_keeps_order(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com")
+    parser.delay_range = (0, 0)
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_get(url, **kwargs):
+        with lock:
+            in_flight.append(url)
+            peak.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(url)
+        return _response(200, url, text=f"page {url[-1]}")
+
+    _patch_get(monkeypatch, slow_get)
+
+    urls = [f"https://www.lcw.com/p-{i}" for i in range(8)]
+    pages = parser.fetch_many(urls)
+
+    assert pages == [f"page {i}" for i in range(8)]
+    assert max(peak) > 1
+
+
+def test_fetch_many_backs_off_on_429_and_retries(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com", max_retries=2)
+    parser.requests_per_second = 50
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            return _response(429, url, headers={"Retry-After": "0"})
+        return _response(200, url, text="ok")
+
+    _patch_get(monkeypatch, get)
+
+    assert parser.fetch_many(["https://www.lcw.com/p-1"]) == ["ok"]
+    assert len(calls) == 2
+    assert get_host_limiter("https://www.lcw.com", 50).rate < 50
+
+
+def test_fetch_many_returns_none_for_failed_pages_but_raises_access_errors(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com", max_retries=0)
+    parser.delay_range = (0, 0)
+
+    def get(url, **kwargs):
+        if url.endswith("missing"):
+            return _response(404, url)
+        if url.endswith("blocked"):
+            return _response(403, url)
+        return _response(200, url, text="ok")
+
+    _patch_get(monkeypatch, get)
+
+    assert parser.fetch_many(["https://www.lcw.com/ok", "https://www.lcw.com/missing"]) == ["ok", None]
+    with pytest.raises(ExternalAccessBlockedError):
+        parser.fetch_many(["https://www.lcw.com/ok", "https://www.lcw.com/blocked"])
+
+
+def test_prefetched_page_is_served_once_without_new_request(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com")
+    parser.delay_range = (0, 0)
+    calls = []
+    _patch_get(monkeypatch, lambda url, **kwargs: calls.append(url) or _response(200, url, text="detail"))
+
+    parser.fetch_many(["/p-1"], prefetch=True)
+
+    assert parser._make_request("https://www.lcw.com/p-1") == "detail"
+    assert parser._make_request("https://www.lcw.com/p-1") == "detail"
+    assert calls == ["https://www.lcw.com/p-1", "https://www.lcw.com/p-1"]
+
+
+def test_fetch_many_uses_own_client_per_worker_thread(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com")
+    parser.delay_range = (0, 0)
+    parser.client.headers["X-Identity"] = "configured"
+    clients = {}
+    lock = threading.Lock()
+
+    def get(client, url, **kwargs):
+        with lock:
+            clients.setdefault(threading.get_ident(), set()).add(id(client))
+            assert client.headers["X-Identity"] == "configured"
+        time.sleep(0.02)
+        return _response(200, url, text="ok")
+
+    monkeypatch.setattr(httpx.Client, "get", get)
+
+    parser.fetch_many([f"https://www.lcw.com/p-{i}" for i in range(8)], max_workers=4)
+
+    used = set().union(*clients.values())
+    assert id(parser.client) not in used
+    assert all(len(ids) == 1 for ids in clients.values())
+    assert len(used) == len(clients)
+
+
+def test_prefetch_buffer_is_capped(monkeypatch):
+    parser = LcwParser(base_url="https://www.lcw.com")
+    parser.delay_range = (0, 0)
+    parser.PREFETCH_BUFFER_SIZE = 3
+    _patch_get(monkeypatch, lambda url, **kwargs: _response(200, url, text=url[-1]))
+
+    parser.fetch_many([f"https://www.lcw.com/p-{i}" for i in range(5)], prefetch=True)
+
+    assert list(parser._prefetched_pages) == [f"https://www.lcw.com/p-{i}" for i in (2, 3, 4)]
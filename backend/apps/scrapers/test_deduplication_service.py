@@ -9,7 +9,9 @@ from apps.catalog.models import (
     ClothingProduct,
     ClothingVariant,
     Product,
+    ProductImage,
 )
+from apps.scrapers.dedup import DedupIndex
 from apps.scrapers.models import ProductDuplicateCandidate
 from apps.scrapers.services import DeduplicationService
 
@@ -140,6 +142,62 @@ def test_find_duplicates_ignores_shadow_variant_products():
     assert duplicates == []
 
 
+@pytest.mark.django_db
+def test_find_duplicates_catches_near_duplicate_names_via_lsh():
+    category = _make_category("Наушники TWS")
+    brand = _make_brand("Galaxy Brand")
+
+    left = _make_product(
+        name="Samsung Galaxy Buds2 Pro Graphite", brand=brand, category=category, source="api"
+    )
+    right = _make_product(
+        name="Samsung Galaxy Buds 2 Pro Graphite", brand=brand, category=category, source="trendyol"
+    )
+    _make_product(name="Apple AirPods Max Silver", brand=brand, category=category, source="trendyol")
+
+    duplicates = DeduplicationService().find_duplicates()
+
+    assert len(duplicates) == 1
+    candidate = duplicates[0]
+    assert {candidate["canonical_product"].pk, candidate["duplicate_product"].pk} == {left.pk, right.pk}
+    assert "Похожее название" in candidate["reasons"]
+    assert candidate["signals"]["name_similarity"] >= DeduplicationService.FUZZY_NAME_THRESHOLD
+
+
+@pytest.mark.django_db
+def test_find_duplicates_uses_image_hashes_as_similarity_signal():
+    category = _make_category("Сумки")
+    brand = _make_brand("Bag Brand")
+    left = _make_product(name="Leather Tote", brand=brand, category=category, source="api")
+    right = _make_product(name="Shopper bag brown", brand=brand, category=category, source="lcw")
+    ProductImage.objects.create(product=left, image_url="https://e.com/1.jpg", image_hash="ffd8a0b0c0d0e0f0")
+    # Расстояние Хэмминга 2 — то же фото после пережатия.
+    ProductImage.objects.create(product=right, image_url="https://e.com/2.jpg", image_hash="ffd8a0b0c0d0e0f3")
+
+    duplicates = DeduplicationService().find_duplicates()
+
+    assert len(duplicates) == 1
+    assert "Совпадает изображение (pHash)" in duplicates[0]["reasons"]
+
+
+def test_dedup_index_splits_name_groups_by_context():
+    index = DedupIndex()
+    for product_id, brand_id, category_id in ((1, 10, 100), (2, 10, 100), (3, 20, 200), (4, 30, 300)):
+        index.add(
+            product_id,
+            normalized_name="basic cotton t-shirt",
+            identifiers={},
+            brand_id=brand_id,
+            category_id=category_id,
+            product_type="clothing",
+        )
+    index.add(5, normalized_name="other", identifiers={"sku": "x-1"}, brand_id=None, category_id=None, product_type="")
+    index.add(6, normalized_name="another", identifiers={"sku": "x-1"}, brand_id=None, category_id=None, product_type="")
+
+    # Одинаковое название без второго совпадения контекста не порождает пару.
+    assert index.candidate_pairs() == {(1, 2), (5, 6)}
+
+
 @pytest.mark.django_db
 def test_store_candidates_creates_pending_review_records_without_merging_products():
     category = _make_category("Чехлы")
@@ -0,0 +1,114 @@
+"""DataSelector: один разбор страницы, кэш выборок и подключаемые HTML backend'ы."""
+
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from apps.scrapers.base import selectors
+from apps.scrapers.base.selectors import DataSelector, SelectorConfig, SoupBackend, get_html_backend
+
+LISTING_HTML = """
+<html><body>
+  <div class="product" data-id="1">
+    <a class="title" href="/p/1">Aspirin 100 mg</a>
+    <span class="price">12,50 TL</span>
+  </div>
+  <div class="product" data-id="2">
+    <a class="title" href="https://e.com/p/2">Parol</a>
+    <span class="price">30 TL</span>
+  </div>
+</body></html>
+"""
+
+FIELD_CONFIGS = {
+    "id": SelectorConfig(selector=".product", attribute="data-id"),
+    "name": SelectorConfig(selector=".title", transformations=["clean"]),
+    "url": SelectorConfig(selector=".title", attribute="href"),
+    "price": SelectorConfig(selector=".price", transformations=["price"]),
+}
+
+EXPECTED_PRODUCTS = [
+    {"id": "1", "name": "Aspirin 100 mg", "url": "https://e.com/p/1", "price": 12.5},
+    {"id": "2", "name": "Parol", "url": "https://e.com/p/2", "price": 30.0},
+]
+
+
+class CountingBackend(SoupBackend):
+    def __init__(self):
+        self.parsed = 0
+        self.selected = []
+
+    def parse(self, html):
+        self.parsed += 1
+        return super().parse(html)
+
+    def select(self, node, css):
+        self.selected.append(css)
+        return super().select(node, css)
+
+
+def test_extract_multiple_selects_each_unique_selector_once():
+    backend = CountingBackend()
+    selector = DataSelector(LISTING_HTML, "https://e.com", backend=backend)
+
+    data = selector.extract_multiple({
+        "name": SelectorConfig(selector=".title"),
+        "url": SelectorConfig(selector=".title", attribute="href"),
+        "second_url": SelectorConfig(selector=".title", attribute="href", index=1),
+        "missing": SelectorConfig(selector=".nope", default="-"),
+    })
+
+    assert data == {
+        "name": "Aspirin 100 mg",
+        "url": "https://e.com/p/1",
+        "second_url": "https://e.com/p/2",
+        "missing": "-",
+    }
+    assert backend.selected == [".title", ".nope"]
+
+
+def test_product_list_is_extracted_from_one_tree():
+    backend = CountingBackend()
+    selector = DataSelector(LISTING_HTML, "https://e.com", backend=backend)
+
+    assert selector.extract_product_list(".product", FIELD_CONFIGS) == EXPECTED_PRODUCTS
+    assert backend.parsed == 1
+
+
+def test_required_selector_error_is_reported():
+    selector = DataSelector(LISTING_HTML, "https://e.com", backend="bs4")
+
+    with pytest.raises(ValueError, match="Обязательный селектор не найден"):
+        selector.extract(SelectorConfig(selector=".nope", required=True))
+
+
+def test_backend_comes_from_settings_and_unknown_name_is_rejected(settings, monkeypatch):
+    monkeypatch.setattr(selectors, "_backend_instances", {})
+    settings.SCRAPER_HTML_BACKEND = "bs4"
+    assert get_html_backend().name == "bs4"
+    with pytest.raises(ValueError):
+        get_html_backend("html5lib")
+
+
+def test_selectolax_backend_matches_bs4():
+    pytest.importorskip("selectolax")
+    fast = DataSelector(LISTING_HTML, "https://e.com", backend="selectolax")
+
+    assert fast.backend.name == "selectolax"
+    assert fast.soup is None
+    assert fast.extract_product_list(".product", FIELD_CONFIGS) == EXPECTED_PRODUCTS
+    assert fast.extract(SelectorConfig(selector="a", attribute="text", all_elements=True)) == [
+        "Aspirin 100 mg",
+        "Parol",
+    ]
+
+
+def test_benchmark_command_reports_every_available_backend():
+    out = StringIO()
+    call_command("benchmark_html_parsing", "--repeat", "1", "--backends", "bs4", "--json", stdout=out)
+
+    report = json.loads(out.getvalue())
+    assert report["pages"] > 0
+    assert report["backends"]["bs4"]["total_ms_mean"] > 0
@@ -0,0 +1,186 @@
+"""Условные запросы парсеров: ETag/Last-Modified, 304 и пропуск неизменных карточек."""
+
+import httpx
+import pytest
+
+from apps.catalog.models import Category, Product
+from apps.scrapers.base import rate_limit
+from apps.scrapers.base.http_cache import PageCache
+from apps.scrapers.base.scraper import ScrapedProduct
+from apps.scrapers.models import (
+    ScraperConfig,
+    ScrapedProductFingerprint,
+    ScrapedProductLog,
+    ScrapingSession,
+)
+from apps.scrapers.parsers.ilacabak import IlacabakParser
+from apps.scrapers.services import ScraperIntegrationService
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+
+
+@pytest.fixture
+def parser(tmp_path, settings):
+    settings.SCRAPER_HTTP_CACHE_DIR = str(tmp_path / "http-cache")
+    parser = IlacabakParser(base_url="https://ilacabak.com")
+    parser.delay_range = (0, 0)
+    return parser
+
+
+def _serve(parser, monkeypatch, responses):
+    """Подменяет client.get: responses — список (status, text, headers) по порядку."""
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(kwargs.get("headers") or {})
+        status, text, headers = responses[len(calls) - 1]
+        return httpx.Response(status, text=text, headers=headers, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(parser.client, "get", get)
+    return calls
+
+
+def test_cache_is_disabled_without_setting(settings):
+    settings.SCRAPER_HTTP_CACHE_DIR = ""
+    assert IlacabakParser(base_url="https://ilacabak.com").http_cache is None
+
+
+def test_not_modified_response_is_served_from_cache(parser, monkeypatch):
+    url = "https://ilacabak.com/ilac/1"
+    calls = _serve(parser, monkeypatch, [
+        (200, "<html>v1</html>", {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}),
+        (304, "", {}),
+    ])
+
+    with parser.tracking_page_changes() as first:
+        assert parser._make_request(url) == "<html>v1</html>"
+    with parser.tracking_page_changes() as second:
+        assert parser._make_request(url) == "<html>v1</html>"
+
+    assert calls[0] == {}
+    assert calls[1] == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+    assert not first.unchanged
+    assert second.unchanged
+
+
+def test_same_body_without_validators_counts_as_unchanged(parser, monkeypatch):
+    url = "https://ilacabak.com/ilac/2"
+    _serve(parser, monkeypatch, [(200, "same", {}), (200, "same", {}), (200, "new", {})])
+
+    states = []
+    for _ in range(3):
+        with parser.tracking_page_changes() as scope:
+            parser._make_request(url)
+        states.append(scope.unchanged)
+
+    assert states == [False, True, False]
+    assert parser.http_cache.read_body(url) == "new"
+
+
+def test_corrupted_cache_body_falls_back_to_full_request(parser, monkeypatch):
+    url = "https://ilacabak.com/ilac/3"
+    calls = _serve(parser, monkeypatch, [
+        (200, "v1", {"ETag": '"v1"'}),
+        (304, "", {}),
+        (200, "v1", {"ETag": '"v1"'}),
+    ])
+    parser._make_request(url)
+    _, body_path = parser.http_cache._paths(url)
+    body_path.write_bytes(b"not gzip")
+
+    acquired = []
+    limiter = parser._get_rate_limiter(url) or rate_limit.get_host_limiter(url, 1000)
+    monkeypatch.setattr(parser, "_get_rate_limiter", lambda url: limiter)
+    monkeypatch.setattr(limiter, "acquire", lambda: acquired.append(1) or 0.0)
+
+    assert parser._make_request(url) == "v1"
+    assert calls[2] == {}
+    # Повторный GET после 304 с битым телом тоже берёт токен из бюджета хоста.
+    assert len(acquired) == 2
+
+
+def test_page_cache_store_reports_unchanged_body(tmp_path):
+    cache = PageCache(tmp_path)
+
+    assert cache.store("https://e.com/a", "body", etag='"1"') is False
+    assert cache.store("https://e.com/a", "body", etag='"2"') is True
+    assert cache.lookup("https://e.com/a").etag == '"2"'
+    assert cache.lookup("https://e.com/b") is None
+
+
+def _session():
+    category = Category.objects.create(name="Кэш", slug="http-cache")
+    config = ScraperConfig.objects.create(
+        name="cache-cfg", parser_class="ilacabak", base_url="https://e.com", default_category=category
+    )
+    return ScrapingSession.objects.create(
+        scraper_config=config, start_url="https://e.com", max_pages=1, max_products=10, status="running"
+    )
+
+
+@pytest.mark.django_db
+def test_unchanged_existing_product_is_skipped_without_writes(monkeypatch):
+    session = _session()
+    existing = Product.objects.create(
+        name="Aspirin", slug="aspirin-cache", product_type="medicines", price=100,
+        currency="TRY", external_id="asp-1", external_data={"source": "ilacabak"},
+    )
+    service = ScraperIntegrationService()
+    media_calls = []
+    monkeypatch.setattr(
+        service, "_normalize_scraped_media", lambda session, product: media_calls.append(product)
+    )
+
+    def scraped(external_id):
+        return ScrapedProduct(
+            name=f"Ilac {external_id}", price=999, currency="TRY", source="ilacabak",
+            url=f"https://e.com/{external_id}", external_id=external_id, source_unchanged=True,
+        )
+
+    # Прошлый проход успешно записал карточку — отпечаток сохранён.
+    service._process_scraped_products(session, [scraped("asp-1")])
+    Product.objects.filter(pk=existing.pk).update(price=100)
+    media_calls.clear()
+    ScrapedProductLog.objects.all().delete()
+
+    results = service._process_scraped_products(session, [scraped("asp-1"), scraped("asp-new")])
+
+    assert results["skipped"] == 1
+    assert results["created"] == 1
+    existing.refresh_from_db()
+    assert existing.price == 100
+    # Неизменная страница без товара в каталоге обрабатывается полностью.
+    assert [p.external_id for p in media_calls] == ["asp-new"]
+    log = ScrapedProductLog.objects.get(session=session, action="skipped")
+    assert log.product == existing
+
+
+@pytest.mark.django_db
+def test_not_modified_page_without_recorded_ingest_is_written_again(monkeypatch):
+    """304 после упавшей записи: отпечатка успешной записи нет — карточка пишется."""
+    session = _session()
+    existing = Product.objects.create(
+        name="Ilac asp-2", slug="aspirin-cache-2", product_type="medicines", price=100,
+        currency="TRY", external_id="asp-2", external_data={"source": "ilacabak"},
+    )
+    service = ScraperIntegrationService()
+    monkeypatch.setattr(service, "_normalize_scraped_media", lambda session, product: None)
+
+    results = service._process_scraped_products(session, [
+        ScrapedProduct(
+            name="Ilac asp-2", price=150, currency="TRY", source="ilacabak",
+            url="https://e.com/asp-2", external_id="asp-2", source_unchanged=True,
+        ),
+    ])
+
+    assert results["unchanged"] == 0
+    assert results["updated"] == 1
+    existing.refresh_from_db()
+    assert existing.price == 150
+    assert ScrapedProductFingerprint.objects.filter(product=existing, source="ilacabak").exists()
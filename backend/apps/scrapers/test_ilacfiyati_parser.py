@@ -1,6 +1,8 @@
 import json
 from decimal import Decimal
 
+import pytest
+
 from apps.scrapers.parsers.ilacfiyati import IlacFiyatiParser
 
 
@@ -140,3 +142,27 @@ def test_scraped_product_to_dict_is_json_serializable_with_decimal_analogs(monke
     assert product is not None
     assert product.analogs[0]["price"] == Decimal("125.45")
     assert json.dumps(product.to_dict())
+
+
+@pytest.mark.parametrize("html_backend", ["bs4", "selectolax"])
+def test_ilacfiyati_listing_extracts_product_urls(monkeypatch, settings, html_backend):
+    settings.SCRAPER_HTML_BACKEND = html_backend
+    base_url = "https://ilacfiyati.com"
+    parser = IlacFiyatiParser(base_url=base_url)
+    listing_html = """
+    <div>
+      <a href="/ilaclar/aspirin-100-mg">Aspirin</a>
+      <a href="/ilaclar/aspirin-100-mg">Aspirin</a>
+      <a href="/takviye-edici-gida/omega-3">Omega</a>
+      <a href="/ilaclar?pg=2">2</a>
+      <a href="/ilaclar">Tümü</a>
+    </div>
+    """
+    monkeypatch.setattr(parser, "_make_request", lambda url, **kwargs: listing_html if "pg=" not in url else "")
+    monkeypatch.setattr(parser, "fetch_many", lambda urls, **kwargs: [])
+    monkeypatch.setattr(parser, "validate_product", lambda product: True)
+    monkeypatch.setattr(parser, "parse_product_detail", lambda url: url)
+
+    urls = list(parser.parse_product_list(f"{base_url}/ilaclar", max_pages=2))
+
+    assert urls == [f"{base_url}/ilaclar/aspirin-100-mg", f"{base_url}/takviye-edici-gida/omega-3"]
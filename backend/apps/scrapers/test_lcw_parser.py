@@ -1,3 +1,4 @@
+import pytest
 from bs4 import BeautifulSoup
 
 from apps.scrapers.parsers.lcw import LcwParser
@@ -288,7 +289,9 @@ def test_chunking_is_enabled_only_for_lcw_category_urls():
     )
 
 
-def test_parse_categories_from_homepage(monkeypatch):
+@pytest.mark.parametrize("html_backend", ["bs4", "selectolax"])
+def test_parse_categories_from_homepage(monkeypatch, settings, html_backend):
+    settings.SCRAPER_HTML_BACKEND = html_backend
     parser = LcwParser()
     monkeypatch.setattr(parser, "_make_request", lambda url, **kwargs: LCW_HOME_HTML)
 
@@ -455,7 +458,9 @@ def test_parse_product_detail(monkeypatch):
     assert product.attributes["fashion_variants"][1]["external_id"] == "lcw-var-4869998"
 
 
-def test_parse_product_list_uses_group_ids_to_deduplicate(monkeypatch):
+@pytest.mark.parametrize("html_backend", ["bs4", "selectolax"])
+def test_parse_product_list_uses_group_ids_to_deduplicate(monkeypatch, settings, html_backend):
+    settings.SCRAPER_HTML_BACKEND = html_backend
     parser = LcwParser()
 
     def fake_make_request(url, **kwargs):
@@ -4,9 +4,18 @@ Celery используется для фоновых задач (парсинг
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 app = Celery("mudaroba")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def _warm_up_qdrant(**kwargs):
+    """Клиент Qdrant и проверка коллекций — при старте процесса воркера, а не в первой задаче."""
+    from apps.recommendations.services.qdrant_registry import warm_up
+
+    warm_up()
@@ -137,6 +137,14 @@ CACHES = {
     }
 }
 
+# Гостевая корзина: redis — hash в Redis без django_session/Cart (в БД переносится
+# при входе или оформлении заказа); db — прежняя анонимная Cart в Postgres.
+GUEST_CART_BACKEND = env("GUEST_CART_BACKEND", default="redis")
+GUEST_CART_REDIS_URL = env("GUEST_CART_REDIS_URL", default=REDIS_URL)
+GUEST_CART_TTL_DAYS = env.int("GUEST_CART_TTL_DAYS", default=30)
+# Перенос анонимных Cart из БД в Redis при первом обращении гостя.
+GUEST_CART_IMPORT_LEGACY = env.bool("GUEST_CART_IMPORT_LEGACY", default=True)
+
 # Celery
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -167,6 +175,9 @@ from celery.schedules import crontab
 CELERY_TASK_ROUTES = {
     "apps.ai.tasks.*": {"queue": "ai"},
     "apps.recommendations.tasks.*": {"queue": "recsys"},
+    # Рендер PDF-чеков (weasyprint) не задерживает общую очередь и колбэки оплаты.
+    "apps.orders.tasks.render_order_receipt_task": {"queue": "receipts"},
+    "apps.orders.tasks.send_order_receipt_task": {"queue": "receipts"},
     "apps.payments.tasks.*": {"queue": "celery"},
     "currency.*": {"queue": "celery"},
 }
@@ -225,12 +236,43 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": 60 * 60 * 24 * 7,
         "kwargs": {"days": 30},
     },
+    # AI: забрать результаты отложенных пакетных заданий (batch API, окно до 24 ч)
+    "ai-poll-batch-jobs": {
+        "task": "apps.ai.tasks.poll_ai_batch_jobs",
+        "schedule": 60 * 10,
+    },
     # RecSys: каждую ночь индексируем только новые/изменённые товары малыми пакетами.
     # Полная переиндексация остаётся только ручной операцией.
     "recsys-sync-stale-nightly": {
         "task": "apps.recommendations.tasks.sync_stale_products_to_qdrant",
         "schedule": crontab(hour=2, minute=15),
-        "kwargs": {"batch_size": 25, "max_products": 200},
+        "kwargs": {"batch_size": 100, "max_products": 2000},
+    },
+    # RecSys: инкрементальное обновление профилей пользователей новыми событиями.
+    "recsys-update-user-embeddings": {
+        "task": "apps.recommendations.tasks.update_user_embeddings",
+        "schedule": 60 * 5,
+    },
+    # RecSys: дозаполнение/обновление предрасчитанных похожих товаров (stale и новые).
+    "recsys-refresh-similar-products": {
+        "task": "apps.recommendations.tasks.refresh_similar_products",
+        "schedule": 60 * 15,
+        "kwargs": {"batch_size": 64, "max_products": 5000},
+    },
+    # RecSys: признаки реранкера — изменённые товары часто, популярность раз в час.
+    "recsys-refresh-ranking-features": {
+        "task": "apps.recommendations.tasks.refresh_ranking_features",
+        "schedule": 60 * 10,
+    },
+    "recsys-refresh-ranking-popularity": {
+        "task": "apps.recommendations.tasks.refresh_ranking_features",
+        "schedule": crontab(minute=40),
+        "kwargs": {"popularity": True},
+    },
+    # RecSys: удаление просроченных записей кэша эмбеддингов (раз в сутки).
+    "recsys-prune-embedding-cache": {
+        "task": "apps.recommendations.tasks.prune_embedding_cache",
+        "schedule": crontab(hour=5, minute=10),
     },
     # Очистка временных файлов поиска по фото (каждый час)
     "cleanup-temp-images": {
@@ -415,6 +457,50 @@ BOOKS_SEO_SITE_NAME = env("BOOKS_SEO_SITE_NAME", default=COMPANY_NAME)
 # Прокси для парсеров (например турецкий residential/mobile для обхода
 # репутационных блокировок Akamai на Zara). Пусто = прямое соединение.
 SCRAPER_PROXY_URL = env("SCRAPER_PROXY_URL", default="")
+# Сколько спарсенных товаров пишется одной транзакцией с общей предзагрузкой каталога
+# и одним bulk_create логов (ScraperIntegrationService._process_scraped_products).
+SCRAPER_INGEST_CHUNK_SIZE = env.int("SCRAPER_INGEST_CHUNK_SIZE", default=500)
+# Потоковый парсинг категории пишет буфер каждые N карточек или T секунд —
+# checkpoint сессии (счётчики, seen-кэш) не отстаёт от парсера на целый чанк.
+SCRAPER_STREAM_FLUSH_SIZE = env.int("SCRAPER_STREAM_FLUSH_SIZE", default=20)
+SCRAPER_STREAM_FLUSH_SECONDS = env.float("SCRAPER_STREAM_FLUSH_SECONDS", default=30.0)
+# Каталог HTTP-кэша страниц источников (ETag/Last-Modified + gzip-тело).
+# Пусто — условные запросы выключены; в проде — постоянный том воркеров парсинга.
+SCRAPER_HTTP_CACHE_DIR = env("SCRAPER_HTTP_CACHE_DIR", default="")
+# Backend разбора HTML для DataSelector: bs4 (BeautifulSoup+lxml) или selectolax,
+# если пакет установлен. Сравнение: manage.py benchmark_html_parsing.
+SCRAPER_HTML_BACKEND = env("SCRAPER_HTML_BACKEND", default="bs4")
+
+# Qdrant: общий на процесс клиент (apps.recommendations.services.qdrant_registry).
+# QDRANT_PREFER_GRPC=true — один gRPC-канал вместо HTTP keep-alive пула.
+QDRANT_HOST = env("QDRANT_HOST", default="qdrant")
+QDRANT_PORT = env.int("QDRANT_PORT", default=6333)
+QDRANT_GRPC_PORT = env.int("QDRANT_GRPC_PORT", default=6334)
+QDRANT_PREFER_GRPC = env.bool("QDRANT_PREFER_GRPC", default=False)
+QDRANT_TIMEOUT = env.int("QDRANT_TIMEOUT", default=10)
+
+# RecSys: индексация векторов товаров пачками (батч энкодеров и upsert в Qdrant)
+# и число потоков для параллельной загрузки изображений под CLIP.
+RECSYS_INDEX_CHUNK_SIZE = env.int("RECSYS_INDEX_CHUNK_SIZE", default=32)
+RECSYS_IMAGE_FETCH_WORKERS = env.int("RECSYS_IMAGE_FETCH_WORKERS", default=8)
+# Срок жизни записей EmbeddingCache (дни); 0 — без ограничения.
+RECSYS_EMBEDDING_CACHE_TTL_DAYS = env.int("RECSYS_EMBEDDING_CACHE_TTL_DAYS", default=30)
+# RecSys: онлайн-обновление профилей пользователей по потоку RecommendationEvent.
+# Период полураспада веса событий (дни), размер микро-батча и окно перечитывания
+# событий ниже курсора (в id) — для событий, закоммиченных не по порядку id.
+RECSYS_PROFILE_HALF_LIFE_DAYS = env.int("RECSYS_PROFILE_HALF_LIFE_DAYS", default=14)
+RECSYS_PROFILE_BATCH_SIZE = env.int("RECSYS_PROFILE_BATCH_SIZE", default=2000)
+RECSYS_PROFILE_CURSOR_OVERLAP = env.int("RECSYS_PROFILE_CURSOR_OVERLAP", default=500)
+# RecSys: сколько соседей хранить на товар в предрасчитанной таблице SimilarProducts.
+RECSYS_SIMILAR_TOP_N = env.int("RECSYS_SIMILAR_TOP_N", default=50)
+# RecSys: int8-квантование векторов product_recommendations (оригиналы на диске)
+# и oversampling кандидатов для пересчёта скоров по оригинальным векторам.
+RECSYS_VECTOR_QUANTIZATION = env.bool("RECSYS_VECTOR_QUANTIZATION", default=True)
+RECSYS_QUANTIZATION_OVERSAMPLING = env.float("RECSYS_QUANTIZATION_OVERSAMPLING", default=2.0)
+# Инференс эмбеддингов в ml_service (пусто — модели грузятся в процессе воркера).
+ML_SERVICE_URL = env("ML_SERVICE_URL", default="")
+ML_SERVICE_TIMEOUT = env.int("ML_SERVICE_TIMEOUT", default=30)
+ML_SERVICE_BATCH_SIZE = env.int("ML_SERVICE_BATCH_SIZE", default=128)
 
 
 # Sentry (неактивен, если DSN пуст)
@@ -492,6 +578,32 @@ AI_CONFIG = {
     'MODEL': env("AI_MODEL", default="gpt-4o-mini"),
     'VISION_MODEL': env("AI_VISION_MODEL", default="gpt-4o-mini"),
     'EMBEDDING_MODEL': env("AI_EMBEDDING_MODEL", default="text-embedding-3-small"),
+    # Кэш ответов LLM по хэшу запроса (таблица LLMResponseCache + Redis).
+    # RESPONSE_CACHE_VERSION — общий сброс всех сохранённых ответов.
+    'RESPONSE_CACHE_ENABLED': env.bool("AI_RESPONSE_CACHE_ENABLED", default=True),
+    'RESPONSE_CACHE_TTL': env.int("AI_RESPONSE_CACHE_TTL", default=60 * 60 * 24 * 30),
+    'RESPONSE_CACHE_VERSION': env("AI_RESPONSE_CACHE_VERSION", default="1"),
+    # Пакетный режим batch_process_products(bulk=True): товаров на задачу,
+    # одновременных запросов и лимиты запросов/токенов в минуту на задачу.
+    'BULK_BATCH_SIZE': env.int("AI_BULK_BATCH_SIZE", default=50),
+    'BULK_CONCURRENCY': env.int("AI_BULK_CONCURRENCY", default=8),
+    'BULK_RPM': env.int("AI_BULK_RPM", default=500),
+    'BULK_TPM': env.int("AI_BULK_TPM", default=200000),
+    # Отложенные пакетные задания (batch_process_products(deferred=True)).
+    # Для разработки: apps.ai.services.batch_backends.LocalFileBatchBackend.
+    'BATCH_BACKEND': env("AI_BATCH_BACKEND", default="apps.ai.services.batch_backends.OpenAIBatchBackend"),
+    'BATCH_LOCAL_DIR': env("AI_BATCH_LOCAL_DIR", default=""),
+    # RAG: категории/шаблоны Qdrant в памяти процесса (перечитываются при смене
+    # версии или раз в RAG_INDEX_TTL секунд) и кэш эмбеддингов запросов.
+    'RAG_LOCAL_INDEX': env.bool("AI_RAG_LOCAL_INDEX", default=True),
+    'RAG_INDEX_TTL': env.int("AI_RAG_INDEX_TTL", default=3600),
+    'EMBEDDING_CACHE_TTL': env.int("AI_EMBEDDING_CACHE_TTL", default=60 * 60 * 24 * 7),
+    'EMBEDDING_MEMO_SIZE': env.int("AI_EMBEDDING_MEMO_SIZE", default=2048),
+    # Производные изображений для Vision (AI_R2_SETTINGS['derivatives_path']):
+    # создаются при первой обработке и переиспользуются (ключ — ETag объекта R2
+    # из head_object, для внешних URL — хэш скачанного содержимого).
+    'ANALYSIS_IMAGE_CACHE': env.bool("AI_ANALYSIS_IMAGE_CACHE", default=True),
+    'ANALYSIS_HTTP_POOL_SIZE': env.int("AI_ANALYSIS_HTTP_POOL_SIZE", default=16),
 }
 
 # R2 Configuration (Used for AI processing and media proxy)
@@ -510,6 +622,7 @@ AI_R2_SETTINGS = {
     'processed_images_path': 'products/processed/',
     'thumbnails_path': 'products/thumbs/',
     'temp_processing_path': 'temp/ai_processing/',
+    'derivatives_path': 'products/ai_derivatives/',
     'cdn_url': R2_PUBLIC_URL,
 }
 
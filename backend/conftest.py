@@ -15,3 +15,16 @@ def _isolate_test_cache(settings):
     cache.clear()
     yield
     cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolate_media_root(settings, tmp_path):
+    """Файлы, сохранённые тестами (парсеры, медиа), не должны попадать в backend/media."""
+    media_root = tmp_path / "media"
+    settings.MEDIA_ROOT = media_root
+    default = settings.STORAGES["default"]
+    if default["BACKEND"] == "django.core.files.storage.FileSystemStorage":
+        settings.STORAGES = {
+            **settings.STORAGES,
+            "default": {**default, "OPTIONS": {**default.get("OPTIONS", {}), "location": media_root}},
+        }
@@ -0,0 +1,95 @@
+"""Dynamic micro-batching for encoder calls.
+
+Requests from all callers are placed in one bounded queue. A single worker
+takes up to ``max_batch_size`` items, waiting at most ``max_wait_ms`` after
+the first one, and runs the encoder once per batch in a thread so the event
+loop keeps accepting requests. A full queue is reported to the caller
+(HTTP 503) instead of growing memory without bound.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """The batcher queue has no room for the request."""
+
+
+@dataclass
+class _Item:
+    payload: Any
+    future: asyncio.Future
+
+
+@dataclass
+class MicroBatcher:
+    name: str
+    encode: Callable[[List[Any]], Sequence[Any]]
+    max_batch_size: int = 64
+    max_wait_ms: float = 10.0
+    queue_size: int = 2048
+    batches: int = 0
+    items: int = 0
+    _queue: asyncio.Queue = field(init=False, default=None)
+    _worker: asyncio.Task = field(init=False, default=None)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run(), name=f"batcher-{self.name}")
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, payloads: Sequence[Any]) -> List[Any]:
+        """Queue the payloads and wait for their results (in order)."""
+        if self._queue.qsize() + len(payloads) > self.queue_size:
+            raise QueueFullError(f"{self.name} queue is full")
+        loop = asyncio.get_running_loop()
+        items = [_Item(payload, loop.create_future()) for payload in payloads]
+        for item in items:
+            self._queue.put_nowait(item)
+        return list(await asyncio.gather(*(item.future for item in items)))
+
+    async def _collect(self) -> List[_Item]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                results = await asyncio.to_thread(self.encode, [item.payload for item in batch])
+            except Exception as e:
+                logger.exception("%s batch of %s failed", self.name, len(batch))
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
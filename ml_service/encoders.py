@@ -0,0 +1,119 @@
+"""CPU encoders served by the embedding endpoints.
+
+Text: sentence-transformers on ONNX Runtime (int8-quantized export by default),
+with a fallback to PyTorch and dynamic int8 quantization of Linear layers.
+Image: only the CLIP vision tower with projection (no text tower in memory),
+dynamically quantized to int8 on CPU.
+
+The models match the backend encoders (apps.recommendations.services.text_encoder /
+image_encoder), but int8 outputs differ from the in-process fp32 ones: the backend tags
+Qdrant points with the encoder backend and never compares vectors across backends.
+"""
+
+import logging
+import os
+from io import BytesIO
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TEXT_MODEL = os.getenv("ML_TEXT_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+IMAGE_MODEL = os.getenv("ML_IMAGE_MODEL", "openai/clip-vit-base-patch32")
+# onnx | torch
+BACKEND = os.getenv("ML_BACKEND", "onnx")
+# int8 | none
+QUANTIZE = os.getenv("ML_QUANTIZE", "int8")
+TEXT_ONNX_FILE = os.getenv("ML_TEXT_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+NUM_THREADS = int(os.getenv("ML_NUM_THREADS", "0"))
+MAX_TEXT_LENGTH = 2000
+
+
+def _configure_torch_threads() -> None:
+    if NUM_THREADS:
+        import torch
+        torch.set_num_threads(NUM_THREADS)
+
+
+class TextEncoder:
+    """Batch text encoder, L2-normalized 384-dim vectors."""
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+
+        self.variant = "torch"
+        self.model = None
+        if BACKEND == "onnx":
+            try:
+                model_kwargs = {"file_name": TEXT_ONNX_FILE} if QUANTIZE == "int8" else {}
+                self.model = SentenceTransformer(TEXT_MODEL, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+                self.variant = "onnx-int8" if QUANTIZE == "int8" else "onnx"
+            except Exception as e:
+                logger.warning("ONNX text model unavailable (%s), falling back to PyTorch", e)
+        if self.model is None:
+            _configure_torch_threads()
+            self.model = SentenceTransformer(TEXT_MODEL, device="cpu")
+            if QUANTIZE == "int8":
+                import torch
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                self.variant = "torch-int8"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        logger.info("Text encoder %s loaded (%s)", TEXT_MODEL, self.variant)
+
+    def __call__(self, texts: List[str]) -> List[np.ndarray]:
+        embeddings = self.model.encode(
+            [(text or "")[:MAX_TEXT_LENGTH] for text in texts],
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return list(np.asarray(embeddings, dtype=np.float32))
+
+
+class ImageEncoder:
+    """Batch image encoder (CLIP image features), L2-normalized 512-dim vectors."""
+
+    def __init__(self):
+        import torch
+        from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
+
+        _configure_torch_threads()
+        self.processor = CLIPImageProcessor.from_pretrained(IMAGE_MODEL)
+        model = CLIPVisionModelWithProjection.from_pretrained(IMAGE_MODEL).eval()
+        self.variant = "torch"
+        if QUANTIZE == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.variant = "torch-int8"
+        self.model = model
+        self.dimension = model.config.projection_dim
+        logger.info("Image encoder %s loaded (%s)", IMAGE_MODEL, self.variant)
+
+    @staticmethod
+    def _decode(data: Optional[bytes]):
+        from PIL import Image
+
+        if not data:
+            return None
+        try:
+            return Image.open(BytesIO(data)).convert("RGB")
+        except Exception as e:
+            logger.warning("Invalid image: %s", e)
+            return None
+
+    def __call__(self, blobs: List[Optional[bytes]]) -> List[Optional[np.ndarray]]:
+        import torch
+
+        images = [self._decode(blob) for blob in blobs]
+        positions = [index for index, image in enumerate(images) if image is not None]
+        results: List[Optional[np.ndarray]] = [None] * len(images)
+        if not positions:
+            return results
+        inputs = self.processor(images=[images[index] for index in positions], return_tensors="pt")
+        with torch.inference_mode():
+            features = self.model(**inputs).image_embeds
+        features = features / features.norm(dim=-1, keepdim=True)
+        for index, row in zip(positions, features.numpy().astype(np.float32)):
+            results[index] = row
+        return results
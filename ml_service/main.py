@@ -1,11 +1,166 @@
-"""Minimal FastAPI service stub for future ML/embeddings (per TZ)."""
+"""Embedding inference service: batched /embed/text and /embed/image.
 
-from fastapi import FastAPI
+Django and Celery workers call it through apps.recommendations.services.ml_client
+(ML_SERVICE_URL) instead of loading sentence-transformers/CLIP in every process.
+Requests from all callers share per-model micro-batchers (see batching.py).
+"""
 
-app = FastAPI(title="ML Service", description="Optional ML/embeddings service for Mudaroba AI")
+import asyncio
+import base64
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+
+import encoders
+from batching import MicroBatcher, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("ML_MAX_WAIT_MS", "10"))
+QUEUE_SIZE = int(os.getenv("ML_QUEUE_SIZE", "2048"))
+MAX_ITEMS_PER_REQUEST = int(os.getenv("ML_MAX_ITEMS_PER_REQUEST", "256"))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("ML_IMAGE_FETCH_TIMEOUT", "30"))
+# Модели, загружаемые при старте: text,image (пусто — обе).
+ENABLED_MODELS = set(filter(None, os.getenv("ML_MODELS", "text,image").split(",")))
+
+
+def _load(name: str, factory):
+    try:
+        return factory()
+    except Exception:
+        logger.exception("Failed to load %s encoder", name)
+        return None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.encoders = {}
+    app.state.batchers = {}
+    factories = {"text": encoders.TextEncoder, "image": encoders.ImageEncoder}
+    for name in ("text", "image"):
+        if name not in ENABLED_MODELS:
+            continue
+        encoder = await asyncio.to_thread(_load, name, factories[name])
+        if encoder is None:
+            continue
+        batcher = MicroBatcher(name, encoder, MAX_BATCH_SIZE, MAX_WAIT_MS, QUEUE_SIZE)
+        batcher.start()
+        app.state.encoders[name] = encoder
+        app.state.batchers[name] = batcher
+    app.state.http = httpx.AsyncClient(
+        timeout=IMAGE_FETCH_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    yield
+    await app.state.http.aclose()
+    for batcher in app.state.batchers.values():
+        await batcher.stop()
+
+
+app = FastAPI(
+    title="ML Service",
+    description="Embedding inference for Mudaroba recommendations",
+    lifespan=lifespan,
+)
+
+
+class TextRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1)
+    format: Literal["float", "base64"] = "float"
+
+
+class ImageRequest(BaseModel):
+    urls: List[str] = Field(default_factory=list)
+    # Base64 содержимое файлов изображений (JPEG/PNG/WebP).
+    images: List[str] = Field(default_factory=list)
+    format: Literal["float", "base64"] = "float"
+
+
+class EmbedResponse(BaseModel):
+    model: str
+    variant: str
+    dimension: int
+    vectors: List[Optional[object]]
+
+
+def _serialize(vector: Optional[np.ndarray], fmt: str):
+    if vector is None:
+        return None
+    if fmt == "base64":
+        return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+    return vector.tolist()
+
+
+async def _embed(name: str, payloads: list, fmt: str) -> EmbedResponse:
+    batcher = app.state.batchers.get(name)
+    if batcher is None:
+        raise HTTPException(status_code=503, detail=f"{name} encoder is not loaded")
+    if len(payloads) > MAX_ITEMS_PER_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ITEMS_PER_REQUEST} items per request")
+    try:
+        vectors = await batcher.submit(payloads)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    encoder = app.state.encoders[name]
+    return EmbedResponse(
+        model=encoders.TEXT_MODEL if name == "text" else encoders.IMAGE_MODEL,
+        variant=encoder.variant,
+        dimension=encoder.dimension,
+        vectors=[_serialize(vector, fmt) for vector in vectors],
+    )
+
+
+async def _download(url: str) -> Optional[bytes]:
+    try:
+        response = await app.state.http.get(url)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.warning("Failed to load image from %s: %s", url, e)
+        return None
 
 
 @app.get("/health")
 def health():
     """Health check for orchestration/load balancers."""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "models": {
+            name: {
+                "variant": app.state.encoders[name].variant,
+                "queue_depth": batcher.depth,
+                "batches": batcher.batches,
+                "items": batcher.items,
+            }
+            for name, batcher in app.state.batchers.items()
+        },
+    }
+
+
+@app.post("/embed/text", response_model=EmbedResponse)
+async def embed_text(request: TextRequest):
+    return await _embed("text", request.texts, request.format)
+
+
+@app.post("/embed/image", response_model=EmbedResponse)
+async def embed_image(request: ImageRequest):
+    if bool(request.urls) == bool(request.images):
+        raise HTTPException(status_code=422, detail="Pass either urls or images")
+    if request.urls:
+        blobs = await asyncio.gather(*(_download(url) for url in request.urls))
+    else:
+        blobs = []
+        for item in request.images:
+            try:
+                blobs.append(base64.b64decode(item, validate=True))
+            except ValueError:
+                blobs.append(None)
+    return await _embed("image", list(blobs), request.format)